@@ -3,9 +3,14 @@
 Detects volume spikes, price breakouts, foreign acceleration, and basis flips.
 Uses QuoteCache, ForeignInvestorTracker, DerivativesTracker as data sources.
 Registers alerts via AlertService (gets dedup for free).
+
+Volume spikes are scored against per-symbol running statistics (windowed
+sum / sum of squares, plus an EWMA) that update on append and evict, so
+each trade costs O(1) regardless of window length.
 """
 
 import logging
+import math
 from collections import deque
 from datetime import datetime, timedelta
 
@@ -14,13 +19,19 @@ from app.analytics.alert_service import AlertService
 from app.services.derivatives_tracker import DerivativesTracker
 from app.services.foreign_investor_tracker import ForeignInvestorTracker
 from app.services.quote_cache import QuoteCache
+from app.services.time_ring import TimeRing
 
 logger = logging.getLogger(__name__)
 
-# Volume spike: current trade vol > N× average over window
+# Volume spike: current trade vol > N× average over window ("ratio" mode),
+# or > N standard deviations above the window / EWMA mean ("zscore" / "ewma")
 _VOL_WINDOW_MIN = 20
 _VOL_SPIKE_MULTIPLIER = 3.0
-_VOL_HISTORY_MAXLEN = 1200  # ~20min at 1 trade/sec
+_VOL_ZSCORE_THRESHOLD = 3.0
+_VOL_EWMA_ALPHA = 0.05  # ~40-trade half-life
+_VOL_MIN_SAMPLES = 10
+_VOL_HISTORY_MAXLEN = 20_000  # caps the 20min window for very active symbols
+VOLUME_SPIKE_MODES = ("ratio", "zscore", "ewma")
 
 # Foreign acceleration: net_value change >30% in 5min
 _FOREIGN_WINDOW_MIN = 5
@@ -29,6 +40,63 @@ _FOREIGN_HISTORY_MAXLEN = 300  # ~5min at 1 msg/sec
 _FOREIGN_MIN_VALUE = 1_000_000_000  # 1B VND — ignore noise on tiny values
 
 
+class _VolumeStats:
+    """Trade volumes in a trailing time window with running moments.
+
+    Volumes are ints, so the windowed sum and sum of squares stay exact
+    through any number of append/evict cycles. The EWMA mean/variance is
+    unwindowed and decays instead.
+    """
+
+    __slots__ = ("_entries", "count", "total", "total_sq", "ewma_mean", "ewma_var", "ewma_n")
+
+    def __init__(self):
+        self._entries: deque[tuple[datetime, int]] = deque()
+        self.count = 0
+        self.total = 0
+        self.total_sq = 0
+        self.ewma_mean = 0.0
+        self.ewma_var = 0.0
+        self.ewma_n = 0
+
+    def evict(self, cutoff: datetime) -> None:
+        """Drop entries older than cutoff."""
+        entries = self._entries
+        while entries and entries[0][0] < cutoff:
+            self._pop()
+
+    def push(self, ts: datetime, vol: int) -> None:
+        if self.count >= _VOL_HISTORY_MAXLEN:
+            self._pop()
+        self._entries.append((ts, vol))
+        self.count += 1
+        self.total += vol
+        self.total_sq += vol * vol
+        if self.ewma_n == 0:
+            self.ewma_mean = float(vol)
+        else:
+            diff = vol - self.ewma_mean
+            incr = _VOL_EWMA_ALPHA * diff
+            self.ewma_mean += incr
+            self.ewma_var = (1 - _VOL_EWMA_ALPHA) * (self.ewma_var + diff * incr)
+        self.ewma_n += 1
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def std(self) -> float:
+        if not self.count:
+            return 0.0
+        var = (self.total_sq - self.total * self.total / self.count) / self.count
+        return math.sqrt(var) if var > 0 else 0.0
+
+    def _pop(self) -> None:
+        _, vol = self._entries.popleft()
+        self.count -= 1
+        self.total -= vol
+        self.total_sq -= vol * vol
+
+
 class PriceTracker:
     """Real-time market alert generator. 4 signal types, no ML, no scoring."""
 
@@ -38,15 +106,19 @@ class PriceTracker:
         quote_cache: QuoteCache,
         foreign_tracker: ForeignInvestorTracker,
         derivatives_tracker: DerivativesTracker,
+        spike_mode: str = "ratio",
     ):
+        if spike_mode not in VOLUME_SPIKE_MODES:
+            raise ValueError(f"spike_mode must be one of {VOLUME_SPIKE_MODES}, got {spike_mode!r}")
         self._alerts = alert_service
         self._quotes = quote_cache
         self._foreign = foreign_tracker
         self._derivatives = derivatives_tracker
-        # Volume history: symbol → deque of (timestamp, trade_vol)
-        self._vol_history: dict[str, deque[tuple[datetime, int]]] = {}
-        # Foreign net_value history: symbol → deque of (timestamp, net_value)
-        self._foreign_history: dict[str, deque[tuple[datetime, float]]] = {}
+        self._spike_mode = spike_mode
+        # Volume window statistics per symbol
+        self._vol_stats: dict[str, _VolumeStats] = {}
+        # Foreign net_value history: symbol → time-indexed ring of net_value
+        self._foreign_history: dict[str, TimeRing[float]] = {}
         # Previous basis sign for zero-crossing detection (True=premium)
         self._prev_basis_sign: bool | None = None
 
@@ -67,40 +139,63 @@ class PriceTracker:
 
     def reset(self):
         """Clear all tracking state. Called at 15:00 VN daily."""
-        self._vol_history.clear()
+        self._vol_stats.clear()
         self._foreign_history.clear()
         self._prev_basis_sign = None
 
     # -- Detection rules --
 
     def _check_volume_spike(self, symbol: str, last_price: float, last_vol: int):
-        """VOLUME_SPIKE: current trade vol > 3× avg vol over 20min window."""
+        """VOLUME_SPIKE: current trade vol > 3× avg vol over 20min window.
+
+        In "zscore" / "ewma" mode: vol > 3σ above the window / EWMA mean of
+        the preceding trades (the current trade is excluded from its baseline).
+        """
         now = datetime.now()
-        if symbol not in self._vol_history:
-            self._vol_history[symbol] = deque(maxlen=_VOL_HISTORY_MAXLEN)
-        history = self._vol_history[symbol]
-        history.append((now, last_vol))
-
-        # Need minimum sample for meaningful average
-        cutoff = now - timedelta(minutes=_VOL_WINDOW_MIN)
-        recent = [v for ts, v in history if ts >= cutoff]
-        if len(recent) < 10:
-            return
+        stats = self._vol_stats.get(symbol)
+        if stats is None:
+            stats = self._vol_stats[symbol] = _VolumeStats()
+        stats.evict(now - timedelta(minutes=_VOL_WINDOW_MIN))
+
+        zscore = None
+        if self._spike_mode == "zscore":
+            if stats.count >= _VOL_MIN_SAMPLES:
+                avg_vol, std = stats.mean(), stats.std()
+                zscore = (last_vol - avg_vol) / std if std > 0 else None
+        elif self._spike_mode == "ewma":
+            if stats.ewma_n >= _VOL_MIN_SAMPLES:
+                avg_vol, std = stats.ewma_mean, math.sqrt(stats.ewma_var)
+                zscore = (last_vol - avg_vol) / std if std > 0 else None
+        stats.push(now, last_vol)
 
-        avg_vol = sum(recent) / len(recent)
-        if avg_vol <= 0:
+        if self._spike_mode == "ratio":
+            # Need minimum sample for meaningful average
+            if stats.count < _VOL_MIN_SAMPLES:
+                return
+            avg_vol = stats.mean()
+            if avg_vol <= 0:
+                return
+            ratio = last_vol / avg_vol
+            if ratio <= _VOL_SPIKE_MULTIPLIER:
+                return
+        elif zscore is None or zscore <= _VOL_ZSCORE_THRESHOLD:
             return
 
-        ratio = last_vol / avg_vol
-        if ratio > _VOL_SPIKE_MULTIPLIER:
-            self._alerts.register_alert(Alert(
-                alert_type=AlertType.VOLUME_SPIKE,
-                severity=AlertSeverity.WARNING,
-                symbol=symbol,
-                message=f"{symbol} vol spike: {last_vol:,} ({ratio:.1f}x avg)",
-                data={"last_vol": last_vol, "avg_vol": round(avg_vol, 1),
-                       "ratio": round(ratio, 1), "price": last_price},
-            ))
+        ratio = last_vol / avg_vol if avg_vol > 0 else 0.0
+        data = {"last_vol": last_vol, "avg_vol": round(avg_vol, 1),
+                "ratio": round(ratio, 1), "price": last_price}
+        if zscore is None:
+            detail = f"{ratio:.1f}x avg"
+        else:
+            detail = f"{zscore:.1f}σ, {ratio:.1f}x avg"
+            data["zscore"] = round(zscore, 1)
+        self._alerts.register_alert(Alert(
+            alert_type=AlertType.VOLUME_SPIKE,
+            severity=AlertSeverity.WARNING,
+            symbol=symbol,
+            message=f"{symbol} vol spike: {last_vol:,} ({detail})",
+            data=data,
+        ))
 
     def _check_price_breakout(self, symbol: str, last_price: float):
         """PRICE_BREAKOUT: price hits ceiling or floor."""
@@ -132,17 +227,15 @@ class PriceTracker:
         net_value = data.net_value
 
         if symbol not in self._foreign_history:
-            self._foreign_history[symbol] = deque(maxlen=_FOREIGN_HISTORY_MAXLEN)
+            self._foreign_history[symbol] = TimeRing(_FOREIGN_HISTORY_MAXLEN)
         history = self._foreign_history[symbol]
-        history.append((now, net_value))
+        history.append(now, net_value)
 
-        # Find value closest to 5min ago
-        cutoff = now - timedelta(minutes=_FOREIGN_WINDOW_MIN)
-        past_entries = [(ts, v) for ts, v in history if ts <= cutoff]
-        if not past_entries:
+        # Most recent value at or before 5min ago
+        past_value = history.at_or_before(now - timedelta(minutes=_FOREIGN_WINDOW_MIN))
+        if past_value is None:
             return
 
-        past_value = past_entries[-1][1]  # most recent entry before cutoff
         if abs(past_value) < _FOREIGN_MIN_VALUE:
             return
 
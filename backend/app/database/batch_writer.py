@@ -1,17 +1,41 @@
 """High-throughput batch writer using asyncpg COPY protocol.
 
 Collects records into bounded asyncio.Queues (maxsize=10000) and flushes
-every 1s or when batch reaches 500 records. On queue full, drops oldest
-with warning. Graceful shutdown flushes remaining records.
+every 1s, or early as soon as any queue crosses the high-water mark. Ticks
+use a columnar TickBuffer that TradeClassifier appends to directly. Each
+flush drains everything pending — at most MAX_QUEUE_SIZE rows per table, so
+one COPY never exceeds what a full queue holds — and COPYs the four tables
+concurrently, each on its own pool connection. Graceful
+shutdown flushes remaining records.
+
+With a SpillLog attached, nothing is dropped: batches that cannot be
+COPYed (no pool, COPY error) and queues that overflow are appended to the
+on-disk log instead, and a replay loop bulk-loads those segments once the
+database is healthy again (reconnecting the pool if startup found it down).
+Without one, a full queue drops its oldest record and a failed COPY is
+logged and lost.
+
+A flush callback, if set, is told the table after every committed COPY
+(replayed=True for spill replays), e.g. to invalidate cached queries.
 """
 
 import asyncio
 import logging
 import time
+from collections.abc import Callable, Collection
 from datetime import datetime, timezone
 
 from app.database.pool import Database
-from app.metrics import db_write_duration_seconds
+from app.database.spill_log import SpillLog
+from app.database.tick_buffer import TICK_COLUMNS, TickBuffer, TickColumns, compact_row
+from app.metrics import (
+    db_queue_depth,
+    db_records_dropped_total,
+    db_replayed_rows_total,
+    db_rows_written_total,
+    db_write_duration_seconds,
+    db_write_rows_per_second,
+)
 from app.models.domain import (
     BasisPoint,
     ClassifiedTrade,
@@ -22,7 +46,69 @@ from app.models.domain import (
 logger = logging.getLogger(__name__)
 
 MAX_QUEUE_SIZE = 10_000
-FLUSH_BATCH_SIZE = 500
+HIGH_WATER_MARK = MAX_QUEUE_SIZE // 2  # queue depth that triggers an early flush
+# Max rows per table per flush; the queue bound is the real limit on COPY size
+FLUSH_MAX_ROWS = MAX_QUEUE_SIZE
+REPLAY_ATTEMPTS = 3  # failed loads of one spill segment before it is set aside
+
+
+FOREIGN_COLUMNS = [
+    "symbol", "timestamp", "buy_vol", "sell_vol",
+    "net_vol", "buy_value", "sell_value",
+]
+INDEX_COLUMNS = ["index_name", "timestamp", "value", "change_pct", "volume"]
+BASIS_COLUMNS = ["contract", "timestamp", "price", "basis", "open_interest"]
+
+
+def _foreign_records(batch: list[ForeignInvestorData]) -> list[tuple]:
+    now = datetime.now(timezone.utc)
+    return [
+        (
+            d.symbol,
+            d.last_updated or now,
+            d.buy_volume,
+            d.sell_volume,
+            d.net_volume,
+            d.buy_value,
+            d.sell_value,
+        )
+        for d in batch
+    ]
+
+
+def _index_records(batch: list[IndexData]) -> list[tuple]:
+    now = datetime.now(timezone.utc)
+    return [
+        (
+            d.index_id,
+            d.last_updated or now,
+            d.value,
+            d.ratio_change,
+            d.total_volume,
+        )
+        for d in batch
+    ]
+
+
+def _basis_records(batch: list[BasisPoint]) -> list[tuple]:
+    return [
+        (
+            b.futures_symbol,
+            b.timestamp,
+            b.futures_price,
+            b.basis,
+            0,  # open_interest — not yet available from stream
+        )
+        for b in batch
+    ]
+
+
+# Queue-backed tables: table → (columns, batch → records)
+_QUEUE_TABLES = {
+    "foreign_flow": (FOREIGN_COLUMNS, _foreign_records),
+    "index_snapshots": (INDEX_COLUMNS, _index_records),
+    "derivatives": (BASIS_COLUMNS, _basis_records),
+}
 
 
 class BatchWriter:
@@ -32,12 +118,14 @@ class BatchWriter:
         self,
         db: Database,
         flush_interval: float = 1.0,
+        spill: SpillLog | None = None,
+        replay_interval: float = 5.0,
     ) -> None:
         self._db = db
         self._interval = flush_interval
-        self._tick_queue: asyncio.Queue[ClassifiedTrade] = asyncio.Queue(
-            maxsize=MAX_QUEUE_SIZE,
-        )
+        self._spill = spill
+        self._replay_interval = replay_interval
+        self._replay_failures: dict[str, int] = {}  # spill segment name -> failed loads
         self._foreign_queue: asyncio.Queue[ForeignInvestorData] = asyncio.Queue(
             maxsize=MAX_QUEUE_SIZE,
         )
@@ -48,76 +136,252 @@ class BatchWriter:
             maxsize=MAX_QUEUE_SIZE,
         )
         self._task: asyncio.Task | None = None
+        self._replay_task: asyncio.Task | None = None
         self._running = False
+        self._on_flush: Callable[[str, bool], None] | None = None
+        # Set by enqueue when a queue crosses HIGH_WATER_MARK; wakes the flush loop
+        self._wake = asyncio.Event()
+        # Ticks are columnar: TradeClassifier appends rows here directly
+        self.tick_buffer = TickBuffer(
+            MAX_QUEUE_SIZE,
+            high_water=HIGH_WATER_MARK,
+            on_high_water=self._wake.set,
+            on_overflow=self._spill_ticks if spill else None,
+        )
+
+    @property
+    def spill_enabled(self) -> bool:
+        return self._spill is not None
+
+    def set_flush_callback(self, callback: Callable[[str, bool], None] | None) -> None:
+        """Call callback(table, replayed) after rows are committed to table."""
+        self._on_flush = callback
 
     # -- Public API -----------------------------------------------------------
 
     async def start(self) -> None:
         self._running = True
         self._task = asyncio.create_task(self._flush_loop())
-        logger.info("BatchWriter started (interval=%.1fs)", self._interval)
+        if self._spill:
+            self._replay_task = asyncio.create_task(self._replay_loop())
+        logger.info(
+            "BatchWriter started (interval=%.1fs, spill=%s)",
+            self._interval, "on" if self._spill else "off",
+        )
 
     async def stop(self) -> None:
-        """Cancel loop and flush remaining records."""
+        """Cancel loops and flush remaining records (to the spill log if the DB is down)."""
         self._running = False
-        if self._task:
-            self._task.cancel()
-            try:
-                await self._task
-            except asyncio.CancelledError:
-                pass
+        for task in (self._task, self._replay_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
         # Final flush
         await self._flush_all()
+        if self._spill:
+            self._spill.close()
         logger.info("BatchWriter stopped — final flush complete")
 
     def enqueue_tick(self, trade: ClassifiedTrade) -> None:
-        self._enqueue_safe(self._tick_queue, trade, "tick")
+        """Append a ClassifiedTrade to the tick buffer (hot path writes columns directly)."""
+        self.tick_buffer.append(
+            trade.symbol, trade.timestamp, trade.price, trade.volume,
+            trade.trade_type.value, trade.bid_price, trade.ask_price,
+        )
 
     def enqueue_foreign(self, data: ForeignInvestorData) -> None:
-        self._enqueue_safe(self._foreign_queue, data, "foreign")
+        self._enqueue_safe(self._foreign_queue, data, "foreign_flow")
 
     def enqueue_index(self, data: IndexData) -> None:
-        self._enqueue_safe(self._index_queue, data, "index")
+        self._enqueue_safe(self._index_queue, data, "index_snapshots")
 
     def enqueue_basis(self, bp: BasisPoint) -> None:
-        self._enqueue_safe(self._basis_queue, bp, "basis")
+        self._enqueue_safe(self._basis_queue, bp, "derivatives")
+
+    async def replay_spill(self) -> int:
+        """Bulk-load spilled segments once the database is healthy. Returns rows loaded.
+
+        Each segment is loaded in one transaction and deleted after commit,
+        so a failed replay leaves the segment intact for the next attempt.
+        A segment that cannot be read, or whose load fails REPLAY_ATTEMPTS
+        times while the database is up, is set aside (SpillLog.set_aside)
+        so later segments still replay; it is never deleted unread.
+        """
+        if not self._spill or not self._spill.has_pending():
+            return 0
+        if self._db.pool is None:
+            try:
+                await self._db.connect()
+                logger.info("Database reconnected — replaying spill log")
+            except Exception:
+                logger.debug("Database still unavailable for spill replay", exc_info=True)
+                return 0
+        if not await self._db.health_check():
+            return 0
+        self._spill.seal()  # make the active segment replayable
+        total = 0
+        for path in self._spill.sealed_segments():
+            counts: dict[str, int] = {}
+            reading = False
+            try:
+                async with self._db.pool.acquire() as conn:
+                    async with conn.transaction():
+                        batches = SpillLog.read_segment(path)
+                        while True:
+                            reading = True
+                            batch = next(batches, None)
+                            reading = False
+                            if batch is None:
+                                break
+                            table, columns, rows = batch
+                            if table == "tick_data" and rows and isinstance(rows[0][4], str):
+                                rows = [compact_row(r) for r in rows]
+                            await conn.copy_records_to_table(table, columns=columns, records=rows)
+                            counts[table] = counts.get(table, 0) + len(rows)
+            except Exception:
+                if reading:
+                    failed = self._spill.set_aside(path)
+                    logger.exception("Unreadable spill segment set aside as %s", failed.name)
+                    continue
+                if not await self._db.health_check():
+                    logger.warning("Database went away during spill replay — will retry")
+                    return total
+                attempts = self._replay_failures.get(path.name, 0) + 1
+                if attempts < REPLAY_ATTEMPTS:
+                    self._replay_failures[path.name] = attempts
+                    logger.exception(
+                        "Spill segment %s failed to load (attempt %d/%d)",
+                        path.name, attempts, REPLAY_ATTEMPTS,
+                    )
+                else:
+                    self._replay_failures.pop(path.name, None)
+                    failed = self._spill.set_aside(path)
+                    logger.exception(
+                        "Spill segment %s failed to load %d times — set aside as %s",
+                        path.name, attempts, failed.name,
+                    )
+                continue
+            self._replay_failures.pop(path.name, None)
+            self._spill.remove(path)
+            for table, n in counts.items():
+                db_replayed_rows_total.labels(table=table).inc(n)
+                total += n
+                if self._on_flush is not None:
+                    self._on_flush(table, True)
+            logger.info("Replayed spill segment %s (%d rows)", path.name, sum(counts.values()))
+        return total
 
     # -- Internal -------------------------------------------------------------
 
-    def _enqueue_safe(self, queue: asyncio.Queue, item: object, label: str) -> None:
-        """Put item in queue. If full, drop oldest and warn."""
+    def _enqueue_safe(self, queue: asyncio.Queue, item: object, table: str) -> None:
+        """Put item in queue. If full, spill the backlog (or drop oldest). Wake flush at high-water."""
         if queue.full():
-            try:
-                queue.get_nowait()
-                logger.warning(
-                    "BatchWriter %s queue full (%d), dropped oldest",
-                    label,
-                    MAX_QUEUE_SIZE,
-                )
-            except asyncio.QueueEmpty:
-                pass
+            if self._spill:
+                self._spill_queue(table, queue)
+            else:
+                try:
+                    queue.get_nowait()
+                    db_records_dropped_total.labels(table=table).inc()
+                    logger.warning(
+                        "BatchWriter %s queue full (%d), dropped oldest",
+                        table,
+                        MAX_QUEUE_SIZE,
+                    )
+                except asyncio.QueueEmpty:
+                    pass
         try:
             queue.put_nowait(item)
         except asyncio.QueueFull:
+            db_records_dropped_total.labels(table=table).inc()
             logger.error(
                 "BatchWriter %s queue still full after drop — discarding new record",
-                label,
+                table,
             )
+        if queue.qsize() >= HIGH_WATER_MARK:
+            self._wake.set()
+
+    def _spill_queue(self, table: str, queue: asyncio.Queue) -> None:
+        """Move a backed-up queue to the spill log in one frame."""
+        columns, to_records = _QUEUE_TABLES[table]
+        batch = self._drain(queue, queue.qsize())
+        self._spill_records(table, columns, to_records(batch))
+
+    def _spill_ticks(self, batch: TickColumns) -> None:
+        self._spill_records("tick_data", TICK_COLUMNS, batch)
+
+    def _spill_records(self, table: str, columns: list[str], records: Collection[tuple]) -> None:
+        try:
+            if self._spill.append(table, columns, records):
+                logger.warning("Spilled %d %s rows to disk", len(records), table)
+        except Exception:
+            db_records_dropped_total.labels(table=table).inc(len(records))
+            logger.exception("Failed to spill %s (%d records) — dropped", table, len(records))
 
     async def _flush_loop(self) -> None:
         while self._running:
-            await asyncio.sleep(self._interval)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
             await self._flush_all()
 
+    async def _replay_loop(self) -> None:
+        while self._running:
+            await asyncio.sleep(self._replay_interval)
+            try:
+                await self.replay_spill()
+            except Exception:
+                logger.exception("Spill replay failed — will retry")
+
     async def _flush_all(self) -> None:
+        """Flush all four tables concurrently on separate pool connections."""
         self._db.update_pool_metrics()
-        await self._flush_ticks()
-        await self._flush_foreign()
-        await self._flush_index()
-        await self._flush_basis()
+        db_queue_depth.labels(table="tick_data").set(len(self.tick_buffer))
+        for table, queue in (
+            ("foreign_flow", self._foreign_queue),
+            ("index_snapshots", self._index_queue),
+            ("derivatives", self._basis_queue),
+        ):
+            db_queue_depth.labels(table=table).set(queue.qsize())
+        await asyncio.gather(
+            self._flush_ticks(),
+            self._flush_foreign(),
+            self._flush_index(),
+            self._flush_basis(),
+        )
+
+    async def _copy(self, table: str, columns: list[str], records: Collection[tuple]) -> None:
+        """COPY records into table on a dedicated pool connection and record metrics."""
+        start = time.monotonic()
+        async with self._db.pool.acquire() as conn:
+            await conn.copy_records_to_table(table, columns=columns, records=records)
+        elapsed = time.monotonic() - start
+        db_write_duration_seconds.labels(table=table).observe(elapsed)
+        db_rows_written_total.labels(table=table).inc(len(records))
+        if elapsed > 0:
+            db_write_rows_per_second.labels(table=table).set(len(records) / elapsed)
+        if self._on_flush is not None:
+            self._on_flush(table, False)
+
+    async def _write(self, table: str, columns: list[str], records: Collection[tuple]) -> None:
+        """COPY a batch; on no pool or COPY failure, spill it if a spill log is attached."""
+        if self._db.pool is None and self._spill:
+            self._spill_records(table, columns, records)
+            return
+        try:
+            await self._copy(table, columns, records)
+            logger.debug("Flushed %d %s rows via COPY", len(records), table)
+        except Exception:
+            logger.exception("Failed to flush %s (%d records)", table, len(records))
+            if self._spill:
+                self._spill_records(table, columns, records)
 
     @staticmethod
-    def _drain(queue: asyncio.Queue, max_items: int = FLUSH_BATCH_SIZE) -> list:
+    def _drain(queue: asyncio.Queue, max_items: int) -> list:
         items: list = []
         while not queue.empty() and len(items) < max_items:
             try:
@@ -127,135 +391,21 @@ class BatchWriter:
         return items
 
     async def _flush_ticks(self) -> None:
-        batch = self._drain(self._tick_queue)
-        if not batch:
-            return
-        records = [
-            (
-                t.symbol,
-                t.timestamp,
-                t.price,
-                t.volume,
-                t.trade_type.value,
-                t.bid_price,
-                t.ask_price,
-            )
-            for t in batch
-        ]
-        try:
-            start = time.monotonic()
-            async with self._db.pool.acquire() as conn:
-                await conn.copy_records_to_table(
-                    "tick_data",
-                    columns=[
-                        "symbol", "timestamp", "price", "volume",
-                        "side", "bid", "ask",
-                    ],
-                    records=records,
-                )
-            db_write_duration_seconds.labels(table="tick_data").observe(
-                time.monotonic() - start,
-            )
-            logger.debug("Flushed %d ticks via COPY", len(records))
-        except Exception:
-            logger.exception("Failed to flush ticks (%d records)", len(records))
+        batch = self.tick_buffer.take(FLUSH_MAX_ROWS)
+        if batch:
+            await self._write("tick_data", TICK_COLUMNS, batch)
 
     async def _flush_foreign(self) -> None:
-        batch = self._drain(self._foreign_queue)
-        if not batch:
-            return
-        now = datetime.now(timezone.utc)
-        records = [
-            (
-                d.symbol,
-                d.last_updated or now,
-                d.buy_volume,
-                d.sell_volume,
-                d.net_volume,
-                d.buy_value,
-                d.sell_value,
-            )
-            for d in batch
-        ]
-        try:
-            start = time.monotonic()
-            async with self._db.pool.acquire() as conn:
-                await conn.copy_records_to_table(
-                    "foreign_flow",
-                    columns=[
-                        "symbol", "timestamp", "buy_vol", "sell_vol",
-                        "net_vol", "buy_value", "sell_value",
-                    ],
-                    records=records,
-                )
-            db_write_duration_seconds.labels(table="foreign_flow").observe(
-                time.monotonic() - start,
-            )
-            logger.debug("Flushed %d foreign records via COPY", len(records))
-        except Exception:
-            logger.exception("Failed to flush foreign (%d records)", len(records))
+        batch = self._drain(self._foreign_queue, FLUSH_MAX_ROWS)
+        if batch:
+            await self._write("foreign_flow", FOREIGN_COLUMNS, _foreign_records(batch))
 
     async def _flush_index(self) -> None:
-        batch = self._drain(self._index_queue)
-        if not batch:
-            return
-        now = datetime.now(timezone.utc)
-        records = [
-            (
-                d.index_id,
-                d.last_updated or now,
-                d.value,
-                d.ratio_change,
-                d.total_volume,
-            )
-            for d in batch
-        ]
-        try:
-            start = time.monotonic()
-            async with self._db.pool.acquire() as conn:
-                await conn.copy_records_to_table(
-                    "index_snapshots",
-                    columns=[
-                        "index_name", "timestamp", "value",
-                        "change_pct", "volume",
-                    ],
-                    records=records,
-                )
-            db_write_duration_seconds.labels(table="index_snapshots").observe(
-                time.monotonic() - start,
-            )
-            logger.debug("Flushed %d index snapshots via COPY", len(records))
-        except Exception:
-            logger.exception("Failed to flush index (%d records)", len(records))
+        batch = self._drain(self._index_queue, FLUSH_MAX_ROWS)
+        if batch:
+            await self._write("index_snapshots", INDEX_COLUMNS, _index_records(batch))
 
     async def _flush_basis(self) -> None:
-        batch = self._drain(self._basis_queue)
-        if not batch:
-            return
-        records = [
-            (
-                b.futures_symbol,
-                b.timestamp,
-                b.futures_price,
-                b.basis,
-                0,  # open_interest — not yet available from stream
-            )
-            for b in batch
-        ]
-        try:
-            start = time.monotonic()
-            async with self._db.pool.acquire() as conn:
-                await conn.copy_records_to_table(
-                    "derivatives",
-                    columns=[
-                        "contract", "timestamp", "price",
-                        "basis", "open_interest",
-                    ],
-                    records=records,
-                )
-            db_write_duration_seconds.labels(table="derivatives").observe(
-                time.monotonic() - start,
-            )
-            logger.debug("Flushed %d derivatives via COPY", len(records))
-        except Exception:
-            logger.exception("Failed to flush derivatives (%d records)", len(records))
+        batch = self._drain(self._basis_queue, FLUSH_MAX_ROWS)
+        if batch:
+            await self._write("derivatives", BASIS_COLUMNS, _basis_records(batch))
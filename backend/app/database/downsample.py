@@ -0,0 +1,110 @@
+"""Largest-Triangle-Three-Buckets (LTTB) downsampling for history series.
+
+Reduces a time series to a point budget while keeping its visual shape:
+the first and last points are kept, the rest is split into equal buckets
+and from each bucket the point forming the largest triangle with the point
+kept before it and the average of the next bucket is picked. Peaks and
+troughs survive, unlike with plain decimation or averaging.
+
+Rows are returned unchanged (a subset, in order), so a downsampled response
+has the same shape as a full one.
+"""
+
+from collections.abc import Iterable
+from datetime import datetime
+
+
+class LttbStream:
+    """LTTB over a series of known length `n`, fed one row at a time in x order.
+
+    Holds only the bucket being decided and the one after it (whose average
+    it needs), so a long range can be reduced straight off a database cursor.
+    `finish()` returns the kept rows. Budgets below 3, or series already
+    within budget, keep every row.
+    """
+
+    def __init__(self, n: int, points: int, x: str = "timestamp", y: str = "value") -> None:
+        self._n = n
+        self._points = points
+        self._x, self._y = x, y
+        self._keep_all = points < 3 or n <= points
+        self._every = 0.0 if self._keep_all else (n - 2) / (points - 2)
+        self._out: list[dict] = []
+        self._pending: list[tuple[int, float, float, dict]] = []  # (index, x, y, row)
+        self._count = 0
+        self._bucket = 0  # next bucket to decide
+        self._kept = (0.0, 0.0)  # (x, y) of the point kept before that bucket
+        self._last: tuple[int, float, float, dict] | None = None
+
+    def push(self, row: dict) -> None:
+        k = self._count
+        self._count += 1
+        if self._keep_all:
+            self._out.append(row)
+            return
+        entry = (k, _number(row[self._x]), float(row[self._y]), row)
+        if k == 0:
+            self._out.append(row)
+            self._kept = entry[1:3]
+            return
+        self._last = entry
+        self._pending.append(entry)
+        # A bucket is decided once every row of the bucket after it has arrived
+        while self._bucket < self._points - 2:
+            _, end, next_end = self._bounds(self._bucket)
+            if end >= next_end or k < next_end - 1:
+                break
+            self._decide()
+
+    def finish(self) -> list[dict]:
+        if not self._keep_all and self._last is not None:
+            while self._bucket < self._points - 2:
+                self._decide()
+            self._out.append(self._last[3])
+            self._last = None
+        return self._out
+
+    def _bounds(self, i: int) -> tuple[int, int, int]:
+        every = self._every
+        return int(i * every) + 1, int((i + 1) * every) + 1, min(int((i + 2) * every) + 1, self._n)
+
+    def _decide(self) -> None:
+        """Keep the point of the current bucket forming the largest triangle."""
+        start, end, next_end = self._bounds(self._bucket)
+        self._bucket += 1
+        following = [e for e in self._pending if end <= e[0] < next_end]
+        if end >= next_end or not following:
+            avg_x, avg_y = self._last[1], self._last[2]
+        else:
+            avg_x = sum(e[1] for e in following) / len(following)
+            avg_y = sum(e[2] for e in following) / len(following)
+
+        ax, ay = self._kept
+        best, best_area = None, -1.0
+        for e in self._pending:
+            if not start <= e[0] < end:
+                continue
+            area = abs((ax - avg_x) * (e[2] - ay) - (ax - e[1]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = e, area
+        if best is not None:
+            self._out.append(best[3])
+            self._kept = best[1:3]
+        self._pending = [e for e in self._pending if e[0] >= end]
+
+
+def lttb(rows: Iterable[dict], points: int, x: str = "timestamp", y: str = "value") -> list[dict]:
+    """Keep at most `points` of rows (sorted by x), chosen by LTTB on (x, y).
+
+    `points` below 3 cannot hold the two endpoints plus a bucket; such
+    budgets return the rows unchanged, as do series already within budget.
+    """
+    rows = list(rows)
+    sampler = LttbStream(len(rows), points, x, y)
+    for row in rows:
+        sampler.push(row)
+    return sampler.finish()
+
+
+def _number(value) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
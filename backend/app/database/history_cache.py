@@ -0,0 +1,206 @@
+"""Read-through cache for HistoryService queries.
+
+Keys are the query name plus its arguments (symbol, date range, ...).
+Results for ranges that end before today (Asia/Ho_Chi_Minh) cover closed
+trading days: they are final and stay cached until evicted (LRU beyond
+history_cache_max_entries). Ranges that include today expire after
+history_cache_ttl_s, and sooner when BatchWriter flushes the table they
+read from (invalidate()).
+
+Concurrent misses on one key share a single query (single-flight): the
+first caller starts the load as its own task and every caller awaits it,
+so one client disconnecting does not cancel the others' result.
+
+With history_cache_redis, closed-range results are also kept in Redis
+(REDIS_URL) and shared by every worker. They are stored as JSON, with
+datetimes as ISO strings and Decimals as numbers — the same values the API
+serializes them to. Row timestamps are parsed back into datetimes on read,
+since page cursors are built from them. Redis errors are logged and fall
+back to the database.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import zoneinfo
+from collections import OrderedDict, defaultdict
+from collections.abc import Awaitable, Callable
+from datetime import date, datetime
+
+from app.config import settings
+from app.database.history_stream import json_default
+from app.metrics import history_cache_requests_total
+
+logger = logging.getLogger(__name__)
+
+_VN_TZ = zoneinfo.ZoneInfo("Asia/Ho_Chi_Minh")
+_REDIS_PREFIX = "history:"
+
+Rows = list[dict]
+
+
+def market_today() -> date:
+    """Current trading date (Asia/Ho_Chi_Minh)."""
+    return datetime.now(_VN_TZ).date()
+
+
+class _Entry:
+    __slots__ = ("rows", "table", "final", "expires", "generation")
+
+    def __init__(self, rows: Rows, table: str, final: bool, expires: float, generation: int):
+        self.rows = rows
+        self.table = table
+        self.final = final
+        self.expires = expires
+        self.generation = generation
+
+
+class HistoryCache:
+    """In-process LRU of query results with single-flight loading."""
+
+    def __init__(
+        self,
+        ttl: float = 5.0,
+        max_entries: int = 1024,
+        redis_url: str | None = None,
+    ) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._redis_url = redis_url
+        self._redis = None
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        # Bumped on every flush of a table; live entries from an older generation are stale
+        self._generations: dict[str, int] = defaultdict(int)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(
+        self,
+        query: str,
+        args: tuple,
+        table: str,
+        end: date,
+        load: Callable[[], Awaitable[Rows]],
+    ) -> Rows:
+        """Cached result of load() for (query, *args).
+
+        `table` is the table whose flushes change the result — for views,
+        the hypertable they aggregate (for flush invalidation) — and
+        `end` the last date it covers (a range ending before today is final).
+        """
+        key = (query, *args)
+        entry = self._entries.get(key)
+        if entry is not None and (
+            entry.final
+            or (entry.expires > time.monotonic() and entry.generation == self._generations[table])
+        ):
+            self._entries.move_to_end(key)
+            history_cache_requests_total.labels(query=query, result="hit").inc()
+            return entry.rows
+
+        task = self._inflight.get(key)
+        if task is None:
+            history_cache_requests_total.labels(query=query, result="miss").inc()
+            task = asyncio.ensure_future(self._fill(
+                key, table, self._generations[table], end < market_today(), load,
+            ))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._loaded(key, t))
+        else:
+            history_cache_requests_total.labels(query=query, result="coalesced").inc()
+        return await asyncio.shield(task)
+
+    def invalidate(self, table: str, replayed: bool = False) -> None:
+        """BatchWriter flushed rows into table: today's results are stale.
+
+        `replayed` rows (spill log) may belong to closed days, so final
+        results for that table are dropped as well.
+        """
+        self._generations[table] += 1
+        if not replayed:
+            return
+        for key in [k for k, e in self._entries.items() if e.table == table]:
+            del self._entries[key]
+        if self._redis_url:
+            asyncio.ensure_future(self._redis_drop(table))
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    # -- Internal --------------------------------------------------------------
+
+    async def _fill(self, key: tuple, table: str, generation: int, final: bool, load) -> Rows:
+        rows = await self._redis_get(table, key) if final and self._redis_url else None
+        if rows is None:
+            rows = await load()
+            if final and self._redis_url:
+                await self._redis_set(table, key, rows)
+        self._entries[key] = _Entry(
+            rows, table, final, time.monotonic() + self._ttl, generation,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        return rows
+
+    def _loaded(self, key: tuple, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here even if every waiter has gone
+
+    def _client(self):
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as exc:  # pragma: no cover - depends on deployment
+                raise RuntimeError(
+                    "HISTORY_CACHE_REDIS=true needs the 'redis' package",
+                ) from exc
+            self._redis = aioredis.from_url(self._redis_url, decode_responses=True)
+        return self._redis
+
+    @staticmethod
+    def _redis_key(table: str, key: tuple) -> str:
+        return _REDIS_PREFIX + table + ":" + json.dumps(key, default=json_default)
+
+    async def _redis_get(self, table: str, key: tuple) -> Rows | None:
+        try:
+            value = await self._client().get(self._redis_key(table, key))
+        except Exception:
+            logger.warning("History cache: Redis read failed", exc_info=True)
+            return None
+        if value is None:
+            return None
+        rows = json.loads(value)
+        for row in rows:
+            stamp = row.get("timestamp") if isinstance(row, dict) else None
+            if isinstance(stamp, str):
+                row["timestamp"] = datetime.fromisoformat(stamp)
+        return rows
+
+    async def _redis_set(self, table: str, key: tuple, rows: Rows) -> None:
+        try:
+            value = json.dumps(rows, default=json_default)
+            await self._client().set(self._redis_key(table, key), value)
+        except Exception:
+            logger.warning("History cache: Redis write failed", exc_info=True)
+
+    async def _redis_drop(self, table: str) -> None:
+        try:
+            client = self._client()
+            async for name in client.scan_iter(match=f"{_REDIS_PREFIX}{table}:*"):
+                await client.delete(name)
+        except Exception:
+            logger.warning("History cache: Redis invalidation failed", exc_info=True)
+
+
+history_cache = HistoryCache(
+    ttl=settings.history_cache_ttl_s,
+    max_entries=settings.history_cache_max_entries,
+    redis_url=settings.redis_url if settings.history_cache_redis else None,
+)
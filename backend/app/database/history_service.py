@@ -1,23 +1,169 @@
-"""Query service for persisted market data (candles, foreign flow, etc.)."""
+"""Query service for persisted market data (candles, foreign flow, etc.).
 
+Candle and foreign flow queries go through a HistoryCache when one is
+given (see history_cache.py); callers must treat returned rows as shared
+and read-only.
+
+Candles come in CANDLE_RESOLUTIONS, each a continuous aggregate: 5m-1h
+cascaded from the 1-minute one, 1d built from the raw rows on the
+Asia/Ho_Chi_Minh day (db/migrations/003_candle_resolutions.sql). Tick and
+index snapshot series accept a point budget: the whole range is streamed
+through a server-side cursor into LTTB (see downsample.py).
+
+Streamed exports are paced by the client and hold a pooled connection
+(shared with BatchWriter) for their whole duration, so at most
+`max_exports` run at once (check `can_export` before starting one) and the
+database ends any that stall for `export_idle_s`.
+"""
+
+import asyncio
+from collections.abc import AsyncIterator, Sequence
 from datetime import date, datetime, timedelta
 
 import asyncpg
 
+from app.database.downsample import LttbStream
+from app.database.history_cache import HistoryCache, market_today
+from app.database.history_stream import Cursor
 from app.database.pool import Database
 
+# Candle resolution -> suffix of the candles_* / index_candles_* view
+CANDLE_RESOLUTIONS = ("1m", "5m", "15m", "1h", "1d")
+
+STREAM_PREFETCH = 1000  # rows per server-side cursor fetch
+
+# tick_data stores prices in hundredths and side as a code (see
+# tick_buffer); reads decode them so responses keep the NUMERIC / name form
+_TICK_SELECT = {
+    "symbol": "t.symbol",
+    "timestamp": "t.timestamp",
+    "price": "(t.price * 0.01)::numeric(12, 2) AS price",
+    "volume": "t.volume",
+    "side": (
+        "(CASE t.side WHEN 1 THEN 'mua_chu_dong' WHEN 2 THEN 'ban_chu_dong'"
+        " ELSE 'neutral' END) AS side"
+    ),
+    "bid": "(t.bid * 0.01)::numeric(12, 2) AS bid",
+    "ask": "(t.ask * 0.01)::numeric(12, 2) AS ask",
+}
+
+# Paged and streamed queries; rows sharing a timestamp are ordered by every
+# other column so OFFSET past them (Cursor.skip) is stable across requests
+TICK_COLUMNS = tuple(_TICK_SELECT)
+_TICK_FROM = """
+    FROM tick_data t
+    WHERE t.symbol = $1
+      AND t.timestamp >= $2
+      AND t.timestamp < $3
+"""
+_TICK_SQL = f"""
+    SELECT {", ".join(_TICK_SELECT.values())}
+    {_TICK_FROM}
+    ORDER BY t.timestamp, t.price, t.volume, t.side, t.bid, t.ask
+"""
+FOREIGN_FLOW_COLUMNS = (
+    "symbol", "timestamp", "buy_vol", "sell_vol", "net_vol", "buy_value", "sell_value",
+)
+_FOREIGN_FLOW_SQL = """
+    SELECT symbol, timestamp, buy_vol, sell_vol, net_vol,
+           buy_value, sell_value
+    FROM foreign_flow
+    WHERE symbol = $1
+      AND timestamp >= $2
+      AND timestamp < $3
+    ORDER BY timestamp, buy_vol, sell_vol
+"""
+
+_INDEX_FROM = """
+    FROM index_snapshots
+    WHERE index_name = $1
+      AND timestamp >= $2
+      AND timestamp < $3
+"""
+_INDEX_SQL = f"""
+    SELECT index_name, timestamp, value, change_pct, volume
+    {_INDEX_FROM}
+    ORDER BY timestamp
+"""
+
+# Export dataset -> (table, columns that may be projected)
+EXPORT_DATASETS = {
+    "ticks": ("tick_data", TICK_COLUMNS),
+    "foreign": ("foreign_flow", FOREIGN_FLOW_COLUMNS),
+}
+# Select expressions for columns not read as stored (table alias t)
+_COLUMN_SQL = {"tick_data": _TICK_SELECT}
+
+
+def _check_resolution(resolution: str) -> None:
+    if resolution not in CANDLE_RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}")
+
+
+def _range(start: date, end: date, after: Cursor | None) -> tuple[datetime, datetime]:
+    """[start day, day after end), begun at the cursor's timestamp if any."""
+    lower = datetime(start.year, start.month, start.day)
+    if after is not None:
+        lower = after.timestamp
+    return lower, datetime(end.year, end.month, end.day) + timedelta(days=1)
+
 
 class HistoryService:
     """Read-only queries against TimescaleDB hypertables."""
 
-    def __init__(self, db: Database) -> None:
+    def __init__(
+        self,
+        db: Database,
+        cache: HistoryCache | None = None,
+        max_exports: int = 3,
+        export_idle_s: float = 30.0,
+        export_statement_s: float = 300.0,
+    ) -> None:
         self._db = db
+        self._cache = cache
+        self._exports = asyncio.Semaphore(max_exports)
+        self._export_timeouts = (
+            f"SET LOCAL idle_in_transaction_session_timeout = {int(export_idle_s * 1000)};"
+            f" SET LOCAL statement_timeout = {int(export_statement_s * 1000)}"
+        )
 
     @property
     def _pool(self) -> asyncpg.Pool:
         assert self._db.pool is not None, "Database not connected"
         return self._db.pool
 
+    @property
+    def can_export(self) -> bool:
+        """False while all `max_exports` export slots are taken."""
+        return not self._exports.locked()
+
+    async def _stream(self, query: str, *args) -> AsyncIterator[asyncpg.Record]:
+        # Cursors need a transaction; the connection is held until the
+        # consumer finishes or closes the iterator. A client that stops
+        # reading leaves it idle in transaction, which the timeout ends.
+        async with self._exports, self._pool.acquire() as conn, conn.transaction(readonly=True):
+            await conn.execute(self._export_timeouts)
+            async for record in conn.cursor(query, *args, prefetch=STREAM_PREFETCH):
+                yield record
+
+    async def _downsample(
+        self, from_sql: str, query: str, args: tuple, skip: int, points: int, y: str,
+    ) -> list[dict]:
+        """LTTB of every row `query` returns, read through a server-side cursor.
+
+        The row count (`from_sql` with the first three args, less `skip`) and
+        the cursor share one repeatable-read snapshot, so the buckets match
+        the rows actually read.
+        """
+        async with self._pool.acquire() as conn, conn.transaction(
+            isolation="repeatable_read", readonly=True,
+        ):
+            count = await conn.fetchval(f"SELECT count(*) {from_sql}", *args[:3])
+            sampler = LttbStream(max(count - skip, 0), points, y=y)
+            async for record in conn.cursor(query, *args, prefetch=STREAM_PREFETCH):
+                sampler.push(dict(record))
+        return sampler.finish()
+
     # -- Candles ---------------------------------------------------------------
 
     async def get_candles(
@@ -25,13 +171,27 @@ class HistoryService:
         symbol: str,
         start: date,
         end: date,
+        resolution: str = "1m",
+    ) -> list[dict]:
+        """Return candles of the given resolution for symbol in date range."""
+        _check_resolution(resolution)
+        if self._cache is not None:
+            return await self._cache.get(
+                # Filed under the hypertable the aggregates are built from:
+                # BatchWriter flushes report tick_data, not the views
+                "candles", (symbol, start, end, resolution), "tick_data", end,
+                lambda: self._fetch_candles(symbol, start, end, resolution),
+            )
+        return await self._fetch_candles(symbol, start, end, resolution)
+
+    async def _fetch_candles(
+        self, symbol: str, start: date, end: date, resolution: str,
     ) -> list[dict]:
-        """Return 1-minute candles for symbol in date range."""
         rows = await self._pool.fetch(
-            """
+            f"""
             SELECT symbol, timestamp, open, high, low, close,
                    volume, active_buy_vol, active_sell_vol
-            FROM candles_1m
+            FROM candles_{resolution}
             WHERE symbol = $1
               AND timestamp >= $2
               AND timestamp < $3
@@ -50,30 +210,53 @@ class HistoryService:
         symbol: str,
         start: date,
         end: date,
+        limit: int | None = None,
+        after: Cursor | None = None,
+    ) -> list[dict]:
+        """Return foreign flow snapshots for symbol in date range.
+
+        With `limit`, one page of at most that many rows following `after`.
+        """
+        if self._cache is not None:
+            return await self._cache.get(
+                "foreign", (symbol, start, end, limit, after), "foreign_flow", end,
+                lambda: self._fetch_foreign_flow(symbol, start, end, limit, after),
+            )
+        return await self._fetch_foreign_flow(symbol, start, end, limit, after)
+
+    async def _fetch_foreign_flow(
+        self, symbol: str, start: date, end: date, limit: int | None, after: Cursor | None,
     ) -> list[dict]:
-        """Return foreign flow snapshots for symbol in date range."""
         rows = await self._pool.fetch(
-            """
-            SELECT symbol, timestamp, buy_vol, sell_vol, net_vol,
-                   buy_value, sell_value
-            FROM foreign_flow
-            WHERE symbol = $1
-              AND timestamp >= $2
-              AND timestamp < $3
-            ORDER BY timestamp
-            """,
-            symbol,
-            datetime(start.year, start.month, start.day),
-            datetime(end.year, end.month, end.day) + timedelta(days=1),
+            _FOREIGN_FLOW_SQL + " LIMIT $4 OFFSET $5",
+            symbol, *_range(start, end, after), limit, after.skip if after else 0,
         )
         return [dict(r) for r in rows]
 
+    def stream_foreign_flow(
+        self, symbol: str, start: date, end: date, after: Cursor | None = None,
+    ) -> AsyncIterator[asyncpg.Record]:
+        """Every foreign flow snapshot in range, read through a server-side cursor."""
+        return self._stream(
+            _FOREIGN_FLOW_SQL + " OFFSET $4",
+            symbol, *_range(start, end, after), after.skip if after else 0,
+        )
+
     async def get_foreign_flow_daily_summary(
         self,
         symbol: str,
         days: int = 30,
     ) -> list[dict]:
         """Aggregate daily foreign net volume for last N days."""
+        if self._cache is not None:
+            today = market_today()
+            return await self._cache.get(
+                "foreign_daily", (symbol, days, today), "foreign_flow", today,
+                lambda: self._fetch_foreign_flow_daily_summary(symbol, days),
+            )
+        return await self._fetch_foreign_flow_daily_summary(symbol, days)
+
+    async def _fetch_foreign_flow_daily_summary(self, symbol: str, days: int) -> list[dict]:
         rows = await self._pool.fetch(
             """
             SELECT date_trunc('day', timestamp) AS day,
@@ -100,12 +283,14 @@ class HistoryService:
         index_name: str,
         start: date,
         end: date,
+        resolution: str = "1m",
     ) -> list[dict]:
-        """Return 1-minute candles for index from continuous aggregate."""
+        """Return candles of the given resolution for index from continuous aggregate."""
+        _check_resolution(resolution)
         rows = await self._pool.fetch(
-            """
+            f"""
             SELECT index_name, timestamp, open, high, low, close, volume
-            FROM index_candles_1m
+            FROM index_candles_{resolution}
             WHERE index_name = $1
               AND timestamp >= $2
               AND timestamp < $3
@@ -125,25 +310,71 @@ class HistoryService:
         start: date,
         end: date,
         limit: int = 10000,
+        points: int | None = None,
+        after: Cursor | None = None,
     ) -> list[dict]:
-        """Return classified ticks for symbol in date range."""
+        """Return classified ticks for symbol in date range.
+
+        One page of at most `limit` rows following `after`; with `points`,
+        instead every tick from there to the end of the range, downsampled
+        (by price) to at most that many.
+        """
+        skip = after.skip if after else 0
+        if points is not None:
+            return await self._downsample(
+                _TICK_FROM, _TICK_SQL + " OFFSET $4",
+                (symbol, *_range(start, end, after), skip), skip, points, "price",
+            )
         rows = await self._pool.fetch(
-            """
-            SELECT symbol, timestamp, price, volume, side, bid, ask
-            FROM tick_data
-            WHERE symbol = $1
-              AND timestamp >= $2
-              AND timestamp < $3
-            ORDER BY timestamp
-            LIMIT $4
-            """,
-            symbol,
-            datetime(start.year, start.month, start.day),
-            datetime(end.year, end.month, end.day) + timedelta(days=1),
-            limit,
+            _TICK_SQL + " LIMIT $4 OFFSET $5",
+            symbol, *_range(start, end, after), limit, skip,
         )
         return [dict(r) for r in rows]
 
+    def stream_ticks(
+        self, symbol: str, start: date, end: date, after: Cursor | None = None,
+    ) -> AsyncIterator[asyncpg.Record]:
+        """Every tick in range, read through a server-side cursor."""
+        return self._stream(
+            _TICK_SQL + " OFFSET $4",
+            symbol, *_range(start, end, after), after.skip if after else 0,
+        )
+
+    # -- Bulk export -----------------------------------------------------------
+
+    def stream_export(
+        self,
+        dataset: str,
+        symbols: Sequence[str],
+        start: date,
+        end: date,
+        columns: Sequence[str] | None = None,
+    ) -> AsyncIterator[asyncpg.Record]:
+        """Rows of an EXPORT_DATASETS table for several symbols, ordered by
+        (symbol, timestamp), in one server-side cursor.
+
+        `columns` projects the query (default: all). Raises ValueError for an
+        unknown dataset or column.
+        """
+        if dataset not in EXPORT_DATASETS:
+            raise ValueError(f"Unknown dataset {dataset!r}")
+        table, allowed = EXPORT_DATASETS[dataset]
+        if unknown := [c for c in columns or () if c not in allowed]:
+            raise ValueError(f"Unknown columns for {dataset}: {', '.join(unknown)}")
+        exprs = _COLUMN_SQL.get(table, {})
+        select = ", ".join(exprs.get(c, f"t.{c}") for c in columns or allowed)
+        return self._stream(
+            f"""
+            SELECT {select}
+            FROM {table} t
+            WHERE t.symbol = ANY($1::text[])
+              AND t.timestamp >= $2
+              AND t.timestamp < $3
+            ORDER BY t.symbol, t.timestamp
+            """,
+            list(symbols), *_range(start, end, None),
+        )
+
     # -- Index snapshots -------------------------------------------------------
 
     async def get_index_history(
@@ -151,21 +382,13 @@ class HistoryService:
         index_name: str,
         start: date,
         end: date,
+        points: int | None = None,
     ) -> list[dict]:
-        """Return index snapshots in date range."""
-        rows = await self._pool.fetch(
-            """
-            SELECT index_name, timestamp, value, change_pct, volume
-            FROM index_snapshots
-            WHERE index_name = $1
-              AND timestamp >= $2
-              AND timestamp < $3
-            ORDER BY timestamp
-            """,
-            index_name,
-            datetime(start.year, start.month, start.day),
-            datetime(end.year, end.month, end.day) + timedelta(days=1),
-        )
+        """Return index snapshots in date range, downsampled to `points` if given."""
+        args = (index_name, *_range(start, end, None))
+        if points is not None:
+            return await self._downsample(_INDEX_FROM, _INDEX_SQL, args, 0, points, "value")
+        rows = await self._pool.fetch(_INDEX_SQL, *args)
         return [dict(r) for r in rows]
 
     # -- Derivatives -----------------------------------------------------------
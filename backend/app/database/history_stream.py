@@ -0,0 +1,106 @@
+"""Paging cursors and streamed encodings for history queries.
+
+Pages are keyset-paginated on timestamp: a Cursor holds the timestamp of the
+last row sent plus how many rows at that timestamp were sent (ticks often
+share a timestamp). The next page starts at that timestamp and skips those
+rows, so page cost does not grow with depth the way OFFSET from the start of
+the range does. Cursors are opaque URL-safe strings for clients.
+
+Streamed exports (NDJSON, CSV) encode asyncpg records as they arrive from a
+server-side cursor and hand out chunks of about CHUNK_BYTES, so memory stays
+flat however many rows a range holds.
+"""
+
+import base64
+import csv
+import io
+import json
+from collections.abc import AsyncIterator, Sequence
+from datetime import date, datetime
+from decimal import Decimal
+from typing import NamedTuple
+
+CHUNK_BYTES = 64 * 1024
+
+
+def json_default(value):
+    """json.dumps default for database values, encoded as FastAPI does."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class Cursor(NamedTuple):
+    """Position after the last row of a page."""
+
+    timestamp: datetime
+    skip: int  # rows at `timestamp` already returned
+
+    def encode(self) -> str:
+        raw = json.dumps([self.timestamp.isoformat(), self.skip]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "Cursor":
+        """Raises ValueError for anything encode() did not produce."""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            stamp, skip = json.loads(raw)
+            cursor = cls(datetime.fromisoformat(stamp), int(skip))
+        except (TypeError, ValueError) as exc:
+            raise ValueError("Invalid cursor") from exc
+        if cursor.skip < 0:
+            raise ValueError("Invalid cursor")
+        return cursor
+
+    @classmethod
+    def after(cls, rows: Sequence[dict], previous: "Cursor | None") -> "Cursor":
+        """Cursor following a non-empty page that started at `previous`."""
+        last = rows[-1]["timestamp"]
+        ties = 0
+        for row in reversed(rows):
+            if row["timestamp"] != last:
+                break
+            ties += 1
+        if ties == len(rows) and previous is not None and previous.timestamp == last:
+            ties += previous.skip  # the whole page continued the previous timestamp
+        return cls(last, ties)
+
+
+async def ndjson_chunks(records: AsyncIterator) -> AsyncIterator[str]:
+    """One JSON object per line."""
+    buf: list[str] = []
+    size = 0
+    async for record in records:
+        line = json.dumps(dict(record), default=json_default, separators=(",", ":")) + "\n"
+        buf.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(buf)
+            buf.clear()
+            size = 0
+    if buf:
+        yield "".join(buf)
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+async def csv_chunks(records: AsyncIterator, columns: Sequence[str]) -> AsyncIterator[str]:
+    """Header row of `columns`, then one row per record."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(columns)
+    async for record in records:
+        writer.writerow([_csv_value(record[c]) for c in columns])
+        if out.tell() >= CHUNK_BYTES:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue()
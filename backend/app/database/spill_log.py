@@ -0,0 +1,214 @@
+"""Append-only, memory-mapped spill log for rows BatchWriter cannot COPY.
+
+When the pool is down, a COPY fails, or a queue overflows, BatchWriter
+appends the affected rows here instead of dropping them; its replay loop
+bulk-loads sealed segments once the database is healthy again.
+
+Layout: a directory of numbered segment files (`000000000001.seg`, ...),
+each preallocated to `segment_bytes` and written through mmap. A segment
+starts with an 8-byte header (magic + format version) followed by frames:
+
+    u32 payload length | u32 crc32(payload) | payload
+
+where payload is a pickled (table, columns, rows) batch — the directory
+must only be writable by the app, as segments are unpickled on replay. A
+zero length marks the end of written data. A frame with a bad checksum
+(torn write after a crash) ends the segment; earlier frames still replay.
+
+Only the active segment is ever written; segments left over from a
+previous process, or sealed by rotation or `seal()`, are read-only and
+become eligible for replay. A segment that cannot be read (wrong header) or
+keeps failing to load is set aside as `<n>.failed` for an operator rather
+than deleted; set-aside files still count towards the cap.
+
+Each append msyncs only the pages it touched, not the whole mapping, so a
+spilled batch costs one small synchronous write. Total segment bytes on
+disk are capped by `max_bytes`: once a new segment would exceed it, batches
+are dropped (counted in `db_spill_dropped_rows_total`) until replay frees
+space.
+"""
+
+import logging
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from app.metrics import (
+    db_spill_dropped_rows_total,
+    db_spill_pending_segments,
+    db_spill_rows_total,
+)
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"SPL1"
+_HEADER = struct.Struct("<4sI")  # magic, format version
+_FRAME = struct.Struct("<II")  # payload length, crc32
+_VERSION = 1
+_SUFFIX = ".seg"
+_FAILED_SUFFIX = ".failed"
+
+SpillBatch = tuple[str, list[str], list[tuple]]  # (table, columns, rows)
+
+
+class SpillLog:
+    """Directory of mmap'd segment files holding spilled COPY batches."""
+
+    def __init__(
+        self,
+        directory: str | Path,
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_bytes: int = 1024 * 1024 * 1024,
+    ) -> None:
+        self._dir = Path(directory)
+        self._segment_bytes = segment_bytes
+        self._max_bytes = max_bytes
+        self._full = False
+        self._active_path: Path | None = None
+        self._file = None
+        self._mm: mmap.mmap | None = None
+        self._offset = 0
+
+    # -- Writing -------------------------------------------------------------
+
+    def append(self, table: str, columns: list[str], rows: Iterable[tuple]) -> int:
+        """Durably append one batch. Returns the number of rows written.
+
+        Returns 0 without writing if the batch needs a new segment and the
+        log is at `max_bytes`; the rows are counted as dropped.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        payload = pickle.dumps((table, columns, rows), protocol=pickle.HIGHEST_PROTOCOL)
+        needed = _FRAME.size + len(payload)
+        if self._mm is None or self._offset + needed + _FRAME.size > len(self._mm):
+            if not self._rotate(needed):
+                db_spill_dropped_rows_total.labels(table=table).inc(len(rows))
+                return 0
+        mm = self._mm
+        frame = self._offset
+        _FRAME.pack_into(mm, frame, len(payload), zlib.crc32(payload))
+        start = frame + _FRAME.size
+        mm[start:start + len(payload)] = payload
+        self._offset = start + len(payload)
+        # msync only the pages this frame touched (offset must be page-aligned)
+        page = frame - frame % mmap.PAGESIZE
+        mm.flush(page, self._offset - page)
+        db_spill_rows_total.labels(table=table).inc(len(rows))
+        return len(rows)
+
+    def seal(self) -> None:
+        """Close the active segment so it becomes eligible for replay."""
+        if self._mm is None:
+            return
+        self._mm.flush()
+        self._mm.close()
+        self._file.close()
+        self._mm = self._file = self._active_path = None
+        self._offset = 0
+        self._update_pending()
+
+    close = seal
+
+    def _rotate(self, min_frame_bytes: int) -> bool:
+        """Seal the active segment and open a fresh, preallocated one.
+
+        Returns False (leaving no active segment) if the new segment would
+        push the log past `max_bytes`.
+        """
+        self.seal()
+        self._dir.mkdir(parents=True, exist_ok=True)
+        size = max(self._segment_bytes, _HEADER.size + min_frame_bytes + _FRAME.size)
+        if self.disk_bytes() + size > self._max_bytes:
+            if not self._full:
+                logger.error(
+                    "Spill log: %s is at its %d MB cap — dropping batches until replay",
+                    self._dir, self._max_bytes // (1024 * 1024),
+                )
+            self._full = True
+            return False
+        self._full = False
+        path = self._dir / f"{self._next_segment_number():012d}{_SUFFIX}"
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        self._file = os.fdopen(fd, "r+b")
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        _HEADER.pack_into(self._mm, 0, _MAGIC, _VERSION)
+        self._offset = _HEADER.size
+        self._active_path = path
+        logger.warning("Spill log: opened segment %s", path.name)
+        self._update_pending()
+        return True
+
+    def _next_segment_number(self) -> int:
+        files = self._segments() + self._failed_segments()
+        existing = [int(p.stem) for p in files if p.stem.isdigit()]
+        return max(existing, default=0) + 1
+
+    # -- Reading / replay ----------------------------------------------------
+
+    def disk_bytes(self) -> int:
+        """Total size of all segment files, including the active and set-aside ones."""
+        return sum(p.stat().st_size for p in self._segments() + self._failed_segments())
+
+    def _segments(self, suffix: str = _SUFFIX) -> list[Path]:
+        if not self._dir.is_dir():
+            return []
+        return sorted(self._dir.glob(f"*{suffix}"))
+
+    def _failed_segments(self) -> list[Path]:
+        return self._segments(_FAILED_SUFFIX)
+
+    def sealed_segments(self) -> list[Path]:
+        """Segments ready for replay, oldest first (excludes the active one)."""
+        return [p for p in self._segments() if p != self._active_path]
+
+    def has_pending(self) -> bool:
+        return self._active_path is not None or bool(self.sealed_segments())
+
+    @staticmethod
+    def read_segment(path: Path) -> Iterator[SpillBatch]:
+        """Yield (table, columns, rows) batches from a sealed segment.
+
+        Raises ValueError if the file is not a segment of this format.
+        """
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError(f"{path.name} is shorter than a segment header")
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                magic, version = _HEADER.unpack_from(mm, 0)
+                if magic != _MAGIC or version != _VERSION:
+                    raise ValueError(f"{path.name} is not a v{_VERSION} segment")
+                offset = _HEADER.size
+                while offset + _FRAME.size <= size:
+                    length, crc = _FRAME.unpack_from(mm, offset)
+                    start = offset + _FRAME.size
+                    if length == 0 or start + length > size:
+                        return
+                    payload = mm[start:start + length]
+                    if zlib.crc32(payload) != crc:
+                        logger.warning("Spill log: torn frame in %s at %d", path.name, offset)
+                        return
+                    yield pickle.loads(payload)
+                    offset = start + length
+
+    def remove(self, path: Path) -> None:
+        """Delete a segment after it has been replayed."""
+        path.unlink(missing_ok=True)
+        self._update_pending()
+
+    def set_aside(self, path: Path) -> Path:
+        """Rename a segment that cannot be replayed out of the replay queue."""
+        failed = path.with_suffix(_FAILED_SUFFIX)
+        path.rename(failed)
+        self._update_pending()
+        return failed
+
+    def _update_pending(self) -> None:
+        db_spill_pending_segments.set(len(self._segments()))
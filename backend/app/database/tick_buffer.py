@@ -0,0 +1,164 @@
+"""Columnar append buffer for tick_data rows awaiting COPY.
+
+Ticks are written straight into parallel columns — symbol, timestamp,
+price, volume, side, bid, ask — instead of one ClassifiedTrade object per
+trade. Columns hold the compact tick_data encoding
+(db/migrations/004_compact_tick_data.sql): prices as integer hundredths
+(PRICE_SCALE) and side as a SIDE_CODES smallint, stored in typed arrays,
+so an append stores raw values and COPY sends fixed-width integers instead
+of NUMERIC and VARCHAR. Symbol holds references to existing strings.
+BatchWriter takes whole column slices at flush time and streams them to
+copy_records_to_table as row tuples produced on the fly.
+"""
+
+import logging
+from array import array
+from collections.abc import Callable, Iterator
+from datetime import datetime
+
+from app.metrics import db_records_dropped_total
+
+logger = logging.getLogger(__name__)
+
+TICK_COLUMNS = ["symbol", "timestamp", "price", "volume", "side", "bid", "ask"]
+
+# Stored price = round(price * PRICE_SCALE); prices are in 1000 VND with at
+# most two decimals, so this is exact
+PRICE_SCALE = 100
+
+# TradeType value -> stored side; HistoryService maps codes back to names
+SIDE_CODES = {"neutral": 0, "mua_chu_dong": 1, "ban_chu_dong": 2}
+
+
+def compact_row(row: tuple) -> tuple:
+    """A tick row in the pre-004 encoding (float prices, side name) re-encoded.
+
+    Spill segments written before the migration still hold such rows.
+    """
+    symbol, timestamp, price, volume, side, bid, ask = row
+    return (
+        symbol, timestamp, round(price * PRICE_SCALE), volume, SIDE_CODES[side],
+        None if bid is None else round(bid * PRICE_SCALE),
+        None if ask is None else round(ask * PRICE_SCALE),
+    )
+
+
+class TickColumns:
+    """A detached batch of tick columns, ready for COPY."""
+
+    __slots__ = ("symbol", "timestamp", "price", "volume", "side", "bid", "ask")
+
+    def __init__(self, symbol, timestamp, price, volume, side, bid, ask):
+        self.symbol = symbol
+        self.timestamp = timestamp
+        self.price = price
+        self.volume = volume
+        self.side = side
+        self.bid = bid
+        self.ask = ask
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def rows(self) -> Iterator[tuple]:
+        """Row tuples in TICK_COLUMNS order, generated lazily."""
+        return zip(
+            self.symbol, self.timestamp, self.price, self.volume,
+            self.side, self.bid, self.ask,
+        )
+
+    __iter__ = rows
+
+
+class TickBuffer:
+    """Bounded columnar tick buffer. Drops the oldest rows when full.
+
+    On overflow the oldest 1% of capacity is dropped in one slice, so a
+    sustained overload costs one memmove per hundred appends rather than
+    one per append — unless `on_overflow` is set, in which case the whole
+    backlog is handed to it (BatchWriter spills it to disk). `on_high_water`
+    fires once the buffer reaches `high_water` rows (used to flush early).
+    """
+
+    __slots__ = (
+        "_capacity", "_high_water", "_on_high_water", "_on_overflow", "_drop_chunk",
+        "_symbol", "_timestamp", "_price", "_volume", "_side", "_bid", "_ask",
+    )
+
+    def __init__(
+        self,
+        capacity: int,
+        high_water: int | None = None,
+        on_high_water: Callable[[], None] | None = None,
+        on_overflow: Callable[[TickColumns], None] | None = None,
+    ) -> None:
+        self._capacity = capacity
+        self._high_water = high_water or capacity
+        self._on_high_water = on_high_water
+        self._on_overflow = on_overflow
+        self._drop_chunk = max(1, capacity // 100)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._symbol: list[str] = []
+        self._timestamp: list[datetime] = []
+        self._price = array("i")
+        self._volume = array("q")
+        self._side = array("b")
+        self._bid = array("i")
+        self._ask = array("i")
+
+    def __len__(self) -> int:
+        return len(self._symbol)
+
+    def append(
+        self,
+        symbol: str,
+        timestamp: datetime,
+        price: float,
+        volume: int,
+        side: str,
+        bid: float,
+        ask: float,
+    ) -> None:
+        """Append one tick row (prices in 1000 VND, side a TradeType value)."""
+        if len(self._symbol) >= self._capacity:
+            if self._on_overflow is not None:
+                self._on_overflow(self.take(self._capacity))
+            else:
+                self._drop_oldest(self._drop_chunk)
+        self._symbol.append(symbol)
+        self._timestamp.append(timestamp)
+        self._price.append(round(price * PRICE_SCALE))
+        self._volume.append(volume)
+        self._side.append(SIDE_CODES[side])
+        self._bid.append(round(bid * PRICE_SCALE))
+        self._ask.append(round(ask * PRICE_SCALE))
+        if self._on_high_water is not None and len(self._symbol) >= self._high_water:
+            self._on_high_water()
+
+    def take(self, max_rows: int) -> TickColumns:
+        """Detach up to max_rows oldest rows. O(1) when taking everything."""
+        if len(self._symbol) <= max_rows:
+            batch = TickColumns(
+                self._symbol, self._timestamp, self._price, self._volume,
+                self._side, self._bid, self._ask,
+            )
+            self._reset()
+            return batch
+        batch = TickColumns(*(col[:max_rows] for col in self._columns()))
+        self._drop_oldest(max_rows, count=False)
+        return batch
+
+    def _columns(self) -> tuple:
+        return (
+            self._symbol, self._timestamp, self._price, self._volume,
+            self._side, self._bid, self._ask,
+        )
+
+    def _drop_oldest(self, n: int, count: bool = True) -> None:
+        for col in self._columns():
+            del col[:n]
+        if count:
+            db_records_dropped_total.labels(table="tick_data").inc(n)
+            logger.warning("Tick buffer full (%d), dropped %d oldest", self._capacity, n)
@@ -16,6 +16,8 @@ logging.basicConfig(level=getattr(logging, settings.log_level.upper(), logging.I
 
 from app.database.pool import db
 from app.database.batch_writer import BatchWriter
+from app.database.history_cache import history_cache
+from app.database.spill_log import SpillLog
 from app.routers.history_router import router as history_router
 from app.routers.market_router import router as market_router
 from app.services.futures_resolver import get_futures_symbols
@@ -23,9 +25,11 @@ from app.services.ssi_auth_service import SSIAuthService
 from app.services.ssi_market_service import SSIMarketService
 from app.services.market_data_processor import MarketDataProcessor
 from app.services.ssi_stream_service import SSIStreamService
+from app.services.state_bus import create_state_bus
 from app.analytics import AlertService, PriceTracker
 from app.websocket import ConnectionManager
 from app.websocket.data_publisher import DataPublisher
+from app.websocket.fanout import FanoutMirror, FrameRelay
 from app.websocket.router import router as ws_router
 
 logger = logging.getLogger(__name__)
@@ -35,17 +39,60 @@ auth_service = SSIAuthService()
 market_service = SSIMarketService(auth_service)
 stream_service = SSIStreamService(auth_service, market_service)
 processor = MarketDataProcessor()
-batch_writer = BatchWriter(db)
+batch_writer = BatchWriter(
+    db,
+    spill=SpillLog(
+        settings.spill_dir,
+        settings.spill_segment_mb * 1024 * 1024,
+        settings.spill_max_mb * 1024 * 1024,
+    ) if settings.spill_dir else None,
+)
+# Today's cached history results go stale once new rows land
+batch_writer.set_flush_callback(history_cache.invalidate)
 alert_service = AlertService()
 price_tracker = PriceTracker(
     alert_service, processor.quote_cache,
     processor.foreign_tracker, processor.derivatives_tracker,
+    spike_mode=settings.volume_spike_mode,
 )
 processor.price_tracker = price_tracker
-market_ws_manager = ConnectionManager(channel="market")
-foreign_ws_manager = ConnectionManager(channel="foreign")
-index_ws_manager = ConnectionManager(channel="index")
+# Snapshot channels hold only the newest pending frame per slow client. A
+# dropped /ws/market delta is replaced by a keyframe; fan-out workers have no
+# local keyframe to offer, so their market channel stays FIFO.
+_coalesce = settings.ws_coalesce_snapshots
+market_ws_manager = ConnectionManager(
+    channel="market",
+    latest_only=_coalesce and settings.app_role != "fanout",
+    resync=lambda topic: publisher.market_keyframe(topic),
+)
+foreign_ws_manager = ConnectionManager(channel="foreign", latest_only=_coalesce)
+index_ws_manager = ConnectionManager(channel="index", latest_only=_coalesce)
 alerts_ws_manager = ConnectionManager(channel="alerts")
+sparkline_ws_manager = ConnectionManager(channel="sparkline")
+publisher = DataPublisher(
+    processor, market_ws_manager, foreign_ws_manager, index_ws_manager,
+    alerts_mgr=alerts_ws_manager,
+    sparkline_mgr=sparkline_ws_manager,
+)
+
+# Multi-process mode: ingest leader relays state to fan-out workers over the bus
+state_bus = (
+    create_state_bus(settings.redis_url, owner=settings.app_role == "ingest")
+    if settings.app_role != "standalone" else None
+)
+frame_relay = (
+    FrameRelay(state_bus, processor, alert_service) if settings.app_role == "ingest" else None
+)
+fanout_mirror = (
+    FanoutMirror(state_bus, {
+        "market": market_ws_manager,
+        "foreign": foreign_ws_manager,
+        "index": index_ws_manager,
+        "alerts": alerts_ws_manager,
+        "sparkline": sparkline_ws_manager,
+    })
+    if settings.app_role == "fanout" else None
+)
 
 # Cached at startup
 vn30_symbols: list[str] = []
@@ -74,10 +121,44 @@ def _on_new_alert(alert):
         alerts_ws_manager.broadcast(alert.model_dump_json())
 
 
+async def _disconnect_ws_clients():
+    await market_ws_manager.disconnect_all()
+    await foreign_ws_manager.disconnect_all()
+    await index_ws_manager.disconnect_all()
+    await alerts_ws_manager.disconnect_all()
+    await sparkline_ws_manager.disconnect_all()
+
+
+@asynccontextmanager
+async def _fanout_lifespan(app: FastAPI):
+    """Fan-out worker: no SSI stream or processing, state comes from the bus."""
+    try:
+        await db.connect()  # history endpoints still query the DB directly
+        app.state.db_available = True
+    except Exception:
+        logger.warning("Database unavailable — history endpoints disabled", exc_info=True)
+        app.state.db_available = False
+    app.state.persist = False
+
+    await fanout_mirror.start()
+    yield
+
+    await fanout_mirror.stop()
+    await _disconnect_ws_clients()
+    await state_bus.close()
+    await history_cache.close()
+    await db.disconnect()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global vn30_symbols
 
+    if fanout_mirror is not None:
+        async with _fanout_lifespan(app):
+            yield
+        return
+
     # 1. Try connecting database pool (app works without DB)
     db_available = False
     try:
@@ -90,9 +171,13 @@ async def lifespan(app: FastAPI):
         )
     app.state.db_available = db_available
 
-    # 2. Start batch writer only if DB is available
-    if db_available:
+    # 2. Start batch writer if DB is available or rows can spill to disk until it
+    #    is; classifier writes tick rows straight into its columnar buffer
+    persist = db_available or batch_writer.spill_enabled
+    app.state.persist = persist
+    if persist:
         await batch_writer.start()
+        processor.classifier.set_tick_buffer(batch_writer.tick_buffer)
 
     # 3. Authenticate with SSI
     await auth_service.authenticate()
@@ -103,6 +188,8 @@ async def lifespan(app: FastAPI):
     if settings.extra_symbols_list:
         watchlist |= set(settings.extra_symbols_list)
     processor.set_watchlist(watchlist)
+    # Drop unwatched X/R/B symbols on the stream thread, before model construction
+    stream_service.set_symbol_filter(processor.is_watched)
 
     # 5. Build channel list and connect stream
     futures_symbols = get_futures_symbols()
@@ -121,20 +208,18 @@ async def lifespan(app: FastAPI):
         result = await processor.handle_trade(msg)
         if result is None:
             return
-        classified, _stats, basis_point = result
-        if db_available and classified:
-            batch_writer.enqueue_tick(classified)
-        if db_available and basis_point:
+        _trade_type, _stats, basis_point = result
+        if persist and basis_point:
             batch_writer.enqueue_basis(basis_point)
 
     async def _on_foreign(msg):
         result = await processor.handle_foreign(msg)
-        if db_available and result:
+        if persist and result:
             batch_writer.enqueue_foreign(result)
 
     async def _on_index(msg):
         result = await processor.handle_index(msg)
-        if db_available and result:
+        if persist and result:
             batch_writer.enqueue_index(result)
 
     stream_service.on_quote(processor.handle_quote)
@@ -146,10 +231,6 @@ async def lifespan(app: FastAPI):
     await stream_service.connect(channels)
 
     # 7. Start event-driven WebSocket publisher (replaces poll-based broadcast loop)
-    publisher = DataPublisher(
-        processor, market_ws_manager, foreign_ws_manager, index_ws_manager,
-        alerts_mgr=alerts_ws_manager,
-    )
     publisher.start()
     processor.subscribe(publisher.notify)
 
@@ -161,7 +242,13 @@ async def lifespan(app: FastAPI):
     # 9. Wire alert broadcasts to /ws/alerts channel
     alert_service.subscribe(_on_new_alert)
 
-    # 10. Schedule daily reset at 15:05 VN time
+    # 10. Ingest leader: relay every frame, alert, and REST body to fan-out workers
+    if frame_relay is not None:
+        publisher.set_frame_sink(frame_relay.on_frame)
+        alert_service.subscribe(frame_relay.on_alert)
+        await frame_relay.start(vn30_symbols)
+
+    # 11. Schedule daily reset at 15:05 VN time
     reset_task = asyncio.create_task(_daily_reset_loop())
 
     yield
@@ -171,14 +258,16 @@ async def lifespan(app: FastAPI):
     alert_service.unsubscribe(_on_new_alert)
     processor.unsubscribe(publisher.notify)
     publisher.stop()
-    await market_ws_manager.disconnect_all()
-    await foreign_ws_manager.disconnect_all()
-    await index_ws_manager.disconnect_all()
-    await alerts_ws_manager.disconnect_all()
+    if frame_relay is not None:
+        alert_service.unsubscribe(frame_relay.on_alert)
+        await frame_relay.stop()
+        await state_bus.close()
+    await _disconnect_ws_clients()
     await stream_service.disconnect()
-    if app.state.db_available:
+    if app.state.persist:
         await batch_writer.stop()
-        await db.disconnect()
+    await history_cache.close()
+    await db.disconnect()
 
 
 app = FastAPI(
@@ -192,6 +281,7 @@ app.add_middleware(
     allow_origins=settings.cors_origins_list,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # history paging
 )
 
 app.include_router(history_router)
@@ -228,13 +318,17 @@ async def prometheus_metrics():
 
 @app.get("/health")
 async def health():
-    db_ok = False
-    if getattr(app.state, "db_available", False):
-        db_ok = await db.health_check()
+    # Checks the live pool — BatchWriter's spill replay may have reconnected it
+    db_ok = await db.health_check()
     return {"status": "ok", "database": "connected" if db_ok else "unavailable"}
 
 
 @app.get("/api/vn30-components")
 async def get_vn30():
     """Return cached VN30 component stock symbols."""
+    if fanout_mirror is not None:
+        frame = fanout_mirror.rest_frame("vn30-components")
+        return Response(
+            content=frame.body if frame else b'{"symbols":[]}', media_type="application/json",
+        )
     return {"symbols": vn30_symbols}
@@ -15,12 +15,59 @@ ws_connections_active = Gauge(
     ["channel"],
 )
 
+ws_send_path_total = Counter(
+    "ws_send_path_total",
+    "WebSocket connections by send path: direct transport write, or queued "
+    "because permessage-deflate was negotiated (deflate) or the server is "
+    "not uvicorn's websockets-sansio protocol (unsupported), or WS_DIRECT_SEND "
+    "is off (disabled)",
+    ["channel", "path"],
+)
+
 ws_messages_sent_total = Counter(
     "ws_messages_sent_total",
     "Total WebSocket messages sent to clients",
     ["channel"],
 )
 
+ws_bytes_sent_total = Counter(
+    "ws_bytes_sent_total",
+    "WebSocket payload bytes sent to clients (characters for JSON text frames)",
+    ["channel", "encoding"],
+)
+
+ws_messages_dropped_total = Counter(
+    "ws_messages_dropped_total",
+    "WebSocket messages discarded before sending: oldest dropped from a full "
+    "queue (overflow) or pending state superseded by a newer one (replaced)",
+    ["channel", "reason"],
+)
+
+ws_client_lag_seconds = Histogram(
+    "ws_client_lag_seconds",
+    "How long a client's pending messages waited before its backlog drained",
+    ["channel"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+ws_client_downgrades_total = Counter(
+    "ws_client_downgrades_total",
+    "Slow WebSocket clients downgraded to a lower update rate",
+    ["channel"],
+)
+
+ws_clients_downgraded = Gauge(
+    "ws_clients_downgraded",
+    "Connected WebSocket clients currently on the lower update rate",
+    ["channel"],
+)
+
+ws_slow_client_disconnects_total = Counter(
+    "ws_slow_client_disconnects_total",
+    "WebSocket clients disconnected for falling too far behind",
+    ["channel"],
+)
+
 # ---------------------------------------------------------------------------
 # SSI stream
 # ---------------------------------------------------------------------------
@@ -30,6 +77,24 @@ ssi_messages_received_total = Counter(
     ["channel"],
 )
 
+ssi_messages_dropped_total = Counter(
+    "ssi_messages_dropped_total",
+    "SSI messages dropped before parsing because the symbol is not watched",
+    ["channel"],
+)
+
+ssi_handoff_batch_size = Histogram(
+    "ssi_handoff_batch_size",
+    "Messages dispatched per drain batch from the SSI stream thread",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+
+ssi_handoff_latency_seconds = Histogram(
+    "ssi_handoff_latency_seconds",
+    "Age of the oldest message in a batch when the event loop drains it",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5),
+)
+
 # ---------------------------------------------------------------------------
 # Trade classification
 # ---------------------------------------------------------------------------
@@ -49,11 +114,65 @@ db_write_duration_seconds = Histogram(
     buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
 )
 
+db_queue_depth = Gauge(
+    "db_queue_depth",
+    "Records waiting in the BatchWriter queue at flush time",
+    ["table"],
+)
+
+db_records_dropped_total = Counter(
+    "db_records_dropped_total",
+    "Records dropped by the BatchWriter because its queue was full",
+    ["table"],
+)
+
+db_rows_written_total = Counter(
+    "db_rows_written_total",
+    "Rows written to the database via COPY",
+    ["table"],
+)
+
+db_write_rows_per_second = Gauge(
+    "db_write_rows_per_second",
+    "Rows/s achieved by the most recent COPY batch",
+    ["table"],
+)
+
+db_spill_rows_total = Counter(
+    "db_spill_rows_total",
+    "Rows written to the on-disk spill log instead of the database",
+    ["table"],
+)
+
+db_spill_dropped_rows_total = Counter(
+    "db_spill_dropped_rows_total",
+    "Rows dropped because the spill log reached its size cap",
+    ["table"],
+)
+
+db_replayed_rows_total = Counter(
+    "db_replayed_rows_total",
+    "Spilled rows bulk-loaded into the database by the replayer",
+    ["table"],
+)
+
+db_spill_pending_segments = Gauge(
+    "db_spill_pending_segments",
+    "Spill log segments on disk awaiting replay (including the active one)",
+)
+
 db_pool_active_connections = Gauge(
     "db_pool_active_connections",
     "Number of active connections in the asyncpg pool",
 )
 
+history_cache_requests_total = Counter(
+    "history_cache_requests_total",
+    "HistoryService lookups by outcome: hit, miss (query ran) or coalesced "
+    "(joined an in-flight query for the same key)",
+    ["query", "result"],
+)
+
 # ---------------------------------------------------------------------------
 # Alerts
 # ---------------------------------------------------------------------------
@@ -6,7 +6,9 @@ Used by Phase 3+ data processing services (TradeClassifier, ForeignTracker, etc.
 from datetime import datetime
 from enum import Enum
 
-from pydantic import BaseModel, computed_field
+from typing import Any
+
+from pydantic import BaseModel, PrivateAttr, computed_field
 
 
 class TradeType(str, Enum):
@@ -117,8 +119,18 @@ class IndexData(BaseModel):
     advances: int = 0
     declines: int = 0
     no_changes: int = 0
-    intraday: list[IntradayPoint] = []
+    intraday_cursor: int = 0  # sparkline sequence number at snapshot time
     last_updated: datetime | None = None
+    # Shared IntradaySeries owned by IndexTracker (not copied per update)
+    _intraday_series: Any = PrivateAttr(default=None)
+
+    @computed_field
+    @property
+    def intraday(self) -> list[IntradayPoint]:
+        """Sparkline points up to this snapshot's cursor, materialized on read."""
+        if self._intraday_series is None:
+            return []
+        return self._intraday_series.points(until=self.intraday_cursor)
 
     @computed_field
     @property
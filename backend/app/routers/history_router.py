@@ -1,14 +1,36 @@
 """REST endpoints for historical market data queries."""
 
 from datetime import date
+from typing import Literal
 
-from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
+from app.config import settings
+from app.database.history_cache import history_cache
 from app.database.pool import db
-from app.database.history_service import HistoryService
+from app.database.history_export import MEDIA_TYPES, columnar_chunks
+from app.database.history_service import (
+    EXPORT_DATASETS,
+    FOREIGN_FLOW_COLUMNS,
+    TICK_COLUMNS,
+    HistoryService,
+)
+from app.database.history_stream import Cursor, csv_chunks, ndjson_chunks
 
 router = APIRouter(prefix="/api/history", tags=["history"])
 
+# Kept in step with history_service.CANDLE_RESOLUTIONS
+Resolution = Literal["1m", "5m", "15m", "1h", "1d"]
+Format = Literal["json", "ndjson", "csv"]
+ExportFormat = Literal["arrow", "parquet"]
+_RESOLUTION = Query("1m", description="Candle size: 1m, 5m, 15m, 1h or 1d")
+_POINTS = Query(None, ge=3, le=10000, description="Downsample to at most N points (LTTB)")
+_AFTER = Query(None, description="Page cursor from a previous X-Next-Cursor header")
+_FORMAT = Query("json", description="json (paged) or a streamed ndjson/csv export")
+
+_MAX_EXPORT_SYMBOLS = 50
+
 # Lazily initialised — db pool available after lifespan startup
 _svc: HistoryService | None = None
 
@@ -18,39 +40,107 @@ def _get_svc(request: Request) -> HistoryService:
     if not getattr(request.app.state, "db_available", False):
         raise HTTPException(status_code=503, detail="Database unavailable")
     if _svc is None:
-        _svc = HistoryService(db)
+        _svc = HistoryService(
+            db,
+            history_cache if settings.history_cache_enabled else None,
+            max_exports=settings.history_export_max,
+            export_idle_s=settings.history_export_idle_s,
+            export_statement_s=settings.history_export_statement_s,
+        )
     return _svc
 
 
+def _check_export_slot(svc: HistoryService) -> None:
+    if not svc.can_export:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many exports in progress",
+            headers={"Retry-After": "5"},
+        )
+
+
+def _cursor(after: str | None) -> Cursor | None:
+    if after is None:
+        return None
+    try:
+        return Cursor.decode(after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _page(response: Response, rows: list[dict], limit: int | None, after: Cursor | None) -> list[dict]:
+    """Set X-Next-Cursor when the page is full (more rows may follow)."""
+    if limit is not None and rows and len(rows) >= limit:
+        response.headers["X-Next-Cursor"] = Cursor.after(rows, after).encode()
+    return rows
+
+
+def _export(records, columns: tuple[str, ...], fmt: Format, name: str) -> StreamingResponse:
+    if fmt == "csv":
+        return StreamingResponse(
+            csv_chunks(records, columns),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{name}.csv"'},
+        )
+    return StreamingResponse(ndjson_chunks(records), media_type="application/x-ndjson")
+
+
 @router.get("/{symbol}/candles")
 async def get_candles(
     request: Request,
     symbol: str,
     start: date = Query(..., description="Start date (YYYY-MM-DD)"),
     end: date = Query(..., description="End date (YYYY-MM-DD)"),
+    resolution: Resolution = _RESOLUTION,
 ):
-    return await _get_svc(request).get_candles(symbol.upper(), start, end)
+    return await _get_svc(request).get_candles(symbol.upper(), start, end, resolution)
 
 
 @router.get("/{symbol}/ticks")
 async def get_ticks(
     request: Request,
+    response: Response,
     symbol: str,
     start: date = Query(..., description="Start date"),
     end: date = Query(..., description="End date"),
     limit: int = Query(10000, le=50000),
+    points: int | None = _POINTS,
+    after: str | None = _AFTER,
+    format: Format = _FORMAT,
 ):
-    return await _get_svc(request).get_ticks(symbol.upper(), start, end, limit)
+    """Ticks in range: a page of `limit` rows; with `points`, the whole range
+    (from `after`, if given) downsampled to that many; or with
+    format=ndjson/csv every row streamed (limit and points do not apply)."""
+    svc, cursor = _get_svc(request), _cursor(after)
+    symbol = symbol.upper()
+    if format != "json":
+        _check_export_slot(svc)
+        records = svc.stream_ticks(symbol, start, end, cursor)
+        return _export(records, TICK_COLUMNS, format, f"{symbol}_ticks_{start}_{end}")
+    rows = await svc.get_ticks(symbol, start, end, limit, points, cursor)
+    # With points the rows span the rest of the range, so there is no next page
+    return _page(response, rows, None if points else limit, cursor)
 
 
 @router.get("/{symbol}/foreign")
 async def get_foreign_flow(
     request: Request,
+    response: Response,
     symbol: str,
     start: date = Query(..., description="Start date"),
     end: date = Query(..., description="End date"),
+    limit: int | None = Query(None, le=50000, description="Page size (default: whole range)"),
+    after: str | None = _AFTER,
+    format: Format = _FORMAT,
 ):
-    return await _get_svc(request).get_foreign_flow(symbol.upper(), start, end)
+    svc, cursor = _get_svc(request), _cursor(after)
+    symbol = symbol.upper()
+    if format != "json":
+        _check_export_slot(svc)
+        records = svc.stream_foreign_flow(symbol, start, end, cursor)
+        return _export(records, FOREIGN_FLOW_COLUMNS, format, f"{symbol}_foreign_{start}_{end}")
+    rows = await svc.get_foreign_flow(symbol, start, end, limit, cursor)
+    return _page(response, rows, limit, cursor)
 
 
 @router.get("/{symbol}/foreign/daily")
@@ -68,8 +158,9 @@ async def get_index_history(
     index_name: str,
     start: date = Query(..., description="Start date"),
     end: date = Query(..., description="End date"),
+    points: int | None = _POINTS,
 ):
-    return await _get_svc(request).get_index_history(index_name.upper(), start, end)
+    return await _get_svc(request).get_index_history(index_name.upper(), start, end, points)
 
 
 @router.get("/index/{index_name}/candles")
@@ -78,9 +169,12 @@ async def get_index_candles(
     index_name: str,
     start: date = Query(..., description="Start date (YYYY-MM-DD)"),
     end: date = Query(..., description="End date (YYYY-MM-DD)"),
+    resolution: Resolution = _RESOLUTION,
 ):
-    """1-minute OHLCV candles for an index (from continuous aggregate)."""
-    return await _get_svc(request).get_index_candles(index_name.upper(), start, end)
+    """OHLCV candles for an index (from continuous aggregates)."""
+    return await _get_svc(request).get_index_candles(
+        index_name.upper(), start, end, resolution,
+    )
 
 
 @router.get("/derivatives/{contract}")
@@ -91,3 +185,36 @@ async def get_derivatives_history(
     end: date = Query(..., description="End date"),
 ):
     return await _get_svc(request).get_derivatives_history(contract.upper(), start, end)
+
+
+@router.get("/export")
+async def export_history(
+    request: Request,
+    symbols: str = Query(..., description="Comma-separated symbols, e.g. VNM,FPT"),
+    start: date = Query(..., description="Start date"),
+    end: date = Query(..., description="End date"),
+    dataset: Literal["ticks", "foreign"] = Query("ticks"),
+    columns: str | None = Query(None, description="Comma-separated columns (default: all)"),
+    format: ExportFormat = Query("arrow", description="arrow (IPC stream) or parquet"),
+):
+    """Bulk columnar export of tick or foreign flow history for many symbols."""
+    names = sorted({s.strip().upper() for s in symbols.split(",") if s.strip()})
+    if not names or len(names) > _MAX_EXPORT_SYMBOLS:
+        raise HTTPException(
+            status_code=400, detail=f"Give 1 to {_MAX_EXPORT_SYMBOLS} symbols",
+        )
+    projection = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    svc = _get_svc(request)
+    _check_export_slot(svc)
+    try:
+        records = svc.stream_export(dataset, names, start, end, projection)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    extension = "arrows" if format == "arrow" else "parquet"
+    return StreamingResponse(
+        columnar_chunks(records, projection or EXPORT_DATASETS[dataset][1], format),
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{dataset}_{start}_{end}.{extension}"',
+        },
+    )
@@ -1,47 +1,119 @@
 """REST endpoints for real-time market data and analytics alerts.
 
 Exposes MarketDataProcessor in-memory state via REST for frontend polling.
+Snapshot-style endpoints reuse the processor's SnapshotCache: the body is
+serialized once per data version and clients revalidate via ETag/304.
+/snapshot serves the same scalar market state as the /ws/market keyframe.
+
+On a fan-out worker (APP_ROLE=fanout) the same endpoints serve the bodies
+the ingest leader published (see app.websocket.fanout) instead.
 """
 
-from fastapi import APIRouter, Query
+import json
+
+from fastapi import APIRouter, Query, Request, Response
 
 from app.analytics.alert_models import AlertSeverity, AlertType
+from app.services.snapshot_cache import (
+    FOREIGN_DEPS,
+    MARKET_DEPS,
+    QUOTES_DEPS,
+    CachedFrame,
+    market_state,
+)
 
 router = APIRouter(prefix="/api/market", tags=["market"])
 
+# Longest window /basis-trend accepts (also what the ingest leader publishes)
+BASIS_TREND_MAX_MINUTES = 120
 
-@router.get("/snapshot")
-async def get_snapshot():
-    """Full market snapshot: quotes + indices + foreign + derivatives."""
-    from app.main import processor
 
-    return processor.get_market_snapshot()
+def _foreign_detail_json(processor) -> str:
+    summary = processor.get_foreign_summary()
+    stocks = processor.foreign_tracker.get_all().values()
+    return json.dumps({
+        "summary": summary.model_dump(mode="json"),
+        "stocks": [s.model_dump(mode="json") for s in stocks],
+    })
+
+
+def _volume_stats_json(processor) -> str:
+    stats = processor.aggregator.get_all_stats().values()
+    return json.dumps({"stats": [s.model_dump(mode="json") for s in stats]})
+
+
+def _cached(name: str, deps: tuple[str, ...], build):
+    """processor → CachedFrame of build(processor), serialized once per version of deps."""
+    return lambda p: p.snapshot_cache.get(f"rest:{name}", deps, lambda: build(p))
+
+
+# Snapshot-style endpoints: name → (dependency channels, processor → CachedFrame)
+REST_FRAMES = {
+    "snapshot": (MARKET_DEPS, market_state),
+    "foreign-detail": (FOREIGN_DEPS, _cached("foreign-detail", FOREIGN_DEPS, _foreign_detail_json)),
+    "volume-stats": (QUOTES_DEPS, _cached("volume-stats", QUOTES_DEPS, _volume_stats_json)),
+}
+
+
+def rest_frame(processor, name: str) -> CachedFrame:
+    """Cached serialized body of a snapshot-style endpoint."""
+    _, frame = REST_FRAMES[name]
+    return frame(processor)
+
+
+def _cached_response(request: Request, frame: CachedFrame) -> Response:
+    """Serve pre-serialized JSON, or 304 if the client already has this version."""
+    headers = {"ETag": frame.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == frame.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=frame.body, media_type="application/json", headers=headers)
+
+
+def _unavailable() -> Response:
+    return Response(
+        content=b'{"detail":"market state not yet received from ingest leader"}',
+        status_code=503,
+        media_type="application/json",
+    )
+
+
+def _frame_response(request: Request, name: str) -> Response:
+    from app.main import fanout_mirror, processor
+
+    if fanout_mirror is not None:
+        frame = fanout_mirror.rest_frame(name)
+        if frame is None:
+            return _unavailable()
+    else:
+        frame = rest_frame(processor, name)
+    return _cached_response(request, frame)
+
+
+@router.get("/snapshot")
+async def get_snapshot(request: Request):
+    """Full market snapshot: quotes + indices (without intraday) + foreign + derivatives."""
+    return _frame_response(request, "snapshot")
 
 
 @router.get("/foreign-detail")
-async def get_foreign_detail():
+async def get_foreign_detail(request: Request):
     """Per-symbol foreign investor data for heatmap/table."""
-    from app.main import processor
-
-    summary = processor.get_foreign_summary()
-    stocks = list(processor.foreign_tracker.get_all().values())
-    return {"summary": summary, "stocks": stocks}
+    return _frame_response(request, "foreign-detail")
 
 
 @router.get("/volume-stats")
-async def get_volume_stats():
+async def get_volume_stats(request: Request):
     """Per-symbol active buy/sell session stats."""
-    from app.main import processor
-
-    stats = list(processor.aggregator.get_all_stats().values())
-    return {"stats": stats}
+    return _frame_response(request, "volume-stats")
 
 
 @router.get("/basis-trend")
-async def get_basis_trend(minutes: int = Query(30, ge=1, le=120)):
+async def get_basis_trend(minutes: int = Query(30, ge=1, le=BASIS_TREND_MAX_MINUTES)):
     """Historical basis points from in-memory DerivativesTracker."""
-    from app.main import processor
+    from app.main import fanout_mirror, processor
 
+    if fanout_mirror is not None:
+        return fanout_mirror.basis_trend(minutes)
     points = processor.derivatives_tracker.get_basis_trend(minutes)
     return [p.model_dump() for p in points]
 
@@ -53,7 +125,9 @@ async def get_alerts(
     severity: AlertSeverity | None = Query(None),
 ):
     """Recent analytics alerts, newest first. Filterable by type and severity."""
-    from app.main import alert_service
+    from app.main import alert_service, fanout_mirror
 
+    if fanout_mirror is not None:
+        return fanout_mirror.recent_alerts(limit, type, severity)
     alerts = alert_service.get_recent_alerts(limit, type, severity)
     return [a.model_dump() for a in alerts]
@@ -2,17 +2,18 @@
 
 Input: X-TRADE messages for VN30F contracts.
 Basis = futures_price - VN30_spot (from IndexTracker).
-Maintains historical basis array for charting.
+Maintains historical basis array for charting (time-indexed, so trend
+queries bisect to the window start instead of scanning).
 """
 
 import logging
-from collections import deque
 from datetime import datetime, timedelta
 
 from app.models.domain import BasisPoint, DerivativesData
 from app.models.ssi_messages import SSITradeMessage
 from app.services.index_tracker import IndexTracker
 from app.services.quote_cache import QuoteCache
+from app.services.time_ring import TimeRing
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +33,7 @@ class DerivativesTracker:
         self._changes: dict[str, float] = {}
         self._change_pcts: dict[str, float] = {}
         # Basis tracking (shared across all VN30F symbols)
-        self._basis_history: deque[BasisPoint] = deque(maxlen=_BASIS_HISTORY_MAXLEN)
+        self._basis_history: TimeRing[BasisPoint] = TimeRing(_BASIS_HISTORY_MAXLEN)
         self._current_basis: BasisPoint | None = None
         # Track which symbol is the active (nearest) contract
         self._active_symbol: str = ""
@@ -72,7 +73,7 @@ class DerivativesTracker:
             basis_pct=basis_pct,
             is_premium=basis > 0,
         )
-        self._basis_history.append(bp)
+        self._basis_history.append(bp.timestamp, bp)
         self._current_basis = bp
         return bp
 
@@ -83,7 +84,7 @@ class DerivativesTracker:
     def get_basis_trend(self, minutes: int = 30) -> list[BasisPoint]:
         """Historical basis points within the time window."""
         cutoff = datetime.now() - timedelta(minutes=minutes)
-        return [b for b in self._basis_history if b.timestamp >= cutoff]
+        return self._basis_history.since(cutoff)
 
     def get_data(self) -> DerivativesData | None:
         """Full derivatives snapshot for the active contract."""
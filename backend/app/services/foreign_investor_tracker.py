@@ -3,11 +3,16 @@
 SSI Channel R sends FBuyVol/FSellVol cumulative from market open.
 Computes deltas between consecutive updates, rolling speed (vol/min),
 acceleration (speed change rate), VN30 aggregate, and top N movers.
+
+Speed comes from per-symbol time-bucketed running sums: each update adds
+its delta to the current bucket and to every window's total, and buckets
+leaving a window are subtracted as time advances — O(1) per update
+however many windows are tracked, with no history scan.
 """
 
 import logging
-from collections import deque
-from datetime import datetime, timedelta
+from array import array
+from datetime import datetime
 
 from app.models.domain import ForeignInvestorData, ForeignSummary
 from app.models.ssi_messages import SSIForeignMessage
@@ -15,28 +20,82 @@ from app.models.ssi_messages import SSIForeignMessage
 logger = logging.getLogger(__name__)
 
 # Rolling window config
-_SPEED_WINDOW_MIN = 5
-_HISTORY_MAXLEN = 600  # ~10 min at 1 msg/sec
-
-
-class _ForeignDelta:
-    """Lightweight delta record for speed/acceleration calculation."""
-
-    __slots__ = ("buy_delta", "sell_delta", "timestamp")
-
-    def __init__(self, buy_delta: int, sell_delta: int, timestamp: datetime):
-        self.buy_delta = buy_delta
-        self.sell_delta = sell_delta
-        self.timestamp = timestamp
+SPEED_WINDOWS_MIN = (1, 5, 15)
+_SPEED_WINDOW_MIN = 5  # window reported as buy/sell_speed_per_min
+_BUCKET_SEC = 1
+
+
+class _RollingFlow:
+    """Buy/sell delta sums over several trailing windows, bucketed by time.
+
+    A ring of `_BUCKET_SEC` buckets spans the longest window. Each window
+    keeps a running total; when the head bucket advances, the bucket that
+    falls out of each window is subtracted from that window's total.
+    """
+
+    __slots__ = ("_sizes", "_n", "_buy", "_sell", "_sum_buy", "_sum_sell", "_head")
+
+    def __init__(self, windows_min: tuple[int, ...]):
+        self._sizes = [m * 60 // _BUCKET_SEC for m in windows_min]
+        self._n = max(self._sizes)
+        self._buy = array("q", bytes(8 * self._n))
+        self._sell = array("q", bytes(8 * self._n))
+        self._sum_buy = [0] * len(self._sizes)
+        self._sum_sell = [0] * len(self._sizes)
+        self._head: int | None = None
+
+    def add(self, ts: float, buy: int, sell: int) -> None:
+        self.advance(ts)
+        slot = self._head % self._n
+        self._buy[slot] += buy
+        self._sell[slot] += sell
+        for i in range(len(self._sizes)):
+            self._sum_buy[i] += buy
+            self._sum_sell[i] += sell
+
+    def advance(self, ts: float) -> None:
+        """Move the head bucket to ts, expiring buckets that leave each window."""
+        bucket = int(ts // _BUCKET_SEC)
+        head = self._head
+        if head is None or bucket - head >= self._n:
+            self._clear()
+            self._head = bucket
+            return
+        if bucket <= head:
+            return  # same bucket (or clock stepped back): keep adding to head
+        buy, sell, n = self._buy, self._sell, self._n
+        for k in range(head + 1, bucket + 1):
+            for i, size in enumerate(self._sizes):
+                old = (k - size) % n
+                self._sum_buy[i] -= buy[old]
+                self._sum_sell[i] -= sell[old]
+            slot = k % n  # oldest bucket of the longest window, now expired
+            buy[slot] = 0
+            sell[slot] = 0
+        self._head = bucket
+
+    def totals(self) -> list[tuple[int, int]]:
+        """(buy, sell) sums per window, in construction order."""
+        return list(zip(self._sum_buy, self._sum_sell))
+
+    def _clear(self) -> None:
+        self._buy = array("q", bytes(8 * self._n))
+        self._sell = array("q", bytes(8 * self._n))
+        self._sum_buy = [0] * len(self._sizes)
+        self._sum_sell = [0] * len(self._sizes)
 
 
 class ForeignInvestorTracker:
     """Per-symbol foreign flow tracking with delta, speed, and acceleration."""
 
-    def __init__(self):
+    def __init__(self, speed_windows_min: tuple[int, ...] = SPEED_WINDOWS_MIN):
+        if _SPEED_WINDOW_MIN not in speed_windows_min:
+            speed_windows_min = tuple(sorted({*speed_windows_min, _SPEED_WINDOW_MIN}))
+        self._windows_min = speed_windows_min
+        self._primary = speed_windows_min.index(_SPEED_WINDOW_MIN)
         self._prev: dict[str, SSIForeignMessage] = {}
         self._session: dict[str, ForeignInvestorData] = {}
-        self._history: dict[str, deque[_ForeignDelta]] = {}
+        self._flow: dict[str, _RollingFlow] = {}
         # Previous speed for acceleration calculation
         self._prev_speed: dict[str, tuple[float, float]] = {}
 
@@ -67,15 +126,16 @@ class ForeignInvestorTracker:
 
         self._prev[symbol] = msg
 
-        # Store delta for speed calculation
-        if symbol not in self._history:
-            self._history[symbol] = deque(maxlen=_HISTORY_MAXLEN)
-        self._history[symbol].append(
-            _ForeignDelta(buy_delta=delta_buy, sell_delta=delta_sell, timestamp=now)
-        )
+        # Add delta to the rolling window sums
+        flow = self._flow.get(symbol)
+        if flow is None:
+            flow = self._flow[symbol] = _RollingFlow(self._windows_min)
+        flow.add(now.timestamp(), delta_buy, delta_sell)
 
-        # Compute speed (vol/min over rolling window)
-        buy_speed, sell_speed = self._compute_speed(symbol)
+        # Speed (vol/min over the primary rolling window)
+        total_buy, total_sell = flow.totals()[self._primary]
+        buy_speed = total_buy / _SPEED_WINDOW_MIN
+        sell_speed = total_sell / _SPEED_WINDOW_MIN
 
         # Compute acceleration (speed change rate)
         prev_buy_speed, prev_sell_speed = self._prev_speed.get(symbol, (0.0, 0.0))
@@ -102,18 +162,16 @@ class ForeignInvestorTracker:
         self._session[symbol] = data
         return data
 
-    def _compute_speed(self, symbol: str) -> tuple[float, float]:
-        """Returns (buy_per_min, sell_per_min) over rolling window."""
-        history = self._history.get(symbol)
-        if not history:
-            return (0.0, 0.0)
-        cutoff = datetime.now() - timedelta(minutes=_SPEED_WINDOW_MIN)
-        recent = [d for d in history if d.timestamp >= cutoff]
-        if not recent:
-            return (0.0, 0.0)
-        total_buy = sum(d.buy_delta for d in recent)
-        total_sell = sum(d.sell_delta for d in recent)
-        return (total_buy / _SPEED_WINDOW_MIN, total_sell / _SPEED_WINDOW_MIN)
+    def get_speeds(self, symbol: str) -> dict[int, tuple[float, float]]:
+        """(buy_per_min, sell_per_min) for every configured window, keyed by minutes."""
+        flow = self._flow.get(symbol)
+        if flow is None:
+            return {m: (0.0, 0.0) for m in self._windows_min}
+        flow.advance(datetime.now().timestamp())
+        return {
+            m: (buy / m, sell / m)
+            for m, (buy, sell) in zip(self._windows_min, flow.totals())
+        }
 
     def get(self, symbol: str) -> ForeignInvestorData:
         """Get foreign data for a single symbol."""
@@ -161,5 +219,5 @@ class ForeignInvestorTracker:
         """Clear all session data. Called at 15:00 VN daily."""
         self._prev.clear()
         self._session.clear()
-        self._history.clear()
+        self._flow.clear()
         self._prev_speed.clear()
@@ -2,13 +2,16 @@
 
 Stores latest index snapshot per index_id, computes breadth ratio,
 and maintains intraday sparkline arrays for charting.
+
+Sparklines live in a columnar IntradaySeries; each IndexData snapshot only
+carries a cursor into it, so an update is O(1) regardless of session length.
 """
 
-from collections import deque
 from datetime import datetime
 
 from app.models.domain import IndexData, IntradayPoint
 from app.models.ssi_messages import SSIIndexMessage
+from app.services.intraday_store import IntradaySeries
 
 # Max intraday points (~6h of trading at 1 update/sec)
 _INTRADAY_MAXLEN = 21600
@@ -19,19 +22,19 @@ class IndexTracker:
 
     def __init__(self):
         self._indices: dict[str, IndexData] = {}
-        self._intraday: dict[str, deque[IntradayPoint]] = {}
+        self._intraday: dict[str, IntradaySeries] = {}
 
     def update(self, msg: SSIIndexMessage) -> IndexData:
         """Process a Channel MI message and return updated index data."""
         now = datetime.now()
 
         # Append to intraday sparkline
-        if msg.index_id not in self._intraday:
-            self._intraday[msg.index_id] = deque(maxlen=_INTRADAY_MAXLEN)
+        series = self._intraday.get(msg.index_id)
+        if series is None:
+            series = IntradaySeries(_INTRADAY_MAXLEN)
+            self._intraday[msg.index_id] = series
         if msg.index_value > 0:
-            self._intraday[msg.index_id].append(
-                IntradayPoint(timestamp=now, value=msg.index_value)
-            )
+            series.append(now.timestamp(), msg.index_value)
 
         data = IndexData(
             index_id=msg.index_id,
@@ -43,9 +46,10 @@ class IndexTracker:
             advances=msg.advances,
             declines=msg.declines,
             no_changes=msg.no_changes,
-            intraday=list(self._intraday[msg.index_id]),
+            intraday_cursor=series.seq,
             last_updated=now,
         )
+        data._intraday_series = series
         self._indices[msg.index_id] = data
         return data
 
@@ -62,10 +66,17 @@ class IndexTracker:
         """Return all tracked indices."""
         return dict(self._indices)
 
-    def get_intraday(self, index_id: str) -> list[IntradayPoint]:
-        """Return intraday sparkline points for an index."""
-        points = self._intraday.get(index_id)
-        return list(points) if points else []
+    def get_intraday(self, index_id: str, since: int = 0) -> list[IntradayPoint]:
+        """Return intraday sparkline points appended at or after cursor `since`.
+
+        Pass a previous IndexData.intraday_cursor to fetch only new points.
+        """
+        series = self._intraday.get(index_id)
+        return series.points(since) if series else []
+
+    def get_intraday_series(self, index_id: str) -> IntradaySeries | None:
+        """Raw columnar series for an index (for delta/columnar consumers)."""
+        return self._intraday.get(index_id)
 
     def reset(self):
         """Clear all index data. Called at 15:00 VN daily."""
@@ -0,0 +1,84 @@
+"""Columnar ring buffer for intraday index sparklines.
+
+Timestamps (epoch seconds) and values live in two parallel array('d')
+columns, so appending a point is O(1) with no per-point object allocation.
+Every appended point gets a monotonically increasing sequence number; a
+cursor is "the sequence number after the last point seen", which lets
+readers pull only the slice they have not consumed yet.
+"""
+
+from array import array
+from datetime import datetime
+
+from app.models.domain import IntradayPoint
+
+
+class IntradaySeries:
+    """Fixed-capacity ring of (timestamp, value) points for one index."""
+
+    __slots__ = ("_capacity", "_ts", "_values", "_seq")
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._ts = array("d")
+        self._values = array("d")
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return self._seq - self.first_seq
+
+    @property
+    def seq(self) -> int:
+        """Cursor just past the newest point (total points ever appended)."""
+        return self._seq
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest point still retained."""
+        return max(0, self._seq - self._capacity)
+
+    def append(self, ts: float, value: float) -> int:
+        """Append a point, overwriting the oldest once full. Returns new cursor."""
+        if len(self._ts) < self._capacity:
+            self._ts.append(ts)
+            self._values.append(value)
+        else:
+            i = self._seq % self._capacity
+            self._ts[i] = ts
+            self._values[i] = value
+        self._seq += 1
+        return self._seq
+
+    def columns(
+        self, since: int = 0, until: int | None = None,
+    ) -> tuple[list[float], list[float]]:
+        """Return (timestamps, values) for points with since <= seq < until.
+
+        Cursors older than the retained window are clamped to the oldest point.
+        """
+        start = max(since, self.first_seq)
+        end = self._seq if until is None else min(until, self._seq)
+        if start >= end:
+            return [], []
+        return self._slice(self._ts, start, end), self._slice(self._values, start, end)
+
+    def points(self, since: int = 0, until: int | None = None) -> list[IntradayPoint]:
+        """Materialize a slice as IntradayPoint models (for REST/JSON consumers)."""
+        timestamps, values = self.columns(since, until)
+        return [
+            IntradayPoint(timestamp=datetime.fromtimestamp(ts), value=v)
+            for ts, v in zip(timestamps, values)
+        ]
+
+    def clear(self):
+        self._ts = array("d")
+        self._values = array("d")
+        self._seq = 0
+
+    def _slice(self, col: array, start: int, end: int) -> list[float]:
+        """Copy the ring range [start, end) out of a column, unwrapping if needed."""
+        n = end - start
+        i = start % self._capacity
+        if i + n <= len(col):
+            return col[i:i + n].tolist()
+        return col[i:].tolist() + col[:i + n - len(col)].tolist()
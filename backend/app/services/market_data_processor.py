@@ -26,6 +26,7 @@ from app.services.foreign_investor_tracker import ForeignInvestorTracker
 from app.services.index_tracker import IndexTracker
 from app.services.quote_cache import QuoteCache
 from app.services.session_aggregator import SessionAggregator
+from app.services.snapshot_cache import SnapshotCache
 from app.services.trade_classifier import TradeClassifier
 
 logger = logging.getLogger(__name__)
@@ -47,6 +48,8 @@ class MarketDataProcessor:
             self.index_tracker, self.quote_cache
         )
         self._subscribers: list[SubscriberCallback] = []
+        # Serialized payloads shared by WS broadcasts and REST, versioned by _notify
+        self.snapshot_cache = SnapshotCache()
         # Price cache: symbol -> (last_price, change, ratio_change)
         self._price_cache: dict[str, tuple[float, float, float]] = {}
         # Optional price tracker for alert generation (set externally)
@@ -61,7 +64,7 @@ class MarketDataProcessor:
         self._watchlist = symbols
         logger.info("Watchlist set: %d symbols", len(symbols))
 
-    def _is_watched(self, symbol: str) -> bool:
+    def is_watched(self, symbol: str) -> bool:
         """Check if symbol is in watchlist. VN30F* always allowed for derivatives."""
         if not self._watchlist:
             return True  # no filter
@@ -73,7 +76,7 @@ class MarketDataProcessor:
 
     async def handle_quote(self, msg: SSIQuoteMessage):
         """Cache latest quote for bid/ask lookup by trade classifier."""
-        if not self._is_watched(msg.symbol):
+        if not self.is_watched(msg.symbol):
             return
         self.quote_cache.update(msg)
         self._notify("market")
@@ -82,9 +85,11 @@ class MarketDataProcessor:
         """Classify trade and accumulate session stats.
 
         Routes VN30F trades to DerivativesTracker AND classifies for persistence.
-        Returns (ClassifiedTrade, SessionStats | None, BasisPoint | None).
+        The tick_data row goes straight into the classifier's TickBuffer (if
+        attached), so no ClassifiedTrade is built on this path.
+        Returns (TradeType, SessionStats | None, BasisPoint | None).
         """
-        if not self._is_watched(msg.symbol):
+        if not self.is_watched(msg.symbol):
             return None, None, None
 
         if msg.symbol.startswith("VN30F"):
@@ -92,25 +97,29 @@ class MarketDataProcessor:
             if bp and self.price_tracker:
                 self.price_tracker.on_basis_update()
             # Also classify for tick_data persistence (candle generation)
-            classified = self.classifier.classify(msg)
+            trade_type, _ = self.classifier.record(msg)
             self._notify("market")
-            return classified, None, bp
+            return trade_type, None, bp
 
         # Cache latest price data from trade
         self._price_cache[msg.symbol] = (
             msg.last_price, msg.change, msg.ratio_change
         )
 
-        classified = self.classifier.classify(msg)
-        stats = self.aggregator.add_trade(classified)
+        trade_type, now = self.classifier.record(msg)
+        stats = self.aggregator.add(
+            msg.symbol, trade_type, msg.last_vol,
+            msg.last_price * msg.last_vol * 1000,  # price in 1000 VND
+            now, msg.trading_session,
+        )
         if self.price_tracker:
             self.price_tracker.on_trade(msg.symbol, msg.last_price, msg.last_vol)
         self._notify("market")
-        return classified, stats, None
+        return trade_type, stats, None
 
     async def handle_foreign(self, msg: SSIForeignMessage):
         """Track foreign investor delta, speed, and acceleration."""
-        if not self._is_watched(msg.symbol):
+        if not self.is_watched(msg.symbol):
             return None
         result = self.foreign_tracker.update(msg)
         if self.price_tracker:
@@ -171,7 +180,8 @@ class MarketDataProcessor:
         self._subscribers = [cb for cb in self._subscribers if cb is not callback]
 
     def _notify(self, channel: str):
-        """Notify all subscribers of a data change on a channel."""
+        """Mark channel payloads dirty, then notify all subscribers."""
+        self.snapshot_cache.mark_dirty(channel)
         for cb in self._subscribers:
             try:
                 cb(channel)
@@ -187,6 +197,7 @@ class MarketDataProcessor:
         self.index_tracker.reset()
         self.derivatives_tracker.reset()
         self._price_cache.clear()
+        self.snapshot_cache.mark_all_dirty()
         if self.price_tracker:
             self.price_tracker.reset()
         logger.info("Session data reset")
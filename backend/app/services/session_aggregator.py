@@ -5,6 +5,8 @@ Splits volumes into ATO / Continuous / ATC session phases.
 Resets daily at 15:00 VN time (end of trading session).
 """
 
+from datetime import datetime
+
 from app.models.domain import ClassifiedTrade, SessionStats, TradeType
 
 
@@ -24,32 +26,47 @@ class SessionAggregator:
 
     def add_trade(self, trade: ClassifiedTrade) -> SessionStats:
         """Add a classified trade to session totals. Returns updated stats."""
-        if trade.symbol not in self._stats:
-            self._stats[trade.symbol] = SessionStats(symbol=trade.symbol)
-        stats = self._stats[trade.symbol]
+        return self.add(
+            trade.symbol, trade.trade_type, trade.volume, trade.value,
+            trade.timestamp, trade.trading_session,
+        )
+
+    def add(
+        self,
+        symbol: str,
+        trade_type: TradeType,
+        volume: int,
+        value: float,
+        timestamp: datetime,
+        trading_session: str = "",
+    ) -> SessionStats:
+        """Add one trade's fields to session totals. Returns updated stats."""
+        if symbol not in self._stats:
+            self._stats[symbol] = SessionStats(symbol=symbol)
+        stats = self._stats[symbol]
 
         # Update overall totals
-        if trade.trade_type == TradeType.MUA_CHU_DONG:
-            stats.mua_chu_dong_volume += trade.volume
-            stats.mua_chu_dong_value += trade.value
-        elif trade.trade_type == TradeType.BAN_CHU_DONG:
-            stats.ban_chu_dong_volume += trade.volume
-            stats.ban_chu_dong_value += trade.value
+        if trade_type == TradeType.MUA_CHU_DONG:
+            stats.mua_chu_dong_volume += volume
+            stats.mua_chu_dong_value += value
+        elif trade_type == TradeType.BAN_CHU_DONG:
+            stats.ban_chu_dong_volume += volume
+            stats.ban_chu_dong_value += value
         else:
-            stats.neutral_volume += trade.volume
+            stats.neutral_volume += volume
 
-        stats.total_volume += trade.volume
-        stats.last_updated = trade.timestamp
+        stats.total_volume += volume
+        stats.last_updated = timestamp
 
         # Update per-session breakdown (ATO/Continuous/ATC)
-        bucket = getattr(stats, self._get_session_bucket(trade.trading_session))
-        if trade.trade_type == TradeType.MUA_CHU_DONG:
-            bucket.mua_chu_dong_volume += trade.volume
-        elif trade.trade_type == TradeType.BAN_CHU_DONG:
-            bucket.ban_chu_dong_volume += trade.volume
+        bucket = getattr(stats, self._get_session_bucket(trading_session))
+        if trade_type == TradeType.MUA_CHU_DONG:
+            bucket.mua_chu_dong_volume += volume
+        elif trade_type == TradeType.BAN_CHU_DONG:
+            bucket.ban_chu_dong_volume += volume
         else:
-            bucket.neutral_volume += trade.volume
-        bucket.total_volume += trade.volume
+            bucket.neutral_volume += volume
+        bucket.total_volume += volume
 
         return stats
 
@@ -0,0 +1,368 @@
+"""Shared-memory StateBus for an ingest leader and fan-out workers on one host.
+
+Selected with REDIS_URL=shm://<name>. The leader (owner) creates a
+`multiprocessing.shared_memory` segment; workers attach to it by name and
+read frames and keys straight out of the mapping — no broker round-trip,
+no socket, and no re-serialization (frames are the leader's encoded bytes).
+
+Segment layout (little-endian):
+
+    header   magic | version | slot_count | slot_bytes | ring_bytes
+             closed u64 | reserve u64 | head u64
+    slots    slot_count x [seq u64 | length u32 | key_len u16 | key | value]
+    ring     ring_bytes of frame records: u32 length | u16 channel_len |
+             channel | frame  (length 0 = padding to the end of the ring)
+
+Keys (set/get) live in fixed slots guarded by a per-slot seqlock: the
+writer makes `seq` odd, writes the value, then makes it even again; a
+reader copies the value and retries if `seq` was odd or changed meanwhile.
+A slot that stays odd (a leader that died mid-write) or a segment closed
+under the reader ends the retries: get() returns None after read_timeout.
+
+Frames (publish/subscribe) go into a byte ring. The writer advances
+`reserve` before overwriting anything and `head` once the record is
+complete; readers keep their own cursor, copy a record, and discard it if
+`reserve` has since moved more than a ring length past it (overrun). A
+reader that falls behind skips to the head and logs — FanoutMirror treats
+the resulting sequence gap like any other and waits for a keyframe.
+
+Single writer only: exactly one process may own a given name.
+"""
+
+import asyncio
+import logging
+import struct
+import time
+from collections.abc import AsyncIterator
+from multiprocessing import shared_memory
+
+from app.services.state_bus import StateBus
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"STB1"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIIIQ")  # magic, version, slot_count, slot_bytes, ring_bytes
+_U64 = struct.Struct("<Q")
+_CLOSED_OFF = 24
+_RESERVE_OFF = 32
+_HEAD_OFF = 40
+_SLOTS_OFF = 64
+
+_SLOT = struct.Struct("<QIH")  # seq, value length, key length
+_KEY_MAX = 110
+_SLOT_HEADER = 128  # _SLOT + key, padded
+_RECORD = struct.Struct("<IH")  # record length, channel length
+
+# Default limits: a key value must fit in SLOT_BYTES, a frame in RING_BYTES // 4
+SLOT_BYTES = 4 * 1024 * 1024
+RING_BYTES = 16 * 1024 * 1024
+
+# Seqlock retries before yielding to the event loop
+_SPIN = 100
+
+# Segments created by this process (a same-process reader must not untrack them)
+_owned: set[str] = set()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without handing it to this process's
+    resource tracker, which would otherwise unlink it when a worker exits."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        from multiprocessing import resource_tracker
+
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _owned:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class _Segment:
+    """Offsets and accessors over one mapped segment."""
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        self.buf = shm.buf
+        magic, version, self.slot_count, self.slot_bytes, self.ring_bytes = (
+            _HEADER.unpack_from(self.buf, 0)
+        )
+        if magic != _MAGIC or version != _VERSION:
+            raise RuntimeError(f"Shared memory segment {shm.name} is not a v{_VERSION} state bus")
+        self.stride = _SLOT_HEADER + self.slot_bytes
+        self.ring_off = _SLOTS_OFF + self.slot_count * self.stride
+
+    @staticmethod
+    def size(slot_count: int, slot_bytes: int, ring_bytes: int) -> int:
+        return _SLOTS_OFF + slot_count * (_SLOT_HEADER + slot_bytes) + ring_bytes
+
+    def u64(self, offset: int) -> int:
+        return _U64.unpack_from(self.buf, offset)[0]
+
+    def set_u64(self, offset: int, value: int) -> None:
+        _U64.pack_into(self.buf, offset, value)
+
+    @property
+    def closed(self) -> bool:
+        return self.u64(_CLOSED_OFF) != 0
+
+    def slot_off(self, index: int) -> int:
+        return _SLOTS_OFF + index * self.stride
+
+    def slot_key(self, index: int) -> str | None:
+        off = self.slot_off(index)
+        key_len = _SLOT.unpack_from(self.buf, off)[2]
+        if not key_len:
+            return None
+        start = off + _SLOT.size
+        return bytes(self.buf[start:start + key_len]).decode()
+
+    def read_slot(self, index: int) -> bytes | None:
+        """One seqlock read attempt; None if the writer was mid-update."""
+        off = self.slot_off(index)
+        seq, length, _ = _SLOT.unpack_from(self.buf, off)
+        if seq & 1:
+            return None
+        start = off + _SLOT_HEADER
+        value = bytes(self.buf[start:start + min(length, self.slot_bytes)])
+        if self.u64(off) != seq:
+            return None
+        return value
+
+    def close(self) -> None:
+        self.buf = None
+        self.shm.close()
+
+
+class SharedMemoryStateBus(StateBus):
+    """StateBus over a named shared memory segment (one host only).
+
+    The owner (the ingest leader) creates the segment lazily on first
+    write and unlinks it on close, replacing any segment a crashed leader
+    left behind. Non-owners attach lazily, and re-attach when the leader
+    restarts; until a segment exists, get() returns None and subscribers
+    wait.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        owner: bool,
+        slot_count: int = 32,
+        slot_bytes: int = SLOT_BYTES,
+        ring_bytes: int = RING_BYTES,
+        poll_interval: float = 0.005,
+        read_timeout: float = 0.5,
+    ):
+        self._name = name
+        self._owner = owner
+        self._slot_count = slot_count
+        self._slot_bytes = slot_bytes
+        self._ring_bytes = ring_bytes
+        self._poll_interval = poll_interval
+        self._read_timeout = read_timeout
+        self._seg: _Segment | None = None
+        self._slots: dict[str, int] = {}
+        self._head = 0  # owner's copy of the committed ring position
+
+    # -- Segment lifecycle --
+
+    def _create(self) -> _Segment:
+        size = _Segment.size(self._slot_count, self._slot_bytes, self._ring_bytes)
+        try:
+            stale = shared_memory.SharedMemory(name=self._name)
+        except FileNotFoundError:
+            pass
+        else:
+            logger.warning("Replacing stale shared memory segment %s", self._name)
+            _U64.pack_into(stale.buf, _CLOSED_OFF, 1)
+            stale.close()
+            stale.unlink()
+        shm = shared_memory.SharedMemory(name=self._name, create=True, size=size)
+        _owned.add(self._name)
+        _HEADER.pack_into(
+            shm.buf, 0, _MAGIC, _VERSION, self._slot_count, self._slot_bytes, self._ring_bytes,
+        )
+        logger.info("Created shared memory state bus %s (%d MB)", self._name, size >> 20)
+        return _Segment(shm)
+
+    def _segment(self) -> _Segment | None:
+        """Current segment, creating (owner) or (re-)attaching (reader) as needed."""
+        if self._owner:
+            if self._seg is None:
+                self._seg = self._create()
+            return self._seg
+        if self._seg is not None and self._seg.closed:
+            self._seg.close()
+            self._seg = None
+            self._slots.clear()
+        if self._seg is None:
+            try:
+                self._seg = _Segment(_attach(self._name))
+            except FileNotFoundError:
+                return None
+            logger.info("Attached to shared memory state bus %s", self._name)
+        return self._seg
+
+    async def close(self) -> None:
+        seg, self._seg = self._seg, None
+        if seg is None:
+            return
+        if self._owner:
+            seg.set_u64(_CLOSED_OFF, 1)
+            seg.close()
+            seg.shm.unlink()
+            _owned.discard(self._name)
+        else:
+            seg.close()
+
+    # -- Keys --
+
+    async def set(self, key: str, value: str) -> None:
+        seg = self._segment()
+        data = value.encode()
+        if len(data) > seg.slot_bytes:
+            raise ValueError(f"Value for {key!r} exceeds slot size ({len(data)} > {seg.slot_bytes})")
+        index = self._slots.get(key)
+        new = index is None
+        if new:
+            key_bytes = key.encode()
+            if len(key_bytes) > _KEY_MAX:
+                raise ValueError(f"Key too long: {key!r}")
+            if len(self._slots) >= seg.slot_count:
+                raise ValueError(f"All {seg.slot_count} shared memory slots in use")
+            index = len(self._slots)
+
+        off = seg.slot_off(index)
+        seq = seg.u64(off)
+        seg.set_u64(off, seq + 1)
+        start = off + _SLOT_HEADER
+        seg.buf[start:start + len(data)] = data
+        key_len = 0
+        if new:
+            seg.buf[off + _SLOT.size:off + _SLOT.size + len(key_bytes)] = key_bytes
+            key_len = len(key_bytes)
+        else:
+            key_len = _SLOT.unpack_from(seg.buf, off)[2]
+        _SLOT.pack_into(seg.buf, off, seq + 1, len(data), key_len)
+        seg.set_u64(off, seq + 2)
+        if new:
+            self._slots[key] = index
+
+    async def get(self, key: str) -> str | None:
+        seg = self._segment()
+        if seg is None:
+            return None
+        index = self._slots.get(key)
+        if index is None:
+            index = self._find_slot(seg, key)
+            if index is None:
+                return None
+        spins = 0
+        deadline = None
+        while (value := seg.read_slot(index)) is None:
+            spins += 1
+            if spins % _SPIN:
+                continue
+            if seg.closed:
+                return None  # leader gone or replaced; the next call re-attaches
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + self._read_timeout
+            elif now >= deadline:
+                logger.warning("Shared memory slot %r stuck mid-write — giving up", key)
+                return None
+            await asyncio.sleep(0)
+        return value.decode()
+
+    def _find_slot(self, seg: _Segment, key: str) -> int | None:
+        for index in range(seg.slot_count):
+            slot_key = seg.slot_key(index)
+            if slot_key is None:
+                return None  # slots are assigned in order
+            self._slots.setdefault(slot_key, index)
+            if slot_key == key:
+                return index
+        return None
+
+    # -- Frames --
+
+    async def publish(self, channel: str, frame: str) -> None:
+        seg = self._segment()
+        channel_bytes = channel.encode()
+        data = frame.encode()
+        length = _RECORD.size + len(channel_bytes) + len(data)
+        if length > seg.ring_bytes // 4:
+            raise ValueError(f"{channel} frame too large for ring ({length} bytes)")
+
+        head = self._head
+        off = head % seg.ring_bytes
+        room = seg.ring_bytes - off
+        pad = room if room < length else 0
+        seg.set_u64(_RESERVE_OFF, head + pad + length)
+        if pad:
+            if room >= 4:
+                struct.pack_into("<I", seg.buf, seg.ring_off + off, 0)
+            head += pad
+            off = 0
+        start = seg.ring_off + off
+        _RECORD.pack_into(seg.buf, start, length, len(channel_bytes))
+        start += _RECORD.size
+        seg.buf[start:start + len(channel_bytes)] = channel_bytes
+        start += len(channel_bytes)
+        seg.buf[start:start + len(data)] = data
+        self._head = head + length
+        seg.set_u64(_HEAD_OFF, self._head)
+
+    async def subscribe(self) -> AsyncIterator[tuple[str, str]]:
+        seg = self._segment()
+        cursor = seg.u64(_HEAD_OFF) if seg is not None else None
+        return self._iterate(seg, cursor)
+
+    async def _iterate(self, seg: _Segment | None, cursor: int | None) -> AsyncIterator[tuple[str, str]]:
+        while True:
+            current = self._segment()
+            if current is not seg:  # leader (re)started: follow the new segment from its head
+                seg = current
+                cursor = seg.u64(_HEAD_OFF) if seg is not None else None
+            if seg is None:
+                await asyncio.sleep(self._poll_interval)
+                continue
+            head = seg.u64(_HEAD_OFF)
+            if cursor == head:
+                await asyncio.sleep(self._poll_interval)
+                continue
+            while cursor < head:
+                record = self._read_record(seg, cursor)
+                if record is None:
+                    logger.warning("Shared memory bus reader overrun — skipping to head")
+                    cursor = seg.u64(_HEAD_OFF)
+                    break
+                cursor, item = record
+                if item is not None:
+                    yield item
+
+    @staticmethod
+    def _read_record(seg: _Segment, cursor: int) -> tuple[int, tuple[str, str] | None] | None:
+        """Record at cursor as (next cursor, (channel, frame) or None for padding).
+
+        None when the writer has already overwritten it.
+        """
+        ring = seg.ring_bytes
+        if seg.u64(_RESERVE_OFF) - cursor > ring:
+            return None
+        off = cursor % ring
+        room = ring - off
+        if room < _RECORD.size:
+            return cursor + room, None
+        start = seg.ring_off + off
+        length, channel_len = _RECORD.unpack_from(seg.buf, start)
+        if length == 0:
+            return cursor + room, None
+        raw = bytes(seg.buf[start:start + min(length, room)])
+        if seg.u64(_RESERVE_OFF) - cursor > ring:
+            return None
+        channel = raw[_RECORD.size:_RECORD.size + channel_len].decode()
+        frame = raw[_RECORD.size + channel_len:].decode()
+        return cursor + length, (channel, frame)
@@ -0,0 +1,110 @@
+"""Versioned serialize-once cache for market state payloads.
+
+MarketDataProcessor bumps a per-channel version on every _notify. A cached
+frame remembers the summed version of the channels it depends on, so each
+payload is serialized at most once per data change no matter how many WS
+broadcasts or REST requests read it. The ETag is derived from the version.
+
+`market_state` is the one scalar market snapshot (indices without their
+intraday arrays, which go out on /ws/sparkline) shared by GET
+/api/market/snapshot and the /ws/market keyframe.
+"""
+
+import json
+import time
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+# Channel dependency sets (channel names match MarketDataProcessor._notify)
+MARKET_DEPS = ("market", "foreign", "index")  # snapshot embeds all three
+FOREIGN_DEPS = ("foreign",)
+INDEX_DEPS = ("index",)
+QUOTES_DEPS = ("market",)
+
+MARKET_STATE_KEY = "market"
+_MARKET_EXCLUDE = {"indices": {"__all__": {"intraday"}}}
+
+
+class CachedFrame(NamedTuple):
+    """One serialized payload at a specific data version."""
+
+    version: int
+    text: str
+    body: bytes
+    etag: str
+    data: Any = None  # JSON-ready object text was serialized from (get_json only)
+
+
+class SnapshotCache:
+    """Per-key serialized payloads invalidated by channel version bumps."""
+
+    def __init__(self):
+        self._versions: dict[str, int] = {}
+        self._frames: dict[str, CachedFrame] = {}
+        # Distinguishes ETags across process restarts (versions restart at 0)
+        self._epoch = f"{time.time_ns():x}"
+
+    def mark_dirty(self, channel: str):
+        """Invalidate every frame that depends on channel."""
+        self._versions[channel] = self._versions.get(channel, 0) + 1
+
+    def mark_all_dirty(self):
+        """Invalidate everything (session reset)."""
+        for channel in self._versions:
+            self._versions[channel] += 1
+        self._frames.clear()
+
+    def version(self, channels: tuple[str, ...]) -> int:
+        """Combined version of a dependency set. Monotonic as each part only grows."""
+        return sum(self._versions.get(ch, 0) for ch in channels)
+
+    def get(
+        self,
+        key: str,
+        channels: tuple[str, ...],
+        build: Callable[[], str],
+    ) -> CachedFrame:
+        """Return cached frame for key, serializing via build() only if stale."""
+        version = self.version(channels)
+        frame = self._frames.get(key)
+        if frame is not None and frame.version == version:
+            return frame
+        return self._store(key, version, build(), None)
+
+    def get_json(
+        self,
+        key: str,
+        channels: tuple[str, ...],
+        build: Callable[[], Any],
+    ) -> CachedFrame:
+        """Like get(), for a builder returning a JSON-ready object, kept as frame.data."""
+        version = self.version(channels)
+        frame = self._frames.get(key)
+        if frame is not None and frame.version == version:
+            return frame
+        data = build()
+        return self._store(key, version, json.dumps(data), data)
+
+    def _store(self, key: str, version: int, text: str, data: Any) -> CachedFrame:
+        frame = CachedFrame(
+            version=version,
+            text=text,
+            body=text.encode(),
+            etag=f'"{self._epoch}-{key}-{version}"',
+            data=data,
+        )
+        self._frames[key] = frame
+        return frame
+
+
+def market_state(processor) -> CachedFrame:
+    """Scalar market snapshot, serialized once per version of MARKET_DEPS.
+
+    frame.data is the state dict the market delta protocol diffs; treat it
+    as read-only, it is shared by every reader of this version.
+    """
+    return processor.snapshot_cache.get_json(
+        MARKET_STATE_KEY,
+        MARKET_DEPS,
+        lambda: processor.get_market_snapshot().model_dump(mode="json", exclude=_MARKET_EXCLUDE),
+    )
@@ -0,0 +1,178 @@
+"""Fast-path SSI message decoder — raw frame to slotted records, no Pydantic.
+
+The default path (extract_content → normalize_fields → Pydantic model per
+RType) builds an intermediate snake_case dict and runs full model
+validation for every message; an X frame pays that twice. This decoder
+does one pass straight from the PascalCase content dict into `__slots__`
+records whose attribute names and defaults mirror the SSI Pydantic models,
+so downstream handlers read them the same way.
+
+A value that is already its field's exact type is stored as is (and an int
+in a float field becomes float(), as Pydantic does); anything else — numeric
+strings, floats in int fields, nulls — is validated by a Pydantic
+TypeAdapter for that field type, so the rules are Pydantic's own: "12.7" or
+12.7 for an int, or a null anywhere, drops the message as a validation error
+does on the Pydantic path. When a message carries both Symbol and
+StockSymbol the one later in the message wins, as in normalize_fields. The
+Pydantic models stay the schema of record — the records are generated from
+their fields and the tests check both paths agree.
+
+JSON parsing uses orjson when installed, json otherwise.
+"""
+
+import json
+import logging
+
+from pydantic import TypeAdapter
+
+from app.models.ssi_messages import (
+    SSIBarMessage,
+    SSIForeignMessage,
+    SSIIndexMessage,
+    SSIQuoteMessage,
+    SSITradeMessage,
+)
+from app.services.ssi_field_normalizer import FIELD_MAP
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+    _JSONDecodeError: tuple[type[Exception], ...] = (orjson.JSONDecodeError, TypeError)
+except ImportError:  # pragma: no cover - orjson is optional
+    _loads = json.loads
+    _JSONDecodeError = (json.JSONDecodeError, TypeError)
+
+logger = logging.getLogger(__name__)
+
+
+class SSIRecord:
+    """Base for slotted SSI records. Attribute-compatible with the Pydantic models."""
+
+    __slots__ = ()
+
+    def model_dump(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{n}={getattr(self, n)!r}" for n in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+# snake_case field → PascalCase source keys (StockSymbol aliases Symbol)
+_SOURCE_KEYS: dict[str, tuple[str, ...]] = {}
+for _pascal, _snake in FIELD_MAP.items():
+    _SOURCE_KEYS[_snake] = _SOURCE_KEYS.get(_snake, ()) + (_pascal,)
+
+
+# Field type → Pydantic validator for values not already of that type
+_ADAPTERS: dict[type, TypeAdapter] = {}
+
+
+def _record_type(model_cls: type) -> tuple[type, tuple]:
+    """Build a slotted record class and its decode spec from a Pydantic model."""
+    names = tuple(model_cls.model_fields)
+    record_cls = type(
+        model_cls.__name__.replace("Message", "Record"),
+        (SSIRecord,),
+        {"__slots__": names, "__doc__": f"Slotted fast-path counterpart of {model_cls.__name__}."},
+    )
+    spec = []
+    for name, field in model_cls.model_fields.items():
+        key, *aliases = _SOURCE_KEYS.get(name, (None,))
+        typ = field.annotation
+        if typ not in _ADAPTERS:
+            _ADAPTERS[typ] = TypeAdapter(typ)
+        spec.append((name, key, tuple(aliases), typ, field.default))
+    return record_cls, tuple(spec)
+
+
+SSITradeRecord, _TRADE_SPEC = _record_type(SSITradeMessage)
+SSIQuoteRecord, _QUOTE_SPEC = _record_type(SSIQuoteMessage)
+SSIForeignRecord, _FOREIGN_SPEC = _record_type(SSIForeignMessage)
+SSIIndexRecord, _INDEX_SPEC = _record_type(SSIIndexMessage)
+SSIBarRecord, _BAR_SPEC = _record_type(SSIBarMessage)
+
+# RType → [(mapped_rtype, record_cls, spec)]; X splits into Trade + Quote
+_ROUTES: dict[str, tuple[tuple[str, type, tuple], ...]] = {
+    "Trade": (("Trade", SSITradeRecord, _TRADE_SPEC),),
+    "Quote": (("Quote", SSIQuoteRecord, _QUOTE_SPEC),),
+    "X": (("Trade", SSITradeRecord, _TRADE_SPEC), ("Quote", SSIQuoteRecord, _QUOTE_SPEC)),
+    "R": (("R", SSIForeignRecord, _FOREIGN_SPEC),),
+    "MI": (("MI", SSIIndexRecord, _INDEX_SPEC),),
+    "B": (("B", SSIBarRecord, _BAR_SPEC),),
+}
+
+
+_MISSING = object()
+
+
+def _build(record_cls: type, spec: tuple, content: dict):
+    """Populate one record from PascalCase content. Raises ValueError where Pydantic would."""
+    record = record_cls.__new__(record_cls)
+    get = content.get
+    for name, key, aliases, typ, default in spec:
+        value = get(key, _MISSING)
+        if aliases:
+            sources = (key, *aliases)
+            present = [k for k in sources if k in content]
+            if len(present) > 1:
+                # normalize_fields keeps the last of them in message order
+                present = [k for k in content if k in sources]
+            if present:
+                value = content[present[-1]]
+        if value is _MISSING:
+            value = default
+        elif value.__class__ is not typ:
+            if typ is float and value.__class__ is int:
+                value = float(value)
+            else:
+                value = _ADAPTERS[typ].validate_python(value)
+        setattr(record, name, value)
+    return record
+
+
+def decode_content(raw) -> dict | None:
+    """extract_content equivalent using the fast JSON parser."""
+    if isinstance(raw, (str, bytes)):
+        try:
+            raw = _loads(raw)
+        except _JSONDecodeError:
+            logger.debug("Failed to parse SSI message as JSON: %s", raw[:200] if raw else raw)
+            return None
+    if not isinstance(raw, dict):
+        return None
+    content = raw.get("Content") or raw.get("content") or raw
+    if isinstance(content, str):
+        try:
+            content = _loads(content)
+        except _JSONDecodeError:
+            return None
+    return content if isinstance(content, dict) else None
+
+
+def parse_records(content: dict) -> list[tuple[str, SSIRecord]]:
+    """Content dict → [(rtype, record)] — parse_message_multi semantics."""
+    rtype = content.get("RType", "")
+    routes = _ROUTES.get(rtype)
+    if routes is None:
+        logger.debug("Unknown RType: %s", rtype)
+        return []
+    results = []
+    for mapped_rtype, record_cls, spec in routes:
+        try:
+            results.append((mapped_rtype, _build(record_cls, spec, content)))
+        except ValueError:
+            logger.debug("Failed to decode %s→%s message", rtype, mapped_rtype, exc_info=True)
+    return results
+
+
+def decode_message(raw) -> list[tuple[str, SSIRecord]]:
+    """Decode a raw SSI frame into [(rtype, record)]."""
+    content = decode_content(raw)
+    return parse_records(content) if content is not None else []
@@ -3,36 +3,67 @@
 Connects to SSI SignalR hub via asyncio.to_thread (ssi-fc-data is sync-only),
 demuxes incoming messages by RType, dispatches to registered callbacks,
 and handles reconnection with REST snapshot reconciliation.
+
+Cross-thread handoff: the stream thread appends (callback, msg) pairs to a
+SimpleQueue and wakes the event loop at most once per burst. A single drain
+task runs the callbacks in arrival order, in batches, so per-message cost is
+a queue put instead of a Future + Task + loop wakeup.
+
+Decoding runs on the stream thread: Pydantic models by default, or slotted
+records from ssi_fast_decoder when settings.ssi_decoder == "fast". With a
+symbol filter set, X/R/B content for unwatched symbols is dropped right
+after JSON extraction, before field normalization and model construction.
 """
 
 import asyncio
 import logging
+import queue
+import time
 from collections.abc import Callable
 
 from ssi_fc_data.fc_md_client import MarketDataClient
 from ssi_fc_data.fc_md_stream import MarketDataStream
 
-from app.metrics import ssi_messages_received_total
+from app.config import settings
+from app.metrics import (
+    ssi_handoff_batch_size,
+    ssi_handoff_latency_seconds,
+    ssi_messages_dropped_total,
+    ssi_messages_received_total,
+)
+from app.services.ssi_fast_decoder import decode_content, parse_records
 from app.services.ssi_field_normalizer import extract_content, parse_message_multi
 
 logger = logging.getLogger(__name__)
 
-# Map RType → Prometheus label
-_RTYPE_LABEL = {"Trade": "trade", "Quote": "quote", "R": "foreign", "MI": "index", "B": "bar"}
+# Map RType → Prometheus label (X = combined trade+quote, only seen pre-parse)
+_RTYPE_LABEL = {
+    "Trade": "trade", "Quote": "quote", "X": "market", "R": "foreign", "MI": "index", "B": "bar",
+}
 
 # Callback type: async function receiving a typed SSI message
 MessageCallback = Callable  # async (msg) -> None
 
+# settings.ssi_decoder → (raw frame → content dict, content dict → [(rtype, msg)])
+_DECODERS: dict[str, tuple[Callable, Callable]] = {
+    "pydantic": (extract_content, parse_message_multi),
+    "fast": (decode_content, parse_records),
+}
+
 
 class SSIStreamService:
     """Manages SSI WebSocket connection, message demux, and auto-reconnect."""
 
     _BASE_RECONNECT_DELAY = 2.0  # seconds
     _MAX_RECONNECT_DELAY = 60.0  # cap for exponential backoff
+    _HANDOFF_MAX_BATCH = 500  # messages per drain batch before yielding to the loop
 
-    def __init__(self, auth_service, market_service):
+    def __init__(self, auth_service, market_service, decoder: str | None = None):
         self._auth = auth_service
         self._market = market_service
+        self._extract, self._parse = _DECODERS[decoder or settings.ssi_decoder]
+        # Pre-parse symbol filter (symbol -> keep?); None = keep everything
+        self._symbol_filter: Callable[[str], bool] | None = None
         self._stream: MarketDataStream | None = None
         self._stream_task: asyncio.Task | None = None
         self._reconnecting = False
@@ -56,6 +87,12 @@ class SSIStreamService:
         self._reconnect_callback: Callable | None = None
         # Main event loop ref — captured at connect() time for cross-thread dispatch
         self._loop: asyncio.AbstractEventLoop | None = None
+        # Stream thread → event loop handoff: (callback, msg, enqueue monotonic time)
+        self._handoff: queue.SimpleQueue[tuple[MessageCallback, object, float]] = (
+            queue.SimpleQueue()
+        )
+        self._drain_scheduled = False  # set by stream thread, cleared by drain task
+        self._drain_task: asyncio.Task | None = None
 
     # -- Callback registration --
 
@@ -86,6 +123,10 @@ class SSIStreamService:
         """Set callback fired after SSI stream reconnects."""
         self._reconnect_callback = cb
 
+    def set_symbol_filter(self, predicate: Callable[[str], bool] | None):
+        """Drop symbol-bearing messages whose symbol fails predicate, before parsing."""
+        self._symbol_filter = predicate
+
     # -- Connection lifecycle --
 
     async def connect(self, channels: list[str]):
@@ -126,11 +167,15 @@ class SSIStreamService:
                 await self._stream_task
             except asyncio.CancelledError:
                 pass
-        # Cancel all pending callback tasks
+        # Cancel all pending callback tasks and discard undelivered messages
         for task in list(self._background_tasks):
             if not task.done():
                 task.cancel()
         self._background_tasks.clear()
+        if self._drain_task and not self._drain_task.done():
+            self._drain_task.cancel()
+        self._handoff = queue.SimpleQueue()
+        self._drain_scheduled = False
         logger.info("SSI stream disconnected")
 
     # -- Message handling --
@@ -140,12 +185,18 @@ class SSIStreamService:
 
         Called from the stream thread — schedules async callbacks on the event loop.
         X:ALL channel sends combined trade+quote data as RType="X",
-        which parse_message_multi splits into separate Trade and Quote results.
+        which the decoder splits into separate Trade and Quote results.
         """
-        content = extract_content(raw)
+        content = self._extract(raw)
         if content is None:
             return
-        for rtype, msg in parse_message_multi(content):
+        if self._symbol_filter is not None:
+            symbol = content.get("Symbol") or content.get("StockSymbol")
+            if isinstance(symbol, str) and not self._symbol_filter(symbol):
+                rtype = content.get("RType", "")
+                ssi_messages_dropped_total.labels(channel=_RTYPE_LABEL.get(rtype, rtype)).inc()
+                return
+        for rtype, msg in self._parse(content):
             ssi_messages_received_total.labels(channel=_RTYPE_LABEL.get(rtype, rtype)).inc()
             callbacks = self._callbacks.get(rtype, [])
             for cb in callbacks:
@@ -156,18 +207,51 @@ class SSIStreamService:
         logger.error("SSI stream error: %s", error)
 
     def _schedule_callback(self, cb: MessageCallback, msg):
-        """Schedule an async callback on the main event loop from the stream thread."""
+        """Queue a callback for the event loop from the stream thread.
+
+        Only the first message of a burst wakes the loop; the rest ride along
+        in the same drain batch.
+        """
         if not self._loop:
             logger.warning("No event loop — dropping callback for %s", type(msg).__name__)
             return
-        asyncio.run_coroutine_threadsafe(self._run_callback(cb, msg), self._loop)
+        self._handoff.put((cb, msg, time.monotonic()))
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            self._loop.call_soon_threadsafe(self._start_drain)
+
+    def _start_drain(self):
+        """Start the drain task on the event loop unless one is already running."""
+        if self._drain_task and not self._drain_task.done():
+            return
+        self._drain_task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        """Dispatch queued callbacks in batches until the handoff queue is empty."""
+        while True:
+            batch = []
+            try:
+                while len(batch) < self._HANDOFF_MAX_BATCH:
+                    batch.append(self._handoff.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                self._drain_scheduled = False
+                # Stream thread may have queued after our empty read but before
+                # the flag reset — if so it did not wake us, so keep draining.
+                if self._handoff.empty():
+                    return
+                self._drain_scheduled = True
+                continue
+
+            ssi_handoff_batch_size.observe(len(batch))
+            ssi_handoff_latency_seconds.observe(time.monotonic() - batch[0][2])
+            for cb, msg, _ in batch:
+                await self._run_callback(cb, msg)
+            await asyncio.sleep(0)  # let WS senders run between batches
 
     async def _run_callback(self, cb: MessageCallback, msg):
         """Execute a callback with error isolation."""
-        task = asyncio.current_task()
-        if task:
-            self._background_tasks.add(task)
-            task.add_done_callback(self._background_tasks.discard)
         try:
             await cb(msg)
         except Exception:
@@ -0,0 +1,132 @@
+"""Transport between the ingest leader and stateless fan-out workers.
+
+The leader publishes serialized WS frames per channel and stores the latest
+bootstrap/REST payloads under keys; workers subscribe to the frames and read
+the keys. Two implementations share one small async interface:
+
+- RedisStateBus — pub/sub + GET/SET on Redis (`redis` package, optional)
+- SharedMemoryStateBus — a shared memory segment, for workers on the
+  leader's host (see shm_state_bus)
+- InProcessStateBus — same semantics inside one process (tests, local dev)
+
+Frames are opaque strings; channel and key names are namespaced with
+`stock:` on Redis.
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = "stock:"
+_FRAME_PREFIX = _PREFIX + "ws:"
+
+
+class StateBus(ABC):
+    """Publish/subscribe for channel frames plus a latest-value key store."""
+
+    @abstractmethod
+    async def publish(self, channel: str, frame: str) -> None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str) -> None: ...
+
+    @abstractmethod
+    async def get(self, key: str) -> str | None: ...
+
+    @abstractmethod
+    async def subscribe(self) -> AsyncIterator[tuple[str, str]]:
+        """Start a subscription; iterate it for (channel, frame).
+
+        Frames published after this returns are delivered, so a subscriber
+        can subscribe first and then read bootstrap keys without a gap.
+        """
+
+    async def close(self) -> None:
+        pass
+
+
+class InProcessStateBus(StateBus):
+    """In-memory stand-in for Redis: one queue per subscriber."""
+
+    def __init__(self) -> None:
+        self._values: dict[str, str] = {}
+        self._subscribers: list[asyncio.Queue[tuple[str, str]]] = []
+
+    async def publish(self, channel: str, frame: str) -> None:
+        for queue in self._subscribers:
+            queue.put_nowait((channel, frame))
+
+    async def set(self, key: str, value: str) -> None:
+        self._values[key] = value
+
+    async def get(self, key: str) -> str | None:
+        return self._values.get(key)
+
+    async def subscribe(self) -> AsyncIterator[tuple[str, str]]:
+        queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue()
+        self._subscribers.append(queue)
+        return self._iterate(queue)
+
+    async def _iterate(self, queue: asyncio.Queue) -> AsyncIterator[tuple[str, str]]:
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.remove(queue)
+
+
+class RedisStateBus(StateBus):
+    """Redis pub/sub transport (requires the `redis` package)."""
+
+    def __init__(self, url: str) -> None:
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as exc:  # pragma: no cover - depends on deployment
+            raise RuntimeError(
+                "APP_ROLE=ingest/fanout with a redis:// REDIS_URL needs the 'redis' package",
+            ) from exc
+        self._client = aioredis.from_url(url, decode_responses=True)
+
+    async def publish(self, channel: str, frame: str) -> None:
+        await self._client.publish(_FRAME_PREFIX + channel, frame)
+
+    async def set(self, key: str, value: str) -> None:
+        await self._client.set(_PREFIX + key, value)
+
+    async def get(self, key: str) -> str | None:
+        return await self._client.get(_PREFIX + key)
+
+    async def subscribe(self) -> AsyncIterator[tuple[str, str]]:
+        pubsub = self._client.pubsub()
+        await pubsub.psubscribe(_FRAME_PREFIX + "*")
+        return self._iterate(pubsub)
+
+    async def _iterate(self, pubsub) -> AsyncIterator[tuple[str, str]]:
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "pmessage":
+                    continue
+                yield message["channel"][len(_FRAME_PREFIX):], message["data"]
+        finally:
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_state_bus(url: str, owner: bool = False) -> StateBus:
+    """Bus for REDIS_URL.
+
+    "memory://" selects the in-process stand-in and "shm://<name>" a shared
+    memory segment, which the owner (the ingest leader) creates.
+    """
+    if url.startswith("memory://"):
+        return InProcessStateBus()
+    if url.startswith("shm://"):
+        from app.services.shm_state_bus import SharedMemoryStateBus
+
+        return SharedMemoryStateBus(url.removeprefix("shm://") or "stock-tracker", owner=owner)
+    return RedisStateBus(url)
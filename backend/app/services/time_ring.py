@@ -0,0 +1,95 @@
+"""Fixed-capacity ring of timestamped items with bisect-based time queries.
+
+Timestamps (epoch seconds) live in an array('d') column alongside the
+items. Appends are O(1) and overwrite the oldest item once full; because
+timestamps are kept non-decreasing, "latest at or before t" and "all
+since t" are a binary search plus the size of the returned slice instead
+of a scan over the whole history.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class _TimestampView:
+    """Read-only logical-order view over the ring's timestamp column, for bisect."""
+
+    __slots__ = ("_ring",)
+
+    def __init__(self, ring: "TimeRing"):
+        self._ring = ring
+
+    def __len__(self) -> int:
+        return self._ring._len
+
+    def __getitem__(self, i: int) -> float:
+        ring = self._ring
+        return ring._ts[(ring._start + i) % ring._capacity]
+
+
+class TimeRing(Generic[T]):
+    """Time-ordered ring buffer. Timestamps must be appended in order.
+
+    A timestamp earlier than the newest one (wall clock stepped back) is
+    clamped to the newest, keeping the column sorted for bisect.
+    """
+
+    __slots__ = ("_capacity", "_ts", "_items", "_start", "_len", "_view")
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._view = _TimestampView(self)
+        self.clear()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def append(self, ts: datetime, item: T) -> None:
+        """Append an item, overwriting the oldest once full."""
+        t = ts.timestamp()
+        if self._len and t < self._ts[self._index(self._len - 1)]:
+            t = self._ts[self._index(self._len - 1)]
+        if len(self._ts) < self._capacity:
+            self._ts.append(t)
+            self._items.append(item)
+            self._len += 1
+        else:
+            self._ts[self._start] = t
+            self._items[self._start] = item
+            self._start = (self._start + 1) % self._capacity
+
+    def at_or_before(self, ts: datetime) -> T | None:
+        """Most recent item with timestamp <= ts, or None."""
+        i = bisect_right(self._view, ts.timestamp())
+        return self._items[self._index(i - 1)] if i else None
+
+    def since(self, ts: datetime) -> list[T]:
+        """Items with timestamp >= ts, oldest first."""
+        return self._slice(bisect_left(self._view, ts.timestamp()), self._len)
+
+    def items(self) -> list[T]:
+        """All retained items, oldest first."""
+        return self._slice(0, self._len)
+
+    def clear(self) -> None:
+        self._ts = array("d")
+        self._items: list[T] = []
+        self._start = 0
+        self._len = 0
+
+    def _index(self, i: int) -> int:
+        return (self._start + i) % self._capacity
+
+    def _slice(self, start: int, end: int) -> list[T]:
+        """Copy logical range [start, end) out of the ring, unwrapping if needed."""
+        if start >= end:
+            return []
+        i = self._index(start)
+        n = end - start
+        if i + n <= len(self._items):
+            return self._items[i:i + n]
+        return self._items[i:] + self._items[:i + n - len(self._items)]
@@ -2,11 +2,17 @@
 
 Uses LastVol (PER-TRADE volume, NOT cumulative TotalVol) against cached
 bid/ask from QuoteCache. ATO/ATC auction trades → NEUTRAL.
+
+The hot path (`record`) returns only the trade type and timestamp and, when
+a TickBuffer is attached, appends the tick_data row straight into its
+columns — no ClassifiedTrade is built. `classify` still returns the full
+model for callers that want one.
 """
 
 import time
 from datetime import datetime
 
+from app.database.tick_buffer import TickBuffer
 from app.metrics import trade_classification_duration_seconds
 from app.models.domain import ClassifiedTrade, TradeType
 from app.models.ssi_messages import SSITradeMessage
@@ -16,8 +22,41 @@ from app.services.quote_cache import QuoteCache
 class TradeClassifier:
     """Classify each trade event using bid/ask from QuoteCache."""
 
-    def __init__(self, quote_cache: QuoteCache):
+    def __init__(self, quote_cache: QuoteCache, tick_buffer: TickBuffer | None = None):
         self._cache = quote_cache
+        self._ticks = tick_buffer
+
+    def set_tick_buffer(self, tick_buffer: TickBuffer | None) -> None:
+        """Attach (or detach) the columnar buffer that receives tick_data rows."""
+        self._ticks = tick_buffer
+
+    def record(self, trade: SSITradeMessage) -> tuple[TradeType, datetime]:
+        """Classify a trade and append its tick row to the attached buffer.
+
+        Returns (trade_type, timestamp) without allocating a ClassifiedTrade.
+        """
+        start = time.monotonic()
+        bid, ask = self._cache.get_bid_ask(trade.symbol)
+        trade_type = self._trade_type(trade, bid, ask)
+        now = datetime.now()
+        if self._ticks is not None:
+            self._ticks.append(
+                trade.symbol, now, trade.last_price, trade.last_vol,
+                trade_type.value, bid, ask,
+            )
+        trade_classification_duration_seconds.observe(time.monotonic() - start)
+        return trade_type, now
+
+    @staticmethod
+    def _trade_type(trade: SSITradeMessage, bid: float, ask: float) -> TradeType:
+        """Active buy/sell/neutral from last price vs cached bid/ask."""
+        if trade.trading_session in ("ATO", "ATC"):
+            return TradeType.NEUTRAL
+        if ask > 0 and trade.last_price >= ask:
+            return TradeType.MUA_CHU_DONG
+        if bid > 0 and trade.last_price <= bid:
+            return TradeType.BAN_CHU_DONG
+        return TradeType.NEUTRAL
 
     def classify(self, trade: SSITradeMessage) -> ClassifiedTrade:
         """Classify a single trade as active buy/sell/neutral.
@@ -32,15 +71,7 @@ class TradeClassifier:
         bid, ask = self._cache.get_bid_ask(trade.symbol)
         volume = trade.last_vol  # PER-TRADE volume, NOT cumulative
 
-        # Auction sessions: classify as neutral
-        if trade.trading_session in ("ATO", "ATC"):
-            trade_type = TradeType.NEUTRAL
-        elif ask > 0 and trade.last_price >= ask:
-            trade_type = TradeType.MUA_CHU_DONG
-        elif bid > 0 and trade.last_price <= bid:
-            trade_type = TradeType.BAN_CHU_DONG
-        else:
-            trade_type = TradeType.NEUTRAL
+        trade_type = self._trade_type(trade, bid, ask)
 
         result = ClassifiedTrade(
             symbol=trade.symbol,
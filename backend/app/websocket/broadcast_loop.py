@@ -1,9 +1,9 @@
 """Background task that broadcasts market data to all WebSocket channels.
 
 Channels:
-  market  — full MarketSnapshot
+  market  — MarketSnapshot (indices without intraday)
   foreign — ForeignSummary only
-  index   — dict of IndexData (VN30 + VNINDEX)
+  index   — dict of IndexData (VN30 + VNINDEX), scalar fields only
 """
 
 import asyncio
@@ -38,7 +38,9 @@ async def broadcast_loop(
             try:
                 if market_ws_manager.client_count > 0:
                     snapshot = processor.get_market_snapshot()
-                    market_ws_manager.broadcast(snapshot.model_dump_json())
+                    market_ws_manager.broadcast(snapshot.model_dump_json(
+                        exclude={"indices": {"__all__": {"intraday"}}},
+                    ))
 
                 if foreign_ws_manager.client_count > 0:
                     foreign = processor.get_foreign_summary()
@@ -46,7 +48,10 @@ async def broadcast_loop(
 
                 if index_ws_manager.client_count > 0:
                     indices = processor.index_tracker.get_all()
-                    data = json.dumps({k: v.model_dump() for k, v in indices.items()})
+                    data = json.dumps({
+                        k: v.model_dump(exclude={"intraday"})
+                        for k, v in indices.items()
+                    })
                     index_ws_manager.broadcast(data)
 
             except Exception:
@@ -1,54 +1,235 @@
-"""Manages WebSocket clients with per-client async queues."""
+"""Manages WebSocket clients with per-client outboxes.
+
+Each client has an Encoding (see encoding.py); a broadcast encodes the
+message once per encoding in use, not once per client. Connections served
+by uvicorn's websockets protocol skip the sender task entirely: the frame
+is built once and written straight to each transport (see direct_send.py).
+
+Messages a client cannot take yet wait in its outbox. Event channels
+(alerts, sparkline) use a bounded FIFO that drops the oldest. Snapshot
+channels (market, foreign, index) use latest-value slots: a newer state
+replaces the pending one, so a slow client holds one frame rather than
+ws_queue_size stale ones and always catches up to current data.
+
+A client may be moved to a topic (any hashable key, e.g. a market
+subscription filter). A broadcast goes to every client by default, or to
+one topic's members, or (topic None) to the clients without a topic.
+
+Slow consumers: a client's backlog age (time its outbox has been non-empty)
+is its lag. On snapshot channels, a client whose lag passes
+ws_slow_client_lag_s is downgraded to at most one state frame per
+ws_slow_client_interval_ms, and restored after a run of prompt drains. Any
+client whose lag passes ws_slow_client_disconnect_s is disconnected.
+"""
 
 import asyncio
 import logging
+import time
+from collections import deque
+from collections.abc import Callable, Hashable
 
 from fastapi import WebSocket, WebSocketDisconnect
 from starlette.websockets import WebSocketState
 
 from app.config import settings
-from app.metrics import ws_connections_active, ws_messages_sent_total
+from app.metrics import (
+    ws_bytes_sent_total,
+    ws_client_downgrades_total,
+    ws_client_lag_seconds,
+    ws_clients_downgraded,
+    ws_connections_active,
+    ws_messages_dropped_total,
+    ws_messages_sent_total,
+    ws_send_path_total,
+    ws_slow_client_disconnects_total,
+)
+from app.websocket.direct_send import PATH_DEFLATE, DirectTransport, send_path
+from app.websocket.encoding import JSON, EncodedMessage, Encoding
 
 logger = logging.getLogger(__name__)
 
+Payload = str | bytes
+
+# Message kinds: a latest-value outbox keeps one pending message per kind
+KIND_STATE = "state"
+KIND_STATUS = "status"
+
+# Broadcast target: every client, whatever its topic
+EVERYONE = object()
+
+# Consecutive prompt drains before a downgraded client gets full rate again
+_RECOVER_DRAINS = 20
+
+_deflate_warned = False
+
+
+def _warn_deflate() -> None:
+    """Log once per process that permessage-deflate keeps clients off the direct path."""
+    global _deflate_warned
+    if not _deflate_warned:
+        _deflate_warned = True
+        logger.warning(
+            "WS client negotiated permessage-deflate — queued send path; "
+            "run uvicorn with --ws-per-message-deflate false to use direct writes",
+        )
+
+
+class _FifoOutbox:
+    """Bounded FIFO; drops the oldest message when full."""
+
+    __slots__ = ("_items",)
+
+    def __init__(self, maxlen: int):
+        self._items: deque[Payload] = deque(maxlen=maxlen)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, kind: str) -> bool:
+        return False
+
+    def put(self, payload: Payload, kind: str) -> bool:
+        """Queue payload; True if the oldest message was dropped for it."""
+        full = len(self._items) == self._items.maxlen
+        self._items.append(payload)
+        return full
+
+    def pop(self) -> Payload:
+        return self._items.popleft()
+
+
+class _LatestOutbox:
+    """One pending message per kind; a newer one replaces it in place."""
+
+    __slots__ = ("_slots",)
+
+    def __init__(self):
+        self._slots: dict[str, Payload] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, kind: str) -> bool:
+        return kind in self._slots
+
+    def put(self, payload: Payload, kind: str) -> bool:
+        """Hold payload; True if it replaced a pending message."""
+        replaced = kind in self._slots
+        self._slots[kind] = payload
+        return replaced
+
+    def pop(self) -> Payload:
+        return self._slots.pop(next(iter(self._slots)))
+
+
+class _Client:
+    """Queued client (outbox + sender task) or direct client (outbox + transport).
+
+    A direct client's `task`, if set, waits for its paused transport to
+    become writable and then drains the outbox.
+
+    `backlog_since` is when the outbox last went from empty to non-empty;
+    `interval` > 0 marks a downgraded client, sent state at most that often.
+    """
+
+    __slots__ = (
+        "encoding", "outbox", "task", "wake", "direct", "sent_bytes", "topic",
+        "backlog_since", "interval", "next_due", "prompt_drains", "timer", "evicted",
+    )
+
+    def __init__(
+        self,
+        encoding: Encoding,
+        outbox: _FifoOutbox | _LatestOutbox,
+        task: asyncio.Task | None = None,
+        wake: asyncio.Event | None = None,
+        direct: DirectTransport | None = None,
+        sent_bytes=None,
+    ):
+        self.encoding = encoding
+        self.outbox = outbox
+        self.task = task
+        self.wake = wake
+        self.direct = direct
+        self.sent_bytes = sent_bytes
+        self.topic: Hashable | None = None
+        self.backlog_since = 0.0
+        self.interval = 0.0
+        self.next_due = 0.0
+        self.prompt_drains = 0
+        self.timer: asyncio.TimerHandle | None = None
+        self.evicted = False
+
 
 class ConnectionManager:
     """Manages WebSocket client connections and message broadcasting.
 
-    Each client gets a dedicated asyncio.Queue and sender task.
-    Broadcast pushes to all queues; slow clients drop oldest messages.
+    Direct clients get pre-built frames written to their transport; their
+    outbox only fills while the transport is not writable. Other clients
+    get a sender task draining their outbox. With `latest_only`, outboxes
+    are latest-value slots; `resync`, if given, builds a full-state message
+    for a topic that replaces a pending one instead of the newer message
+    itself — for delta-encoded channels, where dropping a delta would break
+    the chain.
     """
 
-    def __init__(self, channel: str = "unknown") -> None:
+    def __init__(
+        self,
+        channel: str = "unknown",
+        latest_only: bool = False,
+        resync: Callable[[Hashable | None], str] | None = None,
+    ) -> None:
         self._channel = channel
-        # WebSocket → (queue, sender_task)
-        self._clients: dict[WebSocket, tuple[asyncio.Queue[str], asyncio.Task]] = {}
+        self._latest_only = latest_only
+        self._resync = resync
+        self._clients: dict[WebSocket, _Client] = {}
+        self._topics: dict[Hashable, set[WebSocket]] = {}
+        self._lag = ws_client_lag_seconds.labels(channel=channel)
+        self._overflowed = ws_messages_dropped_total.labels(channel=channel, reason="overflow")
+        self._replaced = ws_messages_dropped_total.labels(channel=channel, reason="replaced")
 
     @property
     def client_count(self) -> int:
         return len(self._clients)
 
-    async def connect(self, ws: WebSocket) -> None:
-        """Accept WS connection, create queue + sender task."""
+    def _new_outbox(self) -> _FifoOutbox | _LatestOutbox:
+        return _LatestOutbox() if self._latest_only else _FifoOutbox(settings.ws_queue_size)
+
+    async def connect(self, ws: WebSocket, encoding: Encoding = JSON) -> None:
+        """Accept WS connection; attach its transport, else start a sender task."""
         await ws.accept()
-        queue: asyncio.Queue[str] = asyncio.Queue(maxsize=settings.ws_queue_size)
-        task = asyncio.create_task(self._sender(ws, queue))
-        self._clients[ws] = (queue, task)
+        sent_bytes = ws_bytes_sent_total.labels(channel=self._channel, encoding=encoding.label)
+        outbox = self._new_outbox()
+        direct, path = send_path(ws) if settings.ws_direct_send else (None, "disabled")
+        ws_send_path_total.labels(channel=self._channel, path=path).inc()
+        if path == PATH_DEFLATE:
+            _warn_deflate()
+        if direct is not None:
+            client = _Client(encoding, outbox, direct=direct, sent_bytes=sent_bytes)
+        else:
+            client = _Client(encoding, outbox, wake=asyncio.Event(), sent_bytes=sent_bytes)
+            client.task = asyncio.create_task(self._sender(ws, client))
+        self._clients[ws] = client
         ws_connections_active.labels(channel=self._channel).inc()
-        logger.info("WS client connected (%d total)", self.client_count)
+        logger.info("WS client connected via %s path (%d total)", path, self.client_count)
 
     async def disconnect(self, ws: WebSocket) -> None:
         """Remove client, cancel sender task, close socket."""
         entry = self._clients.pop(ws, None)
         if entry is None:
             return
+        self._leave_topic(ws, entry)
         ws_connections_active.labels(channel=self._channel).dec()
-        _, task = entry
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+        if entry.timer is not None:
+            entry.timer.cancel()
+        if entry.interval:
+            ws_clients_downgraded.labels(channel=self._channel).dec()
+        if entry.task is not None:
+            entry.task.cancel()
+            try:
+                await entry.task
+            except asyncio.CancelledError:
+                pass
         if ws.client_state == WebSocketState.CONNECTED:
             try:
                 await ws.close()
@@ -56,19 +237,177 @@ class ConnectionManager:
                 pass
         logger.info("WS client disconnected (%d remaining)", self.client_count)
 
-    def broadcast(self, data: str) -> None:
-        """Push JSON string to all client queues. Drop oldest on overflow."""
-        ws_messages_sent_total.labels(channel=self._channel).inc(len(self._clients))
-        for _ws, (queue, _task) in self._clients.items():
-            if queue.full():
-                try:
-                    queue.get_nowait()  # drop oldest
-                except asyncio.QueueEmpty:
-                    pass
-            try:
-                queue.put_nowait(data)
-            except asyncio.QueueFull:
-                pass  # safety fallback
+    def set_topic(self, ws: WebSocket, topic: Hashable | None) -> bool:
+        """Move a client to topic (None = no topic). False if not connected."""
+        client = self._clients.get(ws)
+        if client is None:
+            return False
+        self._leave_topic(ws, client)
+        client.topic = topic
+        if topic is not None:
+            self._topics.setdefault(topic, set()).add(ws)
+        return True
+
+    def has_topic(self, topic: Hashable) -> bool:
+        """True while at least one client is in topic."""
+        return topic in self._topics
+
+    def _leave_topic(self, ws: WebSocket, client: _Client) -> None:
+        if client.topic is None:
+            return
+        members = self._topics[client.topic]
+        members.discard(ws)
+        if not members:
+            del self._topics[client.topic]
+        client.topic = None
+
+    def broadcast(
+        self, data: str, kind: str = KIND_STATE, topic: Hashable | None = EVERYONE,
+    ) -> None:
+        """Deliver JSON string to clients, encoded per client.
+
+        Goes to everyone by default, to a topic's members, or with topic
+        None to the clients not in any topic. `kind` matters only for
+        latest-value outboxes: a pending message of the same kind is replaced.
+        """
+        if topic is EVERYONE:
+            clients = self._clients.items()
+        elif topic is None:
+            clients = [(ws, c) for ws, c in self._clients.items() if c.topic is None]
+        else:
+            clients = [(ws, self._clients[ws]) for ws in self._topics.get(topic, ())]
+        ws_messages_sent_total.labels(channel=self._channel).inc(len(clients))
+        message = EncodedMessage(data)
+        resyncs: dict[Hashable | None, EncodedMessage] = {}
+        now = time.monotonic()
+        for ws, client in clients:
+            if kind == KIND_STATE and self._resync is not None and kind in client.outbox:
+                resync = resyncs.get(client.topic)
+                if resync is None:
+                    resync = resyncs[client.topic] = EncodedMessage(self._resync(client.topic))
+                self._deliver(ws, client, resync, kind, now)
+            else:
+                self._deliver(ws, client, message, kind, now)
+
+    def send_to(self, ws: WebSocket, data: str) -> None:
+        """Deliver a message to a single client (e.g. initial backfill)."""
+        client = self._clients.get(ws)
+        if client is None:
+            return
+        ws_messages_sent_total.labels(channel=self._channel).inc()
+        self._deliver(ws, client, EncodedMessage(data), KIND_STATE, time.monotonic())
+
+    def _deliver(
+        self, ws: WebSocket, client: _Client, message: EncodedMessage, kind: str, now: float,
+    ) -> None:
+        outbox = client.outbox
+        if outbox and not self._check_backlog(ws, client, now):
+            return
+        direct = client.direct
+        if direct is None:
+            self._put(client, message.get(client.encoding), kind, now)
+            client.wake.set()
+            return
+        if direct.closed:
+            return  # the read loop will notice and disconnect
+        frame = message.frame(client.encoding)
+        if not outbox and direct.writable and (not client.interval or now >= client.next_due):
+            direct.write(frame)
+            client.sent_bytes.inc(len(frame))
+            if client.interval:
+                client.next_due = now + client.interval
+            return
+        self._put(client, frame, kind, now)
+        if client.interval and now < client.next_due:
+            if client.timer is None:
+                client.timer = asyncio.get_running_loop().call_later(
+                    client.next_due - now, self._flush, client,
+                )
+            return
+        self._drain_direct(client, now)
+
+    def _put(self, client: _Client, payload: Payload, kind: str, now: float) -> None:
+        if not client.outbox:
+            client.backlog_since = now
+        if client.outbox.put(payload, kind):
+            (self._replaced if self._latest_only else self._overflowed).inc()
+
+    def _drain_direct(self, client: _Client, now: float) -> None:
+        outbox, direct = client.outbox, client.direct
+        while outbox and direct.writable:
+            frame = outbox.pop()
+            direct.write(frame)
+            client.sent_bytes.inc(len(frame))
+        if not outbox:
+            if client.interval:
+                client.next_due = now + client.interval
+            self._drained(client, now)
+        elif client.task is None:
+            # Transport paused: resume when it drains, not on the next delivery
+            client.task = asyncio.get_running_loop().create_task(self._resume(client))
+
+    async def _resume(self, client: _Client) -> None:
+        """Send a direct client its held frames once its transport is writable again."""
+        await client.direct.wait_writable()
+        client.task = None
+        if client.evicted or client.direct.closed:
+            return
+        now = time.monotonic()
+        if client.interval and now < client.next_due:
+            if client.timer is None:  # a downgraded client still waits its turn
+                client.timer = asyncio.get_running_loop().call_later(
+                    client.next_due - now, self._flush, client,
+                )
+            return
+        self._drain_direct(client, now)
+
+    def _flush(self, client: _Client) -> None:
+        """Timer callback: send a downgraded direct client its held frames."""
+        client.timer = None
+        if client.direct.closed:
+            return
+        self._drain_direct(client, time.monotonic())
+
+    def _drained(self, client: _Client, now: float) -> None:
+        """Outbox just emptied: record the lag, count toward recovery."""
+        lag = now - client.backlog_since
+        self._lag.observe(lag)
+        if not client.interval:
+            return
+        if lag - client.interval < settings.ws_slow_client_lag_s / 2:
+            client.prompt_drains += 1
+            if client.prompt_drains >= _RECOVER_DRAINS:
+                client.interval = 0.0
+                client.prompt_drains = 0
+                ws_clients_downgraded.labels(channel=self._channel).dec()
+        else:
+            client.prompt_drains = 0
+
+    def _check_backlog(self, ws: WebSocket, client: _Client, now: float) -> bool:
+        """Act on a client's lag before queuing more; False if it was evicted."""
+        if client.evicted:
+            return False
+        lag = now - client.backlog_since - client.interval
+        disconnect_after = settings.ws_slow_client_disconnect_s
+        if disconnect_after and lag > disconnect_after:
+            self._evict(ws, client, lag)
+            return False
+        if self._latest_only and not client.interval and lag > settings.ws_slow_client_lag_s:
+            client.interval = settings.ws_slow_client_interval_ms / 1000.0
+            client.prompt_drains = 0
+            ws_client_downgrades_total.labels(channel=self._channel).inc()
+            ws_clients_downgraded.labels(channel=self._channel).inc()
+            logger.info("Slow WS client on %s downgraded (lag %.1fs)", self._channel, lag)
+        return True
+
+    def _evict(self, ws: WebSocket, client: _Client, lag: float) -> None:
+        """Drop a client that fell too far behind."""
+        ws_slow_client_disconnects_total.labels(channel=self._channel).inc()
+        logger.warning("Disconnecting slow WS client on %s (lag %.1fs)", self._channel, lag)
+        client.evicted = True
+        if client.direct is not None:
+            client.direct.abort()  # its close handshake would queue behind the backlog
+        asyncio.get_running_loop().create_task(self.disconnect(ws))
 
     async def disconnect_all(self) -> None:
         """Disconnect all clients. Called on shutdown."""
@@ -76,12 +415,29 @@ class ConnectionManager:
         for ws in clients:
             await self.disconnect(ws)
 
-    async def _sender(self, ws: WebSocket, queue: asyncio.Queue[str]) -> None:
-        """Per-client loop: pull from queue, send over WS."""
+    async def _sender(self, ws: WebSocket, client: _Client) -> None:
+        """Per-client loop: drain the outbox, send over WS (text for JSON, else binary).
+
+        A downgraded client's loop pauses `interval` after each drain, so
+        its latest-value outbox coalesces the states in between.
+        """
+        outbox, wake, sent_bytes = client.outbox, client.wake, client.sent_bytes
         try:
             while True:
-                data = await queue.get()
-                await ws.send_text(data)
+                await wake.wait()
+                wake.clear()
+                if not outbox:
+                    continue
+                while outbox:
+                    data = outbox.pop()
+                    if isinstance(data, str):
+                        await ws.send_text(data)
+                    else:
+                        await ws.send_bytes(data)
+                    sent_bytes.inc(len(data))
+                self._drained(client, time.monotonic())
+                if client.interval:
+                    await asyncio.sleep(client.interval)
         except (WebSocketDisconnect, RuntimeError, asyncio.CancelledError):
             pass
         except Exception:
@@ -5,15 +5,35 @@ Replaces poll-based broadcast_loop with reactive push.
 
 Throttle: trailing-edge — if data arrives within the throttle window,
 schedules a deferred broadcast so the latest state always gets sent.
+
+The market channel is delta-encoded (see market_delta): a full keyframe
+every ws_keyframe_interval seconds, and in between only the symbols and
+fields that changed since the previous sequence number. Clients that sent
+a subscribe message get filtered frames instead (see market_subscriptions).
+
+Index and market payloads carry scalar fields only. Intraday sparklines go
+out on the separate sparkline channel as columnar deltas:
+  {"type": "sparkline", "indices": {"VN30": {"from": 120, "seq": 123,
+   "reset": false, "t": [epoch_s, ...], "v": [value, ...]}}}
+Points cover sequence numbers [from, seq). Clients drop points below their
+own last seq, replace their arrays when reset is true, and reconnect for a
+fresh backfill (same shape, type "sparkline_backfill") if from > their seq.
+
+In ingest-leader mode a frame sink (FrameRelay) also receives every frame,
+so channels are published even when this process has no local clients.
 """
 
 import asyncio
 import json
 import logging
 import time
+from collections.abc import Callable
 
 from app.config import settings
-from app.websocket.connection_manager import ConnectionManager
+from app.services.snapshot_cache import FOREIGN_DEPS, INDEX_DEPS, MARKET_DEPS, market_state
+from app.websocket.connection_manager import KIND_STATUS, ConnectionManager
+from app.websocket.market_delta import diff_market_state
+from app.websocket.market_subscriptions import MarketSubscriptions
 
 logger = logging.getLogger(__name__)
 
@@ -21,8 +41,43 @@ logger = logging.getLogger(__name__)
 CH_MARKET = "market"
 CH_FOREIGN = "foreign"
 CH_INDEX = "index"
+CH_SPARKLINE = "sparkline"  # derived from index notifications
 CH_ALERTS = "alerts"  # broadcast via AlertService subscriber, not DataPublisher pull
 
+# Intraday points are excluded from realtime index payloads (and from market_state)
+_INDEX_EXCLUDE = {"intraday"}
+
+# Cap on points per index in one delta (catch-up after idle periods)
+_SPARKLINE_DELTA_MAX = 600
+
+# Frame sink: fn(channel, text, is_keyframe) — is_keyframe marks full market keyframes
+FrameSink = Callable[[str, str, bool], None]
+
+
+def _sparkline_entry(series, since: int, reset: bool = False) -> dict:
+    """Columnar JSON entry for points [since, series.seq) of one index."""
+    timestamps, values = series.columns(since)
+    return {
+        "from": max(since, series.first_seq),
+        "seq": series.seq,
+        "reset": reset,
+        "t": [round(ts, 3) for ts in timestamps],
+        "v": values,
+    }
+
+
+def build_sparkline_backfill(index_tracker) -> str:
+    """Full compact sparkline history for a newly connected client."""
+    indices = {}
+    for index_id in index_tracker.get_all():
+        series = index_tracker.get_intraday_series(index_id)
+        if series is not None:
+            indices[index_id] = _sparkline_entry(series, 0, reset=True)
+    return json.dumps(
+        {"type": "sparkline_backfill", "indices": indices},
+        separators=(",", ":"),
+    )
+
 
 class DataPublisher:
     """Event-driven publisher that throttles per-channel broadcasts.
@@ -40,6 +95,7 @@ class DataPublisher:
         foreign_mgr: ConnectionManager,
         index_mgr: ConnectionManager,
         alerts_mgr: ConnectionManager | None = None,
+        sparkline_mgr: ConnectionManager | None = None,
     ):
         self._processor = processor
         self._managers: dict[str, ConnectionManager] = {
@@ -49,12 +105,39 @@ class DataPublisher:
         }
         if alerts_mgr:
             self._managers[CH_ALERTS] = alerts_mgr
+        if sparkline_mgr:
+            self._managers[CH_SPARKLINE] = sparkline_mgr
         self._throttle_s = settings.ws_throttle_interval_ms / 1000.0
         self._last_broadcast: dict[str, float] = {}
         self._pending: dict[str, asyncio.TimerHandle] = {}
+        # index_id -> (series, last broadcast cursor); series identity detects resets
+        self._sparkline_cursors: dict[str, tuple[object, int]] = {}
+        # Market delta protocol state: last sent state + its sequence number
+        self._keyframe_s = settings.ws_keyframe_interval
+        self._market_seq = 0
+        self._market_state: dict | None = None
+        self._market_text = ""  # market_state JSON of _market_state, spliced into keyframes
+        self._market_version = -1  # SnapshotCache version of _market_state
+        self._market_keyframe_at = 0.0
+        self._market_keyframe: tuple[int, str] | None = None  # (seq, text)
+        self._market_changes: dict | None = None  # last frame's delta, None = keyframe
+        self.market_subscriptions = MarketSubscriptions(
+            market_mgr, self._current_market_state, self.market_keyframe,
+        )
+        self._sink: FrameSink | None = None
         self._loop: asyncio.AbstractEventLoop | None = None
         self._running = False
 
+    def set_frame_sink(self, sink: FrameSink | None):
+        """Also hand every broadcast frame to sink, with or without local clients."""
+        self._sink = sink
+
+    def _has_audience(self, channel: str) -> bool:
+        manager = self._managers.get(channel)
+        if manager is None:
+            return False
+        return self._sink is not None or manager.client_count > 0
+
     def start(self):
         """Capture event loop and mark as running."""
         self._loop = asyncio.get_running_loop()
@@ -82,8 +165,13 @@ class DataPublisher:
         if not self._running or not self._loop:
             return
 
-        manager = self._managers.get(channel)
-        if not manager or manager.client_count == 0:
+        if channel == CH_INDEX and CH_SPARKLINE in self._managers:
+            self._schedule_broadcast(CH_SPARKLINE)
+        self._schedule_broadcast(channel)
+
+    def _schedule_broadcast(self, channel: str):
+        """Fire broadcast now or schedule trailing-edge broadcast for channel."""
+        if not self._has_audience(channel):
             return
 
         now = time.monotonic()
@@ -109,34 +197,159 @@ class DataPublisher:
         if not self._running:
             return
 
-        manager = self._managers.get(channel)
-        if not manager or manager.client_count == 0:
+        if not self._has_audience(channel):
             return
 
         try:
             data = self._get_channel_data(channel)
             if data:
-                manager.broadcast(data)
+                manager = self._managers[channel]
+                if manager.client_count > 0:
+                    if channel == CH_MARKET:
+                        manager.broadcast(data, topic=None)
+                        self.market_subscriptions.publish(
+                            self._market_seq, self._market_state, self._market_changes,
+                        )
+                    else:
+                        manager.broadcast(data)
+                if self._sink is not None:
+                    keyframe = (
+                        channel == CH_MARKET
+                        and self._market_keyframe is not None
+                        and data is self._market_keyframe[1]
+                    )
+                    self._sink(channel, data, keyframe)
                 self._last_broadcast[channel] = time.monotonic()
         except Exception:
             logger.exception("Error broadcasting to %s", channel)
 
     def _get_channel_data(self, channel: str) -> str | None:
-        """Serialize latest processor state for a channel."""
+        """Latest processor state for a channel, serialized once per data version."""
+        cache = self._processor.snapshot_cache
         match channel:
             case "market":
-                return self._processor.get_market_snapshot().model_dump_json()
+                return self._get_market_frame()
             case "foreign":
-                return self._processor.get_foreign_summary().model_dump_json()
+                return cache.get("ws:foreign", FOREIGN_DEPS, self._serialize_foreign).text
             case "index":
-                indices = self._processor.index_tracker.get_all()
-                return json.dumps(
-                    {k: v.model_dump() for k, v in indices.items()},
-                    default=str,
-                )
+                return cache.get("ws:index", INDEX_DEPS, self._serialize_index).text
+            case "sparkline":
+                return self._get_sparkline_delta()
             case _:
                 return None
 
+    # -- Market delta protocol --
+
+    def _capture_market_state(self) -> dict:
+        frame = market_state(self._processor)
+        self._market_version = frame.version
+        self._market_text = frame.text
+        return frame.data
+
+    def _get_market_frame(self) -> str | None:
+        """Keyframe or delta vs the last sent state. None if nothing changed."""
+        cache_version = self._processor.snapshot_cache.version(MARKET_DEPS)
+        if self._market_state is not None and cache_version == self._market_version:
+            return None
+
+        prev = self._market_state
+        state = self._capture_market_state()
+        now = time.monotonic()
+        changes = None
+        if prev is not None and now - self._market_keyframe_at < self._keyframe_s:
+            changes = diff_market_state(prev, state)
+            if changes == {}:
+                self._market_state = state
+                return None
+
+        self._market_seq += 1
+        self._market_state = state
+        self._market_changes = changes
+        if changes is None:
+            self._market_keyframe_at = now
+            return self._keyframe_text()
+        return json.dumps({
+            "type": "delta",
+            "seq": self._market_seq,
+            "base": self._market_seq - 1,
+            **changes,
+        })
+
+    def _keyframe_text(self) -> str:
+        """Keyframe of the last sent state, cached per sequence number.
+
+        Reuses the market_state body GET /api/market/snapshot serves, with the
+        type and seq fields spliced in front instead of re-serializing.
+        """
+        if self._market_keyframe is None or self._market_keyframe[0] != self._market_seq:
+            body = self._market_text[1:].lstrip()
+            sep = ", " if body != "}" else ""
+            text = f'{{"type": "keyframe", "seq": {self._market_seq}{sep}{body}'
+            self._market_keyframe = (self._market_seq, text)
+        return self._market_keyframe[1]
+
+    def _current_market_state(self) -> tuple[int, dict]:
+        """(seq, state) of the last market frame, captured first if none yet.
+
+        Also recaptured when the data changed while nobody was listening:
+        broadcasts are skipped without an audience, so nothing else would
+        move the state on. A change with a broadcast still pending is left to
+        that broadcast — the new client gets its delta.
+        """
+        if self._market_state is None or (
+            CH_MARKET not in self._pending
+            and self._processor.snapshot_cache.version(MARKET_DEPS) != self._market_version
+        ):
+            self._market_state = self._capture_market_state()
+            self._market_seq += 1
+            self._market_changes = None
+            self._market_keyframe_at = time.monotonic()
+        return self._market_seq, self._market_state
+
+    def market_keyframe(self, topic=None) -> str:
+        """Keyframe for a newly connected (or resynced) /ws/market client.
+
+        Matches the last broadcast sequence so the next delta applies cleanly.
+        `topic` is the client's subscription filter, if any.
+        """
+        if topic is not None:
+            return self.market_subscriptions.keyframe(topic)
+        self._current_market_state()
+        return self._keyframe_text()
+
+    def _serialize_foreign(self) -> str:
+        return self._processor.get_foreign_summary().model_dump_json()
+
+    def _serialize_index(self) -> str:
+        indices = self._processor.index_tracker.get_all()
+        return json.dumps(
+            {k: v.model_dump(exclude=_INDEX_EXCLUDE) for k, v in indices.items()},
+            default=str,
+        )
+
+    def _get_sparkline_delta(self) -> str | None:
+        """Points appended since the last sparkline broadcast. None if nothing new."""
+        tracker = self._processor.index_tracker
+        indices = {}
+        for index_id in tracker.get_all():
+            series = tracker.get_intraday_series(index_id)
+            if series is None:
+                continue
+            prev_series, cursor = self._sparkline_cursors.get(index_id, (None, 0))
+            reset = prev_series is not None and prev_series is not series
+            if reset:
+                cursor = 0
+            if series.seq > cursor:
+                since = max(cursor, series.seq - _SPARKLINE_DELTA_MAX)
+                indices[index_id] = _sparkline_entry(series, since, reset)
+            self._sparkline_cursors[index_id] = (series, series.seq)
+        if not indices:
+            return None
+        return json.dumps(
+            {"type": "sparkline", "indices": indices},
+            separators=(",", ":"),
+        )
+
     # -- SSI connection status notifications --
 
     def on_ssi_disconnect(self):
@@ -154,8 +367,10 @@ class DataPublisher:
     def _broadcast_status(self, msg: str) -> int:
         """Send status message to all channels with connected clients."""
         count = 0
-        for manager in self._managers.values():
+        for channel, manager in self._managers.items():
             if manager.client_count > 0:
-                manager.broadcast(msg)
+                manager.broadcast(msg, kind=KIND_STATUS)
                 count += 1
+            if self._sink is not None:
+                self._sink(channel, msg, False)
         return count
@@ -0,0 +1,107 @@
+"""Direct frame writes to uvicorn WebSocket transports.
+
+Server→client WebSocket frames are unmasked, so a message framed once is
+byte-identical for every client using the same encoding. When a connection
+is served by uvicorn's websockets (sans-I/O) protocol without
+permessage-deflate, ConnectionManager writes that pre-built frame straight
+to the connection's asyncio transport — no ASGI send, no per-client UTF-8
+encode, no per-client queue or sender task. Any other connection (other
+ASGI servers, wsproto, deflate negotiated, test clients) returns None here
+and keeps the queued path.
+
+Backpressure follows the transport: uvicorn clears `writable` when the
+transport's write buffer passes its high-water mark, and we stop writing
+until it drains — frames held meanwhile are written as soon as it sets
+`writable` again (wait_writable), not on the next broadcast.
+
+The Dockerfile runs uvicorn with `--ws websockets-sansio
+--ws-per-message-deflate false`; without the latter every browser
+negotiates deflate and stays on the queued path. The protocol attributes
+used here are uvicorn internals, so requirements.txt pins the uvicorn
+range this was checked against. `ws_send_path_total` counts which path
+each connection took.
+"""
+
+import logging
+import struct
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+_OP_TEXT = 0x1
+_OP_BINARY = 0x2
+_LEN16 = struct.Struct("!BBH")
+_LEN64 = struct.Struct("!BBQ")
+
+
+def build_frame(payload: bytes, binary: bool) -> bytes:
+    """Single unfragmented, unmasked frame carrying payload."""
+    head = 0x80 | (_OP_BINARY if binary else _OP_TEXT)
+    n = len(payload)
+    if n < 126:
+        return bytes((head, n)) + payload
+    if n < 1 << 16:
+        return _LEN16.pack(head, 126, n) + payload
+    return _LEN64.pack(head, 127, n) + payload
+
+
+class DirectTransport:
+    """Write access to one uvicorn WebSocket connection's transport."""
+
+    __slots__ = ("_proto", "_transport")
+
+    def __init__(self, proto):
+        self._proto = proto
+        self._transport = proto.transport
+
+    @property
+    def closed(self) -> bool:
+        proto = self._proto
+        return proto.close_sent or proto.disconnected or self._transport.is_closing()
+
+    @property
+    def writable(self) -> bool:
+        """True while the transport's write buffer is below its high-water mark."""
+        return self._proto.writable.is_set()
+
+    async def wait_writable(self) -> None:
+        """Return once the write buffer has drained below its low-water mark."""
+        await self._proto.writable.wait()
+
+    def write(self, frame: bytes) -> None:
+        self._transport.write(frame)
+
+    def abort(self) -> None:
+        """Drop the connection without flushing buffered frames."""
+        self._transport.abort()
+
+
+# Send paths reported by send_path (the `path` label of ws_send_path_total)
+PATH_DIRECT = "direct"
+PATH_DEFLATE = "deflate"  # permessage-deflate negotiated: frames compressed per connection
+PATH_UNSUPPORTED = "unsupported"  # other ASGI server / protocol, test clients
+
+
+def send_path(ws: WebSocket) -> tuple[DirectTransport | None, str]:
+    """(DirectTransport or None, path) for an accepted connection."""
+    # Middleware may wrap `send`, but `receive` reaches the app unwrapped:
+    # its bound instance is the server's protocol object for this connection.
+    proto = getattr(getattr(ws, "_receive", None), "__self__", None)
+    conn = getattr(proto, "conn", None)
+    if (
+        conn is None
+        or type(proto).__name__ != "WebSocketsSansIOProtocol"
+        or not all(
+            hasattr(proto, attr) for attr in ("transport", "writable", "close_sent", "disconnected")
+        )
+    ):
+        return None, PATH_UNSUPPORTED
+    if getattr(conn, "extensions", None):
+        return None, PATH_DEFLATE
+    return DirectTransport(proto), PATH_DIRECT
+
+
+def direct_transport(ws: WebSocket) -> DirectTransport | None:
+    """DirectTransport for an accepted connection, or None if not eligible."""
+    return send_path(ws)[0]
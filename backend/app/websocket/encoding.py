@@ -0,0 +1,95 @@
+"""Per-connection WebSocket message encodings.
+
+Publishers produce one JSON string per message. A client picks how it
+receives them with query params on the WS URL:
+
+  ?format=json     (default) text frames, the JSON as-is
+  ?format=msgpack  binary frames, the same document as MessagePack
+  ?compress=deflate  binary frames, raw DEFLATE (RFC 1951) of the above —
+                     browsers inflate with DecompressionStream("deflate-raw")
+
+Unlike permessage-deflate, which the server negotiates and compresses per
+connection, `compress=deflate` output is computed once per message and
+shared by every client using that encoding. Binary heartbeats stay the
+literal bytes b"ping".
+"""
+
+import json
+import zlib
+from typing import NamedTuple
+
+from app.websocket.direct_send import build_frame
+
+WS_FORMATS = ("json", "msgpack")
+WS_COMPRESSIONS = ("none", "deflate")
+
+_DEFLATE_LEVEL = 6
+
+
+class Encoding(NamedTuple):
+    format: str = "json"
+    deflate: bool = False
+
+    @property
+    def label(self) -> str:
+        return f"{self.format}+deflate" if self.deflate else self.format
+
+
+JSON = Encoding()
+
+
+def parse_encoding(params) -> Encoding:
+    """Encoding requested by WS query params. Raises ValueError if unsupported."""
+    fmt = params.get("format", "json")
+    compress = params.get("compress", "none")
+    if fmt not in WS_FORMATS:
+        raise ValueError(f"unsupported format {fmt!r}")
+    if compress not in WS_COMPRESSIONS:
+        raise ValueError(f"unsupported compress {compress!r}")
+    if fmt == "msgpack" and _msgpack() is None:
+        raise ValueError("msgpack format unavailable (msgpack not installed)")
+    return Encoding(fmt, compress == "deflate")
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:  # pragma: no cover - msgpack is optional
+        return None
+    return msgpack
+
+
+class EncodedMessage:
+    """One outgoing message, encoded lazily and at most once per encoding."""
+
+    __slots__ = ("text", "_encoded", "_frames")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._encoded: dict[Encoding, str | bytes] = {JSON: text}
+        self._frames: dict[Encoding, bytes] = {}
+
+    def frame(self, encoding: Encoding) -> bytes:
+        """Complete WebSocket frame for encoding (text frame for plain JSON)."""
+        frame = self._frames.get(encoding)
+        if frame is None:
+            payload = self.get(encoding)
+            if isinstance(payload, str):
+                frame = build_frame(payload.encode(), binary=False)
+            else:
+                frame = build_frame(payload, binary=True)
+            self._frames[encoding] = frame
+        return frame
+
+    def get(self, encoding: Encoding) -> str | bytes:
+        payload = self._encoded.get(encoding)
+        if payload is None:
+            if encoding.deflate:
+                raw = self.get(Encoding(encoding.format))
+                if isinstance(raw, str):
+                    raw = raw.encode()
+                payload = zlib.compress(raw, _DEFLATE_LEVEL, wbits=-15)
+            else:  # msgpack
+                payload = _msgpack().packb(json.loads(self.text))
+            self._encoded[encoding] = payload
+        return payload
@@ -0,0 +1,376 @@
+"""Ingest-leader → fan-out worker relay of processed market state.
+
+APP_ROLE=ingest: the process that owns the SSI stream and
+MarketDataProcessor also runs a FrameRelay. Every DataPublisher frame and
+alert goes onto the StateBus in order, and a state loop stores what a
+worker cannot rebuild from frames alone: the latest market keyframe and
+sparkline backfill (for newly connected WS clients) and the REST bodies.
+
+APP_ROLE=fanout: stateless workers run a FanoutMirror instead of the
+stream and processor. It rebroadcasts frames to its local WS clients,
+keeps "last keyframe + deltas since" logs so a new client starts from a
+consistent state, and polls the REST bodies served by /api/market/*.
+
+Bus keys:
+  ws:market:keyframe, ws:sparkline:backfill — bootstrap frames
+  rest:<name> — "<etag>\\n<json body>" (see REST_NAMES)
+
+A value the bus refuses (ValueError, e.g. larger than a shared-memory slot)
+is logged and skipped; it does not hold up the other keys or frames.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from app.analytics.alert_models import AlertSeverity, AlertType
+from app.analytics.alert_service import MAX_BUFFER_SIZE
+from app.config import settings
+from app.routers.market_router import BASIS_TREND_MAX_MINUTES, REST_FRAMES, rest_frame
+from app.services.snapshot_cache import INDEX_DEPS, CachedFrame
+from app.services.state_bus import StateBus
+from app.websocket.connection_manager import KIND_STATE, KIND_STATUS, ConnectionManager
+from app.websocket.data_publisher import (
+    CH_ALERTS,
+    CH_MARKET,
+    CH_SPARKLINE,
+    build_sparkline_backfill,
+)
+
+logger = logging.getLogger(__name__)
+
+# Internal channel: periodic full sparkline history, consumed (not broadcast) by workers
+CH_SPARKLINE_BACKFILL = "sparkline_backfill"
+
+KEYFRAME_KEY = "ws:market:keyframe"
+BACKFILL_KEY = "ws:sparkline:backfill"
+REST_NAMES = (*REST_FRAMES, "basis-trend", "alerts", "vn30-components")
+
+# Frames buffered while the bus is slow/unreachable; oldest dropped beyond this
+_OUTBOX_MAX = 10_000
+# Upper bound on a worker's keyframe/backfill + delta log
+_LOG_MAX = 1_000
+# DataPublisher status messages (json.dumps of {"type": "status", ...})
+_STATUS_PREFIX = '{"type": "status"'
+
+
+class FrameRelay:
+    """Leader side: publishes frames and state to the bus."""
+
+    def __init__(
+        self,
+        bus: StateBus,
+        processor,
+        alert_service,
+        rest_interval: float = 1.0,
+        backfill_interval: float | None = None,
+    ):
+        self._bus = bus
+        self._processor = processor
+        self._alerts = alert_service
+        self._rest_interval = rest_interval
+        self._backfill_interval = backfill_interval or settings.ws_keyframe_interval
+        # (channel, frame, key to also store the frame under)
+        self._outbox: deque[tuple[str, str, str | None]] = deque(maxlen=_OUTBOX_MAX)
+        self._wake = asyncio.Event()
+        self._stored: dict[str, str] = {}  # key → etag last written
+        self._rest_versions: dict[str, int] = {}  # REST_FRAMES name → version last written
+        self._rejected: set[str] = set()  # keys/channels the bus refused, logged once
+        self._signatures: dict[str, object] = {}
+        self._epoch = f"{time.time_ns():x}"
+        self._counter = 0
+        self._backfill_version = -1
+        self._backfill_at = 0.0
+        self._bus_ok = True
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self, vn30_symbols: list[str]) -> None:
+        await self._store(
+            "rest:vn30-components", self._next_etag("vn30-components"),
+            json.dumps({"symbols": vn30_symbols}),
+        )
+        self._tasks = [
+            asyncio.create_task(self._publish_loop()),
+            asyncio.create_task(self._state_loop()),
+        ]
+        logger.info("FrameRelay started — publishing market state to bus")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await self.flush()
+
+    # -- Frame intake (sync, called from DataPublisher / AlertService) --
+
+    def on_frame(self, channel: str, frame: str, keyframe: bool = False) -> None:
+        self._outbox.append((channel, frame, KEYFRAME_KEY if keyframe else None))
+        self._wake.set()
+
+    def on_alert(self, alert) -> None:
+        self.on_frame(CH_ALERTS, alert.model_dump_json())
+
+    # -- Publishing --
+
+    async def flush(self) -> None:
+        """Publish queued frames in order."""
+        while self._outbox:
+            channel, frame, key = self._outbox.popleft()
+            try:
+                await self._bus.publish(channel, frame)
+                if key:
+                    await self._bus.set(key, frame)
+                self._set_bus_ok(True)
+                self._rejected.discard(key or channel)
+            except ValueError:
+                self._reject(key or channel)
+            except Exception:
+                self._set_bus_ok(False)
+
+    async def publish_state(self) -> None:
+        """Store REST bodies that changed and, at the backfill interval, sparklines."""
+        cache = self._processor.snapshot_cache
+        for name, (deps, _) in REST_FRAMES.items():
+            # Compare versions before building, so unchanged bodies are never serialized
+            version = cache.version(deps)
+            if self._rest_versions.get(name) == version:
+                continue
+            frame = rest_frame(self._processor, name)
+            await self._store(f"rest:{name}", frame.etag, frame.text)
+            self._rest_versions[name] = version
+
+        basis = self._processor.derivatives_tracker.get_current_basis()
+        await self._store_if_changed(
+            "basis-trend",
+            (basis.timestamp, basis.basis) if basis else None,
+            self._basis_trend_json,
+        )
+        alerts = self._alerts.get_recent_alerts(MAX_BUFFER_SIZE)
+        await self._store_if_changed(
+            "alerts",
+            (len(alerts), alerts[0].id if alerts else None),
+            lambda: json.dumps([a.model_dump(mode="json") for a in alerts]),
+        )
+
+        now = time.monotonic()
+        version = self._processor.snapshot_cache.version(INDEX_DEPS)
+        if version != self._backfill_version and now - self._backfill_at >= self._backfill_interval:
+            self._backfill_version = version
+            self._backfill_at = now
+            backfill = build_sparkline_backfill(self._processor.index_tracker)
+            # Through the outbox, so it stays ordered with sparkline deltas
+            self._outbox.append((CH_SPARKLINE_BACKFILL, backfill, BACKFILL_KEY))
+            self._wake.set()
+
+    async def _publish_loop(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            await self.flush()
+
+    async def _state_loop(self) -> None:
+        while True:
+            try:
+                await self.publish_state()
+                self._set_bus_ok(True)
+            except Exception:
+                self._set_bus_ok(False)
+            await asyncio.sleep(self._rest_interval)
+
+    def _basis_trend_json(self) -> str:
+        points = self._processor.derivatives_tracker.get_basis_trend(BASIS_TREND_MAX_MINUTES)
+        return json.dumps([p.model_dump(mode="json") for p in points])
+
+    async def _store_if_changed(self, name: str, signature, build) -> None:
+        key = f"rest:{name}"
+        if key in self._signatures and self._signatures[key] == signature:
+            return
+        await self._store(key, self._next_etag(name), build())
+        self._signatures[key] = signature
+
+    async def _store(self, key: str, etag: str, body: str) -> None:
+        if self._stored.get(key) == etag:
+            return
+        try:
+            await self._bus.set(key, f"{etag}\n{body}")
+        except ValueError:
+            self._reject(key)
+            return
+        self._stored[key] = etag
+        self._rejected.discard(key)
+
+    def _reject(self, key: str) -> None:
+        """Log a value the bus refused, once until that key goes through again."""
+        if key not in self._rejected:
+            self._rejected.add(key)
+            logger.error("State bus rejected %s — skipped", key, exc_info=True)
+
+    def _next_etag(self, name: str) -> str:
+        self._counter += 1
+        return f'"{self._epoch}-{name}-{self._counter}"'
+
+    def _set_bus_ok(self, ok: bool) -> None:
+        if ok != self._bus_ok:
+            if ok:
+                logger.info("State bus reachable again")
+            else:
+                logger.warning("State bus unreachable — frames are being dropped", exc_info=True)
+        self._bus_ok = ok
+
+
+class FanoutMirror:
+    """Worker side: rebroadcasts bus frames and serves the leader's REST bodies."""
+
+    def __init__(
+        self,
+        bus: StateBus,
+        managers: dict[str, ConnectionManager],
+        poll_interval: float = 1.0,
+    ):
+        self._bus = bus
+        self._managers = managers
+        self._poll_interval = poll_interval
+        # Keyframe (or backfill) followed by every delta since, for new clients
+        self._market_log: list[str] = []
+        self._market_seq = 0
+        self._sparkline_log: list[str] = []
+        self._rest: dict[str, CachedFrame] = {}
+        # name → (etag, parsed JSON list) for endpoints filtered per request
+        self._parsed: dict[str, tuple[str, list]] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        # Subscribe before reading bootstrap keys so no frame falls in between
+        frames = await self._bus.subscribe()
+        keyframe = await self._bus.get(KEYFRAME_KEY)
+        if keyframe:
+            self._apply_market(keyframe)
+        backfill = await self._bus.get(BACKFILL_KEY)
+        if backfill:
+            self._sparkline_log = [backfill]
+        await self.poll_rest()
+        self._tasks = [
+            asyncio.create_task(self._consume(frames)),
+            asyncio.create_task(self._poll_loop()),
+        ]
+        logger.info("FanoutMirror started — serving state from ingest leader")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    # -- Frames --
+
+    def on_frame(self, channel: str, frame: str) -> None:
+        """Track bootstrap logs, then broadcast to local clients."""
+        if channel == CH_SPARKLINE_BACKFILL:
+            self._sparkline_log = [frame]
+            return
+        if channel == CH_MARKET:
+            self._apply_market(frame)
+        elif channel == CH_SPARKLINE and self._sparkline_log:
+            self._sparkline_log.append(frame)
+            if len(self._sparkline_log) > _LOG_MAX:
+                self._sparkline_log = []
+        manager = self._managers.get(channel)
+        if manager is not None and manager.client_count > 0:
+            kind = KIND_STATUS if frame.startswith(_STATUS_PREFIX) else KIND_STATE
+            manager.broadcast(frame, kind=kind)
+
+    def initial_frames(self, channel: str) -> list[str]:
+        """Messages that bring a newly connected client up to date."""
+        if channel == CH_MARKET:
+            return list(self._market_log)
+        if channel == CH_SPARKLINE:
+            return list(self._sparkline_log)
+        return []
+
+    def _apply_market(self, frame: str) -> None:
+        msg = json.loads(frame)
+        kind = msg.get("type")
+        if kind == "keyframe":
+            self._market_log = [frame]
+            self._market_seq = msg["seq"]
+        elif kind == "delta":
+            if msg["seq"] <= self._market_seq:
+                return  # already covered by the bootstrap keyframe
+            if self._market_log and msg["base"] == self._market_seq and len(self._market_log) < _LOG_MAX:
+                self._market_log.append(frame)
+            else:
+                self._market_log = []  # gap: wait for the next keyframe
+            self._market_seq = msg["seq"]
+
+    async def _consume(self, frames) -> None:
+        async for channel, frame in frames:
+            try:
+                self.on_frame(channel, frame)
+            except Exception:
+                logger.exception("Error relaying %s frame", channel)
+
+    # -- REST --
+
+    async def poll_rest(self) -> None:
+        for name in REST_NAMES:
+            value = await self._bus.get(f"rest:{name}")
+            if not value:
+                continue
+            etag, _, body = value.partition("\n")
+            current = self._rest.get(name)
+            if current is None or current.etag != etag:
+                self._rest[name] = CachedFrame(version=0, text=body, body=body.encode(), etag=etag)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            try:
+                await self.poll_rest()
+            except Exception:
+                logger.warning("State bus poll failed", exc_info=True)
+
+    def rest_frame(self, name: str) -> CachedFrame | None:
+        """Latest body the leader stored for name, None before the first one."""
+        return self._rest.get(name)
+
+    def basis_trend(self, minutes: int) -> list[dict]:
+        cutoff = datetime.now() - timedelta(minutes=minutes)
+        return [p for ts, p in self._parsed_list("basis-trend", _with_timestamp) if ts >= cutoff]
+
+    def recent_alerts(
+        self,
+        limit: int = 50,
+        type_filter: AlertType | None = None,
+        severity_filter: AlertSeverity | None = None,
+    ) -> list[dict]:
+        alerts = self._parsed_list("alerts")
+        if type_filter is not None:
+            alerts = [a for a in alerts if a["alert_type"] == type_filter.value]
+        if severity_filter is not None:
+            alerts = [a for a in alerts if a["severity"] == severity_filter.value]
+        return alerts[:limit]
+
+    def _parsed_list(self, name: str, transform=None) -> list:
+        frame = self._rest.get(name)
+        if frame is None:
+            return []
+        cached = self._parsed.get(name)
+        if cached is None or cached[0] != frame.etag:
+            items = json.loads(frame.text)
+            cached = (frame.etag, [transform(i) for i in items] if transform else items)
+            self._parsed[name] = cached
+        return cached[1]
+
+
+def _with_timestamp(point: dict) -> tuple[datetime, dict]:
+    return datetime.fromisoformat(point["timestamp"]), point
@@ -0,0 +1,56 @@
+"""Field-level diff of consecutive /ws/market states.
+
+States are MarketSnapshot dicts (model_dump(mode="json")). The market
+channel sends two frame types:
+
+  keyframe — {"type": "keyframe", "seq": N, <full MarketSnapshot fields>}
+  delta    — {"type": "delta", "seq": N, "base": N-1, <changed sections>}
+
+A delta section holds only what changed since `base`: per-symbol maps
+("quotes", "prices", "indices") list changed symbols with only their
+changed fields (new symbols in full); object sections ("foreign",
+"derivatives") list only their changed fields. Clients apply a delta only
+if `base` equals their last seq, otherwise they wait for the next keyframe.
+"""
+
+SYMBOL_SECTIONS = ("quotes", "prices", "indices")
+OBJECT_SECTIONS = ("foreign", "derivatives")
+
+
+def _diff_fields(prev: dict, curr: dict) -> dict:
+    """Top-level fields of curr that differ from prev (nested values compared whole)."""
+    return {k: v for k, v in curr.items() if prev.get(k) != v}
+
+
+def diff_market_state(prev: dict, curr: dict) -> dict | None:
+    """Changed sections between two market states.
+
+    Returns {} when nothing changed, or None when the change cannot be
+    expressed as a delta (symbols or sections removed, e.g. session reset)
+    and a keyframe must be sent instead.
+    """
+    changes: dict = {}
+
+    for section in SYMBOL_SECTIONS:
+        before, after = prev.get(section) or {}, curr.get(section) or {}
+        if before.keys() - after.keys():
+            return None
+        changed = {}
+        for symbol, fields in after.items():
+            old = before.get(symbol)
+            if old is None:
+                changed[symbol] = fields
+            elif old != fields:
+                changed[symbol] = _diff_fields(old, fields)
+        if changed:
+            changes[section] = changed
+
+    for section in OBJECT_SECTIONS:
+        before, after = prev.get(section), curr.get(section)
+        if before == after:
+            continue
+        if after is None:
+            return None
+        changes[section] = after if before is None else _diff_fields(before, after)
+
+    return changes
@@ -0,0 +1,204 @@
+"""Per-client subscriptions on /ws/market.
+
+A client narrows its market stream by sending, over the open socket:
+
+  {"type": "subscribe", "symbols": ["VNM"], "fields": ["last_price", "change"],
+   "channels": ["quotes", "prices"]}
+
+Every key is optional; an omitted or null key means "all". `symbols` selects
+entries of the per-symbol sections ("quotes", "prices"), `fields` the fields
+kept in every quotes/prices/indices entry, and `channels` which frame
+sections are sent at all (see market_delta for the section names).
+{"type": "unsubscribe"} returns to the full stream. Each (un)subscribe is
+answered with a keyframe for the new selection.
+
+Clients with the same filter form one subscription group — a
+ConnectionManager topic — so a filtered frame is built and encoded once per
+group, not per client. An inverted index from symbol to groups picks the
+groups a delta touches; groups it does not touch get nothing. Each group
+keeps its own delta chain: a filtered delta's `base` is the last seq that
+group was sent, so skipped frames (which held nothing for it) are not gaps.
+"""
+
+import json
+import logging
+from collections import defaultdict
+from collections.abc import Callable
+from typing import NamedTuple
+
+from fastapi import WebSocket
+
+from app.websocket.market_delta import OBJECT_SECTIONS, SYMBOL_SECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Sections keyed by stock symbol (indices are keyed by index id)
+_BY_SYMBOL = ("quotes", "prices")
+CHANNELS = SYMBOL_SECTIONS + OBJECT_SECTIONS
+
+_MAX_ITEMS = 500  # per list in a subscribe message
+
+
+class MarketFilter(NamedTuple):
+    """One subscription; None means no restriction on that axis."""
+
+    symbols: frozenset[str] | None = None
+    fields: frozenset[str] | None = None
+    channels: frozenset[str] | None = None
+
+    def select(self, sections: dict, keyframe: bool) -> dict:
+        """The parts of a market state (keyframe) or delta this filter keeps.
+
+        Keyframes keep every selected section, even if empty, so the client
+        state is complete; deltas drop sections left empty.
+        """
+        out = {}
+        for section, value in sections.items():
+            if self.channels is not None and section not in self.channels:
+                continue
+            if section in SYMBOL_SECTIONS and value:
+                if self.symbols is not None and section in _BY_SYMBOL:
+                    value = {s: value[s] for s in self.symbols if s in value}
+                if self.fields is not None:
+                    value = {
+                        key: kept for key, entry in value.items()
+                        if (kept := {f: entry[f] for f in self.fields if f in entry})
+                    }
+            if value or keyframe:
+                out[section] = value
+        return out
+
+
+def _string_set(message: dict, key: str, allowed: tuple[str, ...] | None = None):
+    value = message.get(key)
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{key} must be a list of strings")
+    if len(value) > _MAX_ITEMS:
+        raise ValueError(f"too many {key} ({len(value)} > {_MAX_ITEMS})")
+    if allowed is not None and (unknown := set(value) - set(allowed)):
+        raise ValueError(f"unknown {key}: {sorted(unknown)}")
+    return frozenset(value)
+
+
+def parse_subscription(message: dict) -> MarketFilter | None:
+    """Filter for a subscribe message; None if it selects everything.
+
+    Raises ValueError if malformed.
+    """
+    flt = MarketFilter(
+        symbols=_string_set(message, "symbols"),
+        fields=_string_set(message, "fields"),
+        channels=_string_set(message, "channels", CHANNELS),
+    )
+    return None if flt == MarketFilter() else flt
+
+
+class MarketSubscriptions:
+    """Subscription groups of one market ConnectionManager.
+
+    `state` returns the (seq, state) of the last market frame sent;
+    `keyframe` the full keyframe text for unfiltered clients.
+    """
+
+    def __init__(
+        self,
+        manager,
+        state: Callable[[], tuple[int, dict]],
+        keyframe: Callable[[], str],
+    ):
+        self._manager = manager
+        self._state = state
+        self._keyframe = keyframe
+        self._last_seq: dict[MarketFilter, int] = {}
+        self._by_symbol: dict[str, set[MarketFilter]] = defaultdict(set)
+
+    @property
+    def group_count(self) -> int:
+        return len(self._last_seq)
+
+    def handle(self, ws: WebSocket, text: str) -> None:
+        """Apply a client message from the read loop; anything else is ignored."""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        match message.get("type"):
+            case "subscribe":
+                try:
+                    flt = parse_subscription(message)
+                except ValueError as exc:
+                    logger.warning("Ignoring market subscription: %s", exc)
+                    return
+            case "unsubscribe":
+                flt = None
+            case _:
+                return
+        self.subscribe(ws, flt)
+
+    def subscribe(self, ws: WebSocket, flt: MarketFilter | None) -> None:
+        """Move a client to flt's group (None = full stream) and send it a keyframe."""
+        if flt is not None and flt not in self._last_seq:
+            self._add_group(flt)
+        if not self._manager.set_topic(ws, flt):
+            return
+        self._manager.send_to(ws, self.keyframe(flt))
+
+    def keyframe(self, flt: MarketFilter | None) -> str:
+        """Keyframe of the current state for a group, on that group's chain."""
+        if flt is None:
+            return self._keyframe()
+        seq, state = self._state()
+        # Frames since the group's last seq held nothing for it, so the
+        # filtered current state is also its state as of that seq
+        return json.dumps({
+            "type": "keyframe",
+            "seq": self._last_seq.get(flt, seq),
+            **flt.select(state, keyframe=True),
+        })
+
+    def publish(self, seq: int, state: dict, changes: dict | None) -> None:
+        """Send frame seq to the groups it concerns (changes None = keyframe)."""
+        if not self._last_seq:
+            return
+        for flt in [f for f in self._last_seq if not self._manager.has_topic(f)]:
+            self._remove_group(flt)
+        groups = list(self._last_seq) if changes is None else self._touched(changes)
+        for flt in groups:
+            if changes is None:
+                sections = flt.select(state, keyframe=True)
+                frame = {"type": "keyframe", "seq": seq, **sections}
+            else:
+                sections = flt.select(changes, keyframe=False)
+                if not sections:
+                    continue
+                frame = {"type": "delta", "seq": seq, "base": self._last_seq[flt], **sections}
+            self._last_seq[flt] = seq
+            self._manager.broadcast(json.dumps(frame), topic=flt)
+
+    def _touched(self, changes: dict) -> set[MarketFilter] | list[MarketFilter]:
+        """Groups a delta may concern: via the symbol index when only
+        per-symbol sections changed, otherwise every group."""
+        if any(section not in _BY_SYMBOL for section in changes):
+            return list(self._last_seq)
+        groups = {f for f in self._last_seq if f.symbols is None}
+        for section in changes:
+            for symbol in changes[section]:
+                groups.update(self._by_symbol.get(symbol, ()))
+        return groups
+
+    def _add_group(self, flt: MarketFilter) -> None:
+        self._last_seq[flt] = self._state()[0]
+        for symbol in flt.symbols or ():
+            self._by_symbol[symbol].add(flt)
+
+    def _remove_group(self, flt: MarketFilter) -> None:
+        del self._last_seq[flt]
+        for symbol in flt.symbols or ():
+            groups = self._by_symbol[symbol]
+            groups.discard(flt)
+            if not groups:
+                del self._by_symbol[symbol]
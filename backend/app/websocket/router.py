@@ -1,19 +1,29 @@
 """Multi-channel WebSocket router with authentication and rate limiting.
 
 Channels:
-  /ws/market  — full MarketSnapshot (quotes + indices + foreign + derivatives)
+  /ws/market  — MarketSnapshot keyframes + per-symbol deltas (see market_delta)
   /ws/foreign — ForeignSummary only (aggregate + top movers)
-  /ws/index   — VN30 + VNINDEX IndexData only
+  /ws/index   — VN30 + VNINDEX IndexData only (scalar fields, no intraday)
+  /ws/sparkline — intraday sparkline deltas; full backfill on connect
   /ws/alerts  — real-time analytics alerts (volume spike, breakout, foreign accel, basis flip)
+
+Every channel accepts ?format=json|msgpack and ?compress=deflate (see
+encoding.py); messages are then sent as binary frames. /ws/market clients
+may send subscribe messages to narrow their stream (see market_subscriptions).
+
+On a fan-out worker the connect-time messages come from FanoutMirror
+(leader's keyframe/backfill plus the deltas since) instead of local state.
 """
 
 import asyncio
 import logging
 from collections import defaultdict
+from collections.abc import Callable
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
 
 from app.config import settings
+from app.websocket.encoding import Encoding, parse_encoding
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -69,6 +79,16 @@ async def _check_rate_limit(ws: WebSocket) -> bool:
     return True
 
 
+async def _negotiate_encoding(ws: WebSocket) -> Encoding | None:
+    """Encoding from query params. Returns None and closes WS if unsupported."""
+    try:
+        return parse_encoding(ws.query_params)
+    except ValueError as exc:
+        await ws.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        logger.warning("WS rejected: %s", exc)
+        return None
+
+
 async def _heartbeat(ws: WebSocket) -> None:
     """Send ping bytes at interval. Gives up if send fails."""
     try:
@@ -86,21 +106,38 @@ async def _heartbeat(ws: WebSocket) -> None:
         pass
 
 
-async def _ws_lifecycle(ws: WebSocket, manager) -> None:
-    """Shared lifecycle: auth → rate limit → connect → heartbeat → read loop → cleanup."""
+async def _ws_lifecycle(
+    ws: WebSocket,
+    manager,
+    initial: Callable[[], list[str]] | None = None,
+    on_message: Callable[[WebSocket, str], None] | None = None,
+) -> None:
+    """Shared lifecycle: auth → rate limit → connect → heartbeat → read loop → cleanup.
+
+    `initial` builds the messages queued to this client right after connect;
+    `on_message` handles text the client sends (ignored if None).
+    """
     if not await _authenticate(ws):
         return
     if not await _check_rate_limit(ws):
         return
+    encoding = await _negotiate_encoding(ws)
+    if encoding is None:
+        return
 
     ip = ws.client.host if ws.client else "unknown"
     _rate_limiter.increment(ip)
 
-    await manager.connect(ws)
+    await manager.connect(ws, encoding)
+    if initial is not None:
+        for message in initial():
+            manager.send_to(ws, message)
     heartbeat_task = asyncio.create_task(_heartbeat(ws))
     try:
         while True:
-            await ws.receive_text()  # keep-alive read loop
+            text = await ws.receive_text()  # keep-alive read loop
+            if on_message is not None:
+                on_message(ws, text)
     except (WebSocketDisconnect, RuntimeError):
         pass
     finally:
@@ -119,9 +156,17 @@ async def _ws_lifecycle(ws: WebSocket, manager) -> None:
 
 @router.websocket("/ws/market")
 async def market_websocket(ws: WebSocket) -> None:
-    """Market data channel: full MarketSnapshot."""
-    from app.main import market_ws_manager
-    await _ws_lifecycle(ws, market_ws_manager)
+    """Market data channel: keyframe on connect, then delta-encoded updates.
+
+    Fan-out workers relay the leader's frames as-is and ignore subscriptions.
+    """
+    from app.main import fanout_mirror, market_ws_manager, publisher
+    initial = (
+        (lambda: fanout_mirror.initial_frames("market")) if fanout_mirror is not None
+        else (lambda: [publisher.market_keyframe()])
+    )
+    on_message = publisher.market_subscriptions.handle if fanout_mirror is None else None
+    await _ws_lifecycle(ws, market_ws_manager, initial=initial, on_message=on_message)
 
 
 @router.websocket("/ws/foreign")
@@ -138,6 +183,18 @@ async def index_websocket(ws: WebSocket) -> None:
     await _ws_lifecycle(ws, index_ws_manager)
 
 
+@router.websocket("/ws/sparkline")
+async def sparkline_websocket(ws: WebSocket) -> None:
+    """Sparkline channel: compact backfill on connect, then appended points."""
+    from app.main import fanout_mirror, processor, sparkline_ws_manager
+    from app.websocket.data_publisher import build_sparkline_backfill
+    initial = (
+        (lambda: fanout_mirror.initial_frames("sparkline")) if fanout_mirror is not None
+        else (lambda: [build_sparkline_backfill(processor.index_tracker)])
+    )
+    await _ws_lifecycle(ws, sparkline_ws_manager, initial=initial)
+
+
 @router.websocket("/ws/alerts")
 async def alerts_websocket(ws: WebSocket) -> None:
     """Alerts channel: real-time analytics alerts."""
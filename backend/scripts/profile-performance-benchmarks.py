@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
-"""Performance profiling — CPU hotspots, memory usage, asyncio health, DB pool.
+"""Performance profiling — CPU hotspots, memory, asyncio, DB pool, SSI decoders, tick path, WS fan-out, tick storage.
 
 Usage:
     ./venv/bin/python scripts/profile-performance-benchmarks.py
     ./venv/bin/python scripts/profile-performance-benchmarks.py --mode cpu
     ./venv/bin/python scripts/profile-performance-benchmarks.py --mode memory
+    ./venv/bin/python scripts/profile-performance-benchmarks.py --mode decoder
+    ./venv/bin/python scripts/profile-performance-benchmarks.py --mode ticks
+    ./venv/bin/python scripts/profile-performance-benchmarks.py --mode broadcast
+    DATABASE_URL=... ./venv/bin/python scripts/profile-performance-benchmarks.py --mode tickdb
     ./venv/bin/python scripts/profile-performance-benchmarks.py --output results.json
 
 Outputs:
@@ -16,6 +20,7 @@ Outputs:
 import asyncio
 import argparse
 import cProfile
+import gc
 import json
 import logging
 import pstats
@@ -23,13 +28,15 @@ import random
 import sys
 import time
 import tracemalloc
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from io import StringIO
 from pathlib import Path
 
 # Add backend to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from app.database.tick_buffer import TICK_COLUMNS, TickBuffer, compact_row
 from app.models.ssi_messages import (
     SSIForeignMessage,
     SSIIndexMessage,
@@ -37,6 +44,13 @@ from app.models.ssi_messages import (
     SSITradeMessage,
 )
 from app.services.market_data_processor import MarketDataProcessor
+from app.services.quote_cache import QuoteCache
+from app.services.trade_classifier import TradeClassifier
+from app.services.ssi_fast_decoder import decode_message
+from app.services.ssi_field_normalizer import extract_content, parse_message_multi
+from app.websocket.connection_manager import ConnectionManager, _Client, _FifoOutbox
+from app.websocket.direct_send import DirectTransport
+from app.websocket.encoding import JSON
 
 logging.basicConfig(level=logging.WARNING)
 
@@ -247,6 +261,243 @@ def profile_memory(message_count: int = 50_000) -> dict:
     }
 
 
+# ============================================================================
+# SSI decoder microbenchmark
+# ============================================================================
+
+
+def _rand_raw_frame(kind: str) -> str:
+    """Raw SSI stream frame: JSON envelope with JSON-string Content, as sent live."""
+    symbol = random.choice(VN30_SYMBOLS)
+    price = round(random.uniform(50, 150), 1)
+    if kind == "X":
+        content = {
+            "RType": "X", "Symbol": symbol, "Exchange": "HOSE",
+            "LastPrice": price, "LastVol": random.randint(10, 500),
+            "TotalVol": random.randint(10_000, 5_000_000), "TotalVal": price * 1e6,
+            "Change": round(random.uniform(-2, 5), 2), "RatioChange": round(random.uniform(-1.5, 3.5), 2),
+            "TradingSession": "LO", "Ceiling": round(price * 1.07, 1), "Floor": round(price * 0.93, 1),
+            "RefPrice": price, "Open": price, "High": price + 1, "Low": price - 1,
+        }
+        for level in (1, 2, 3):
+            content[f"BidPrice{level}"] = round(price - 0.1 * level, 1)
+            content[f"BidVol{level}"] = random.randint(100, 5000)
+            content[f"AskPrice{level}"] = round(price + 0.1 * level, 1)
+            content[f"AskVol{level}"] = random.randint(100, 5000)
+    elif kind == "R":
+        content = {
+            "RType": "R", "Symbol": symbol,
+            "FBuyVol": random.randint(100, 5000), "FSellVol": random.randint(100, 5000),
+            "FBuyVal": random.uniform(1e4, 5e5), "FSellVal": random.uniform(1e4, 5e5),
+            "TotalRoom": 1_000_000, "CurrentRoom": random.randint(500_000, 999_000),
+        }
+    else:
+        content = {
+            "RType": "MI", "IndexId": random.choice(["VN30", "VNINDEX"]),
+            "IndexValue": random.uniform(1200, 1300), "PriorIndexValue": random.uniform(1190, 1290),
+            "Change": random.uniform(-10, 10), "RatioChange": random.uniform(-1, 1),
+            "TotalQtty": random.randint(1_000_000, 5_000_000),
+            "Advances": random.randint(10, 20), "Declines": random.randint(5, 15),
+            "NoChanges": random.randint(0, 5),
+        }
+    return json.dumps({"DataType": kind, "Content": json.dumps(content)})
+
+
+def _decode_pydantic(raw: str) -> list:
+    content = extract_content(raw)
+    return parse_message_multi(content) if content is not None else []
+
+
+def profile_decoders(message_count: int = 100_000) -> dict:
+    """Compare msgs/s of the Pydantic and fast SSI decoders on identical raw frames."""
+    print(f"\n=== SSI Decoder Microbenchmark ({message_count:,} frames) ===")
+
+    # Live mix is dominated by X (trade+quote); R and MI are the other hot RTypes
+    kinds = random.choices(["X", "R", "MI"], weights=[8, 1, 1], k=message_count)
+    frames = [_rand_raw_frame(kind) for kind in kinds]
+
+    results = {}
+    for name, decode in (("pydantic", _decode_pydantic), ("fast", decode_message)):
+        decode(frames[0])  # warm up
+        start = time.perf_counter()
+        for raw in frames:
+            decode(raw)
+        elapsed = time.perf_counter() - start
+        throughput = message_count / elapsed
+        print(f"  {name:<9} {throughput:>12,.0f} msg/s  ({elapsed * 1e6 / message_count:.2f}us/msg)")
+        results[name] = {
+            "total_time_s": round(elapsed, 3),
+            "messages_per_second": round(throughput, 1),
+        }
+
+    speedup = results["fast"]["messages_per_second"] / results["pydantic"]["messages_per_second"]
+    print(f"  Speedup:  {speedup:.2f}x")
+    return {"message_count": message_count, **results, "speedup": round(speedup, 2)}
+
+
+# ============================================================================
+# Tick persistence path: ClassifiedTrade objects vs columnar TickBuffer
+# ============================================================================
+
+
+def _tick_path_objects(classifier: TradeClassifier, trades: list) -> int:
+    """Legacy path: one ClassifiedTrade per trade, re-tupled at flush."""
+    pending = [classifier.classify(t) for t in trades]
+    rows = [
+        (t.symbol, t.timestamp, t.price, t.volume, t.trade_type.value, t.bid_price, t.ask_price)
+        for t in pending
+    ]
+    return len(rows)
+
+
+def _tick_path_columnar(classifier: TradeClassifier, trades: list) -> int:
+    """Columnar path: classifier appends into TickBuffer, flush streams rows."""
+    buf = TickBuffer(len(trades))
+    classifier.set_tick_buffer(buf)
+    for t in trades:
+        classifier.record(t)
+    classifier.set_tick_buffer(None)
+    return sum(1 for _ in buf.take(len(trades)).rows())
+
+
+def profile_tick_path(trade_count: int = 100_000) -> dict:
+    """Allocation, GC and time per trade for both tick persistence paths."""
+    print(f"\n=== Tick Persistence Path ({trade_count:,} trades) ===")
+
+    cache = QuoteCache()
+    for symbol in VN30_SYMBOLS:
+        cache.update(_rand_quote(symbol))
+    classifier = TradeClassifier(cache)
+    trades = [
+        _rand_trade(sym, cache.get_bid_ask(sym)[1])
+        for sym in random.choices(VN30_SYMBOLS, k=trade_count)
+    ]
+
+    results = {}
+    for name, path in (("objects", _tick_path_objects), ("columnar", _tick_path_columnar)):
+        gc.collect()
+        gen0_before = gc.get_stats()[0]["collections"]
+        tracemalloc.start()
+        start = time.perf_counter()
+        path(classifier, trades)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        gen0 = gc.get_stats()[0]["collections"] - gen0_before
+        bytes_per_trade = peak / trade_count
+        print(
+            f"  {name:<9} peak {peak / 1024 / 1024:7.2f} MB  "
+            f"({bytes_per_trade:6.1f} B/trade)  gen0 GCs {gen0:5d}  "
+            f"{trade_count / elapsed:>10,.0f} trades/s"
+        )
+        results[name] = {
+            "peak_mb": round(peak / 1024 / 1024, 2),
+            "bytes_per_trade": round(bytes_per_trade, 1),
+            "gen0_collections": gen0,
+            "trades_per_second": round(trade_count / elapsed, 1),
+        }
+    return {"trade_count": trade_count, **results}
+
+
+# ============================================================================
+# WebSocket fan-out: queued ASGI send vs direct transport writes
+# ============================================================================
+
+
+class _NullTransport:
+    """Stands in for an asyncio transport; counts bytes written."""
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data: bytes) -> None:
+        self.written += len(data)
+
+    def is_closing(self) -> bool:
+        return False
+
+
+class _NullCounter:
+    def inc(self, n: int = 1) -> None:
+        pass
+
+
+class _QueuedWS:
+    """ASGI-path client: per-client UTF-8 encode + framing, as uvicorn's send does."""
+
+    def __init__(self, transport: _NullTransport):
+        from websockets.protocol import State
+        from websockets.server import ServerProtocol
+
+        self._conn = ServerProtocol(state=State.OPEN)
+        self._transport = transport
+
+    async def send_text(self, data: str) -> None:
+        self._conn.send_text(data.encode())
+        self._transport.write(b"".join(self._conn.data_to_send()))
+
+
+def _direct_proto(transport: _NullTransport):
+    proto = type("Proto", (), {})()
+    proto.transport = transport
+    proto.writable = asyncio.Event()
+    proto.writable.set()
+    proto.close_sent = proto.disconnected = False
+    return proto
+
+
+async def _broadcast_cpu(clients: int, direct: bool, messages: int, frame: str) -> float:
+    """CPU seconds to deliver `messages` broadcasts to `clients` clients."""
+    manager = ConnectionManager(channel="bench")
+    transports = [_NullTransport() for _ in range(clients)]
+    tasks = []
+    for i, transport in enumerate(transports):
+        outbox = _FifoOutbox(messages + 1)
+        if direct:
+            client = _Client(
+                JSON, outbox, direct=DirectTransport(_direct_proto(transport)), sent_bytes=_NullCounter(),
+            )
+        else:
+            client = _Client(JSON, outbox, wake=asyncio.Event(), sent_bytes=_NullCounter())
+            client.task = asyncio.create_task(manager._sender(_QueuedWS(transport), client))
+            tasks.append(client.task)
+        manager._clients[i] = client
+    await asyncio.sleep(0)
+
+    start = time.process_time()
+    for _ in range(messages):
+        manager.broadcast(frame)
+        await asyncio.sleep(0)  # every woken sender task runs before we resume
+    elapsed = time.process_time() - start
+    expected = messages * len(frame.encode())
+    assert all(t.written > expected for t in transports), "not every frame was written"
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return elapsed
+
+
+async def profile_broadcast(messages: int = 50) -> dict:
+    """Per-client cost of a /ws/market-sized broadcast as client count grows."""
+    print(f"\n=== WS Broadcast Fan-out ({messages} messages) ===")
+    quotes = {s: {"price": 100.5, "volume": 12_345, "bid": 100.4, "ask": 100.6} for s in VN30_SYMBOLS}
+    frame = json.dumps({"type": "delta", "seq": 1, "base": 0, "quotes": quotes})
+
+    results = {}
+    for clients in (300, 1_000, 5_000):
+        row = {}
+        for name, direct in (("queued", False), ("direct", True)):
+            cpu = await _broadcast_cpu(clients, direct, messages, frame)
+            row[name] = round(cpu / (clients * messages) * 1e6, 3)  # µs per client-message
+        print(
+            f"  {clients:>5} clients  queued {row['queued']:6.2f} µs/client-msg  "
+            f"direct {row['direct']:6.2f} µs/client-msg  ({row['queued'] / row['direct']:.1f}x)"
+        )
+        results[str(clients)] = row
+    return {"frame_bytes": len(frame), "messages": messages, "us_per_client_message": results}
+
+
 # ============================================================================
 # Asyncio monitoring
 # ============================================================================
@@ -280,6 +531,141 @@ async def profile_asyncio() -> dict:
     }
 
 
+# ============================================================================
+# tick_data storage: NUMERIC/VARCHAR schema vs compact integer schema (004)
+# ============================================================================
+
+_LEGACY_TICK_DDL = """
+    symbol VARCHAR(10) NOT NULL, timestamp TIMESTAMPTZ NOT NULL,
+    price NUMERIC(12, 2) NOT NULL, volume INTEGER NOT NULL, side VARCHAR(20) NOT NULL,
+    bid NUMERIC(12, 2), ask NUMERIC(12, 2)
+"""
+_COMPACT_TICK_DDL = """
+    symbol VARCHAR(10) NOT NULL, timestamp TIMESTAMPTZ NOT NULL,
+    price INTEGER NOT NULL, volume INTEGER NOT NULL, side SMALLINT NOT NULL,
+    bid INTEGER, ask INTEGER
+"""
+
+
+def _legacy_ticks(count: int) -> list[tuple]:
+    """Rows as the pre-004 schema took them: Decimal prices, side names."""
+    t0 = datetime(2026, 2, 9, 2, 15, tzinfo=timezone.utc)
+    sides = ("mua_chu_dong", "ban_chu_dong", "neutral")
+    rows = []
+    for i in range(count):
+        price = Decimal(random.randint(1000, 15000)) / 20  # 0.05 tick size
+        rows.append((
+            random.choice(VN30_SYMBOLS), t0 + timedelta(milliseconds=i * 100), price,
+            random.randint(1, 500) * 10, random.choice(sides),
+            price - Decimal("0.05"), price + Decimal("0.05"),
+        ))
+    return rows
+
+
+def _numeric_wire_bytes(value: Decimal) -> int:
+    """Binary COPY size of a NUMERIC: 8-byte header + 2 bytes per base-10000 digit."""
+    units, frac = divmod(abs(int(value * 100)), 100)
+    groups = []
+    while units:
+        groups.append(units % 10_000)
+        units //= 10_000
+    while groups and not frac and groups[0] == 0:
+        groups.pop(0)  # trailing zero digits are not sent
+    return 8 + 2 * (len(groups) + (1 if frac else 0))
+
+
+# Fixed-width integer columns of the compact schema
+_INT_BYTES = {"price": 4, "volume": 4, "side": 2, "bid": 4, "ask": 4}
+
+
+def _copy_wire_bytes(row: tuple) -> int:
+    """Binary COPY size of one tick row (2-byte field count, 4-byte length per field)."""
+    size = 2 + 4 * len(row)
+    for column, value in zip(TICK_COLUMNS, row):
+        if isinstance(value, Decimal):
+            size += _numeric_wire_bytes(value)
+        elif isinstance(value, str):
+            size += len(value.encode())
+        elif isinstance(value, datetime):
+            size += 8
+        else:
+            size += _INT_BYTES[column]
+    return size
+
+
+_BENCH_SCHEMA = "bench_ticks"
+
+
+async def _copy_and_measure(conn, name: str, ddl: str, rows: list[tuple]) -> dict:
+    table = f"{_BENCH_SCHEMA}.{name}"
+    await conn.execute(f"CREATE TABLE {table} ({ddl})")
+    await conn.execute(f"SELECT create_hypertable('{table}', 'timestamp')")
+    start = time.perf_counter()
+    for i in range(0, len(rows), 10_000):
+        await conn.copy_records_to_table(
+            name, schema_name=_BENCH_SCHEMA,
+            columns=TICK_COLUMNS, records=rows[i:i + 10_000],
+        )
+    elapsed = time.perf_counter() - start
+    size = await conn.fetchval(f"SELECT hypertable_size('{table}')")
+    await conn.execute(f"""
+        ALTER TABLE {table} SET (timescaledb.compress,
+            timescaledb.compress_segmentby = 'symbol',
+            timescaledb.compress_orderby = 'timestamp DESC')
+    """)
+    await conn.execute(f"SELECT compress_chunk(c) FROM show_chunks('{table}') c")
+    compressed = await conn.fetchval(f"SELECT hypertable_size('{table}')")
+    return {
+        "rows_per_second": round(len(rows) / elapsed, 1),
+        "disk_bytes_per_row": round(size / len(rows), 1),
+        "compressed_bytes_per_row": round(compressed / len(rows), 1),
+    }
+
+
+async def profile_tick_storage(row_count: int = 200_000) -> dict:
+    """COPY wire size, COPY rows/s and on-disk bytes/row for both tick_data schemas.
+
+    Wire sizes are computed offline; rows/s and disk sizes need a TimescaleDB
+    at DATABASE_URL (tables are created in a scratch schema and dropped).
+    """
+    print(f"\n=== tick_data Storage ({row_count:,} rows) ===")
+    legacy = _legacy_ticks(row_count)
+    compact = [compact_row(r) for r in legacy]
+    results = {"row_count": row_count}
+    for name, rows in (("numeric", legacy), ("compact", compact)):
+        wire = sum(_copy_wire_bytes(r) for r in rows) / row_count
+        results[name] = {"copy_wire_bytes_per_row": round(wire, 1)}
+        print(f"  {name:<8} COPY wire {wire:6.1f} B/row")
+
+    try:
+        import asyncpg
+
+        from app.config import settings
+
+        conn = await asyncpg.connect(settings.database_url, timeout=5)
+    except Exception as exc:
+        print(f"  DB unavailable ({exc}) — skipping COPY and disk measurements")
+        return results
+    try:
+        await conn.execute(
+            f"DROP SCHEMA IF EXISTS {_BENCH_SCHEMA} CASCADE; CREATE SCHEMA {_BENCH_SCHEMA}",
+        )
+        for name, ddl, rows in (
+            ("numeric", _LEGACY_TICK_DDL, legacy), ("compact", _COMPACT_TICK_DDL, compact),
+        ):
+            stats = await _copy_and_measure(conn, f"{name}_ticks", ddl, rows)
+            results[name].update(stats)
+            print(
+                f"  {name:<8} {stats['rows_per_second']:>10,.0f} rows/s  "
+                f"disk {stats['disk_bytes_per_row']:6.1f} B/row  "
+                f"compressed {stats['compressed_bytes_per_row']:6.1f} B/row"
+            )
+    finally:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {_BENCH_SCHEMA} CASCADE")
+        await conn.close()
+    return results
+
+
 # ============================================================================
 # Database pool metrics
 # ============================================================================
@@ -324,7 +710,9 @@ def main():
     parser = argparse.ArgumentParser(description="Performance profiling suite")
     parser.add_argument(
         "--mode",
-        choices=["all", "cpu", "memory", "asyncio", "db"],
+        choices=[
+            "all", "cpu", "memory", "asyncio", "db", "decoder", "ticks", "broadcast", "tickdb",
+        ],
         default="all",
         help="Profiling mode (default: all)",
     )
@@ -340,6 +728,18 @@ def main():
         "--memory-messages", type=int, default=50_000,
         help="Message count for memory profiling (default: 50000)",
     )
+    parser.add_argument(
+        "--decoder-messages", type=int, default=100_000,
+        help="Frame count for SSI decoder microbenchmark (default: 100000)",
+    )
+    parser.add_argument(
+        "--tick-trades", type=int, default=100_000,
+        help="Trade count for tick persistence path comparison (default: 100000)",
+    )
+    parser.add_argument(
+        "--storage-rows", type=int, default=200_000,
+        help="Row count for tick_data storage comparison (default: 200000)",
+    )
     args = parser.parse_args()
 
     results = {"timestamp": datetime.now().isoformat(), "mode": args.mode}
@@ -353,6 +753,18 @@ def main():
     if args.mode in ("all", "asyncio"):
         results["asyncio"] = asyncio.run(profile_asyncio())
 
+    if args.mode in ("all", "decoder"):
+        results["decoder"] = profile_decoders(args.decoder_messages)
+
+    if args.mode in ("all", "ticks"):
+        results["ticks"] = profile_tick_path(args.tick_trades)
+
+    if args.mode in ("all", "broadcast"):
+        results["broadcast"] = asyncio.run(profile_broadcast())
+
+    if args.mode in ("all", "tickdb"):
+        results["tick_storage"] = asyncio.run(profile_tick_storage(args.storage_rows))
+
     if args.mode in ("all", "db"):
         results["database"] = asyncio.run(profile_database())
 
@@ -6,6 +6,7 @@ Provides:
 - wired_system: processor → DataPublisher → ConnectionManagers
 - ssi_factories: message builder functions
 - ws_receive: helper to receive broadcast from a ConnectionManager
+- apply_market_frame: rebuild /ws/market state from keyframe + delta frames
 """
 
 import asyncio
@@ -125,6 +126,33 @@ def ws_receive():
     return _connect
 
 
+def _apply_market_frame(state: dict | None, frame: dict) -> dict | None:
+    """Apply a /ws/market keyframe or delta to a client-side state dict."""
+    if frame.get("type") == "keyframe":
+        return {k: v for k, v in frame.items() if k not in ("type", "seq")}
+    if frame.get("type") != "delta" or state is None:
+        return state
+    for section, changes in frame.items():
+        if section in ("type", "seq", "base"):
+            continue
+        if section in ("quotes", "prices", "indices"):
+            for symbol, fields in changes.items():
+                state[section][symbol] = {**state[section].get(symbol, {}), **fields}
+        else:
+            state[section] = {**(state.get(section) or {}), **changes}
+    return state
+
+
+@pytest.fixture
+def apply_market_frame():
+    """Client-side /ws/market state rebuild.
+
+    Usage:
+        state = apply_market_frame(state, json.loads(raw))
+    """
+    return _apply_market_frame
+
+
 # ============================================================================
 # SSI Message Factories
 # ============================================================================
@@ -20,6 +20,7 @@ async def test_quote_updates_reach_ws_clients(wired_system, f, ws_receive):
     await proc.handle_quote(f.quote("VNM", bid=80.0, ask=80.5))
 
     msg = json.loads(await asyncio.wait_for(ws.messages.get(), timeout=2.0))
+    assert msg["type"] == "keyframe"
     assert "quotes" in msg
     assert "indices" in msg
     assert "foreign" in msg
@@ -46,7 +47,7 @@ async def test_trade_classification_end_to_end(wired_system, f, ws_receive):
 
 
 @pytest.mark.asyncio
-async def test_multi_symbol_updates(wired_system, f, ws_receive):
+async def test_multi_symbol_updates(wired_system, f, ws_receive, apply_market_frame):
     """Multiple symbols process independently and all appear in snapshot."""
     proc = wired_system["processor"]
     market_mgr = wired_system["managers"]["market"]
@@ -64,12 +65,10 @@ async def test_multi_symbol_updates(wired_system, f, ws_receive):
 
     # Wait past throttle window for aggregated broadcast
     await asyncio.sleep(0.6)
-    # Get the latest message (may have multiple due to throttle)
+    # Rebuild client state from keyframe + deltas (may be several due to throttle)
     msg = None
     while not ws.messages.empty():
-        msg = json.loads(ws.messages.get_nowait())
-    if msg is None:
-        msg = json.loads(await asyncio.wait_for(ws.messages.get(), timeout=2.0))
+        msg = apply_market_frame(msg, json.loads(ws.messages.get_nowait()))
 
     for sym in symbols:
         assert sym in msg["quotes"]
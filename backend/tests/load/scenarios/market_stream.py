@@ -12,12 +12,14 @@ from backend.tests.load.websocket_user import WebSocketUser
 class MarketStreamUser(WebSocketUser):
     """WebSocket user that subscribes to /ws/market and receives continuous updates.
 
-    Validates that MarketSnapshot contains expected keys:
-    quotes, indices, foreign, derivatives, prices
+    Validates that keyframes contain all MarketSnapshot keys:
+    quotes, indices, foreign, derivatives, prices. Deltas carry only
+    changed sections and must reference the previous sequence number.
     """
 
     ws_path = "/ws/market"
     wait_time = between(0.01, 0.05)  # Fast polling loop for continuous receive
+    _seq: int | None = None  # last applied market sequence number
 
     @task
     def receive_market_data(self):
@@ -27,19 +29,28 @@ class MarketStreamUser(WebSocketUser):
             self.on_message(data)
 
     def on_message(self, data: dict):
-        """Validate MarketSnapshot structure."""
-        # Skip status/heartbeat messages
-        if data.get("type") in ("status", "ping", "pong"):
-            return
-
-        expected_keys = {"quotes", "indices", "foreign", "derivatives", "prices"}
-        missing = expected_keys - set(data.keys())
-        if missing:
+        """Validate keyframe structure and delta sequence continuity."""
+        msg_type = data.get("type")
+        error = None
+        if msg_type == "keyframe":
+            expected_keys = {"quotes", "indices", "foreign", "derivatives", "prices"}
+            missing = expected_keys - set(data.keys())
+            if missing:
+                error = ValueError(f"Missing keys: {missing}")
+            self._seq = data.get("seq")
+        elif msg_type == "delta":
+            if self._seq is not None and data.get("base") != self._seq:
+                error = ValueError(f"Sequence gap: base={data.get('base')} last={self._seq}")
+            self._seq = data.get("seq")
+        else:
+            return  # status/heartbeat messages
+
+        if error:
             events.request.fire(
                 request_type="WS",
                 name="validate /ws/market",
                 response_time=0,
                 response_length=0,
-                exception=ValueError(f"Missing keys: {missing}"),
+                exception=error,
                 context={},
             )
@@ -1,4 +1,4 @@
-"""Tests for BatchWriter — queue management, drain, enqueue overflow."""
+"""Tests for BatchWriter — queue management, drain, enqueue overflow, parallel flush, spill/replay."""
 
 import asyncio
 from datetime import datetime, timezone
@@ -6,8 +6,16 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from app.database.batch_writer import BatchWriter, MAX_QUEUE_SIZE, FLUSH_BATCH_SIZE
+from app.database.batch_writer import (
+    BatchWriter,
+    FLUSH_MAX_ROWS,
+    HIGH_WATER_MARK,
+    MAX_QUEUE_SIZE,
+    REPLAY_ATTEMPTS,
+)
 from app.database.pool import Database
+from app.database.spill_log import SpillLog
+from app.database.tick_buffer import SIDE_CODES, TICK_COLUMNS
 from app.models.domain import (
     BasisPoint,
     ClassifiedTrade,
@@ -64,6 +72,13 @@ def _make_basis() -> BasisPoint:
     )
 
 
+def _mock_pool(conn) -> MagicMock:
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+    return pool
+
+
 @pytest.fixture
 def mock_db():
     db = MagicMock(spec=Database)
@@ -80,7 +95,7 @@ class TestEnqueue:
     def test_enqueue_tick_adds_to_queue(self, writer):
         trade = _make_trade()
         writer.enqueue_tick(trade)
-        assert writer._tick_queue.qsize() == 1
+        assert len(writer.tick_buffer) == 1
 
     def test_enqueue_foreign_adds_to_queue(self, writer):
         writer.enqueue_foreign(_make_foreign())
@@ -97,41 +112,60 @@ class TestEnqueue:
     def test_enqueue_multiple(self, writer):
         for _ in range(10):
             writer.enqueue_tick(_make_trade())
-        assert writer._tick_queue.qsize() == 10
+        assert len(writer.tick_buffer) == 10
 
 
 class TestEnqueueOverflow:
     def test_drop_oldest_when_full(self, mock_db):
         """When queue is full, oldest record should be dropped."""
         bw = BatchWriter(mock_db)
-        # Fill tick queue to capacity
-        for i in range(MAX_QUEUE_SIZE):
-            bw.enqueue_tick(_make_trade(price=float(i)))
-        assert bw._tick_queue.qsize() == MAX_QUEUE_SIZE
+        # Fill foreign queue to capacity
+        for _ in range(MAX_QUEUE_SIZE):
+            bw.enqueue_foreign(_make_foreign())
+        assert bw._foreign_queue.qsize() == MAX_QUEUE_SIZE
 
         # Add one more — should drop oldest and add new
+        bw.enqueue_foreign(_make_foreign("FPT"))
+        assert bw._foreign_queue.qsize() == MAX_QUEUE_SIZE
+
+    def test_tick_buffer_drops_oldest_when_full(self, mock_db):
+        bw = BatchWriter(mock_db)
+        for i in range(MAX_QUEUE_SIZE):
+            bw.enqueue_tick(_make_trade(price=float(i)))
         bw.enqueue_tick(_make_trade(price=99999.0))
-        assert bw._tick_queue.qsize() == MAX_QUEUE_SIZE
+        prices = bw.tick_buffer.take(MAX_QUEUE_SIZE).price
+        assert len(prices) <= MAX_QUEUE_SIZE
+        assert prices[0] > 0  # oldest gone
+        assert prices[-1] == 9_999_900  # hundredths
+
+    def test_drop_counted(self, mock_db):
+        from app.metrics import db_records_dropped_total
+
+        bw = BatchWriter(mock_db)
+        before = db_records_dropped_total.labels(table="index_snapshots")._value.get()
+        for _ in range(MAX_QUEUE_SIZE + 3):
+            bw.enqueue_index(_make_index())
+        assert db_records_dropped_total.labels(table="index_snapshots")._value.get() - before == 3
 
 
 class TestDrain:
     def test_drain_empty_queue(self, writer):
-        items = writer._drain(writer._tick_queue)
+        items = writer._drain(writer._foreign_queue, max_items=MAX_QUEUE_SIZE)
         assert items == []
 
     def test_drain_returns_all_items(self, writer):
         for _ in range(5):
-            writer.enqueue_tick(_make_trade())
-        items = writer._drain(writer._tick_queue)
+            writer.enqueue_foreign(_make_foreign())
+        items = writer._drain(writer._foreign_queue, max_items=MAX_QUEUE_SIZE)
         assert len(items) == 5
-        assert writer._tick_queue.qsize() == 0
+        assert writer._foreign_queue.qsize() == 0
 
     def test_drain_respects_max_items(self, writer):
-        for _ in range(FLUSH_BATCH_SIZE + 100):
-            writer.enqueue_tick(_make_trade())
-        items = writer._drain(writer._tick_queue, max_items=FLUSH_BATCH_SIZE)
-        assert len(items) == FLUSH_BATCH_SIZE
-        assert writer._tick_queue.qsize() == 100
+        for _ in range(600):
+            writer.enqueue_foreign(_make_foreign())
+        items = writer._drain(writer._foreign_queue, max_items=500)
+        assert len(items) == 500
+        assert writer._foreign_queue.qsize() == 100
 
 
 class TestFlushTicks:
@@ -152,6 +186,10 @@ class TestFlushTicks:
         assert call_kwargs[1]["columns"] == [
             "symbol", "timestamp", "price", "volume", "side", "bid", "ask",
         ]
+        (row,) = list(call_kwargs[1]["records"])
+        assert row[0] == "VNM"
+        assert row[2] == 8000  # price in hundredths
+        assert row[4] == SIDE_CODES["mua_chu_dong"]
 
     @pytest.mark.asyncio
     async def test_flush_empty_noop(self, mock_db):
@@ -171,6 +209,110 @@ class TestFlushTicks:
         await bw._flush_ticks()
 
 
+class TestAdaptiveBatching:
+    @pytest.mark.asyncio
+    async def test_flush_drains_all_pending(self, mock_db):
+        """No fixed 500-row ceiling: a full queue flushes in one COPY."""
+        mock_conn = AsyncMock()
+        mock_db.pool = _mock_pool(mock_conn)
+        bw = BatchWriter(mock_db)
+        for _ in range(MAX_QUEUE_SIZE):
+            bw.enqueue_tick(_make_trade())
+        await bw._flush_ticks()
+        assert len(list(mock_conn.copy_records_to_table.call_args[1]["records"])) == MAX_QUEUE_SIZE
+        assert len(bw.tick_buffer) == 0
+
+    @pytest.mark.asyncio
+    async def test_row_cap_limits_batch(self, mock_db):
+        mock_conn = AsyncMock()
+        mock_db.pool = _mock_pool(mock_conn)
+        bw = BatchWriter(mock_db)
+        for _ in range(1000):
+            bw.enqueue_tick(_make_trade())
+        with patch("app.database.batch_writer.FLUSH_MAX_ROWS", 300):
+            await bw._flush_ticks()
+        assert len(list(mock_conn.copy_records_to_table.call_args[1]["records"])) == 300
+        assert len(bw.tick_buffer) == 700
+        assert FLUSH_MAX_ROWS == MAX_QUEUE_SIZE  # default: a flush takes a full queue
+
+    @pytest.mark.asyncio
+    async def test_tables_flushed_concurrently(self, mock_db):
+        """All four COPYs are in flight at once, each on its own connection."""
+        in_flight, peak = 0, 0
+        release = asyncio.Event()
+
+        async def _copy(*args, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            if peak == 4:
+                release.set()
+            await asyncio.wait_for(release.wait(), timeout=1.0)
+            in_flight -= 1
+
+        mock_conn = AsyncMock()
+        mock_conn.copy_records_to_table.side_effect = _copy
+        mock_db.pool = _mock_pool(mock_conn)
+        bw = BatchWriter(mock_db)
+        bw.enqueue_tick(_make_trade())
+        bw.enqueue_foreign(_make_foreign())
+        bw.enqueue_index(_make_index())
+        bw.enqueue_basis(_make_basis())
+        await bw._flush_all()
+
+        assert peak == 4
+        assert mock_db.pool.acquire.call_count == 4
+
+    @pytest.mark.asyncio
+    async def test_high_water_mark_triggers_early_flush(self, mock_db):
+        mock_conn = AsyncMock()
+        mock_db.pool = _mock_pool(mock_conn)
+        bw = BatchWriter(mock_db, flush_interval=60.0)
+        await bw.start()
+        for _ in range(HIGH_WATER_MARK):
+            bw.enqueue_tick(_make_trade())
+        await asyncio.sleep(0.05)
+        assert len(bw.tick_buffer) == 0
+        mock_conn.copy_records_to_table.assert_called_once()
+        await bw.stop()
+
+    @pytest.mark.asyncio
+    async def test_rows_written_counted(self, mock_db):
+        from app.metrics import db_rows_written_total
+
+        mock_db.pool = _mock_pool(AsyncMock())
+        bw = BatchWriter(mock_db)
+        before = db_rows_written_total.labels(table="foreign_flow")._value.get()
+        for _ in range(7):
+            bw.enqueue_foreign(_make_foreign())
+        await bw._flush_foreign()
+        assert db_rows_written_total.labels(table="foreign_flow")._value.get() - before == 7
+
+
+class TestFlushCallback:
+    @pytest.mark.asyncio
+    async def test_called_per_table_after_copy(self, mock_db):
+        mock_db.pool = _mock_pool(AsyncMock())
+        bw = BatchWriter(mock_db)
+        on_flush = MagicMock()
+        bw.set_flush_callback(on_flush)
+        bw.enqueue_tick(_make_trade())
+        bw.enqueue_foreign(_make_foreign())
+        await bw._flush_all()
+        assert sorted(c.args for c in on_flush.call_args_list) == [
+            ("foreign_flow", False), ("tick_data", False),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_not_called_when_spilled(self, mock_db, tmp_path):
+        bw = BatchWriter(mock_db, spill=SpillLog(tmp_path))
+        on_flush = MagicMock()
+        bw.set_flush_callback(on_flush)
+        bw.enqueue_tick(_make_trade())
+        await bw._flush_all()  # no pool
+        on_flush.assert_not_called()
+
+
 class TestFlushForeign:
     @pytest.mark.asyncio
     async def test_flush_calls_copy(self, mock_db):
@@ -247,3 +389,191 @@ class TestStartStop:
 
         # Both tick and foreign should have been flushed during stop
         assert mock_conn.copy_records_to_table.call_count == 2
+
+
+def _spilled(spill: SpillLog) -> list:
+    spill.seal()
+    return [b for p in spill.sealed_segments() for b in SpillLog.read_segment(p)]
+
+
+class TestSpill:
+    @pytest.mark.asyncio
+    async def test_spills_when_no_pool(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        bw = BatchWriter(mock_db, spill=spill)
+        bw.enqueue_tick(_make_trade())
+        bw.enqueue_foreign(_make_foreign())
+        await bw._flush_all()
+
+        batches = {table: rows for table, _, rows in _spilled(spill)}
+        assert set(batches) == {"tick_data", "foreign_flow"}
+        assert batches["tick_data"][0][0] == "VNM"
+
+    @pytest.mark.asyncio
+    async def test_spills_on_copy_failure(self, mock_db, tmp_path):
+        mock_conn = AsyncMock()
+        mock_conn.copy_records_to_table.side_effect = RuntimeError("timeout")
+        mock_db.pool = _mock_pool(mock_conn)
+        spill = SpillLog(tmp_path)
+        bw = BatchWriter(mock_db, spill=spill)
+        bw.enqueue_basis(_make_basis())
+        await bw._flush_basis()
+
+        ((table, columns, rows),) = _spilled(spill)
+        assert table == "derivatives"
+        assert columns[0] == "contract"
+        assert rows[0][0] == "VN30F2603"
+
+    def test_full_queue_spills_instead_of_dropping(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        bw = BatchWriter(mock_db, spill=spill)
+        for _ in range(MAX_QUEUE_SIZE + 1):
+            bw.enqueue_index(_make_index())
+
+        assert bw._index_queue.qsize() == 1
+        ((table, _, rows),) = _spilled(spill)
+        assert table == "index_snapshots"
+        assert len(rows) == MAX_QUEUE_SIZE
+
+    def test_full_tick_buffer_spills(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        bw = BatchWriter(mock_db, spill=spill)
+        for _ in range(MAX_QUEUE_SIZE + 1):
+            bw.enqueue_tick(_make_trade())
+
+        assert len(bw.tick_buffer) == 1
+        ((table, _, rows),) = _spilled(spill)
+        assert table == "tick_data"
+        assert len(rows) == MAX_QUEUE_SIZE
+
+
+class TestReplay:
+    @staticmethod
+    def _healthy(mock_db, conn) -> None:
+        mock_db.pool = _mock_pool(conn)
+        mock_db.health_check = AsyncMock(return_value=True)
+        conn.transaction = MagicMock()
+        conn.transaction.return_value.__aenter__ = AsyncMock(return_value=None)
+        conn.transaction.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    @pytest.mark.asyncio
+    async def test_replays_and_removes_segments(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        bw = BatchWriter(mock_db, spill=spill)
+        bw.enqueue_tick(_make_trade())
+        bw.enqueue_foreign(_make_foreign())
+        await bw._flush_all()  # no pool → spilled
+
+        mock_conn = AsyncMock()
+        self._healthy(mock_db, mock_conn)
+        assert await bw.replay_spill() == 2
+
+        tables = [c[0][0] for c in mock_conn.copy_records_to_table.call_args_list]
+        assert sorted(tables) == ["foreign_flow", "tick_data"]
+        mock_conn.transaction.assert_called_once()
+        assert not spill.has_pending()
+
+    @pytest.mark.asyncio
+    async def test_replay_reports_replayed_tables(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        spill.append("derivatives", ["contract"], [("VN30F2603",)])
+        bw = BatchWriter(mock_db, spill=spill)
+        on_flush = MagicMock()
+        bw.set_flush_callback(on_flush)
+        self._healthy(mock_db, AsyncMock())
+        await bw.replay_spill()
+        on_flush.assert_called_once_with("derivatives", True)
+
+    @pytest.mark.asyncio
+    async def test_legacy_tick_rows_reencoded(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        ts = datetime(2026, 2, 9, 2, 15, tzinfo=timezone.utc)
+        spill.append("tick_data", TICK_COLUMNS, [("VNM", ts, 80.5, 100, "mua_chu_dong", 80.0, 80.5)])
+        bw = BatchWriter(mock_db, spill=spill)
+        mock_conn = AsyncMock()
+        self._healthy(mock_db, mock_conn)
+        await bw.replay_spill()
+        records = mock_conn.copy_records_to_table.call_args[1]["records"]
+        assert list(records) == [("VNM", ts, 8050, 100, 1, 8000, 8050)]
+
+    @pytest.mark.asyncio
+    async def test_reconnects_pool(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        spill.append("derivatives", ["contract"], [("VN30F2603",)])
+        bw = BatchWriter(mock_db, spill=spill)
+        mock_conn = AsyncMock()
+
+        async def connect():
+            self._healthy(mock_db, mock_conn)
+
+        mock_db.connect = AsyncMock(side_effect=connect)
+        assert await bw.replay_spill() == 1
+        mock_db.connect.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_failed_replay_keeps_segment(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        spill.append("derivatives", ["contract"], [("VN30F2603",)])
+        bw = BatchWriter(mock_db, spill=spill)
+        mock_conn = AsyncMock()
+        self._healthy(mock_db, mock_conn)
+        mock_conn.copy_records_to_table.side_effect = RuntimeError("constraint")
+
+        assert await bw.replay_spill() == 0
+        assert len(spill.sealed_segments()) == 1
+
+    @pytest.mark.asyncio
+    async def test_failing_segment_set_aside_and_later_ones_replay(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        spill.append("derivatives", ["contract"], [("BAD",)])
+        spill.seal()
+        spill.append("derivatives", ["contract"], [("VN30F2603",)])
+        bw = BatchWriter(mock_db, spill=spill)
+        mock_conn = AsyncMock()
+        self._healthy(mock_db, mock_conn)
+
+        async def copy(table, columns, records):
+            if records[0][0] == "BAD":
+                raise RuntimeError("constraint")
+        mock_conn.copy_records_to_table.side_effect = copy
+
+        assert await bw.replay_spill() == 1  # the later segment is not blocked
+        for _ in range(REPLAY_ATTEMPTS - 1):
+            assert await bw.replay_spill() == 0
+        assert not spill.has_pending()
+        assert [p.name for p in tmp_path.iterdir()] == ["000000000001.failed"]
+
+    @pytest.mark.asyncio
+    async def test_outage_during_replay_does_not_count_against_segment(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        spill.append("derivatives", ["contract"], [("VN30F2603",)])
+        bw = BatchWriter(mock_db, spill=spill)
+        mock_conn = AsyncMock()
+        self._healthy(mock_db, mock_conn)
+        mock_conn.copy_records_to_table.side_effect = ConnectionError("reset")
+        mock_db.health_check = AsyncMock(side_effect=[True, False] * REPLAY_ATTEMPTS)
+
+        for _ in range(REPLAY_ATTEMPTS):
+            assert await bw.replay_spill() == 0
+        assert len(spill.sealed_segments()) == 1
+
+    @pytest.mark.asyncio
+    async def test_unreadable_segment_set_aside_not_deleted(self, mock_db, tmp_path):
+        (tmp_path / "000000000001.seg").write_bytes(b"NOPE" + b"\0" * 64)
+        spill = SpillLog(tmp_path)
+        spill.append("derivatives", ["contract"], [("VN30F2603",)])
+        bw = BatchWriter(mock_db, spill=spill)
+        self._healthy(mock_db, AsyncMock())
+
+        assert await bw.replay_spill() == 1
+        assert (tmp_path / "000000000001.failed").read_bytes().startswith(b"NOPE")
+
+    @pytest.mark.asyncio
+    async def test_db_still_down_is_noop(self, mock_db, tmp_path):
+        spill = SpillLog(tmp_path)
+        spill.append("derivatives", ["contract"], [("VN30F2603",)])
+        bw = BatchWriter(mock_db, spill=spill)
+        mock_db.connect = AsyncMock(side_effect=OSError("refused"))
+
+        assert await bw.replay_spill() == 0
+        assert spill.has_pending()
@@ -1,12 +1,14 @@
 """Tests for WebSocket ConnectionManager."""
 
 import asyncio
+import json
 
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from starlette.websockets import WebSocketState
 
-from app.websocket.connection_manager import ConnectionManager
+from app.websocket.connection_manager import KIND_STATUS, ConnectionManager
+from app.websocket.encoding import Encoding
 
 
 @pytest.fixture
@@ -20,6 +22,7 @@ def _mock_ws():
     ws.client_state = WebSocketState.CONNECTED
     ws.accept = AsyncMock()
     ws.send_text = AsyncMock()
+    ws.send_bytes = AsyncMock()
     ws.close = AsyncMock()
     return ws
 
@@ -105,6 +108,7 @@ class TestBroadcast:
         """When queue is full, oldest message is dropped."""
         with patch("app.websocket.connection_manager.settings") as mock_settings:
             mock_settings.ws_queue_size = 2
+            mock_settings.ws_slow_client_disconnect_s = 30.0
             mgr = ConnectionManager()
             ws = _mock_ws()
             # Block sender so queue fills up
@@ -120,6 +124,298 @@ class TestBroadcast:
             await mgr.disconnect_all()
 
 
+class TestEncodings:
+    @pytest.mark.asyncio
+    async def test_encoded_once_per_encoding(self, manager):
+        msgpack_clients = [_mock_ws() for _ in range(3)]
+        json_client = _mock_ws()
+        for ws in msgpack_clients:
+            await manager.connect(ws, Encoding("msgpack"))
+        await manager.connect(json_client)
+        with patch("app.websocket.encoding.json.loads", wraps=json.loads) as loads:
+            manager.broadcast('{"n": 1}')
+        assert loads.call_count == 1
+        await asyncio.sleep(0.05)
+        payloads = {ws.send_bytes.await_args.args[0] for ws in msgpack_clients}
+        assert payloads == {b"\x81\xa1n\x01"}
+        json_client.send_text.assert_awaited_with('{"n": 1}')
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_send_to_uses_client_encoding(self, manager):
+        ws = _mock_ws()
+        await manager.connect(ws, Encoding("json", deflate=True))
+        manager.send_to(ws, '{"backfill": 1}')
+        await asyncio.sleep(0.05)
+        ws.send_text.assert_not_awaited()
+        ws.send_bytes.assert_awaited_once()
+        await manager.disconnect_all()
+
+
+def _blocked_ws():
+    """Client whose first send never completes (a laggard)."""
+    ws = _mock_ws()
+    ws.send_text = AsyncMock(side_effect=asyncio.Event().wait)
+    return ws
+
+
+class TestLatestOnly:
+    @pytest.mark.asyncio
+    async def test_newer_state_replaces_pending(self):
+        mgr = ConnectionManager(latest_only=True)
+        ws = _blocked_ws()
+        await mgr.connect(ws)
+        mgr.broadcast("s1")
+        await asyncio.sleep(0)  # sender takes s1 and blocks sending it
+        for i in range(2, 60):
+            mgr.broadcast(f"s{i}")
+        outbox = mgr._clients[ws].outbox
+        assert len(outbox) == 1
+        assert outbox.pop() == "s59"
+        await mgr.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_status_kept_alongside_state(self):
+        mgr = ConnectionManager(latest_only=True)
+        ws = _blocked_ws()
+        await mgr.connect(ws)
+        mgr.broadcast("s1")
+        await asyncio.sleep(0)
+        mgr.broadcast("s2")
+        mgr.broadcast("down", kind=KIND_STATUS)
+        mgr.broadcast("s3")
+        outbox = mgr._clients[ws].outbox
+        assert [outbox.pop(), outbox.pop()] == ["s3", "down"]
+        await mgr.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_resync_replaces_pending_delta(self):
+        resync = MagicMock(return_value="keyframe")
+        mgr = ConnectionManager(latest_only=True, resync=resync)
+        laggards = [_blocked_ws() for _ in range(3)]
+        for ws in laggards:
+            await mgr.connect(ws)
+        mgr.broadcast("d1")
+        await asyncio.sleep(0)  # in flight; outboxes now empty
+        mgr.broadcast("d2")  # nothing pending: delta queued as-is
+        resync.assert_not_called()
+        mgr.broadcast("d3")  # d2 still pending: replaced by a keyframe
+        assert resync.call_count == 1  # built once for all laggards
+        assert [mgr._clients[ws].outbox.pop() for ws in laggards] == ["keyframe"] * 3
+        await mgr.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_fifo_by_default(self):
+        with patch("app.websocket.connection_manager.settings") as mock_settings:
+            mock_settings.ws_queue_size = 50
+            mgr = ConnectionManager()
+            ws = _blocked_ws()
+            await mgr.connect(ws)
+        for i in range(5):
+            mgr.broadcast(f"a{i}")
+        await asyncio.sleep(0)
+        assert len(mgr._clients[ws].outbox) == 4  # a0 in flight
+        await mgr.disconnect_all()
+
+
+class _Transport:
+    def __init__(self):
+        self.frames: list[bytes] = []
+        self.aborted = False
+
+    def write(self, data: bytes) -> None:
+        self.frames.append(data)
+
+    def is_closing(self) -> bool:
+        return self.aborted
+
+    def abort(self) -> None:
+        self.aborted = True
+
+
+def _direct_client(mgr: ConnectionManager):
+    """Direct-send client on a fake transport; returns (ws, proto, client)."""
+    from app.websocket.connection_manager import _Client
+    from app.websocket.direct_send import DirectTransport
+    from app.websocket.encoding import JSON
+
+    proto = MagicMock()
+    proto.transport = _Transport()
+    proto.writable = asyncio.Event()
+    proto.writable.set()
+    proto.close_sent = proto.disconnected = False
+    ws = MagicMock()
+    client = _Client(JSON, mgr._new_outbox(), direct=DirectTransport(proto), sent_bytes=MagicMock())
+    mgr._clients[ws] = client
+    return ws, proto, client
+
+
+def _sent(proto) -> list[str]:
+    return [frame[2:].decode() for frame in proto.transport.frames]
+
+
+class TestSlowConsumers:
+    @pytest.mark.asyncio
+    async def test_overflow_and_replacement_counted(self):
+        fifo = ConnectionManager(channel="t-fifo")
+        latest = ConnectionManager(channel="t-latest", latest_only=True)
+        for mgr in (fifo, latest):
+            _, proto, _ = _direct_client(mgr)
+            proto.writable.clear()
+            for i in range(60):
+                mgr.broadcast(f'"{i}"')
+        assert fifo._overflowed._value.get() == 10  # ws_queue_size 50
+        assert latest._replaced._value.get() == 59
+
+    @pytest.mark.asyncio
+    async def test_lagging_snapshot_client_downgraded(self):
+        mgr = ConnectionManager(channel="t-downgrade", latest_only=True)
+        _, proto, client = _direct_client(mgr)
+        proto.writable.clear()
+        mgr.broadcast('"s1"')
+        client.backlog_since -= 5  # held for 5s
+        mgr.broadcast('"s2"')
+        assert client.interval == 2.0
+        proto.writable.set()
+        mgr.broadcast('"s3"')
+        assert _sent(proto) == ['"s3"']
+
+    @pytest.mark.asyncio
+    async def test_event_channel_never_downgraded(self):
+        mgr = ConnectionManager(channel="t-events")
+        _, proto, client = _direct_client(mgr)
+        proto.writable.clear()
+        mgr.broadcast('"a"')
+        client.backlog_since -= 5
+        mgr.broadcast('"b"')
+        assert client.interval == 0
+
+    @pytest.mark.asyncio
+    async def test_downgraded_client_gets_latest_state_per_interval(self):
+        mgr = ConnectionManager(channel="t-interval", latest_only=True)
+        _, proto, client = _direct_client(mgr)
+        client.interval = 0.05
+        mgr.broadcast('"s1"')
+        mgr.broadcast('"s2"')
+        mgr.broadcast('"s3"')
+        assert _sent(proto) == ['"s1"']
+        await asyncio.sleep(0.08)
+        assert _sent(proto) == ['"s1"', '"s3"']
+
+    @pytest.mark.asyncio
+    async def test_recovers_after_prompt_drains(self):
+        mgr = ConnectionManager(channel="t-recover", latest_only=True)
+        _, _, client = _direct_client(mgr)
+        client.interval = 2.0
+        now = 100.0
+        for _ in range(20):
+            client.backlog_since = now - 2.1
+            mgr._drained(client, now)
+        assert client.interval == 0
+
+    @pytest.mark.asyncio
+    async def test_far_behind_client_disconnected(self):
+        mgr = ConnectionManager(channel="t-evict")
+        ws, proto, client = _direct_client(mgr)
+        proto.writable.clear()
+        mgr.broadcast('"a"')
+        client.backlog_since -= 60
+        mgr.broadcast('"b"')
+        mgr.broadcast('"c"')
+        assert proto.transport.aborted
+        await asyncio.sleep(0)
+        assert mgr.client_count == 0
+        assert len(client.outbox) == 1  # nothing queued after the eviction
+
+    @pytest.mark.asyncio
+    async def test_downgraded_queued_sender_pauses(self):
+        mgr = ConnectionManager(channel="t-queued", latest_only=True)
+        ws = _mock_ws()
+        await mgr.connect(ws)
+        mgr._clients[ws].interval = 0.05
+        mgr.broadcast("s1")
+        await asyncio.sleep(0.01)
+        mgr.broadcast("s2")
+        mgr.broadcast("s3")
+        await asyncio.sleep(0.01)
+        assert [c.args[0] for c in ws.send_text.await_args_list] == ["s1"]
+        await asyncio.sleep(0.08)
+        assert [c.args[0] for c in ws.send_text.await_args_list] == ["s1", "s3"]
+        await mgr.disconnect_all()
+
+
+class TestTopics:
+    @pytest.mark.asyncio
+    async def test_broadcast_targets(self, manager):
+        plain, a1, a2, b = (_mock_ws() for _ in range(4))
+        for ws in (plain, a1, a2, b):
+            await manager.connect(ws)
+        manager.set_topic(a1, "a")
+        manager.set_topic(a2, "a")
+        manager.set_topic(b, "b")
+        manager.broadcast("to-a", topic="a")
+        manager.broadcast("untopiced", topic=None)
+        manager.broadcast("all")
+        await asyncio.sleep(0.05)
+        sent = {ws: [c.args[0] for c in ws.send_text.await_args_list] for ws in (plain, a1, a2, b)}
+        assert sent[plain] == ["untopiced", "all"]
+        assert sent[a1] == sent[a2] == ["to-a", "all"]
+        assert sent[b] == ["all"]
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_topic_removed_with_last_member(self, manager):
+        ws1, ws2 = _mock_ws(), _mock_ws()
+        await manager.connect(ws1)
+        await manager.connect(ws2)
+        manager.set_topic(ws1, "a")
+        manager.set_topic(ws2, "a")
+        manager.set_topic(ws1, None)
+        assert manager.has_topic("a")
+        await manager.disconnect(ws2)
+        assert not manager.has_topic("a")
+
+    @pytest.mark.asyncio
+    async def test_set_topic_unknown_client(self, manager):
+        assert manager.set_topic(_mock_ws(), "a") is False
+        assert not manager.has_topic("a")
+
+    @pytest.mark.asyncio
+    async def test_resync_built_per_topic(self):
+        resync = MagicMock(side_effect=lambda topic: f"keyframe-{topic}")
+        mgr = ConnectionManager(latest_only=True, resync=resync)
+        plain, grouped = _blocked_ws(), _blocked_ws()
+        await mgr.connect(plain)
+        await mgr.connect(grouped)
+        mgr.set_topic(grouped, "vnm")
+        for topic in (None, "vnm"):
+            mgr.broadcast("d1", topic=topic)
+        await asyncio.sleep(0)
+        for topic in (None, "vnm"):
+            mgr.broadcast("d2", topic=topic)
+            mgr.broadcast("d3", topic=topic)
+        assert mgr._clients[plain].outbox.pop() == "keyframe-None"
+        assert mgr._clients[grouped].outbox.pop() == "keyframe-vnm"
+        await mgr.disconnect_all()
+
+
+class TestSendTo:
+    @pytest.mark.asyncio
+    async def test_send_to_single_client(self, manager):
+        ws1, ws2 = _mock_ws(), _mock_ws()
+        await manager.connect(ws1)
+        await manager.connect(ws2)
+        manager.send_to(ws1, '{"backfill": 1}')
+        await asyncio.sleep(0.05)
+        ws1.send_text.assert_awaited_with('{"backfill": 1}')
+        ws2.send_text.assert_not_awaited()
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_send_to_unknown_client_is_noop(self, manager):
+        manager.send_to(_mock_ws(), '{"data": 1}')
+
+
 class TestDisconnectAll:
     @pytest.mark.asyncio
     async def test_disconnect_all_clears(self, manager):
@@ -1,6 +1,7 @@
 """Tests for WebSocket DataPublisher — event-driven throttle broadcasting."""
 
 import asyncio
+import itertools
 import json
 import time
 
@@ -8,6 +9,8 @@ import pytest
 import pytest_asyncio
 from unittest.mock import MagicMock, patch
 
+from app.services.snapshot_cache import SnapshotCache
+from app.websocket.connection_manager import KIND_STATUS
 from app.websocket.data_publisher import DataPublisher, CH_MARKET, CH_FOREIGN, CH_INDEX
 
 
@@ -20,10 +23,17 @@ def _mock_manager(client_count=1):
 
 
 def _mock_processor():
-    """Create mock MarketDataProcessor with serializable returns."""
+    """Create mock MarketDataProcessor with serializable returns.
+
+    Each market snapshot reports a new VNM volume so consecutive states differ.
+    """
     proc = MagicMock()
+    proc.snapshot_cache = SnapshotCache()
     snapshot = MagicMock()
-    snapshot.model_dump_json.return_value = '{"quotes":{}}'
+    counter = itertools.count(1)
+    snapshot.model_dump.side_effect = lambda **_kw: {
+        "quotes": {"VNM": {"total_volume": next(counter)}},
+    }
     proc.get_market_snapshot.return_value = snapshot
 
     summary = MagicMock()
@@ -36,6 +46,12 @@ def _mock_processor():
     return proc
 
 
+def _notify_changed(pub, channel):
+    """Mimic MarketDataProcessor._notify: bump the channel version, then notify."""
+    pub._processor.snapshot_cache.mark_dirty(channel)
+    pub.notify(channel)
+
+
 @pytest_asyncio.fixture
 async def publisher():
     proc = _mock_processor()
@@ -85,11 +101,11 @@ class TestThrottle:
     @pytest.mark.asyncio
     async def test_second_notify_within_window_is_deferred(self, parts):
         """Second notification within throttle window should NOT broadcast immediately."""
-        parts["pub"].notify(CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
         assert parts["market"].broadcast.call_count == 1
 
         # Second notify within 500ms — should defer, not broadcast now
-        parts["pub"].notify(CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
         assert parts["market"].broadcast.call_count == 1
 
     @pytest.mark.asyncio
@@ -98,10 +114,10 @@ class TestThrottle:
         # Use short throttle for test speed
         parts["pub"]._throttle_s = 0.05
 
-        parts["pub"].notify(CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
         assert parts["market"].broadcast.call_count == 1
 
-        parts["pub"].notify(CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
         assert parts["market"].broadcast.call_count == 1
 
         # Wait for trailing edge to fire
@@ -114,10 +130,10 @@ class TestThrottle:
         parts["pub"]._throttle_s = 0.05
 
         # First fires immediately
-        parts["pub"].notify(CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
         # These should all coalesce into one deferred
         for _ in range(10):
-            parts["pub"].notify(CH_MARKET)
+            _notify_changed(parts["pub"], CH_MARKET)
 
         await asyncio.sleep(0.1)
         # 1 immediate + 1 deferred = 2 total
@@ -128,12 +144,12 @@ class TestThrottle:
         """Notify after throttle window passes should broadcast immediately."""
         parts["pub"]._throttle_s = 0.05
 
-        parts["pub"].notify(CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
         assert parts["market"].broadcast.call_count == 1
 
         await asyncio.sleep(0.1)  # wait for window to expire
 
-        parts["pub"].notify(CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
         assert parts["market"].broadcast.call_count == 2
 
 
@@ -177,15 +193,15 @@ class TestSSIStatus:
     async def test_on_ssi_disconnect_notifies_clients(self, parts):
         parts["pub"].on_ssi_disconnect()
         expected = json.dumps({"type": "status", "connected": False})
-        parts["market"].broadcast.assert_called_with(expected)
-        parts["foreign"].broadcast.assert_called_with(expected)
-        parts["index"].broadcast.assert_called_with(expected)
+        parts["market"].broadcast.assert_called_with(expected, kind=KIND_STATUS)
+        parts["foreign"].broadcast.assert_called_with(expected, kind=KIND_STATUS)
+        parts["index"].broadcast.assert_called_with(expected, kind=KIND_STATUS)
 
     @pytest.mark.asyncio
     async def test_on_ssi_reconnect_notifies_clients(self, parts):
         parts["pub"].on_ssi_reconnect()
         expected = json.dumps({"type": "status", "connected": True})
-        parts["market"].broadcast.assert_called_with(expected)
+        parts["market"].broadcast.assert_called_with(expected, kind=KIND_STATUS)
 
     @pytest.mark.asyncio
     async def test_disconnect_skips_empty_channels(self):
@@ -225,3 +241,303 @@ class TestLifecycle:
         """Notify with unknown channel should not raise."""
         parts["pub"].notify("unknown_channel")
         # No broadcast, no error
+
+
+class TestSerializeOnce:
+    @pytest.mark.asyncio
+    async def test_unchanged_version_reuses_serialization(self, parts):
+        parts["pub"]._throttle_s = 0
+        parts["pub"].notify(CH_FOREIGN)
+        parts["pub"].notify(CH_FOREIGN)
+        assert parts["foreign"].broadcast.call_count == 2
+        parts["proc"].get_foreign_summary.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_dirty_version_reserializes(self, parts):
+        parts["pub"]._throttle_s = 0
+        parts["pub"].notify(CH_FOREIGN)
+        parts["proc"].snapshot_cache.mark_dirty("foreign")
+        parts["pub"].notify(CH_FOREIGN)
+        assert parts["proc"].get_foreign_summary.call_count == 2
+
+
+class TestScalarPayloads:
+    @pytest.mark.asyncio
+    async def test_index_payload_excludes_intraday(self):
+        from app.models.ssi_messages import SSIIndexMessage
+        from app.services.index_tracker import IndexTracker
+
+        proc = _mock_processor()
+        proc.index_tracker = IndexTracker()
+        proc.index_tracker.update(SSIIndexMessage(index_id="VN30", index_value=1250.0))
+        index = _mock_manager()
+        pub = DataPublisher(proc, _mock_manager(), _mock_manager(), index)
+        pub.start()
+
+        pub.notify(CH_INDEX)
+        payload = json.loads(index.broadcast.call_args[0][0])
+        assert payload["VN30"]["value"] == 1250.0
+        assert payload["VN30"]["intraday_cursor"] == 1
+        assert "intraday" not in payload["VN30"]
+        pub.stop()
+
+    @pytest.mark.asyncio
+    async def test_market_payload_excludes_intraday(self):
+        from app.models.domain import IndexData, MarketSnapshot
+
+        proc = _mock_processor()
+        proc.get_market_snapshot.return_value = MarketSnapshot(
+            indices={"VN30": IndexData(index_id="VN30", value=1250.0)},
+        )
+        market = _mock_manager()
+        pub = DataPublisher(proc, market, _mock_manager(), _mock_manager())
+        pub.start()
+
+        pub.notify(CH_MARKET)
+        payload = json.loads(market.broadcast.call_args[0][0])
+        assert payload["indices"]["VN30"]["value"] == 1250.0
+        assert "intraday" not in payload["indices"]["VN30"]
+        pub.stop()
+
+
+class TestSparklineChannel:
+    @staticmethod
+    def _setup():
+        from app.services.index_tracker import IndexTracker
+
+        proc = _mock_processor()
+        proc.index_tracker = IndexTracker()
+        sparkline = _mock_manager()
+        pub = DataPublisher(
+            proc, _mock_manager(), _mock_manager(), _mock_manager(),
+            sparkline_mgr=sparkline,
+        )
+        pub._throttle_s = 0
+        pub.start()
+        return pub, proc.index_tracker, sparkline
+
+    @staticmethod
+    def _update(tracker, value, index_id="VN30"):
+        from app.models.ssi_messages import SSIIndexMessage
+
+        tracker.update(SSIIndexMessage(index_id=index_id, index_value=value))
+
+    @pytest.mark.asyncio
+    async def test_index_notify_sends_delta(self):
+        pub, tracker, sparkline = self._setup()
+        self._update(tracker, 1250.0)
+        pub.notify(CH_INDEX)
+        frame = json.loads(sparkline.broadcast.call_args[0][0])
+        assert frame["type"] == "sparkline"
+        entry = frame["indices"]["VN30"]
+        assert entry["from"] == 0
+        assert entry["seq"] == 1
+        assert entry["v"] == [1250.0]
+        pub.stop()
+
+    @pytest.mark.asyncio
+    async def test_delta_only_contains_new_points(self):
+        pub, tracker, sparkline = self._setup()
+        self._update(tracker, 1250.0)
+        pub.notify(CH_INDEX)
+        self._update(tracker, 1251.0)
+        self._update(tracker, 1252.0)
+        pub.notify(CH_INDEX)
+        entry = json.loads(sparkline.broadcast.call_args[0][0])["indices"]["VN30"]
+        assert entry["from"] == 1
+        assert entry["seq"] == 3
+        assert entry["v"] == [1251.0, 1252.0]
+        pub.stop()
+
+    @pytest.mark.asyncio
+    async def test_no_new_points_skips_broadcast(self):
+        pub, tracker, sparkline = self._setup()
+        self._update(tracker, 1250.0)
+        pub.notify(CH_INDEX)
+        pub.notify(CH_INDEX)
+        assert sparkline.broadcast.call_count == 1
+        pub.stop()
+
+    @pytest.mark.asyncio
+    async def test_session_reset_flagged(self):
+        pub, tracker, sparkline = self._setup()
+        self._update(tracker, 1250.0)
+        self._update(tracker, 1251.0)
+        pub.notify(CH_INDEX)
+        tracker.reset()
+        self._update(tracker, 1300.0)
+        pub.notify(CH_INDEX)
+        entry = json.loads(sparkline.broadcast.call_args[0][0])["indices"]["VN30"]
+        assert entry["reset"] is True
+        assert entry["from"] == 0
+        assert entry["v"] == [1300.0]
+        pub.stop()
+
+    def test_backfill_contains_full_history(self):
+        from app.services.index_tracker import IndexTracker
+        from app.websocket.data_publisher import build_sparkline_backfill
+
+        tracker = IndexTracker()
+        self._update(tracker, 1250.0)
+        self._update(tracker, 1251.0)
+        self._update(tracker, 1300.0, index_id="VNINDEX")
+        frame = json.loads(build_sparkline_backfill(tracker))
+        assert frame["type"] == "sparkline_backfill"
+        assert frame["indices"]["VN30"]["v"] == [1250.0, 1251.0]
+        assert frame["indices"]["VN30"]["seq"] == 2
+        assert frame["indices"]["VNINDEX"]["v"] == [1300.0]
+
+
+class TestMarketDeltaProtocol:
+    @pytest.mark.asyncio
+    async def test_first_frame_is_keyframe(self, parts):
+        parts["pub"].notify(CH_MARKET)
+        frame = json.loads(parts["market"].broadcast.call_args[0][0])
+        assert frame["type"] == "keyframe"
+        assert frame["seq"] == 1
+        assert "quotes" in frame
+
+    @pytest.mark.asyncio
+    async def test_following_frame_is_delta(self, parts):
+        parts["pub"]._throttle_s = 0
+        _notify_changed(parts["pub"], CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
+        frame = json.loads(parts["market"].broadcast.call_args[0][0])
+        assert frame["type"] == "delta"
+        assert frame["seq"] == 2
+        assert frame["base"] == 1
+        assert frame["quotes"] == {"VNM": {"total_volume": 2}}
+
+    @pytest.mark.asyncio
+    async def test_unchanged_version_skips_broadcast(self, parts):
+        parts["pub"]._throttle_s = 0
+        parts["pub"].notify(CH_MARKET)
+        parts["pub"].notify(CH_MARKET)
+        assert parts["market"].broadcast.call_count == 1
+        parts["proc"].get_market_snapshot.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_keyframe_after_interval(self, parts):
+        parts["pub"]._throttle_s = 0
+        parts["pub"]._keyframe_s = 0
+        _notify_changed(parts["pub"], CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
+        frame = json.loads(parts["market"].broadcast.call_args[0][0])
+        assert frame["type"] == "keyframe"
+        assert frame["seq"] == 2
+
+    @pytest.mark.asyncio
+    async def test_connect_keyframe_matches_last_seq(self, parts):
+        parts["pub"]._throttle_s = 0
+        _notify_changed(parts["pub"], CH_MARKET)
+        _notify_changed(parts["pub"], CH_MARKET)
+        frame = json.loads(parts["pub"].market_keyframe())
+        assert frame["type"] == "keyframe"
+        assert frame["seq"] == 2
+        assert frame["quotes"] == {"VNM": {"total_volume": 2}}
+
+    @pytest.mark.asyncio
+    async def test_keyframe_shares_rest_snapshot_body(self, parts):
+        from app.routers.market_router import rest_frame
+
+        parts["pub"].notify(CH_MARKET)
+        keyframe = json.loads(parts["market"].broadcast.call_args[0][0])
+        rest = json.loads(rest_frame(parts["proc"], "snapshot").text)
+        parts["proc"].get_market_snapshot.assert_called_once()
+        assert keyframe == {"type": "keyframe", "seq": 1, **rest}
+
+    @pytest.mark.asyncio
+    async def test_connect_keyframe_before_any_broadcast(self, parts):
+        frame = json.loads(parts["pub"].market_keyframe())
+        assert frame["seq"] == 1
+        _notify_changed(parts["pub"], CH_MARKET)
+        delta = json.loads(parts["market"].broadcast.call_args[0][0])
+        assert delta["base"] == 1
+
+    @pytest.mark.asyncio
+    async def test_connect_keyframe_after_change_without_audience(self, parts):
+        pub = parts["pub"]
+        pub._throttle_s = 0
+        _notify_changed(pub, CH_MARKET)
+        parts["market"].client_count = 0  # last client left
+        _notify_changed(pub, CH_MARKET)  # skipped: nobody to send to
+        parts["market"].client_count = 1
+        frame = json.loads(pub.market_keyframe())
+        assert frame["seq"] == 2
+        assert frame["quotes"] == {"VNM": {"total_volume": 2}}
+        _notify_changed(pub, CH_MARKET)
+        delta = json.loads(parts["market"].broadcast.call_args[0][0])
+        assert delta["base"] == 2
+
+    @pytest.mark.asyncio
+    async def test_connect_keyframe_leaves_pending_change_to_broadcast(self, parts):
+        pub = parts["pub"]
+        _notify_changed(pub, CH_MARKET)
+        _notify_changed(pub, CH_MARKET)  # within the throttle window: deferred
+        assert CH_MARKET in pub._pending
+        assert json.loads(pub.market_keyframe())["seq"] == 1
+
+    @pytest.mark.asyncio
+    async def test_filtered_keyframe_after_change_without_audience(self, parts):
+        from app.websocket.market_subscriptions import MarketFilter
+
+        pub = parts["pub"]
+        pub._throttle_s = 0
+        _notify_changed(pub, CH_MARKET)
+        parts["market"].client_count = 0
+        _notify_changed(pub, CH_MARKET)
+        frame = json.loads(pub.market_keyframe(MarketFilter(symbols=frozenset({"VNM"}))))
+        assert frame["quotes"] == {"VNM": {"total_volume": 2}}
+
+
+class TestMarketSubscriptions:
+    @pytest.mark.asyncio
+    async def test_subscribed_client_gets_filtered_frames(self):
+        from app.websocket.connection_manager import ConnectionManager, _Client, _FifoOutbox
+        from app.websocket.encoding import JSON
+
+        market = ConnectionManager(channel="market")
+        plain, subscribed = MagicMock(), MagicMock()
+        for ws in (plain, subscribed):
+            market._clients[ws] = _Client(JSON, _FifoOutbox(50), wake=MagicMock())
+        pub = DataPublisher(_mock_processor(), market, _mock_manager(), _mock_manager())
+        pub.start()
+        pub._throttle_s = 0
+        pub.market_subscriptions.handle(
+            subscribed, '{"type": "subscribe", "symbols": ["FPT"], "channels": ["quotes"]}',
+        )
+        _notify_changed(pub, CH_MARKET)  # VNM changes only
+        pub.stop()
+
+        def frames(ws):
+            outbox = market._clients[ws].outbox
+            return [json.loads(outbox.pop()) for _ in range(len(outbox))]
+
+        assert frames(subscribed) == [{"type": "keyframe", "seq": 1, "quotes": {}}]
+        assert [f["type"] for f in frames(plain)] == ["delta"]
+
+
+class TestFrameSink:
+    @pytest.mark.asyncio
+    async def test_sink_receives_frames_without_local_clients(self):
+        pub = DataPublisher(
+            _mock_processor(), _mock_manager(0), _mock_manager(0), _mock_manager(0),
+        )
+        frames = []
+        pub.set_frame_sink(lambda ch, text, keyframe: frames.append((ch, keyframe)))
+        pub.start()
+        _notify_changed(pub, CH_FOREIGN)
+        _notify_changed(pub, CH_MARKET)
+        pub._processor.snapshot_cache.mark_dirty(CH_MARKET)
+        pub._do_broadcast(CH_MARKET)  # skip the throttle window
+        pub.stop()
+
+        assert frames == [(CH_FOREIGN, False), (CH_MARKET, True), (CH_MARKET, False)]
+        pub._managers[CH_MARKET].broadcast.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_status_goes_to_sink_for_every_channel(self, publisher):
+        frames = []
+        publisher.set_frame_sink(lambda ch, text, keyframe: frames.append(ch))
+        publisher.on_ssi_disconnect()
+        assert sorted(frames) == sorted([CH_MARKET, CH_FOREIGN, CH_INDEX])
@@ -0,0 +1,270 @@
+"""Tests for direct frame writes to uvicorn WebSocket transports."""
+
+import asyncio
+import socket
+import time
+from unittest.mock import MagicMock, patch
+
+import msgpack
+import pytest
+import pytest_asyncio
+import uvicorn
+from fastapi import FastAPI, WebSocket
+from websockets.asyncio.client import connect
+
+from app.metrics import ws_send_path_total
+from app.websocket.connection_manager import ConnectionManager, _Client
+from app.websocket.direct_send import build_frame
+from app.websocket.encoding import JSON
+from app.websocket.router import _rate_limiter, _ws_lifecycle
+
+
+class TestBuildFrame:
+    def test_short_text(self):
+        assert build_frame(b"hi", binary=False) == b"\x81\x02hi"
+
+    def test_binary_opcode(self):
+        assert build_frame(b"\x00", binary=True) == b"\x82\x01\x00"
+
+    def test_16_bit_length(self):
+        frame = build_frame(b"x" * 126, binary=False)
+        assert frame[:4] == b"\x81\x7e\x00\x7e"
+        assert len(frame) == 4 + 126
+
+    def test_64_bit_length(self):
+        frame = build_frame(b"x" * 70_000, binary=True)
+        assert frame[:2] == b"\x82\x7f"
+        assert int.from_bytes(frame[2:10], "big") == 70_000
+
+
+class _FakeTransport:
+    def __init__(self):
+        self.frames: list[bytes] = []
+        self.closing = False
+
+    def write(self, data: bytes) -> None:
+        self.frames.append(data)
+
+    def is_closing(self) -> bool:
+        return self.closing
+
+
+class TestBacklog:
+    def _direct_client(self, manager: ConnectionManager):
+        from app.websocket.direct_send import DirectTransport
+
+        proto = MagicMock()
+        proto.transport = _FakeTransport()
+        proto.writable = asyncio.Event()
+        proto.writable.set()
+        proto.close_sent = proto.disconnected = False
+        client = _Client(
+            JSON, manager._new_outbox(), direct=DirectTransport(proto), sent_bytes=MagicMock(),
+        )
+        manager._clients[MagicMock()] = client
+        return proto, client
+
+    def test_writes_immediately_when_writable(self):
+        manager = ConnectionManager()
+        proto, _ = self._direct_client(manager)
+        manager.broadcast('{"a": 1}')
+        assert proto.transport.frames == [build_frame(b'{"a": 1}', binary=False)]
+
+    def test_same_frame_object_for_every_client(self):
+        manager = ConnectionManager()
+        first, _ = self._direct_client(manager)
+        second, _ = self._direct_client(manager)
+        manager.broadcast('{"a": 1}')
+        assert first.transport.frames[0] is second.transport.frames[0]
+
+    @pytest.mark.asyncio
+    async def test_holds_frames_until_writable_then_flushes_in_order(self):
+        manager = ConnectionManager()
+        proto, client = self._direct_client(manager)
+        proto.writable.clear()
+        manager.broadcast('"1"')
+        manager.broadcast('"2"')
+        assert proto.transport.frames == []
+        assert len(client.outbox) == 2
+        proto.writable.set()
+        manager.broadcast('"3"')
+        assert [f[2:] for f in proto.transport.frames] == [b'"1"', b'"2"', b'"3"']
+        assert not client.outbox
+
+    @pytest.mark.asyncio
+    async def test_backlog_drops_oldest(self):
+        with patch("app.websocket.connection_manager.settings") as s:
+            s.ws_queue_size = 2
+            manager = ConnectionManager()
+            proto, client = self._direct_client(manager)
+        proto.writable.clear()
+        for i in range(4):
+            manager.broadcast(f'"{i}"')
+        assert [client.outbox.pop()[2:] for _ in range(2)] == [b'"2"', b'"3"']
+
+    @pytest.mark.asyncio
+    async def test_backlog_flushed_when_writable_without_next_broadcast(self):
+        manager = ConnectionManager()
+        proto, client = self._direct_client(manager)
+        proto.writable.clear()
+        manager.broadcast('"alert"')
+        await asyncio.sleep(0)
+        assert proto.transport.frames == []
+        proto.writable.set()  # transport drained
+        await asyncio.sleep(0)
+        assert [f[2:] for f in proto.transport.frames] == [b'"alert"']
+        assert not client.outbox and client.task is None
+
+    @pytest.mark.asyncio
+    async def test_resume_respects_downgrade_interval(self):
+        manager = ConnectionManager(latest_only=True)
+        proto, client = self._direct_client(manager)
+        client.interval = 0.05
+        proto.writable.clear()
+        manager.broadcast('"s1"')  # due now, but the transport is paused
+        assert client.task is not None
+        client.next_due = time.monotonic() + 0.05  # its turn moved on meanwhile
+        proto.writable.set()
+        await asyncio.sleep(0)
+        assert proto.transport.frames == []
+        await asyncio.sleep(0.08)
+        assert [f[2:] for f in proto.transport.frames] == [b'"s1"']
+
+    @pytest.mark.asyncio
+    async def test_resume_task_cancelled_on_disconnect(self):
+        manager = ConnectionManager()
+        proto, client = self._direct_client(manager)
+        proto.writable.clear()
+        manager.broadcast('"x"')
+        task = client.task
+        (ws,) = manager._clients
+        ws.client_state = None
+        await manager.disconnect(ws)
+        assert task.cancelled()
+
+    def test_closed_transport_skipped(self):
+        manager = ConnectionManager()
+        proto, client = self._direct_client(manager)
+        proto.transport.closing = True
+        manager.broadcast('"x"')
+        assert proto.transport.frames == [] and not client.outbox
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _serve(per_message_deflate: bool = True):
+    """Real uvicorn server (websockets sans-I/O protocol) with one /ws endpoint."""
+    manager = ConnectionManager(channel="test")
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def ws_endpoint(ws: WebSocket):
+        await _ws_lifecycle(ws, manager, initial=lambda: ['{"initial": true}'])
+
+    port = _free_port()
+    config = uvicorn.Config(
+        app, host="127.0.0.1", port=port, ws="websockets-sansio", log_level="warning",
+        ws_per_message_deflate=per_message_deflate,
+    )
+    srv = uvicorn.Server(config)
+    task = asyncio.create_task(srv.serve())
+    while not srv.started:
+        await asyncio.sleep(0.01)
+    _rate_limiter._connections.clear()
+    yield manager, f"ws://127.0.0.1:{port}/ws"
+    srv.should_exit = True
+    await task
+    _rate_limiter._connections.clear()
+
+
+@pytest_asyncio.fixture
+async def server():
+    async for value in _serve():
+        yield value
+
+
+@pytest_asyncio.fixture
+async def server_no_deflate():
+    """As deployed: uvicorn run with --ws-per-message-deflate false."""
+    async for value in _serve(per_message_deflate=False):
+        yield value
+
+
+def _path_count(path: str) -> float:
+    return ws_send_path_total.labels(channel="test", path=path)._value.get()
+
+
+async def _wait_for_clients(manager: ConnectionManager, n: int) -> None:
+    for _ in range(200):
+        if manager.client_count == n:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"expected {n} clients, have {manager.client_count}")
+
+
+class TestUvicorn:
+    @pytest.mark.asyncio
+    async def test_direct_path_without_deflate(self, server):
+        manager, url = server
+        async with connect(url, compression=None) as ws:
+            await _wait_for_clients(manager, 1)
+            (client,) = manager._clients.values()
+            assert client.direct is not None and client.task is None
+            assert await ws.recv() == '{"initial": true}'
+            manager.broadcast('{"quotes": {"VNM": 1}}')
+            assert await ws.recv() == '{"quotes": {"VNM": 1}}'
+            manager.broadcast("x" * 70_000)
+            assert await ws.recv() == "x" * 70_000
+
+    @pytest.mark.asyncio
+    async def test_direct_binary_encoding(self, server):
+        manager, url = server
+        async with connect(url + "?format=msgpack", compression=None) as ws:
+            await _wait_for_clients(manager, 1)
+            await ws.recv()  # initial
+            manager.broadcast('{"n": [1, 2]}')
+            assert msgpack.unpackb(await ws.recv()) == {"n": [1, 2]}
+
+    @pytest.mark.asyncio
+    async def test_permessage_deflate_uses_queue(self, server):
+        manager, url = server
+        async with connect(url) as ws:  # client offers permessage-deflate
+            await _wait_for_clients(manager, 1)
+            (client,) = manager._clients.values()
+            assert client.direct is None and client.task is not None
+            assert await ws.recv() == '{"initial": true}'
+            manager.broadcast('{"quotes": {}}')
+            assert await ws.recv() == '{"quotes": {}}'
+
+    @pytest.mark.asyncio
+    async def test_send_path_counted(self, server):
+        manager, url = server
+        direct, deflate = _path_count("direct"), _path_count("deflate")
+        async with connect(url, compression=None):
+            await _wait_for_clients(manager, 1)
+        async with connect(url):
+            await _wait_for_clients(manager, 1)
+        assert (_path_count("direct") - direct, _path_count("deflate") - deflate) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_deflate_disabled_server_puts_browsers_on_direct_path(self, server_no_deflate):
+        manager, url = server_no_deflate
+        async with connect(url) as ws:  # offers permessage-deflate, server declines
+            await _wait_for_clients(manager, 1)
+            (client,) = manager._clients.values()
+            assert client.direct is not None
+            assert await ws.recv() == '{"initial": true}'
+            manager.broadcast('{"quotes": {}}')
+            assert await ws.recv() == '{"quotes": {}}'
+
+    @pytest.mark.asyncio
+    async def test_disconnect_cleans_up(self, server):
+        manager, url = server
+        async with connect(url, compression=None):
+            await _wait_for_clients(manager, 1)
+        await _wait_for_clients(manager, 0)
+        manager.broadcast('"after"')  # no clients, no error
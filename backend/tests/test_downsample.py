@@ -0,0 +1,50 @@
+"""Tests for LTTB downsampling of history series."""
+
+import math
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from app.database.downsample import lttb
+
+
+def _series(n: int) -> list[dict]:
+    t0 = datetime(2026, 2, 9, 9, 15)
+    return [
+        {"timestamp": t0 + timedelta(seconds=i), "value": Decimal(str(round(math.sin(i / 50), 4)))}
+        for i in range(n)
+    ]
+
+
+class TestLttb:
+    def test_within_budget_unchanged(self):
+        rows = _series(10)
+        assert lttb(rows, 10) == rows
+        assert lttb(rows, 100) == rows
+
+    def test_budget_below_three_unchanged(self):
+        rows = _series(10)
+        assert lttb(rows, 2) == rows
+
+    def test_exact_point_count_with_endpoints(self):
+        rows = _series(5000)
+        out = lttb(rows, 300)
+        assert len(out) == 300
+        assert out[0] is rows[0] and out[-1] is rows[-1]
+
+    def test_rows_kept_in_order(self):
+        rows = _series(1000)
+        out = lttb(rows, 50)
+        stamps = [r["timestamp"] for r in out]
+        assert stamps == sorted(stamps) and len(set(stamps)) == 50
+
+    def test_keeps_spike(self):
+        rows = [{"timestamp": i, "price": 80.0} for i in range(1000)]
+        rows[437]["price"] = 95.0
+        out = lttb(rows, 20, y="price")
+        assert rows[437] in out
+
+    def test_keeps_extremes_of_oscillation(self):
+        rows = _series(3000)
+        out = lttb(rows, 200)
+        values = [float(r["value"]) for r in out]
+        assert max(values) > 0.99 and min(values) < -0.99
@@ -0,0 +1,281 @@
+"""Tests for ingest-leader → fan-out worker relay over the in-process StateBus."""
+
+import asyncio
+import json
+import uuid
+from unittest.mock import MagicMock
+
+import pytest
+import pytest_asyncio
+
+from app.analytics.alert_models import Alert, AlertSeverity, AlertType
+from app.analytics.alert_service import AlertService
+from app.models.ssi_messages import SSIIndexMessage, SSITradeMessage
+from app.routers.market_router import rest_frame
+from app.services.market_data_processor import MarketDataProcessor
+from app.services.index_tracker import _INTRADAY_MAXLEN
+from app.services.shm_state_bus import RING_BYTES, SLOT_BYTES, SharedMemoryStateBus
+from app.services.state_bus import InProcessStateBus
+from app.websocket.connection_manager import KIND_STATE, KIND_STATUS
+from app.websocket.data_publisher import build_sparkline_backfill
+from app.websocket.fanout import (
+    BACKFILL_KEY,
+    CH_SPARKLINE_BACKFILL,
+    KEYFRAME_KEY,
+    FanoutMirror,
+    FrameRelay,
+)
+
+
+def _keyframe(seq: int) -> str:
+    return json.dumps({"type": "keyframe", "seq": seq, "quotes": {}})
+
+
+def _delta(seq: int, base: int | None = None) -> str:
+    return json.dumps({"type": "delta", "seq": seq, "base": seq - 1 if base is None else base})
+
+
+def _manager(client_count: int = 1) -> MagicMock:
+    mgr = MagicMock()
+    mgr.client_count = client_count
+    return mgr
+
+
+@pytest.fixture
+def bus():
+    return InProcessStateBus()
+
+
+@pytest.fixture
+def managers():
+    return {ch: _manager() for ch in ("market", "foreign", "index", "alerts", "sparkline")}
+
+
+async def _drain(mirror_frames, mirror, count):
+    for _ in range(count):
+        channel, frame = await asyncio.wait_for(anext(mirror_frames), 1)
+        mirror.on_frame(channel, frame)
+
+
+class TestFrameRelay:
+    @pytest.mark.asyncio
+    async def test_frames_published_in_order_and_keyframe_stored(self, bus):
+        relay = FrameRelay(bus, MarketDataProcessor(), AlertService())
+        frames = await bus.subscribe()
+        relay.on_frame("market", _keyframe(1), keyframe=True)
+        relay.on_frame("market", _delta(2))
+        relay.on_frame("index", "{}")
+        await relay.flush()
+
+        received = [await anext(frames) for _ in range(3)]
+        assert [ch for ch, _ in received] == ["market", "market", "index"]
+        assert await bus.get(KEYFRAME_KEY) == _keyframe(1)
+
+    @pytest.mark.asyncio
+    async def test_alerts_relayed(self, bus):
+        relay = FrameRelay(bus, MarketDataProcessor(), AlertService())
+        frames = await bus.subscribe()
+        alert = Alert(alert_type=AlertType.VOLUME_SPIKE, severity=AlertSeverity.WARNING,
+                      symbol="VNM", message="spike")
+        relay.on_alert(alert)
+        await relay.flush()
+        channel, frame = await anext(frames)
+        assert channel == "alerts"
+        assert json.loads(frame)["id"] == alert.id
+
+    @pytest.mark.asyncio
+    async def test_rest_bodies_written_once_per_version(self, bus):
+        processor = MarketDataProcessor()
+        relay = FrameRelay(bus, processor, AlertService())
+        await relay.publish_state()
+        stored = await bus.get("rest:snapshot")
+        etag, _, body = stored.partition("\n")
+        frame = rest_frame(processor, "snapshot")
+        assert (etag, body) == (frame.etag, frame.text)
+
+        await bus.set("rest:snapshot", "sentinel")
+        await relay.publish_state()  # unchanged version → not rewritten
+        assert await bus.get("rest:snapshot") == "sentinel"
+
+        processor.snapshot_cache.mark_dirty("market")
+        await relay.publish_state()
+        assert await bus.get("rest:snapshot") != "sentinel"
+
+    @pytest.mark.asyncio
+    async def test_unchanged_rest_bodies_not_rebuilt(self, bus):
+        processor = MarketDataProcessor()
+        relay = FrameRelay(bus, processor, AlertService())
+        await relay.publish_state()
+        snapshot = processor.get_market_snapshot
+        processor.get_market_snapshot = MagicMock(wraps=snapshot)
+        processor.snapshot_cache._frames.clear()  # a rebuild would have to re-serialize
+        await relay.publish_state()
+        processor.get_market_snapshot.assert_not_called()
+
+        processor.snapshot_cache.mark_dirty("market")
+        await relay.publish_state()
+        processor.get_market_snapshot.assert_called_once()
+
+        processor = MarketDataProcessor()
+        processor.index_tracker.update(SSIIndexMessage(index_id="VN30", index_value=1250.0))
+        relay = FrameRelay(bus, processor, AlertService(), backfill_interval=60)
+        frames = await bus.subscribe()
+        await relay.publish_state()
+        await relay.flush()
+
+        channel, frame = await anext(frames)
+        assert channel == CH_SPARKLINE_BACKFILL
+        assert "VN30" in json.loads(frame)["indices"]
+        assert await bus.get(BACKFILL_KEY) == frame
+
+
+def _full_session(processor: MarketDataProcessor) -> None:
+    """Fill VN30 and VNINDEX sparklines to capacity (a whole trading session)."""
+    for i in range(_INTRADAY_MAXLEN):
+        for index_id in ("VN30", "VNINDEX"):
+            processor.index_tracker.update(
+                SSIIndexMessage(index_id=index_id, index_value=1250.0 + i * 0.01),
+            )
+
+
+@pytest.fixture(scope="module")
+def session_processor():
+    processor = MarketDataProcessor()
+    _full_session(processor)
+    return processor
+
+
+class TestSessionLengthState:
+    def test_fits_default_shm_limits(self, session_processor):
+        processor = session_processor
+        assert len(rest_frame(processor, "snapshot").body) < 64 * 1024  # scalar only
+        assert len(build_sparkline_backfill(processor.index_tracker).encode()) < min(
+            SLOT_BYTES, RING_BYTES // 4,
+        )
+
+    @pytest.mark.asyncio
+    async def test_oversized_value_skipped_others_stored(self, session_processor):
+        bus = SharedMemoryStateBus(
+            f"stb-test-{uuid.uuid4().hex[:12]}", owner=True, slot_bytes=64 * 1024, ring_bytes=8 << 20,
+        )
+        try:
+            relay = FrameRelay(bus, session_processor, AlertService(), backfill_interval=60)
+            frames = await bus.subscribe()
+            await relay.publish_state()
+            relay.on_frame("market", _keyframe(1), keyframe=True)
+            await relay.flush()
+
+            # The backfill exceeds a 64 KiB slot; everything else still lands
+            assert await bus.get(BACKFILL_KEY) is None
+            for name in ("snapshot", "foreign-detail", "volume-stats", "basis-trend", "alerts"):
+                assert await bus.get(f"rest:{name}") is not None
+            assert await bus.get(KEYFRAME_KEY) == _keyframe(1)
+            channel, _ = await asyncio.wait_for(anext(frames), 1)
+            assert channel == CH_SPARKLINE_BACKFILL  # the frame itself fit the ring
+            assert relay._bus_ok
+        finally:
+            await bus.close()
+
+
+class TestFanoutMirror:
+    @pytest.mark.asyncio
+    async def test_bootstrap_from_stored_keyframe(self, bus, managers):
+        await bus.set(KEYFRAME_KEY, _keyframe(5))
+        mirror = FanoutMirror(bus, managers)
+        await mirror.start()
+        try:
+            assert mirror.initial_frames("market") == [_keyframe(5)]
+        finally:
+            await mirror.stop()
+
+    def test_market_log_chains_deltas(self, bus, managers):
+        mirror = FanoutMirror(bus, managers)
+        mirror.on_frame("market", _keyframe(1))
+        mirror.on_frame("market", _delta(2))
+        mirror.on_frame("market", _delta(3))
+        assert mirror.initial_frames("market") == [_keyframe(1), _delta(2), _delta(3)]
+        assert managers["market"].broadcast.call_count == 3
+
+    def test_gap_clears_log_until_next_keyframe(self, bus, managers):
+        mirror = FanoutMirror(bus, managers)
+        mirror.on_frame("market", _keyframe(1))
+        mirror.on_frame("market", _delta(3, base=2))
+        assert mirror.initial_frames("market") == []
+        mirror.on_frame("market", _delta(4))
+        assert mirror.initial_frames("market") == []
+        mirror.on_frame("market", _keyframe(5))
+        assert mirror.initial_frames("market") == [_keyframe(5)]
+
+    def test_stale_delta_ignored(self, bus, managers):
+        mirror = FanoutMirror(bus, managers)
+        mirror.on_frame("market", _keyframe(5))
+        mirror.on_frame("market", _delta(4))
+        assert mirror.initial_frames("market") == [_keyframe(5)]
+
+    def test_sparkline_backfill_not_broadcast(self, bus, managers):
+        mirror = FanoutMirror(bus, managers)
+        mirror.on_frame("sparkline", "early-delta")  # no backfill yet → not logged
+        mirror.on_frame(CH_SPARKLINE_BACKFILL, "backfill")
+        mirror.on_frame("sparkline", "delta")
+        assert mirror.initial_frames("sparkline") == ["backfill", "delta"]
+        assert [c.args[0] for c in managers["sparkline"].broadcast.call_args_list] == [
+            "early-delta", "delta",
+        ]
+
+    def test_status_frames_use_status_kind(self, bus, managers):
+        mirror = FanoutMirror(bus, managers)
+        mirror.on_frame("foreign", json.dumps({"type": "status", "connected": False}))
+        mirror.on_frame("foreign", '{"total_buy": 1}')
+        kinds = [c.kwargs["kind"] for c in managers["foreign"].broadcast.call_args_list]
+        assert kinds == [KIND_STATUS, KIND_STATE]
+
+    def test_no_broadcast_without_clients(self, bus):
+        managers = {"foreign": _manager(client_count=0)}
+        FanoutMirror(bus, managers).on_frame("foreign", "{}")
+        managers["foreign"].broadcast.assert_not_called()
+
+    def test_rest_frame_none_before_first_poll(self, bus, managers):
+        assert FanoutMirror(bus, managers).rest_frame("snapshot") is None
+
+
+class TestEndToEnd:
+    @pytest_asyncio.fixture(params=["memory", "shm"])
+    async def bus(self, request):
+        if request.param == "memory":
+            yield InProcessStateBus()
+            return
+        bus = SharedMemoryStateBus(f"stb-test-{uuid.uuid4().hex[:12]}", owner=True, poll_interval=0.001)
+        yield bus
+        await bus.close()
+
+    @pytest.mark.asyncio
+    async def test_leader_state_served_by_worker(self, bus, managers):
+        processor = MarketDataProcessor()
+        alerts = AlertService()
+        relay = FrameRelay(bus, processor, alerts)
+        mirror = FanoutMirror(bus, managers)
+        frames = await bus.subscribe()
+
+        processor.index_tracker.update(SSIIndexMessage(index_id="VN30", index_value=1250.0))
+        await processor.handle_trade(SSITradeMessage(symbol="VN30F2603", last_price=1260.0, last_vol=5))
+        alerts.register_alert(Alert(alert_type=AlertType.BASIS_DIVERGENCE,
+                                    severity=AlertSeverity.WARNING, symbol="VN30F2603", message="flip"))
+        alerts.register_alert(Alert(alert_type=AlertType.VOLUME_SPIKE,
+                                    severity=AlertSeverity.WARNING, symbol="VNM", message="spike"))
+        await relay.start(["VNM", "FPT"])
+        await relay.publish_state()
+        relay.on_frame("market", _keyframe(1), keyframe=True)
+        await relay.flush()
+        await _drain(frames, mirror, 2)  # sparkline backfill + market keyframe
+        await mirror.poll_rest()
+        await relay.stop()
+
+        assert mirror.rest_frame("snapshot").text == rest_frame(processor, "snapshot").text
+        assert json.loads(mirror.rest_frame("vn30-components").text) == {"symbols": ["VNM", "FPT"]}
+        (point,) = mirror.basis_trend(30)
+        assert point["futures_price"] == 1260.0
+        assert [a["symbol"] for a in mirror.recent_alerts()] == ["VNM", "VN30F2603"]
+        assert [a["symbol"] for a in mirror.recent_alerts(type_filter=AlertType.VOLUME_SPIKE)] == ["VNM"]
+        assert mirror.recent_alerts(limit=1)[0]["symbol"] == "VNM"
+        assert mirror.initial_frames("market") == [_keyframe(1)]
+        assert len(mirror.initial_frames("sparkline")) == 1
@@ -1,4 +1,4 @@
-"""Tests for ForeignInvestorTracker — delta, speed, acceleration, aggregate, top N."""
+"""Tests for ForeignInvestorTracker — delta, rolling speed windows, acceleration, aggregate, top N."""
 
 from datetime import datetime, timedelta
 from unittest.mock import patch
@@ -119,6 +119,74 @@ class TestSpeed:
         assert data.sell_speed_per_min == 0.0
 
 
+_T0 = datetime(2026, 2, 9, 10, 0, 0)
+
+
+def _update_at(tracker, seconds, **kw):
+    with patch("app.services.foreign_investor_tracker.datetime") as mock_dt:
+        mock_dt.now.return_value = _T0 + timedelta(seconds=seconds)
+        return tracker.update(_make_msg(**kw))
+
+
+def _speeds_at(tracker, seconds, symbol="VNM"):
+    with patch("app.services.foreign_investor_tracker.datetime") as mock_dt:
+        mock_dt.now.return_value = _T0 + timedelta(seconds=seconds)
+        return tracker.get_speeds(symbol)
+
+
+class TestRollingWindows:
+    def test_speed_is_window_sum_per_minute(self):
+        tracker = ForeignInvestorTracker()
+        _update_at(tracker, 0, f_buy_vol=0, f_sell_vol=0)
+        _update_at(tracker, 10, f_buy_vol=500, f_sell_vol=100)
+        data = _update_at(tracker, 20, f_buy_vol=1500, f_sell_vol=600)
+        assert data.buy_speed_per_min == 1500 / 5
+        assert data.sell_speed_per_min == 600 / 5
+
+    def test_old_deltas_expire(self):
+        tracker = ForeignInvestorTracker()
+        _update_at(tracker, 0, f_buy_vol=0, f_sell_vol=0)
+        _update_at(tracker, 1, f_buy_vol=3000, f_sell_vol=0)
+        # 5 min + 1s later the first delta has left the 5-minute window
+        data = _update_at(tracker, 302, f_buy_vol=3600, f_sell_vol=0)
+        assert data.buy_speed_per_min == 600 / 5
+
+    def test_all_windows_tracked_together(self):
+        tracker = ForeignInvestorTracker()
+        _update_at(tracker, 0, f_buy_vol=0, f_sell_vol=0)
+        _update_at(tracker, 30, f_buy_vol=900, f_sell_vol=0)   # 9.5 min before query
+        _update_at(tracker, 420, f_buy_vol=1500, f_sell_vol=0)  # 3 min before
+        _update_at(tracker, 570, f_buy_vol=1560, f_sell_vol=0)  # 30 s before
+        speeds = _speeds_at(tracker, 600)
+        assert speeds[1] == (60 / 1, 0.0)
+        assert speeds[5] == (660 / 5, 0.0)
+        assert speeds[15] == (1560 / 15, 0.0)
+
+    def test_speeds_decay_without_updates(self):
+        tracker = ForeignInvestorTracker()
+        _update_at(tracker, 0, f_buy_vol=0, f_sell_vol=0)
+        _update_at(tracker, 1, f_buy_vol=1500, f_sell_vol=0)
+        assert _speeds_at(tracker, 120)[1] == (0.0, 0.0)
+        assert _speeds_at(tracker, 3600) == {1: (0.0, 0.0), 5: (0.0, 0.0), 15: (0.0, 0.0)}
+
+    def test_gap_longer_than_ring_resets(self):
+        tracker = ForeignInvestorTracker()
+        _update_at(tracker, 0, f_buy_vol=0, f_sell_vol=0)
+        _update_at(tracker, 1, f_buy_vol=1000, f_sell_vol=0)
+        data = _update_at(tracker, 7200, f_buy_vol=1050, f_sell_vol=0)
+        assert data.buy_speed_per_min == 50 / 5
+
+    def test_custom_windows_keep_primary(self):
+        tracker = ForeignInvestorTracker(speed_windows_min=(2, 30))
+        _update_at(tracker, 0, f_buy_vol=600, f_sell_vol=0)
+        assert set(_speeds_at(tracker, 0)) == {2, 5, 30}
+        assert _speeds_at(tracker, 0)[2] == (300.0, 0.0)
+
+    def test_unknown_symbol_speeds_zero(self):
+        tracker = ForeignInvestorTracker()
+        assert tracker.get_speeds("XYZ")[5] == (0.0, 0.0)
+
+
 class TestAcceleration:
     def test_acceleration_on_first_update_is_speed(self):
         """First update: prev_speed=0, so acceleration equals speed."""
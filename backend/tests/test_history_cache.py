@@ -0,0 +1,240 @@
+"""Tests for HistoryCache — hits, TTL, single-flight, flush invalidation, LRU."""
+
+import asyncio
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.database.history_cache import HistoryCache, market_today
+
+PAST = date(2026, 1, 30)
+
+
+def _today() -> date:
+    return market_today()
+
+
+def _loader(rows=None):
+    return AsyncMock(return_value=rows if rows is not None else [{"close": 80.5}])
+
+
+class TestReadThrough:
+    @pytest.mark.asyncio
+    async def test_second_get_is_a_hit(self):
+        cache = HistoryCache()
+        load = _loader()
+        first = await cache.get("candles", ("VNM",), "candles_1m", _today(), load)
+        second = await cache.get("candles", ("VNM",), "candles_1m", _today(), load)
+        assert first == second == [{"close": 80.5}]
+        load.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_args_are_part_of_the_key(self):
+        cache = HistoryCache()
+        load = _loader()
+        await cache.get("candles", ("VNM",), "candles_1m", _today(), load)
+        await cache.get("candles", ("FPT",), "candles_1m", _today(), load)
+        assert load.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_live_entry_expires_after_ttl(self):
+        cache = HistoryCache(ttl=5.0)
+        load = _loader()
+        with patch("app.database.history_cache.time.monotonic", return_value=100.0):
+            await cache.get("candles", ("VNM",), "candles_1m", _today(), load)
+        with patch("app.database.history_cache.time.monotonic", return_value=106.0):
+            await cache.get("candles", ("VNM",), "candles_1m", _today(), load)
+        assert load.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_closed_range_never_expires(self):
+        cache = HistoryCache(ttl=5.0)
+        load = _loader()
+        with patch("app.database.history_cache.time.monotonic", return_value=100.0):
+            await cache.get("candles", ("VNM",), "candles_1m", PAST, load)
+        with patch("app.database.history_cache.time.monotonic", return_value=10_000.0):
+            await cache.get("candles", ("VNM",), "candles_1m", PAST, load)
+        load.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_lru_bound(self):
+        cache = HistoryCache(max_entries=2)
+        load = _loader()
+        for symbol in ("VNM", "FPT"):
+            await cache.get("candles", (symbol,), "candles_1m", PAST, load)
+        await cache.get("candles", ("VNM",), "candles_1m", PAST, load)  # VNM most recent
+        await cache.get("candles", ("HPG",), "candles_1m", PAST, load)  # evicts FPT
+        assert len(cache) == 2
+        await cache.get("candles", ("VNM",), "candles_1m", PAST, load)
+        assert load.await_count == 3
+        await cache.get("candles", ("FPT",), "candles_1m", PAST, load)
+        assert load.await_count == 4
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_load(self):
+        cache = HistoryCache()
+        release = asyncio.Event()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return [{"close": 1}]
+
+        waiters = [
+            asyncio.create_task(cache.get("candles", ("VNM",), "candles_1m", _today(), load))
+            for _ in range(10)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        assert calls == 1
+        assert all(r == [{"close": 1}] for r in results)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_others(self):
+        cache = HistoryCache()
+        release = asyncio.Event()
+
+        async def load():
+            await release.wait()
+            return [{"close": 1}]
+
+        first = asyncio.create_task(cache.get("candles", ("VNM",), "candles_1m", _today(), load))
+        second = asyncio.create_task(cache.get("candles", ("VNM",), "candles_1m", _today(), load))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert await second == [{"close": 1}]
+        assert first.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_failure_propagates_and_is_not_cached(self):
+        cache = HistoryCache()
+        load = AsyncMock(side_effect=[RuntimeError("db down"), [{"close": 2}]])
+        with pytest.raises(RuntimeError):
+            await cache.get("candles", ("VNM",), "candles_1m", _today(), load)
+        assert len(cache) == 0
+        assert await cache.get("candles", ("VNM",), "candles_1m", _today(), load) == [{"close": 2}]
+
+
+class TestInvalidate:
+    @pytest.mark.asyncio
+    async def test_flush_invalidates_live_entries_of_that_table(self):
+        cache = HistoryCache(ttl=60.0)
+        flow, ticks = _loader(), _loader()
+        await cache.get("foreign", ("VNM",), "foreign_flow", _today(), flow)
+        await cache.get("ticks", ("VNM",), "tick_data", _today(), ticks)
+        cache.invalidate("foreign_flow")
+        await cache.get("foreign", ("VNM",), "foreign_flow", _today(), flow)
+        await cache.get("ticks", ("VNM",), "tick_data", _today(), ticks)
+        assert flow.await_count == 2
+        ticks.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_flush_keeps_closed_entries(self):
+        cache = HistoryCache()
+        load = _loader()
+        await cache.get("foreign", ("VNM",), "foreign_flow", PAST, load)
+        cache.invalidate("foreign_flow")
+        await cache.get("foreign", ("VNM",), "foreign_flow", PAST, load)
+        load.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_replay_drops_closed_entries(self):
+        cache = HistoryCache()
+        load = _loader()
+        await cache.get("foreign", ("VNM",), "foreign_flow", PAST, load)
+        cache.invalidate("foreign_flow", replayed=True)
+        await cache.get("foreign", ("VNM",), "foreign_flow", PAST, load)
+        assert load.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_load_racing_a_flush_is_not_reused(self):
+        cache = HistoryCache(ttl=60.0)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return [{"close": 1}]
+
+        pending = asyncio.create_task(cache.get("foreign", ("VNM",), "foreign_flow", _today(), slow))
+        await asyncio.sleep(0)
+        cache.invalidate("foreign_flow")  # rows flushed while the query ran
+        release.set()
+        await pending
+        fresh = _loader([{"close": 2}])
+        assert await cache.get("foreign", ("VNM",), "foreign_flow", _today(), fresh) == [{"close": 2}]
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data: dict[str, str] = {}
+
+    async def get(self, name):
+        return self.data.get(name)
+
+    async def set(self, name, value):
+        self.data[name] = value
+
+    async def delete(self, name):
+        self.data.pop(name, None)
+
+    async def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        for name in list(self.data):
+            if name.startswith(prefix):
+                yield name
+
+    async def aclose(self):
+        pass
+
+
+class TestRedis:
+    @staticmethod
+    def _cache(redis=None) -> HistoryCache:
+        cache = HistoryCache(redis_url="redis://localhost:6379/0")
+        cache._redis = redis or _FakeRedis()
+        return cache
+
+    @pytest.mark.asyncio
+    async def test_closed_results_shared_between_workers(self):
+        redis = _FakeRedis()
+        rows = [{"timestamp": datetime(2026, 1, 30, 9, 15), "net_value": Decimal("1500")}]
+        await self._cache(redis).get("foreign", ("VNM",), "foreign_flow", PAST, _loader(rows))
+
+        other = _loader()
+        result = await self._cache(redis).get("foreign", ("VNM",), "foreign_flow", PAST, other)
+        other.assert_not_awaited()
+        assert result == [{"timestamp": datetime(2026, 1, 30, 9, 15), "net_value": 1500}]
+
+    @pytest.mark.asyncio
+    async def test_live_results_stay_local(self):
+        redis = _FakeRedis()
+        await self._cache(redis).get("foreign", ("VNM",), "foreign_flow", _today(), _loader())
+        assert redis.data == {}
+
+    @pytest.mark.asyncio
+    async def test_replay_drops_shared_entries(self):
+        redis = _FakeRedis()
+        cache = self._cache(redis)
+        await cache.get("foreign", ("VNM",), "foreign_flow", PAST, _loader())
+        await cache.get("ticks", ("VNM",), "tick_data", PAST, _loader())
+        cache.invalidate("foreign_flow", replayed=True)
+        await asyncio.sleep(0.01)
+        assert [json.loads(k.split(":", 2)[2])[0] for k in redis.data] == ["ticks"]
+
+    @pytest.mark.asyncio
+    async def test_redis_errors_fall_back_to_database(self):
+        redis = _FakeRedis()
+        redis.get = AsyncMock(side_effect=ConnectionError("refused"))
+        redis.set = AsyncMock(side_effect=ConnectionError("refused"))
+        load = _loader()
+        assert await self._cache(redis).get("foreign", ("VNM",), "foreign_flow", PAST, load) == [{"close": 80.5}]
+        load.assert_awaited_once()
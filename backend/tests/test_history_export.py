@@ -0,0 +1,85 @@
+"""Tests for columnar (Arrow IPC / Parquet) history exports."""
+
+import io
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.database import history_export
+from app.database.history_export import columnar_chunks
+from app.database.history_service import TICK_COLUMNS
+
+T0 = datetime(2026, 2, 9, 2, 15, tzinfo=timezone.utc)
+
+
+def _ticks(n: int, symbol: str = "VNM") -> list[tuple]:
+    return [
+        (symbol, T0 + timedelta(seconds=i), Decimal("80.50"), 100 + i,
+         "mua_chu_dong" if i % 2 else "ban_chu_dong", None, Decimal("80.60"))
+        for i in range(n)
+    ]
+
+
+async def _records(rows):
+    for row in rows:
+        yield row
+
+
+async def _body(rows, columns, fmt) -> tuple[bytes, int]:
+    chunks = [c async for c in columnar_chunks(_records(rows), columns, fmt)]
+    return b"".join(chunks), len(chunks)
+
+
+class TestArrow:
+    @pytest.mark.asyncio
+    async def test_round_trip(self):
+        body, _ = await _body(_ticks(3), TICK_COLUMNS, "arrow")
+        table = pa.ipc.open_stream(body).read_all()
+        assert table.column_names == list(TICK_COLUMNS)
+        assert table.num_rows == 3
+        assert table["volume"].to_pylist() == [100, 101, 102]
+        assert table["price"].to_pylist() == [Decimal("80.50")] * 3
+        assert table["bid"].null_count == 3
+        assert table["timestamp"][0].as_py() == T0
+
+    @pytest.mark.asyncio
+    async def test_dictionary_encodes_repeated_strings(self):
+        body, _ = await _body(_ticks(4), TICK_COLUMNS, "arrow")
+        side = pa.ipc.open_stream(body).read_all()["side"]
+        assert pa.types.is_dictionary(side.type)
+
+    @pytest.mark.asyncio
+    async def test_batches_streamed_as_written(self, monkeypatch):
+        monkeypatch.setattr(history_export, "BATCH_ROWS", 10)
+        body, chunks = await _body(_ticks(25), TICK_COLUMNS, "arrow")
+        reader = pa.ipc.open_stream(body)
+        assert [b.num_rows for b in reader] == [10, 10, 5]
+        assert chunks >= 4  # schema + each batch (+ end-of-stream marker)
+
+    @pytest.mark.asyncio
+    async def test_projection(self):
+        rows = [(T0, Decimal("80.50"))]
+        body, _ = await _body(rows, ("timestamp", "price"), "arrow")
+        assert pa.ipc.open_stream(body).read_all().column_names == ["timestamp", "price"]
+
+    @pytest.mark.asyncio
+    async def test_empty_has_schema(self):
+        body, _ = await _body([], TICK_COLUMNS, "arrow")
+        table = pa.ipc.open_stream(body).read_all()
+        assert table.num_rows == 0 and table.column_names == list(TICK_COLUMNS)
+
+
+class TestParquet:
+    @pytest.mark.asyncio
+    async def test_round_trip_one_row_group_per_batch(self, monkeypatch):
+        monkeypatch.setattr(history_export, "BATCH_ROWS", 10)
+        rows = _ticks(15, "FPT") + _ticks(10, "VNM")
+        body, _ = await _body(rows, TICK_COLUMNS, "parquet")
+        parquet = pq.ParquetFile(io.BytesIO(body))
+        assert parquet.metadata.num_row_groups == 3
+        table = parquet.read()
+        assert table.num_rows == 25
+        assert table["symbol"].to_pylist() == ["FPT"] * 15 + ["VNM"] * 10
@@ -1,12 +1,18 @@
 """Tests for history REST endpoints — candles, ticks, foreign, index, derivatives."""
 
-from unittest.mock import AsyncMock, patch
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pyarrow as pa
 import pytest
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 from fastapi import FastAPI
 
+from app.database.history_service import HistoryService
+from app.database.history_stream import Cursor
 from app.routers.history_router import router
 
 
@@ -93,6 +99,34 @@ class TestGetCandles:
         )
         assert resp.status_code == 422
 
+    @pytest.mark.asyncio
+    async def test_default_resolution(self, client, mock_svc):
+        mock_svc.get_candles.return_value = []
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            await client.get(
+                "/api/history/VNM/candles",
+                params={"start": "2026-02-01", "end": "2026-02-07"},
+            )
+        assert mock_svc.get_candles.call_args[0][3] == "1m"
+
+    @pytest.mark.asyncio
+    async def test_resolution_passed(self, client, mock_svc):
+        mock_svc.get_candles.return_value = []
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            await client.get(
+                "/api/history/VNM/candles",
+                params={"start": "2026-01-01", "end": "2026-02-07", "resolution": "1h"},
+            )
+        assert mock_svc.get_candles.call_args[0][3] == "1h"
+
+    @pytest.mark.asyncio
+    async def test_unknown_resolution_rejected(self, client):
+        resp = await client.get(
+            "/api/history/VNM/candles",
+            params={"start": "2026-02-01", "end": "2026-02-07", "resolution": "2m"},
+        )
+        assert resp.status_code == 422
+
 
 # ---------------------------------------------------------------------------
 # GET /api/history/{symbol}/ticks
@@ -131,6 +165,131 @@ class TestGetTicks:
         )
         assert resp.status_code == 422
 
+    @pytest.mark.asyncio
+    async def test_points_passed(self, client, mock_svc):
+        mock_svc.get_ticks.return_value = []
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            await client.get(
+                "/api/history/VNM/ticks",
+                params={"start": "2026-02-01", "end": "2026-02-07", "points": 800},
+            )
+        assert mock_svc.get_ticks.call_args[0][4] == 800
+
+    @pytest.mark.asyncio
+    async def test_points_below_minimum_rejected(self, client):
+        resp = await client.get(
+            "/api/history/VNM/ticks",
+            params={"start": "2026-02-07", "end": "2026-02-07", "points": 2},
+        )
+        assert resp.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_full_page_sets_next_cursor(self, client, mock_svc):
+        mock_svc.get_ticks.return_value = [
+            {"symbol": "VNM", "timestamp": datetime(2026, 2, 7, 3, 0, i, tzinfo=timezone.utc),
+             "price": 80.5}
+            for i in range(3)
+        ]
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get(
+                "/api/history/VNM/ticks",
+                params={"start": "2026-02-07", "end": "2026-02-07", "limit": 3},
+            )
+            cursor = resp.headers["X-Next-Cursor"]
+            assert Cursor.decode(cursor) == Cursor(
+                datetime(2026, 2, 7, 3, 0, 2, tzinfo=timezone.utc), 1,
+            )
+            await client.get(
+                "/api/history/VNM/ticks",
+                params={"start": "2026-02-07", "end": "2026-02-07", "limit": 3, "after": cursor},
+            )
+        assert mock_svc.get_ticks.call_args[0][5] == Cursor.decode(cursor)
+
+    @pytest.mark.asyncio
+    async def test_points_cover_range_beyond_limit(self, client):
+        """More rows in range than `limit`: points= samples all of them, unpaged."""
+        rows = [
+            {"symbol": "VNM", "timestamp": datetime(2026, 1, 5, tzinfo=timezone.utc) + timedelta(seconds=i),
+             "price": Decimal(80 + i % 11)}
+            for i in range(5000)
+        ]
+        conn = MagicMock()
+        conn.transaction.return_value.__aenter__ = AsyncMock(return_value=None)
+        conn.transaction.return_value.__aexit__ = AsyncMock(return_value=False)
+        conn.fetchval = AsyncMock(return_value=len(rows))
+
+        async def records():
+            for row in rows:
+                yield row
+        conn.cursor = MagicMock(return_value=records())
+        db = MagicMock()
+        db.pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+        db.pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+
+        with patch("app.routers.history_router._get_svc", return_value=HistoryService(db)):
+            resp = await client.get(
+                "/api/history/VNM/ticks",
+                params={"start": "2026-01-05", "end": "2026-02-07", "limit": 100, "points": 200},
+            )
+        body = resp.json()
+        assert len(body) == 200
+        assert body[-1]["timestamp"] == "2026-01-05T01:23:19+00:00"  # last row of the range
+        assert "X-Next-Cursor" not in resp.headers
+
+    @pytest.mark.asyncio
+    async def test_last_page_has_no_cursor(self, client, mock_svc):
+        mock_svc.get_ticks.return_value = []
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get(
+                "/api/history/VNM/ticks",
+                params={"start": "2026-02-07", "end": "2026-02-07", "limit": 3},
+            )
+        assert "X-Next-Cursor" not in resp.headers
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor_rejected(self, client, mock_svc):
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get(
+                "/api/history/VNM/ticks",
+                params={"start": "2026-02-07", "end": "2026-02-07", "after": "garbage"},
+            )
+        assert resp.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_ndjson_stream(self, client, mock_svc):
+        async def records():
+            for i in range(3):
+                yield {"symbol": "VNM", "price": Decimal("80.5"), "volume": i}
+
+        mock_svc.stream_ticks = MagicMock(return_value=records())
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get(
+                "/api/history/VNM/ticks",
+                params={"start": "2026-02-07", "end": "2026-02-07", "format": "ndjson"},
+            )
+        assert resp.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line)["volume"] for line in resp.text.splitlines()] == [0, 1, 2]
+        mock_svc.get_ticks.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_csv_stream(self, client, mock_svc):
+        async def records():
+            yield {"symbol": "VNM", "timestamp": "t", "price": 80.5, "volume": 100,
+                   "side": "mua_chu_dong", "bid": None, "ask": 80.5}
+
+        mock_svc.stream_ticks = MagicMock(return_value=records())
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get(
+                "/api/history/VNM/ticks",
+                params={"start": "2026-02-07", "end": "2026-02-07", "format": "csv"},
+            )
+        assert resp.headers["content-type"].startswith("text/csv")
+        assert "VNM_ticks_2026-02-07_2026-02-07.csv" in resp.headers["content-disposition"]
+        assert resp.text.splitlines() == [
+            "symbol,timestamp,price,volume,side,bid,ask",
+            "VNM,t,80.5,100,mua_chu_dong,,80.5",
+        ]
+
     @pytest.mark.asyncio
     async def test_symbol_uppercased(self, client, mock_svc):
         mock_svc.get_ticks.return_value = []
@@ -172,6 +331,54 @@ class TestGetForeignFlow:
         assert resp.status_code == 200
         assert resp.json() == []
 
+    @pytest.mark.asyncio
+    async def test_unpaged_by_default(self, client, mock_svc):
+        mock_svc.get_foreign_flow.return_value = [
+            {"symbol": "VNM", "timestamp": datetime(2026, 2, 7, 3, tzinfo=timezone.utc)},
+        ]
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get(
+                "/api/history/VNM/foreign",
+                params={"start": "2026-02-01", "end": "2026-02-07"},
+            )
+        assert mock_svc.get_foreign_flow.call_args[0][3:] == (None, None)
+        assert "X-Next-Cursor" not in resp.headers
+
+    @pytest.mark.asyncio
+    async def test_limit_pages(self, client, mock_svc):
+        mock_svc.get_foreign_flow.return_value = [
+            {"symbol": "VNM", "timestamp": datetime(2026, 2, 7, 3, tzinfo=timezone.utc)},
+        ]
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get(
+                "/api/history/VNM/foreign",
+                params={"start": "2026-02-01", "end": "2026-02-07", "limit": 1},
+            )
+        assert "X-Next-Cursor" in resp.headers
+
+    @pytest.mark.asyncio
+    async def test_full_page_from_redis_sets_next_cursor(self, client):
+        """A closed-range page another worker cached in Redis still pages."""
+        from app.database.history_cache import HistoryCache
+        from tests.test_history_cache import _FakeRedis
+
+        stamp = datetime(2026, 2, 6, 3, tzinfo=timezone.utc)
+        db = MagicMock()
+        db.pool.fetch = AsyncMock(return_value=[
+            {"symbol": "VNM", "timestamp": stamp, "net_vol": 10},
+            {"symbol": "VNM", "timestamp": stamp, "net_vol": 20},
+        ])
+        redis = _FakeRedis()
+        params = {"start": "2026-02-02", "end": "2026-02-06", "limit": 2}
+        for _ in range(2):  # first worker fills Redis, second is served from it
+            cache = HistoryCache(redis_url="redis://localhost:6379/0")
+            cache._redis = redis
+            with patch("app.routers.history_router._get_svc", return_value=HistoryService(db, cache)):
+                resp = await client.get("/api/history/VNM/foreign", params=params)
+            assert resp.status_code == 200
+            assert Cursor.decode(resp.headers["X-Next-Cursor"]) == Cursor(stamp, 2)
+        db.pool.fetch.assert_awaited_once()
+
     @pytest.mark.asyncio
     async def test_missing_params(self, client):
         resp = await client.get("/api/history/VNM/foreign")
@@ -317,3 +524,78 @@ class TestGetDerivativesHistory:
     async def test_missing_params(self, client):
         resp = await client.get("/api/history/derivatives/VN30F2603")
         assert resp.status_code == 422
+
+
+# ---------------------------------------------------------------------------
+# GET /api/history/export
+# ---------------------------------------------------------------------------
+class TestExport:
+    @pytest.mark.asyncio
+    async def test_arrow_stream(self, client, mock_svc):
+        async def records():
+            yield ("VNM", datetime(2026, 2, 9, 2, 15, tzinfo=timezone.utc))
+
+        mock_svc.stream_export = MagicMock(return_value=records())
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get("/api/history/export", params={
+                "symbols": "vnm, fpt,VNM", "start": "2026-02-09", "end": "2026-02-09",
+                "columns": "symbol,timestamp",
+            })
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "application/vnd.apache.arrow.stream"
+        assert mock_svc.stream_export.call_args[0][:2] == ("ticks", ["FPT", "VNM"])
+        assert mock_svc.stream_export.call_args[0][4] == ["symbol", "timestamp"]
+        table = pa.ipc.open_stream(resp.content).read_all()
+        assert table["symbol"].to_pylist() == ["VNM"]
+
+    @pytest.mark.asyncio
+    async def test_parquet_filename(self, client, mock_svc):
+        async def records():
+            return
+            yield
+
+        mock_svc.stream_export = MagicMock(return_value=records())
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get("/api/history/export", params={
+                "symbols": "VNM", "start": "2026-02-09", "end": "2026-02-09",
+                "dataset": "foreign", "format": "parquet",
+            })
+        assert 'filename="foreign_2026-02-09_2026-02-09.parquet"' in resp.headers["content-disposition"]
+        assert resp.content[:4] == b"PAR1"
+
+    @pytest.mark.asyncio
+    async def test_unknown_column_rejected(self, client, mock_svc):
+        mock_svc.stream_export = MagicMock(side_effect=ValueError("Unknown columns for ticks: x"))
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get("/api/history/export", params={
+                "symbols": "VNM", "start": "2026-02-09", "end": "2026-02-09", "columns": "x",
+            })
+        assert resp.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_busy_when_export_slots_taken(self, client, mock_svc):
+        mock_svc.can_export = False
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            resp = await client.get(
+                "/api/history/export",
+                params={"symbols": "VNM", "start": "2026-02-09", "end": "2026-02-09"},
+            )
+            ticks = await client.get(
+                "/api/history/VNM/ticks",
+                params={"start": "2026-02-09", "end": "2026-02-09", "format": "csv"},
+            )
+        assert resp.status_code == ticks.status_code == 503
+        assert resp.headers["Retry-After"] == "5"
+        mock_svc.stream_export.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_symbol_count_bounded(self, client, mock_svc):
+        with patch("app.routers.history_router._get_svc", return_value=mock_svc):
+            empty = await client.get("/api/history/export", params={
+                "symbols": " , ", "start": "2026-02-09", "end": "2026-02-09",
+            })
+            many = await client.get("/api/history/export", params={
+                "symbols": ",".join(f"S{i}" for i in range(51)),
+                "start": "2026-02-09", "end": "2026-02-09",
+            })
+        assert empty.status_code == many.status_code == 400
@@ -1,12 +1,14 @@
 """Tests for HistoryService — query methods against mock asyncpg pool."""
 
-from datetime import date
+from datetime import date, datetime, timezone
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
+from app.database.history_cache import HistoryCache, market_today
 from app.database.pool import Database
 from app.database.history_service import HistoryService
+from app.database.history_stream import Cursor
 
 
 @pytest.fixture
@@ -39,6 +41,18 @@ class TestGetCandles:
         result = await svc.get_candles("XYZ", date(2026, 1, 1), date(2026, 1, 31))
         assert result == []
 
+    @pytest.mark.asyncio
+    async def test_resolution_selects_view(self, svc, mock_db):
+        mock_db.pool.fetch = AsyncMock(return_value=[])
+        await svc.get_candles("VNM", date(2026, 1, 1), date(2026, 2, 7), "1d")
+        assert "FROM candles_1d" in mock_db.pool.fetch.call_args[0][0]
+
+    @pytest.mark.asyncio
+    async def test_unknown_resolution_rejected(self, svc, mock_db):
+        with pytest.raises(ValueError):
+            await svc.get_candles("VNM", date(2026, 1, 1), date(2026, 2, 7), "1m; DROP")
+        mock_db.pool.fetch.assert_not_called()
+
 
 class TestGetForeignFlow:
     @pytest.mark.asyncio
@@ -74,6 +88,170 @@ class TestGetTicks:
         assert len(result) == 5
 
 
+class TestTickPaging:
+    @pytest.mark.asyncio
+    async def test_first_page_starts_at_range(self, svc, mock_db):
+        mock_db.pool.fetch = AsyncMock(return_value=[])
+        await svc.get_ticks("VNM", date(2026, 2, 7), date(2026, 2, 7), limit=100)
+        args = mock_db.pool.fetch.call_args[0]
+        assert args[2] == datetime(2026, 2, 7)
+        assert args[4:] == (100, 0)
+
+    @pytest.mark.asyncio
+    async def test_cursor_sets_lower_bound_and_skip(self, svc, mock_db):
+        mock_db.pool.fetch = AsyncMock(return_value=[])
+        at = datetime(2026, 2, 7, 3, 0, 1, tzinfo=timezone.utc)
+        await svc.get_ticks(
+            "VNM", date(2026, 2, 7), date(2026, 2, 7), limit=100, after=Cursor(at, 2),
+        )
+        args = mock_db.pool.fetch.call_args[0]
+        assert args[2] == at
+        assert args[4:] == (100, 2)
+
+
+class _FakeConn:
+    """asyncpg connection with a server-side cursor over fixed rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursor_args = None
+        self.transaction = MagicMock()
+        self.transaction.return_value.__aenter__ = AsyncMock(return_value=None)
+        self.transaction.return_value.__aexit__ = AsyncMock(return_value=False)
+        self.fetchval = AsyncMock(return_value=len(rows))
+        self.execute = AsyncMock()
+
+    def cursor(self, query, *args, prefetch):
+        self.cursor_args = (query, args, prefetch)
+
+        async def records():
+            for row in self.rows:
+                yield row
+        return records()
+
+
+class TestStream:
+    @pytest.mark.asyncio
+    async def test_stream_ticks_iterates_cursor_in_transaction(self, svc, mock_db):
+        conn = _FakeConn([{"symbol": "VNM", "price": 80}] * 3)
+        mock_db.pool = MagicMock()
+        mock_db.pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+        mock_db.pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+
+        rows = [r async for r in svc.stream_ticks("VNM", date(2026, 2, 7), date(2026, 2, 7))]
+        assert len(rows) == 3
+        query, args, _ = conn.cursor_args
+        assert "FROM tick_data" in query and "LIMIT" not in query
+        assert args[-1] == 0
+        conn.transaction.assert_called_once()
+        mock_db.pool.acquire.return_value.__aexit__.assert_awaited_once()
+
+
+def _attach(mock_db, conn: _FakeConn) -> None:
+    mock_db.pool = MagicMock()
+    mock_db.pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+    mock_db.pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+
+
+class TestDownsample:
+    @pytest.mark.asyncio
+    async def test_ticks_cover_whole_range_not_limit(self, svc, mock_db):
+        rows = [{"symbol": "VNM", "timestamp": i, "price": 80 + i % 7,
+                 "volume": 100, "side": "mua_chu_dong", "bid": 79.5, "ask": 80}
+                for i in range(30_000)]
+        conn = _FakeConn(rows)
+        _attach(mock_db, conn)
+        result = await svc.get_ticks(
+            "VNM", date(2026, 1, 5), date(2026, 2, 7), limit=100, points=50,
+        )
+        assert len(result) == 50
+        assert result[0] == rows[0] and result[-1] == rows[-1]
+        query, args, _ = conn.cursor_args
+        assert "LIMIT" not in query and args[-1] == 0
+        assert "count(*)" in conn.fetchval.call_args[0][0]
+        conn.transaction.assert_called_once_with(isolation="repeatable_read", readonly=True)
+
+    @pytest.mark.asyncio
+    async def test_ticks_after_cursor_skips_counted_rows(self, svc, mock_db):
+        rows = [{"timestamp": i, "price": float(i % 5)} for i in range(100)]
+        conn = _FakeConn(rows)
+        conn.fetchval.return_value = 102  # two rows at the cursor timestamp already sent
+        _attach(mock_db, conn)
+        at = datetime(2026, 2, 7, 3, 0, 1, tzinfo=timezone.utc)
+        result = await svc.get_ticks(
+            "VNM", date(2026, 2, 7), date(2026, 2, 7), points=10, after=Cursor(at, 2),
+        )
+        assert len(result) == 10 and result[-1] == rows[-1]
+        assert conn.cursor_args[1][1:] == (at, datetime(2026, 2, 8), 2)
+
+    @pytest.mark.asyncio
+    async def test_index_history_points(self, svc, mock_db):
+        rows = [{"index_name": "VN30", "timestamp": i, "value": 1200 + i % 9} for i in range(500)]
+        conn = _FakeConn(rows)
+        _attach(mock_db, conn)
+        result = await svc.get_index_history("VN30", date(2026, 2, 1), date(2026, 2, 7), points=20)
+        assert len(result) == 20
+        assert "FROM index_snapshots" in conn.cursor_args[0]
+
+
+class TestExportLimits:
+    @pytest.mark.asyncio
+    async def test_stream_sets_server_timeouts(self, mock_db):
+        conn = _FakeConn([{"price": 80}])
+        _attach(mock_db, conn)
+        svc = HistoryService(mock_db, export_idle_s=15, export_statement_s=60)
+        [r async for r in svc.stream_ticks("VNM", date(2026, 2, 7), date(2026, 2, 7))]
+        sql = conn.execute.call_args[0][0]
+        assert "idle_in_transaction_session_timeout = 15000" in sql
+        assert "statement_timeout = 60000" in sql
+        conn.transaction.assert_called_once_with(readonly=True)
+
+    @pytest.mark.asyncio
+    async def test_slot_held_until_stream_closed(self, mock_db):
+        _attach(mock_db, _FakeConn([{"price": 80}] * 3))
+        svc = HistoryService(mock_db, max_exports=1)
+        records = svc.stream_ticks("VNM", date(2026, 2, 7), date(2026, 2, 7))
+        assert svc.can_export
+        await anext(records)
+        assert not svc.can_export
+        await records.aclose()
+        assert svc.can_export
+
+
+class TestStreamExport:
+    def _conn(self, mock_db) -> _FakeConn:
+        conn = _FakeConn([])
+        mock_db.pool = MagicMock()
+        mock_db.pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+        mock_db.pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+        return conn
+
+    @pytest.mark.asyncio
+    async def test_projects_columns_for_all_symbols(self, svc, mock_db):
+        conn = self._conn(mock_db)
+        records = svc.stream_export(
+            "ticks", ["FPT", "VNM"], date(2026, 2, 9), date(2026, 2, 9), ["timestamp", "price"],
+        )
+        assert [r async for r in records] == []
+        query, args, _ = conn.cursor_args
+        assert "SELECT t.timestamp, (t.price * 0.01)::numeric(12, 2) AS price" in query
+        assert "FROM tick_data" in query
+        assert args[0] == ["FPT", "VNM"]
+
+    @pytest.mark.asyncio
+    async def test_defaults_to_every_column(self, svc, mock_db):
+        conn = self._conn(mock_db)
+        [r async for r in svc.stream_export("foreign", ["VNM"], date(2026, 2, 9), date(2026, 2, 9))]
+        assert "sell_value" in conn.cursor_args[0] and "FROM foreign_flow" in conn.cursor_args[0]
+
+    @pytest.mark.parametrize("dataset, columns", [
+        ("orders", None), ("ticks", ["price", "net_vol"]), ("ticks", ["1; DROP TABLE"]),
+    ])
+    def test_rejects_unknown_names(self, svc, dataset, columns):
+        with pytest.raises(ValueError):
+            svc.stream_export(dataset, ["VNM"], date(2026, 2, 9), date(2026, 2, 9), columns)
+
+
 class TestGetIndexHistory:
     @pytest.mark.asyncio
     async def test_returns_rows(self, svc, mock_db):
@@ -86,6 +264,14 @@ class TestGetIndexHistory:
         assert result[0]["index_name"] == "VN30"
 
 
+class TestGetIndexCandles:
+    @pytest.mark.asyncio
+    async def test_resolution_selects_view(self, svc, mock_db):
+        mock_db.pool.fetch = AsyncMock(return_value=[])
+        await svc.get_index_candles("VN30", date(2026, 2, 1), date(2026, 2, 7), "15m")
+        assert "FROM index_candles_15m" in mock_db.pool.fetch.call_args[0][0]
+
+
 class TestGetDerivativesHistory:
     @pytest.mark.asyncio
     async def test_returns_rows(self, svc, mock_db):
@@ -100,6 +286,48 @@ class TestGetDerivativesHistory:
         assert result[0]["basis"] == 9.5
 
 
+class TestCached:
+    @pytest.mark.asyncio
+    async def test_repeat_query_served_from_cache(self, mock_db):
+        svc = HistoryService(mock_db, HistoryCache())
+        mock_db.pool.fetch = AsyncMock(return_value=[{"symbol": "VNM", "close": 80.5}])
+        for _ in range(3):
+            result = await svc.get_candles("VNM", date(2026, 2, 1), date(2026, 2, 7))
+        assert result == [{"symbol": "VNM", "close": 80.5}]
+        mock_db.pool.fetch.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_flush_refreshes_live_foreign_flow(self, mock_db):
+        cache = HistoryCache(ttl=60.0)
+        svc = HistoryService(mock_db, cache)
+        mock_db.pool.fetch = AsyncMock(return_value=[])
+        await svc.get_foreign_flow_daily_summary("VNM", days=30)
+        cache.invalidate("foreign_flow")
+        await svc.get_foreign_flow_daily_summary("VNM", days=30)
+        assert mock_db.pool.fetch.await_count == 2
+
+
+    @pytest.mark.asyncio
+    async def test_tick_flush_refreshes_live_candles(self, mock_db):
+        cache = HistoryCache(ttl=60.0)
+        svc = HistoryService(mock_db, cache)
+        mock_db.pool.fetch = AsyncMock(return_value=[])
+        today = market_today()
+        await svc.get_candles("VNM", today, today, "5m")
+        cache.invalidate("tick_data")
+        await svc.get_candles("VNM", today, today, "5m")
+        assert mock_db.pool.fetch.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_tick_replay_drops_closed_day_candles(self, mock_db):
+        cache = HistoryCache()
+        svc = HistoryService(mock_db, cache)
+        mock_db.pool.fetch = AsyncMock(return_value=[])
+        await svc.get_candles("VNM", date(2026, 2, 1), date(2026, 2, 7), "1d")
+        cache.invalidate("tick_data", replayed=True)
+        await svc.get_candles("VNM", date(2026, 2, 1), date(2026, 2, 7), "1d")
+        assert mock_db.pool.fetch.await_count == 2
+
 class TestPoolNotConnected:
     def test_raises_when_pool_is_none(self):
         db = MagicMock(spec=Database)
@@ -0,0 +1,93 @@
+"""Tests for history paging cursors and streamed NDJSON/CSV encodings."""
+
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.database import history_stream
+from app.database.history_stream import Cursor, csv_chunks, ndjson_chunks
+
+T0 = datetime(2026, 2, 9, 2, 15, tzinfo=timezone.utc)
+
+
+def _rows(*offsets: int) -> list[dict]:
+    return [{"timestamp": T0 + timedelta(seconds=s), "price": Decimal("80.5")} for s in offsets]
+
+
+async def _records(rows):
+    for row in rows:
+        yield row
+
+
+async def _collect(chunks) -> list[str]:
+    return [chunk async for chunk in chunks]
+
+
+class TestCursor:
+    def test_round_trip(self):
+        cursor = Cursor(T0 + timedelta(microseconds=123), 3)
+        assert Cursor.decode(cursor.encode()) == cursor
+
+    def test_token_is_url_safe(self):
+        token = Cursor(T0, 0).encode()
+        assert token.replace("-", "").replace("_", "").isalnum()
+
+    @pytest.mark.parametrize("token", ["", "!!!", "bm90IGpzb24", Cursor(T0, -1).encode()])
+    def test_invalid_token(self, token):
+        with pytest.raises(ValueError):
+            Cursor.decode(token)
+
+    def test_after_counts_trailing_ties(self):
+        assert Cursor.after(_rows(0, 1, 2, 2, 2), None) == Cursor(T0 + timedelta(seconds=2), 3)
+
+    def test_after_page_of_one_timestamp_adds_previous_skip(self):
+        previous = Cursor(T0, 4)
+        assert Cursor.after(_rows(0, 0), previous) == Cursor(T0, 6)
+
+    def test_after_ignores_previous_at_other_timestamp(self):
+        previous = Cursor(T0 - timedelta(seconds=1), 4)
+        assert Cursor.after(_rows(0, 0), previous) == Cursor(T0, 2)
+
+
+class TestNdjson:
+    @pytest.mark.asyncio
+    async def test_one_object_per_line(self):
+        body = "".join(await _collect(ndjson_chunks(_records(_rows(0, 1)))))
+        lines = body.splitlines()
+        assert json.loads(lines[0]) == {"timestamp": "2026-02-09T02:15:00+00:00", "price": 80.5}
+        assert len(lines) == 2 and body.endswith("\n")
+
+    @pytest.mark.asyncio
+    async def test_chunked(self, monkeypatch):
+        monkeypatch.setattr(history_stream, "CHUNK_BYTES", 100)
+        chunks = await _collect(ndjson_chunks(_records(_rows(*range(10)))))
+        assert len(chunks) > 1
+        assert sum(c.count("\n") for c in chunks) == 10
+
+    @pytest.mark.asyncio
+    async def test_empty(self):
+        assert await _collect(ndjson_chunks(_records([]))) == []
+
+
+class TestCsv:
+    @pytest.mark.asyncio
+    async def test_header_and_rows(self):
+        body = "".join(await _collect(csv_chunks(_records(_rows(0)), ("timestamp", "price"))))
+        assert list(csv.reader(io.StringIO(body))) == [
+            ["timestamp", "price"], ["2026-02-09T02:15:00+00:00", "80.5"],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_chunked(self, monkeypatch):
+        monkeypatch.setattr(history_stream, "CHUNK_BYTES", 100)
+        chunks = await _collect(csv_chunks(_records(_rows(*range(10))), ("timestamp", "price")))
+        assert len(chunks) > 1
+        assert len(list(csv.reader(io.StringIO("".join(chunks))))) == 11
+
+    @pytest.mark.asyncio
+    async def test_empty_has_header(self):
+        assert await _collect(csv_chunks(_records([]), ("a", "b"))) == ["a,b\n"]
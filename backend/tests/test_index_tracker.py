@@ -212,3 +212,46 @@ class TestReset:
         tracker.update(_make_msg(index_value=1260.0))
         assert tracker.get("VN30").value == 1260.0
         assert len(tracker.get_intraday("VN30")) == 1
+
+
+class TestIntradayCursor:
+    def test_cursor_advances_per_point(self):
+        tracker = IndexTracker()
+        first = tracker.update(_make_msg(index_value=1250.0))
+        second = tracker.update(_make_msg(index_value=1251.0))
+        assert first.intraday_cursor == 1
+        assert second.intraday_cursor == 2
+
+    def test_zero_value_does_not_advance_cursor(self):
+        tracker = IndexTracker()
+        tracker.update(_make_msg(index_value=1250.0))
+        result = tracker.update(_make_msg(index_value=0.0))
+        assert result.intraday_cursor == 1
+
+    def test_snapshot_intraday_frozen_at_cursor(self):
+        """Older snapshots keep their view even as the series grows."""
+        tracker = IndexTracker()
+        first = tracker.update(_make_msg(index_value=1250.0))
+        tracker.update(_make_msg(index_value=1251.0))
+        assert len(first.intraday) == 1
+        assert len(tracker.get("VN30").intraday) == 2
+
+    def test_get_intraday_since_cursor(self):
+        tracker = IndexTracker()
+        cursor = tracker.update(_make_msg(index_value=1250.0)).intraday_cursor
+        tracker.update(_make_msg(index_value=1251.0))
+        tracker.update(_make_msg(index_value=1252.0))
+        points = tracker.get_intraday("VN30", since=cursor)
+        assert [p.value for p in points] == [1251.0, 1252.0]
+
+    def test_get_intraday_since_current_cursor_is_empty(self):
+        tracker = IndexTracker()
+        cursor = tracker.update(_make_msg(index_value=1250.0)).intraday_cursor
+        assert tracker.get_intraday("VN30", since=cursor) == []
+
+    def test_model_dump_includes_intraday(self):
+        tracker = IndexTracker()
+        tracker.update(_make_msg(index_value=1250.0))
+        dumped = tracker.get("VN30").model_dump()
+        assert dumped["intraday"][0]["value"] == 1250.0
+        assert dumped["intraday_cursor"] == 1
@@ -0,0 +1,68 @@
+"""Tests for IntradaySeries — columnar ring buffer with sequence cursors."""
+
+from app.models.domain import IntradayPoint
+from app.services.intraday_store import IntradaySeries
+
+
+def _filled(n, capacity=5):
+    series = IntradaySeries(capacity)
+    for i in range(n):
+        series.append(1_700_000_000.0 + i, 1000.0 + i)
+    return series
+
+
+class TestAppend:
+    def test_append_returns_cursor(self):
+        series = IntradaySeries(5)
+        assert series.append(1.0, 10.0) == 1
+        assert series.append(2.0, 11.0) == 2
+        assert series.seq == 2
+
+    def test_len_before_full(self):
+        assert len(_filled(3)) == 3
+
+    def test_len_capped_at_capacity(self):
+        series = _filled(12)
+        assert len(series) == 5
+        assert series.seq == 12
+        assert series.first_seq == 7
+
+
+class TestColumns:
+    def test_all_points_in_order(self):
+        _, values = _filled(3).columns()
+        assert values == [1000.0, 1001.0, 1002.0]
+
+    def test_since_cursor(self):
+        _, values = _filled(4).columns(since=2)
+        assert values == [1002.0, 1003.0]
+
+    def test_until_cursor(self):
+        _, values = _filled(4).columns(until=2)
+        assert values == [1000.0, 1001.0]
+
+    def test_wraparound_keeps_order(self):
+        ts, values = _filled(8).columns()
+        assert values == [1003.0, 1004.0, 1005.0, 1006.0, 1007.0]
+        assert ts == sorted(ts)
+
+    def test_stale_cursor_clamped_to_oldest(self):
+        _, values = _filled(8).columns(since=1)
+        assert values[0] == 1003.0
+
+    def test_cursor_at_head_is_empty(self):
+        series = _filled(3)
+        assert series.columns(since=series.seq) == ([], [])
+
+
+class TestPoints:
+    def test_points_are_intraday_points(self):
+        points = _filled(2).points()
+        assert all(isinstance(p, IntradayPoint) for p in points)
+        assert points[1].value == 1001.0
+
+    def test_clear_resets_cursor(self):
+        series = _filled(3)
+        series.clear()
+        assert series.seq == 0
+        assert series.points() == []
@@ -2,6 +2,7 @@
 
 import pytest
 
+from app.database.tick_buffer import TickBuffer
 from app.models.domain import TradeType
 from app.models.ssi_messages import (
     SSIForeignMessage,
@@ -29,19 +30,31 @@ class TestHandleTrade:
     async def test_classifies_and_aggregates(self, proc):
         await proc.handle_quote(SSIQuoteMessage(symbol="VNM", bid_price_1=80.0, ask_price_1=80.5))
         trade = SSITradeMessage(symbol="VNM", last_price=80.5, last_vol=100, trading_session="LO")
-        classified, stats, bp = await proc.handle_trade(trade)
-        assert classified.trade_type == TradeType.MUA_CHU_DONG
+        trade_type, stats, bp = await proc.handle_trade(trade)
+        assert trade_type == TradeType.MUA_CHU_DONG
         assert stats.mua_chu_dong_volume == 100
+        assert stats.mua_chu_dong_value == 80.5 * 100 * 1000
         assert bp is None
 
+    @pytest.mark.asyncio
+    async def test_tick_row_written_to_buffer(self, proc):
+        buf = TickBuffer(100)
+        proc.classifier.set_tick_buffer(buf)
+        await proc.handle_quote(SSIQuoteMessage(symbol="VNM", bid_price_1=80.0, ask_price_1=80.5))
+        await proc.handle_trade(SSITradeMessage(symbol="VNM", last_price=80.0, last_vol=30))
+        rows = list(buf.take(100).rows())
+        assert len(rows) == 1
+        symbol, _ts, price, volume, side, bid, ask = rows[0]
+        assert (symbol, price, volume, side, bid, ask) == ("VNM", 8000, 30, 2, 8000, 8050)
+
     @pytest.mark.asyncio
     async def test_routes_futures_to_derivatives_tracker(self, proc):
         """VN30F trades go to DerivativesTracker AND are classified for persistence."""
         # Seed VN30 index so basis can be computed
         await proc.handle_index(SSIIndexMessage(index_id="VN30", index_value=1250.0))
         trade = SSITradeMessage(symbol="VN30F2603", last_price=1260.0, last_vol=10)
-        classified, stats, bp = await proc.handle_trade(trade)
-        assert classified is not None  # now classified for tick_data persistence
+        trade_type, stats, bp = await proc.handle_trade(trade)
+        assert trade_type is not None  # now classified for tick_data persistence
         assert stats is None
         assert bp is not None  # basis point computed
         # Verify derivatives tracker received the trade
@@ -111,6 +124,17 @@ class TestUnifiedAPI:
         assert proc.get_derivatives_data() is None
 
 
+class TestWatchlist:
+    def test_empty_watchlist_allows_all(self, proc):
+        assert proc.is_watched("AAA")
+
+    def test_filters_unwatched_but_allows_futures(self, proc):
+        proc.set_watchlist({"VNM"})
+        assert proc.is_watched("VNM")
+        assert proc.is_watched("VN30F2603")
+        assert not proc.is_watched("AAA")
+
+
 class TestSubscribers:
     def test_subscribe_and_unsubscribe(self, proc):
         cb = lambda: None  # noqa: E731
@@ -144,3 +168,18 @@ class TestResetSession:
         assert proc.get_derivatives_data() is not None
         proc.reset_session()
         assert proc.get_derivatives_data() is None
+
+
+class TestSnapshotCacheVersioning:
+    @pytest.mark.asyncio
+    async def test_notify_bumps_channel_version(self, proc):
+        before = proc.snapshot_cache.version(("foreign",))
+        await proc.handle_foreign(SSIForeignMessage(symbol="VNM", f_buy_vol=100))
+        assert proc.snapshot_cache.version(("foreign",)) == before + 1
+
+    @pytest.mark.asyncio
+    async def test_notify_marks_dirty_before_subscribers(self, proc):
+        seen = []
+        proc.subscribe(lambda ch: seen.append(proc.snapshot_cache.version((ch,))))
+        await proc.handle_index(SSIIndexMessage(index_id="VN30", index_value=1250.0))
+        assert seen == [1]
@@ -0,0 +1,58 @@
+"""Tests for market_delta — field-level diff of /ws/market states."""
+
+from app.websocket.market_delta import diff_market_state
+
+
+def _state(**overrides):
+    state = {
+        "quotes": {"VNM": {"symbol": "VNM", "total_volume": 100, "ato": {"total_volume": 0}}},
+        "prices": {"VNM": {"last_price": 80.5, "change": 0.5}},
+        "indices": {"VN30": {"value": 1250.0, "advances": 10}},
+        "foreign": {"total_net_value": 1.0, "top_buy": []},
+        "derivatives": None,
+    }
+    state.update(overrides)
+    return state
+
+
+class TestNoChange:
+    def test_identical_states_empty_delta(self):
+        assert diff_market_state(_state(), _state()) == {}
+
+
+class TestSymbolSections:
+    def test_changed_fields_only(self):
+        curr = _state(prices={"VNM": {"last_price": 81.0, "change": 0.5}})
+        assert diff_market_state(_state(), curr) == {"prices": {"VNM": {"last_price": 81.0}}}
+
+    def test_unchanged_symbols_omitted(self):
+        prev = _state(prices={"VNM": {"last_price": 80.5}, "FPT": {"last_price": 100.0}})
+        curr = _state(prices={"VNM": {"last_price": 80.5}, "FPT": {"last_price": 101.0}})
+        assert diff_market_state(prev, curr) == {"prices": {"FPT": {"last_price": 101.0}}}
+
+    def test_new_symbol_sent_in_full(self):
+        quotes = dict(_state()["quotes"])
+        quotes["FPT"] = {"symbol": "FPT", "total_volume": 5}
+        changes = diff_market_state(_state(), _state(quotes=quotes))
+        assert changes == {"quotes": {"FPT": {"symbol": "FPT", "total_volume": 5}}}
+
+    def test_nested_field_sent_whole(self):
+        quotes = {"VNM": {"symbol": "VNM", "total_volume": 100, "ato": {"total_volume": 7}}}
+        changes = diff_market_state(_state(), _state(quotes=quotes))
+        assert changes == {"quotes": {"VNM": {"ato": {"total_volume": 7}}}}
+
+    def test_removed_symbol_requires_keyframe(self):
+        assert diff_market_state(_state(), _state(quotes={})) is None
+
+
+class TestObjectSections:
+    def test_changed_object_fields(self):
+        curr = _state(foreign={"total_net_value": 2.0, "top_buy": []})
+        assert diff_market_state(_state(), curr) == {"foreign": {"total_net_value": 2.0}}
+
+    def test_new_object_sent_in_full(self):
+        deriv = {"symbol": "VN30F2603", "basis": 10.0}
+        assert diff_market_state(_state(), _state(derivatives=deriv)) == {"derivatives": deriv}
+
+    def test_object_removed_requires_keyframe(self):
+        assert diff_market_state(_state(), _state(foreign=None)) is None
@@ -21,6 +21,7 @@ from app.models.domain import (
     SessionStats,
 )
 from app.routers.market_router import router
+from app.services.snapshot_cache import SnapshotCache
 
 
 # Isolated test app — no production lifespan/db/ssi
@@ -30,7 +31,9 @@ _app.include_router(router)
 
 @pytest.fixture
 def mock_processor():
-    return MagicMock()
+    proc = MagicMock()
+    proc.snapshot_cache = SnapshotCache()
+    return proc
 
 
 @pytest_asyncio.fixture
@@ -39,6 +42,7 @@ async def client(mock_processor):
     # (real app.main triggers SSIAuthService which requires credentials)
     fake_main = ModuleType("app.main")
     fake_main.processor = mock_processor
+    fake_main.fanout_mirror = None
     with patch.dict(sys.modules, {"app.main": fake_main}):
         transport = ASGITransport(app=_app)
         async with AsyncClient(transport=transport, base_url="http://test") as c:
@@ -83,6 +87,55 @@ class TestGetSnapshot:
         assert data["derivatives"] is None
 
 
+class TestSnapshotScalar:
+    @pytest.mark.asyncio
+    async def test_indices_omit_intraday(self, client, mock_processor):
+        mock_processor.get_market_snapshot.return_value = MarketSnapshot(
+            indices={"VN30": IndexData(index_id="VN30", value=1250.0, intraday_cursor=3)},
+        )
+        resp = await client.get("/api/market/snapshot")
+        vn30 = resp.json()["indices"]["VN30"]
+        assert vn30["intraday_cursor"] == 3
+        assert "intraday" not in vn30
+
+
+class TestSnapshotCaching:
+    @pytest.mark.asyncio
+    async def test_serialized_once_per_version(self, client, mock_processor):
+        mock_processor.get_market_snapshot.return_value = MarketSnapshot()
+        await client.get("/api/market/snapshot")
+        await client.get("/api/market/snapshot")
+        mock_processor.get_market_snapshot.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_reserialized_after_dirty(self, client, mock_processor):
+        mock_processor.get_market_snapshot.return_value = MarketSnapshot()
+        await client.get("/api/market/snapshot")
+        mock_processor.snapshot_cache.mark_dirty("market")
+        await client.get("/api/market/snapshot")
+        assert mock_processor.get_market_snapshot.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_etag_returns_304(self, client, mock_processor):
+        mock_processor.get_market_snapshot.return_value = MarketSnapshot()
+        first = await client.get("/api/market/snapshot")
+        etag = first.headers["etag"]
+        resp = await client.get("/api/market/snapshot", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.content == b""
+
+    @pytest.mark.asyncio
+    async def test_stale_etag_returns_body(self, client, mock_processor):
+        mock_processor.get_market_snapshot.return_value = MarketSnapshot()
+        first = await client.get("/api/market/snapshot")
+        mock_processor.snapshot_cache.mark_dirty("index")
+        resp = await client.get(
+            "/api/market/snapshot", headers={"If-None-Match": first.headers["etag"]},
+        )
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != first.headers["etag"]
+
+
 # ---------------------------------------------------------------------------
 # GET /api/market/foreign-detail
 # ---------------------------------------------------------------------------
@@ -198,3 +251,42 @@ class TestGetBasisTrend:
 
         assert resp.status_code == 200
         assert resp.json() == []
+
+
+# ---------------------------------------------------------------------------
+# Fan-out worker mode (APP_ROLE=fanout)
+# ---------------------------------------------------------------------------
+class TestFanoutMode:
+    @pytest_asyncio.fixture
+    async def fanout_client(self):
+        from app.services.state_bus import InProcessStateBus
+        from app.websocket.fanout import FanoutMirror
+
+        bus = InProcessStateBus()
+        mirror = FanoutMirror(bus, {})
+        fake_main = ModuleType("app.main")
+        fake_main.processor = None
+        fake_main.fanout_mirror = mirror
+        with patch.dict(sys.modules, {"app.main": fake_main}):
+            transport = ASGITransport(app=_app)
+            async with AsyncClient(transport=transport, base_url="http://test") as c:
+                yield c, bus, mirror
+
+    @pytest.mark.asyncio
+    async def test_503_before_leader_state(self, fanout_client):
+        client, _, _ = fanout_client
+        resp = await client.get("/api/market/snapshot")
+        assert resp.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_serves_leader_body_with_etag(self, fanout_client):
+        client, bus, mirror = fanout_client
+        await bus.set("rest:volume-stats", '"e1"\n{"stats":[]}')
+        await mirror.poll_rest()
+
+        resp = await client.get("/api/market/volume-stats")
+        assert resp.status_code == 200
+        assert resp.json() == {"stats": []}
+        assert resp.headers["etag"] == '"e1"'
+        resp = await client.get("/api/market/volume-stats", headers={"If-None-Match": '"e1"'})
+        assert resp.status_code == 304
@@ -0,0 +1,249 @@
+"""Tests for per-client /ws/market subscriptions."""
+
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.websocket.connection_manager import ConnectionManager, _Client, _FifoOutbox, _LatestOutbox
+from app.websocket.encoding import JSON
+from app.websocket.market_subscriptions import (
+    MarketFilter,
+    MarketSubscriptions,
+    parse_subscription,
+)
+
+STATE = {
+    "quotes": {
+        "VNM": {"total_volume": 100, "avg_price": 80.0},
+        "FPT": {"total_volume": 200, "avg_price": 120.0},
+    },
+    "prices": {
+        "VNM": {"last_price": 80.5, "change": 0.5},
+        "FPT": {"last_price": 121.0, "change": 1.0},
+    },
+    "indices": {"VN30": {"value": 1250.0, "change": 3.0}},
+    "foreign": {"total_net_value": 5.0},
+    "derivatives": None,
+}
+
+
+class TestParseSubscription:
+    def test_all_keys(self):
+        flt = parse_subscription({
+            "type": "subscribe", "symbols": ["VNM"], "fields": ["last_price"],
+            "channels": ["prices"],
+        })
+        assert flt == MarketFilter(
+            frozenset({"VNM"}), frozenset({"last_price"}), frozenset({"prices"}),
+        )
+
+    def test_omitted_keys_select_all(self):
+        assert parse_subscription({"type": "subscribe", "symbols": ["VNM"]}).fields is None
+
+    def test_no_restriction_is_none(self):
+        assert parse_subscription({"type": "subscribe", "symbols": None}) is None
+
+    def test_order_and_duplicates_share_a_filter(self):
+        a = parse_subscription({"symbols": ["VNM", "FPT"]})
+        b = parse_subscription({"symbols": ["FPT", "VNM", "FPT"]})
+        assert a == b and hash(a) == hash(b)
+
+    @pytest.mark.parametrize("message", [
+        {"symbols": "VNM"},
+        {"symbols": [1, 2]},
+        {"channels": ["quotes", "orders"]},
+        {"fields": ["x"] * 501},
+    ])
+    def test_malformed_rejected(self, message):
+        with pytest.raises(ValueError):
+            parse_subscription(message)
+
+
+class TestSelect:
+    def test_keyframe_keeps_selected_sections(self):
+        flt = MarketFilter(symbols=frozenset({"VNM"}))
+        out = flt.select(STATE, keyframe=True)
+        assert out["quotes"] == {"VNM": STATE["quotes"]["VNM"]}
+        assert out["prices"] == {"VNM": STATE["prices"]["VNM"]}
+        assert out["indices"] == STATE["indices"]  # keyed by index id, not symbol
+        assert out["foreign"] == STATE["foreign"]
+        assert out["derivatives"] is None
+
+    def test_fields_and_channels(self):
+        flt = MarketFilter(fields=frozenset({"last_price", "value"}),
+                           channels=frozenset({"prices", "indices"}))
+        assert flt.select(STATE, keyframe=True) == {
+            "prices": {"VNM": {"last_price": 80.5}, "FPT": {"last_price": 121.0}},
+            "indices": {"VN30": {"value": 1250.0}},
+        }
+
+    def test_delta_drops_empty_sections(self):
+        flt = MarketFilter(symbols=frozenset({"VNM"}), fields=frozenset({"last_price"}))
+        delta = {"prices": {"FPT": {"change": 1.1}, "VNM": {"change": 0.6}}}
+        assert flt.select(delta, keyframe=False) == {}
+
+    def test_keyframe_keeps_empty_sections(self):
+        flt = MarketFilter(symbols=frozenset({"HPG"}), channels=frozenset({"quotes"}))
+        assert flt.select(STATE, keyframe=True) == {"quotes": {}}
+
+
+def _client(manager: ConnectionManager, outbox=None) -> MagicMock:
+    ws = MagicMock()
+    if outbox is None:
+        outbox = _FifoOutbox(50)
+    manager._clients[ws] = _Client(JSON, outbox, wake=MagicMock())
+    return ws
+
+
+def _frames(manager: ConnectionManager, ws) -> list[dict]:
+    outbox = manager._clients[ws].outbox
+    return [json.loads(outbox.pop()) for _ in range(len(outbox))]
+
+
+class _Market:
+    """Stand-in for DataPublisher's market state: seq + state, advanced by tests."""
+
+    def __init__(self):
+        self.seq = 5
+        self.state = json.loads(json.dumps(STATE))
+
+    def current(self):
+        return self.seq, self.state
+
+    def keyframe(self):
+        return json.dumps({"type": "keyframe", "seq": self.seq, **self.state})
+
+    def delta(self, changes: dict) -> tuple[int, dict, dict]:
+        self.seq += 1
+        for section, entries in changes.items():
+            for key, fields in entries.items():
+                self.state[section].setdefault(key, {}).update(fields)
+        return self.seq, self.state, changes
+
+
+@pytest.fixture
+def market():
+    return _Market()
+
+
+@pytest.fixture
+def manager():
+    return ConnectionManager(channel="market")
+
+
+@pytest.fixture
+def subs(manager, market):
+    return MarketSubscriptions(manager, market.current, market.keyframe)
+
+
+def _subscribe(subs, ws, **message):
+    subs.handle(ws, json.dumps({"type": "subscribe", **message}))
+
+
+class TestMarketSubscriptions:
+    def test_subscribe_sends_filtered_keyframe(self, subs, manager):
+        ws = _client(manager)
+        _subscribe(subs, ws, symbols=["VNM"], channels=["prices"])
+        assert _frames(manager, ws) == [
+            {"type": "keyframe", "seq": 5, "prices": {"VNM": {"last_price": 80.5, "change": 0.5}}},
+        ]
+
+    def test_delta_routed_only_to_interested_groups(self, subs, manager, market):
+        vnm, fpt, full = _client(manager), _client(manager), _client(manager)
+        _subscribe(subs, vnm, symbols=["VNM"])
+        _subscribe(subs, fpt, symbols=["FPT"])
+        _frames(manager, vnm), _frames(manager, fpt)
+
+        subs.publish(*market.delta({"prices": {"FPT": {"last_price": 121.5}}}))
+        assert _frames(manager, vnm) == []
+        assert _frames(manager, fpt) == [
+            {"type": "delta", "seq": 6, "base": 5, "prices": {"FPT": {"last_price": 121.5}}},
+        ]
+        assert _frames(manager, full) == []  # unfiltered clients get the publisher's broadcast
+
+    def test_group_chain_skips_irrelevant_frames(self, subs, manager, market):
+        ws = _client(manager)
+        _subscribe(subs, ws, symbols=["VNM"])
+        _frames(manager, ws)
+        subs.publish(*market.delta({"quotes": {"FPT": {"total_volume": 210}}}))
+        subs.publish(*market.delta({"quotes": {"FPT": {"total_volume": 220}}}))
+        subs.publish(*market.delta({"quotes": {"VNM": {"total_volume": 110}}}))
+        (frame,) = _frames(manager, ws)
+        assert (frame["seq"], frame["base"]) == (8, 5)
+
+    def test_late_joiner_keyframe_is_on_group_chain(self, subs, manager, market):
+        first = _client(manager)
+        _subscribe(subs, first, symbols=["VNM"])
+        subs.publish(*market.delta({"quotes": {"FPT": {"total_volume": 210}}}))
+        second = _client(manager)
+        _subscribe(subs, second, symbols=["VNM"])
+        assert _frames(manager, second)[0]["seq"] == 5
+        subs.publish(*market.delta({"prices": {"VNM": {"change": 0.7}}}))
+        assert _frames(manager, second)[-1]["base"] == 5
+
+    def test_same_filter_built_once(self, subs, manager, market):
+        clients = [_client(manager) for _ in range(3)]
+        for ws in clients:
+            _subscribe(subs, ws, symbols=["VNM"])
+        assert subs.group_count == 1
+        manager.broadcast = MagicMock()
+        subs.publish(*market.delta({"prices": {"VNM": {"change": 0.7}}}))
+        manager.broadcast.assert_called_once()
+
+    def test_index_change_reaches_every_group(self, subs, manager, market):
+        ws = _client(manager)
+        _subscribe(subs, ws, symbols=["VNM"])
+        _frames(manager, ws)
+        subs.publish(*market.delta({"indices": {"VN30": {"value": 1251.0}}}))
+        assert _frames(manager, ws)[0]["indices"] == {"VN30": {"value": 1251.0}}
+
+    def test_keyframe_goes_to_every_group(self, subs, manager, market):
+        ws = _client(manager)
+        _subscribe(subs, ws, symbols=["FPT"], channels=["quotes"])
+        _frames(manager, ws)
+        market.seq = 9
+        subs.publish(market.seq, market.state, None)
+        assert _frames(manager, ws) == [
+            {"type": "keyframe", "seq": 9, "quotes": {"FPT": STATE["quotes"]["FPT"]}},
+        ]
+
+    def test_unsubscribe_returns_to_full_stream(self, subs, manager, market):
+        ws = _client(manager)
+        _subscribe(subs, ws, symbols=["VNM"])
+        subs.handle(ws, '{"type": "unsubscribe"}')
+        frames = _frames(manager, ws)
+        assert frames[-1] == json.loads(market.keyframe())
+        assert manager._clients[ws].topic is None
+
+    def test_empty_group_pruned(self, subs, manager, market):
+        ws = _client(manager)
+        _subscribe(subs, ws, symbols=["VNM"])
+        manager.set_topic(ws, None)
+        subs.publish(*market.delta({"prices": {"VNM": {"change": 0.7}}}))
+        assert subs.group_count == 0
+        assert not subs._by_symbol
+
+    @pytest.mark.parametrize("text", [
+        "ping", "[1]", '{"type": "hello"}', '{"type": "subscribe", "channels": ["x"]}',
+    ])
+    def test_other_messages_ignored(self, subs, manager, text):
+        ws = _client(manager)
+        subs.handle(ws, text)
+        assert _frames(manager, ws) == []
+        assert manager._clients[ws].topic is None
+
+    def test_resync_rebuilds_group_keyframe(self, market):
+        manager = ConnectionManager(
+            channel="market", latest_only=True, resync=lambda topic: subs.keyframe(topic),
+        )
+        subs = MarketSubscriptions(manager, market.current, market.keyframe)
+        ws = _client(manager, _LatestOutbox())
+        _subscribe(subs, ws, symbols=["VNM"], channels=["prices"])
+        _frames(manager, ws)
+        subs.publish(*market.delta({"prices": {"VNM": {"change": 0.7}}}))
+        subs.publish(*market.delta({"prices": {"VNM": {"change": 0.8}}}))  # replaces pending
+        assert _frames(manager, ws) == [
+            {"type": "keyframe", "seq": 7,
+             "prices": {"VNM": {"last_price": 80.5, "change": 0.8}}},
+        ]
@@ -7,7 +7,7 @@ import pytest
 
 from app.analytics.alert_models import Alert, AlertSeverity, AlertType
 from app.analytics.alert_service import AlertService
-from app.analytics.price_tracker import PriceTracker
+from app.analytics.price_tracker import PriceTracker, _VolumeStats
 from app.models.domain import BasisPoint, ForeignInvestorData
 from app.services.derivatives_tracker import DerivativesTracker
 from app.services.foreign_investor_tracker import ForeignInvestorTracker
@@ -150,6 +150,87 @@ class TestVolumeSpikeDetection:
         assert hpg_alert is None
 
 
+def _spike_alerts(alert_service):
+    return [a for a in alert_service.get_recent_alerts() if a.alert_type == AlertType.VOLUME_SPIKE]
+
+
+def _mode_tracker(alert_service, quote_cache, foreign_tracker, derivatives_tracker, mode):
+    return PriceTracker(alert_service, quote_cache, foreign_tracker, derivatives_tracker,
+                        spike_mode=mode)
+
+
+class TestVolumeStats:
+    """Running window statistics stay equal to a full recomputation."""
+
+    def test_moments_match_brute_force_after_eviction(self):
+        stats = _VolumeStats()
+        t0 = datetime(2026, 2, 9, 10, 0)
+        vols = [(i * 37) % 500 for i in range(200)]
+        for i, v in enumerate(vols):
+            stats.evict(t0 + timedelta(seconds=i) - timedelta(seconds=60))
+            stats.push(t0 + timedelta(seconds=i), v)
+        window = vols[-61:]  # entries at or after the 60s cutoff
+        assert stats.count == len(window)
+        assert stats.total == sum(window)
+        mean = sum(window) / len(window)
+        assert stats.mean() == pytest.approx(mean)
+        var = sum((v - mean) ** 2 for v in window) / len(window)
+        assert stats.std() == pytest.approx(var ** 0.5)
+
+    def test_old_trades_leave_window(self, tracker, alert_service):
+        t0 = datetime(2026, 2, 9, 10, 0)
+        with patch("app.analytics.price_tracker.datetime") as mock_dt:
+            mock_dt.now.return_value = t0
+            for _ in range(20):
+                tracker.on_trade("VNM", 80.0, 1000)
+            # 21 minutes later the heavy baseline has expired
+            mock_dt.now.return_value = t0 + timedelta(minutes=21)
+            for _ in range(10):
+                tracker.on_trade("VNM", 80.0, 100)
+            tracker.on_trade("VNM", 80.0, 400)
+        assert tracker._vol_stats["VNM"].count == 11
+        assert len(_spike_alerts(alert_service)) == 1
+
+    def test_invalid_mode_rejected(self, alert_service, quote_cache, foreign_tracker, derivatives_tracker):
+        with pytest.raises(ValueError):
+            _mode_tracker(alert_service, quote_cache, foreign_tracker, derivatives_tracker, "median")
+
+
+class TestVolumeSpikeModes:
+    @pytest.mark.parametrize("mode", ["zscore", "ewma"])
+    def test_outlier_triggers_with_zscore(
+        self, alert_service, quote_cache, foreign_tracker, derivatives_tracker, mode,
+    ):
+        tracker = _mode_tracker(alert_service, quote_cache, foreign_tracker, derivatives_tracker, mode)
+        for i in range(30):
+            tracker.on_trade("VNM", 80.0, 90 + (i % 3) * 10)  # 90/100/110
+        tracker.on_trade("VNM", 80.0, 200)
+        (alert,) = _spike_alerts(alert_service)
+        assert alert.data["zscore"] > 3.0
+        assert "σ" in alert.message
+
+    @pytest.mark.parametrize("mode", ["zscore", "ewma"])
+    def test_noisy_baseline_suppresses_ratio_spike(
+        self, alert_service, quote_cache, foreign_tracker, derivatives_tracker, mode,
+    ):
+        """A 4x-average trade is normal for a symbol whose volume swings widely."""
+        tracker = _mode_tracker(alert_service, quote_cache, foreign_tracker, derivatives_tracker, mode)
+        for i in range(30):
+            tracker.on_trade("VNM", 80.0, 10 if i % 2 else 500)
+        tracker.on_trade("VNM", 80.0, 800)  # 3.1x the mean, ~2.2σ
+        assert _spike_alerts(alert_service) == []
+
+    @pytest.mark.parametrize("mode", ["zscore", "ewma"])
+    def test_constant_baseline_has_no_zscore(
+        self, alert_service, quote_cache, foreign_tracker, derivatives_tracker, mode,
+    ):
+        tracker = _mode_tracker(alert_service, quote_cache, foreign_tracker, derivatives_tracker, mode)
+        for _ in range(5):
+            tracker.on_trade("VNM", 80.0, 100)
+        tracker.on_trade("VNM", 80.0, 10_000)  # too few samples
+        assert _spike_alerts(alert_service) == []
+
+
 class TestPriceBreakoutDetection:
     """Price breakout: price hits ceiling or floor."""
 
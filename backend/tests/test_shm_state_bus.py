@@ -0,0 +1,207 @@
+"""Tests for the shared-memory StateBus (seqlock slots + frame ring)."""
+
+import asyncio
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+from app.services.shm_state_bus import _SLOT_HEADER, SharedMemoryStateBus
+from app.services.state_bus import create_state_bus
+
+
+@pytest.fixture
+def name():
+    return f"stb-test-{uuid.uuid4().hex[:12]}"
+
+
+@pytest_asyncio.fixture
+async def buses(name):
+    leader = SharedMemoryStateBus(name, owner=True, slot_count=4, slot_bytes=256, ring_bytes=1024)
+    worker = SharedMemoryStateBus(name, owner=False, poll_interval=0.001)
+    yield leader, worker
+    await worker.close()
+    await leader.close()
+
+
+class TestKeys:
+    @pytest.mark.asyncio
+    async def test_get_before_segment_exists(self, buses):
+        _, worker = buses
+        assert await worker.get("rest:snapshot") is None
+
+    @pytest.mark.asyncio
+    async def test_set_then_get_across_buses(self, buses):
+        leader, worker = buses
+        await leader.set("rest:snapshot", "v1")
+        await leader.set("rest:foreign", "f1")
+        assert await worker.get("rest:snapshot") == "v1"
+        assert await worker.get("rest:foreign") == "f1"
+        assert await worker.get("rest:missing") is None
+
+    @pytest.mark.asyncio
+    async def test_overwrite_shorter_value(self, buses):
+        leader, worker = buses
+        await leader.set("k", "a long first value")
+        await leader.set("k", "short")
+        assert await worker.get("k") == "short"
+
+    @pytest.mark.asyncio
+    async def test_torn_read_is_retried(self, buses):
+        leader, worker = buses
+        await leader.set("k", "v1")
+        seg = worker._segment()
+        assert seg.read_slot(0) == b"v1"
+        seq = seg.u64(seg.slot_off(0))
+        seg.set_u64(seg.slot_off(0), seq + 1)  # writer mid-update
+        assert seg.read_slot(0) is None
+        seg.set_u64(seg.slot_off(0), seq + 2)
+        assert seg.read_slot(0) == b"v1"
+
+    @pytest.mark.asyncio
+    async def test_slot_stuck_mid_write_times_out(self, buses):
+        leader, worker = buses
+        await leader.set("k", "v1")
+        worker._read_timeout = 0.05
+        seg = worker._segment()
+        seg.set_u64(seg.slot_off(0), seg.u64(seg.slot_off(0)) + 1)  # leader died mid-write
+        assert await asyncio.wait_for(worker.get("k"), timeout=2) is None
+
+    @pytest.mark.asyncio
+    async def test_closed_segment_ends_read(self, buses):
+        leader, worker = buses
+        await leader.set("k", "v1")
+        seg = worker._segment()
+        seg.set_u64(seg.slot_off(0), seg.u64(seg.slot_off(0)) + 1)
+        read = asyncio.ensure_future(worker.get("k"))
+        await asyncio.sleep(0.01)
+        assert not read.done()
+        await leader.close()  # marks the segment closed
+        assert await asyncio.wait_for(read, timeout=2) is None
+
+    @pytest.mark.asyncio
+    async def test_limits(self, buses):
+        leader, _ = buses
+        with pytest.raises(ValueError, match="slot size"):
+            await leader.set("big", "x" * 300)
+        for i in range(4):
+            await leader.set(f"k{i}", "v")
+        with pytest.raises(ValueError, match="slots in use"):
+            await leader.set("k4", "v")
+
+    @pytest.mark.asyncio
+    async def test_slot_header_fits_key(self):
+        from app.services.shm_state_bus import _KEY_MAX, _SLOT
+
+        assert _SLOT.size + _KEY_MAX <= _SLOT_HEADER
+
+
+class TestFrames:
+    @pytest.mark.asyncio
+    async def test_frames_in_order(self, buses):
+        leader, worker = buses
+        await leader.set("init", "x")  # segment exists before subscribe
+        frames = await worker.subscribe()
+        await leader.publish("market", "a")
+        await leader.publish("index", "b")
+        assert await anext(frames) == ("market", "a")
+        assert await anext(frames) == ("index", "b")
+        await frames.aclose()
+
+    @pytest.mark.asyncio
+    async def test_frames_before_subscribe_not_delivered(self, buses):
+        leader, worker = buses
+        await leader.publish("market", "early")
+        frames = await worker.subscribe()
+        await leader.publish("market", "late")
+        assert await anext(frames) == ("market", "late")
+        await frames.aclose()
+
+    @pytest.mark.asyncio
+    async def test_ring_wraps(self, buses):
+        leader, worker = buses
+        await leader.publish("market", "warmup")
+        frames = await worker.subscribe()
+        for i in range(40):  # ~40 x 30 bytes: wraps the 1 KB ring
+            await leader.publish("market", f"frame-{i:03d}-{'x' * 10}")
+            assert await anext(frames) == ("market", f"frame-{i:03d}-{'x' * 10}")
+        await frames.aclose()
+
+    @pytest.mark.asyncio
+    async def test_overrun_skips_to_head(self, buses):
+        leader, worker = buses
+        await leader.publish("market", "warmup")
+        frames = await worker.subscribe()
+        for i in range(100):  # reader far behind: its records are overwritten
+            await leader.publish("market", f"stale-{i:03d}")
+        pending = asyncio.ensure_future(anext(frames))
+        await asyncio.sleep(0.02)  # reader detects the overrun and jumps to the head
+        assert not pending.done()
+        await leader.publish("market", "fresh")
+        assert await asyncio.wait_for(pending, 1) == ("market", "fresh")
+        await frames.aclose()
+
+    @pytest.mark.asyncio
+    async def test_oversized_frame_rejected(self, buses):
+        leader, _ = buses
+        with pytest.raises(ValueError, match="too large"):
+            await leader.publish("sparkline", "x" * 300)
+
+
+class TestLifecycle:
+    @pytest.mark.asyncio
+    async def test_reader_follows_leader_restart(self, name):
+        worker = SharedMemoryStateBus(name, owner=False, poll_interval=0.001)
+        first = SharedMemoryStateBus(name, owner=True, slot_count=4, slot_bytes=256, ring_bytes=1024)
+        await first.set("k", "old")
+        assert await worker.get("k") == "old"
+
+        await first.close()
+        second = SharedMemoryStateBus(name, owner=True, slot_count=4, slot_bytes=256, ring_bytes=1024)
+        await second.set("k", "new")
+        assert await worker.get("k") == "new"
+        await worker.close()
+        await second.close()
+
+    @pytest.mark.asyncio
+    async def test_owner_replaces_stale_segment(self, name):
+        crashed = SharedMemoryStateBus(name, owner=True, slot_count=4, slot_bytes=256, ring_bytes=1024)
+        await crashed.set("k", "stale")
+        leader = SharedMemoryStateBus(name, owner=True, slot_count=4, slot_bytes=256, ring_bytes=1024)
+        await leader.set("other", "v")
+        worker = SharedMemoryStateBus(name, owner=False)
+        assert await worker.get("k") is None
+        assert await worker.get("other") == "v"
+        await worker.close()
+        await leader.close()
+        crashed._seg.close()
+
+    @pytest.mark.asyncio
+    async def test_read_from_another_process(self, buses, name):
+        leader, _ = buses
+        await leader.set("rest:snapshot", '{"quotes": {}}')
+        script = (
+            "import asyncio\n"
+            "from app.services.shm_state_bus import SharedMemoryStateBus\n"
+            f"bus = SharedMemoryStateBus({name!r}, owner=False)\n"
+            "print(asyncio.run(bus.get('rest:snapshot')))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=Path(__file__).resolve().parents[1],
+            capture_output=True, text=True, timeout=30,
+        )
+        assert result.stdout.strip() == '{"quotes": {}}', result.stderr
+        # Exiting reader must not have unlinked the leader's segment
+        assert await SharedMemoryStateBus(name, owner=False).get("rest:snapshot") == '{"quotes": {}}'
+
+
+class TestFactory:
+    def test_shm_url(self):
+        bus = create_state_bus("shm://stock-test", owner=True)
+        assert isinstance(bus, SharedMemoryStateBus)
+        assert bus._name == "stock-test"
+        assert bus._owner is True
@@ -0,0 +1,100 @@
+"""Tests for SnapshotCache — versioned serialize-once payload cache."""
+
+from unittest.mock import MagicMock
+
+from app.services.snapshot_cache import SnapshotCache
+
+
+def _builder(text='{"a":1}'):
+    return MagicMock(return_value=text)
+
+
+class TestGet:
+    def test_builds_on_first_get(self):
+        cache = SnapshotCache()
+        build = _builder()
+        frame = cache.get("k", ("market",), build)
+        assert frame.text == '{"a":1}'
+        assert frame.body == b'{"a":1}'
+        build.assert_called_once()
+
+    def test_reuses_frame_until_dirty(self):
+        cache = SnapshotCache()
+        build = _builder()
+        first = cache.get("k", ("market",), build)
+        second = cache.get("k", ("market",), build)
+        assert first is second
+        build.assert_called_once()
+
+    def test_dirty_dependency_rebuilds(self):
+        cache = SnapshotCache()
+        build = _builder()
+        cache.get("k", ("market", "index"), build)
+        cache.mark_dirty("index")
+        cache.get("k", ("market", "index"), build)
+        assert build.call_count == 2
+
+    def test_unrelated_channel_keeps_frame(self):
+        cache = SnapshotCache()
+        build = _builder()
+        cache.get("k", ("foreign",), build)
+        cache.mark_dirty("market")
+        cache.get("k", ("foreign",), build)
+        build.assert_called_once()
+
+    def test_keys_cached_independently(self):
+        cache = SnapshotCache()
+        a = cache.get("a", ("market",), _builder("A"))
+        b = cache.get("b", ("market",), _builder("B"))
+        assert (a.text, b.text) == ("A", "B")
+
+
+class TestGetJson:
+    def test_keeps_data_alongside_text(self):
+        cache = SnapshotCache()
+        build = MagicMock(return_value={"a": 1})
+        frame = cache.get_json("k", ("market",), build)
+        assert frame.data == {"a": 1}
+        assert frame.text == '{"a": 1}'
+        assert cache.get_json("k", ("market",), build) is frame
+        build.assert_called_once()
+
+
+class TestMarketState:
+    def test_excludes_intraday(self):
+        from app.models.domain import IndexData, MarketSnapshot
+        from app.services.snapshot_cache import market_state
+
+        proc = MagicMock()
+        proc.snapshot_cache = SnapshotCache()
+        proc.get_market_snapshot.return_value = MarketSnapshot(
+            indices={"VN30": IndexData(index_id="VN30", value=1250.0)},
+        )
+        frame = market_state(proc)
+        assert frame.data["indices"]["VN30"]["value"] == 1250.0
+        assert "intraday" not in frame.data["indices"]["VN30"]
+
+
+class TestEtag:
+    def test_etag_changes_with_version(self):
+        cache = SnapshotCache()
+        first = cache.get("k", ("market",), _builder())
+        cache.mark_dirty("market")
+        second = cache.get("k", ("market",), _builder())
+        assert first.etag != second.etag
+
+    def test_etag_differs_across_instances(self):
+        """Versions restart at 0 after a restart; ETags must not collide."""
+        a = SnapshotCache().get("k", ("market",), _builder())
+        b = SnapshotCache().get("k", ("market",), _builder())
+        assert a.etag != b.etag
+
+
+class TestMarkAllDirty:
+    def test_invalidates_everything(self):
+        cache = SnapshotCache()
+        build = _builder()
+        cache.get("k", ("market",), build)
+        cache.mark_all_dirty()
+        cache.get("k", ("market",), build)
+        assert build.call_count == 2
@@ -0,0 +1,154 @@
+"""Tests for SpillLog — append/read round-trip, rotation, torn frames, seal/remove, size cap."""
+
+import mmap
+from datetime import datetime, timezone
+
+import pytest
+
+from app.database.spill_log import SpillLog
+from app.metrics import db_spill_dropped_rows_total
+
+_TS = datetime(2026, 2, 9, 10, 30, tzinfo=timezone.utc)
+_COLS = ["symbol", "timestamp", "price"]
+
+
+def _rows(n: int, start: int = 0) -> list[tuple]:
+    return [("VNM", _TS, float(i)) for i in range(start, start + n)]
+
+
+def _read_all(log: SpillLog) -> list:
+    return [b for p in log.sealed_segments() for b in SpillLog.read_segment(p)]
+
+
+class TestRoundTrip:
+    def test_append_then_read(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=4096)
+        assert log.append("tick_data", _COLS, _rows(3)) == 3
+        assert log.append("foreign_flow", ["symbol"], [("FPT",)]) == 1
+        log.seal()
+        assert _read_all(log) == [
+            ("tick_data", _COLS, _rows(3)),
+            ("foreign_flow", ["symbol"], [("FPT",)]),
+        ]
+
+    def test_empty_rows_not_written(self, tmp_path):
+        log = SpillLog(tmp_path)
+        assert log.append("tick_data", _COLS, []) == 0
+        assert not log.has_pending()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_accepts_iterables(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=4096)
+        log.append("tick_data", _COLS, iter(_rows(2)))
+        log.seal()
+        assert _read_all(log)[0][2] == _rows(2)
+
+
+    def test_frames_across_page_boundaries(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=4 * mmap.PAGESIZE)
+        for i in range(30):
+            log.append("tick_data", _COLS, _rows(7, start=i * 7))
+        log.seal()
+        rows = [r for _, _, batch in _read_all(log) for r in batch]
+        assert rows == _rows(210)
+
+
+class TestSegments:
+    def test_active_segment_not_replayable(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=4096)
+        log.append("tick_data", _COLS, _rows(1))
+        assert log.has_pending()
+        assert log.sealed_segments() == []
+        log.seal()
+        assert len(log.sealed_segments()) == 1
+
+    def test_rotates_when_full(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=1024)
+        for i in range(20):
+            log.append("tick_data", _COLS, _rows(5, start=i * 5))
+        log.seal()
+        segments = log.sealed_segments()
+        assert len(segments) > 1
+        assert [p.name for p in segments] == sorted(p.name for p in segments)
+        rows = [r for _, _, batch in _read_all(log) for r in batch]
+        assert rows == _rows(100)
+
+    def test_oversized_batch_gets_own_segment(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=256)
+        log.append("tick_data", _COLS, _rows(200))
+        log.seal()
+        assert _read_all(log)[0][2] == _rows(200)
+
+    def test_remove_and_new_process_resumes_numbering(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=4096)
+        log.append("tick_data", _COLS, _rows(1))
+        log.seal()
+        (first,) = log.sealed_segments()
+
+        restarted = SpillLog(tmp_path, segment_bytes=4096)
+        assert restarted.has_pending()  # leftover segment from previous process
+        restarted.append("tick_data", _COLS, _rows(1))
+        restarted.seal()
+        assert len(restarted.sealed_segments()) == 2
+        restarted.remove(first)
+        assert first not in restarted.sealed_segments()
+        assert first.name < restarted.sealed_segments()[0].name
+
+
+class TestCorruption:
+    def test_torn_frame_ends_segment(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=4096)
+        log.append("tick_data", _COLS, _rows(2))
+        log.append("tick_data", _COLS, _rows(2, start=2))
+        log.seal()
+        (path,) = log.sealed_segments()
+        data = bytearray(path.read_bytes())
+        # Corrupt the last payload byte of the second frame
+        end = data.rstrip(b"\0")
+        data[len(end) - 1] ^= 0xFF
+        path.write_bytes(bytes(data))
+        assert _read_all(log) == [("tick_data", _COLS, _rows(2))]
+
+    def test_foreign_file_rejected(self, tmp_path):
+        (tmp_path / "000000000001.seg").write_bytes(b"NOPE" + b"\0" * 64)
+        log = SpillLog(tmp_path)
+        with pytest.raises(ValueError, match="not a v1 segment"):
+            _read_all(log)
+
+    def test_set_aside_keeps_file_and_numbering(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=1024)
+        log.append("tick_data", _COLS, _rows(1))
+        log.seal()
+        (path,) = log.sealed_segments()
+        failed = log.set_aside(path)
+        assert failed.name == "000000000001.failed"
+        assert not log.has_pending()
+        assert log.disk_bytes() == failed.stat().st_size
+        log.append("tick_data", _COLS, _rows(1))
+        log.seal()
+        assert [p.name for p in log.sealed_segments()] == ["000000000002.seg"]
+
+
+class TestCap:
+    def test_drops_once_cap_reached(self, tmp_path):
+        dropped = db_spill_dropped_rows_total.labels(table="tick_data")
+        before = dropped._value.get()
+        log = SpillLog(tmp_path, segment_bytes=1024, max_bytes=2048)
+        written = sum(log.append("tick_data", _COLS, _rows(5, start=i * 5)) for i in range(40))
+        assert 0 < written < 200
+        assert log.disk_bytes() <= 2048
+        assert dropped._value.get() - before == 200 - written
+
+    def test_replay_frees_space(self, tmp_path):
+        log = SpillLog(tmp_path, segment_bytes=1024, max_bytes=1024)
+        log.append("tick_data", _COLS, _rows(1))
+        log.seal()
+        assert log.append("tick_data", _COLS, _rows(1)) == 0
+        for path in log.sealed_segments():
+            log.remove(path)
+        assert log.append("tick_data", _COLS, _rows(1)) == 1
+
+    def test_counts_leftover_segments(self, tmp_path):
+        SpillLog(tmp_path, segment_bytes=1024).append("tick_data", _COLS, _rows(1))
+        restarted = SpillLog(tmp_path, segment_bytes=1024, max_bytes=1024)
+        assert restarted.append("tick_data", _COLS, _rows(1)) == 0
@@ -0,0 +1,133 @@
+"""Tests for the fast-path SSI decoder — parity with the Pydantic path."""
+
+import json
+
+import pytest
+
+from app.services.ssi_fast_decoder import (
+    SSIQuoteRecord,
+    SSITradeRecord,
+    decode_content,
+    decode_message,
+)
+from app.services.ssi_field_normalizer import extract_content, parse_message_multi
+
+
+def _pydantic(raw):
+    content = extract_content(raw)
+    return parse_message_multi(content) if content is not None else []
+
+
+def _assert_parity(raw):
+    fast, slow = decode_message(raw), _pydantic(raw)
+    assert [r for r, _ in fast] == [r for r, _ in slow]
+    for (_, rec), (_, model) in zip(fast, slow):
+        assert rec.model_dump() == model.model_dump()
+        for name, value in model.model_dump().items():
+            assert type(getattr(rec, name)) is type(value), name
+
+
+X_CONTENT = {
+    "RType": "X", "Symbol": "VNM", "Exchange": "HOSE",
+    "LastPrice": 85000, "LastVol": 100, "TotalVol": 50000,
+    "TotalVal": 4250000000, "Change": 1.5, "RatioChange": 1.8,
+    "TradingSession": "LO", "Ceiling": 90900, "Floor": 79100,
+    "RefPrice": 85000, "BidPrice1": 84900, "BidVol1": 1000,
+    "AskPrice1": 85000, "AskVol1": 800, "Unmapped": "ignored",
+}
+
+
+class TestParity:
+    @pytest.mark.parametrize("content", [
+        X_CONTENT,
+        {"RType": "Trade", "Symbol": "FPT", "LastPrice": 120.5, "LastVol": 10},
+        {"RType": "Quote", "Symbol": "HPG", "BidPrice1": 25400, "AskVol1": 800},
+        {"RType": "R", "Symbol": "VCB", "FBuyVol": 500, "FSellVal": 3e7, "TotalRoom": 100000},
+        {"RType": "MI", "IndexId": "VN30", "IndexValue": 1234.56, "Advances": 20},
+        {"RType": "B", "Symbol": "VNM", "Time": "14:30:00", "Close": 85000, "Volume": 100000},
+        {"RType": "Trade", "Symbol": "FPT"},
+        {"RType": "R", "StockSymbol": "SSI", "FBuyVol": 1},
+    ])
+    def test_matches_pydantic_models(self, content):
+        _assert_parity(json.dumps({"Content": json.dumps(content)}))
+
+    def test_numeric_strings_coerced(self):
+        _assert_parity({"Content": {"RType": "Trade", "Symbol": "VNM", "LastPrice": "85000", "LastVol": "100"}})
+
+    @pytest.mark.parametrize("field, value", [
+        ("LastVol", "12.7"),
+        ("LastVol", 12.7),
+        ("LastVol", 12.0),
+        ("LastVol", "12"),
+        ("LastVol", " 12 "),
+        ("LastVol", True),
+        ("LastVol", None),
+        ("LastPrice", "1e3"),
+        ("LastPrice", " 85000.5 "),
+        ("LastPrice", True),
+        ("LastPrice", None),
+        ("LastPrice", "n/a"),
+        ("LastPrice", [1]),
+        ("Exchange", 1),
+        ("Exchange", None),
+        ("TradingSession", ""),
+    ])
+    def test_field_values_follow_pydantic(self, field, value):
+        _assert_parity({"RType": "Trade", "Symbol": "VNM", field: value})
+
+    @pytest.mark.parametrize("content", [
+        {"RType": "R", "Symbol": "VCB", "StockSymbol": "SSI"},
+        {"RType": "R", "StockSymbol": "SSI", "Symbol": "VCB"},
+        {"RType": "R", "Symbol": "VCB", "StockSymbol": None},
+        {"RType": "R", "StockSymbol": None, "Symbol": "VCB"},
+        {"RType": "R", "Symbol": None},
+    ])
+    def test_symbol_precedence_matches(self, content):
+        _assert_parity(content)
+
+    def test_unknown_rtype(self):
+        assert decode_message({"RType": "Unknown"}) == []
+        assert decode_message({"Symbol": "VNM"}) == []
+
+
+class TestDecodeMessage:
+    def test_x_splits_into_trade_and_quote(self):
+        results = decode_message({"Content": X_CONTENT})
+        assert [r for r, _ in results] == ["Trade", "Quote"]
+        trade, quote = results[0][1], results[1][1]
+        assert isinstance(trade, SSITradeRecord)
+        assert isinstance(quote, SSIQuoteRecord)
+        assert trade.last_vol == 100
+        assert quote.bid_price_1 == 84900.0
+
+    def test_records_are_slotted(self):
+        _, trade = decode_message({"RType": "Trade", "Symbol": "VNM"})[0]
+        assert not hasattr(trade, "__dict__")
+
+    def test_null_drops_message(self):
+        assert decode_message({"RType": "Trade", "Symbol": "VNM", "LastPrice": None}) == []
+
+    def test_absent_field_takes_default(self):
+        _, trade = decode_message({"RType": "Trade", "Symbol": "VNM"})[0]
+        assert trade.last_price == 0.0
+
+    def test_uncoercible_value_drops_message(self):
+        assert decode_message({"RType": "Trade", "Symbol": "VNM", "LastVol": "n/a"}) == []
+
+    def test_bytes_input(self):
+        assert decode_message(b'{"RType": "MI", "IndexId": "VN30"}')[0][1].index_id == "VN30"
+
+
+class TestDecodeContent:
+    def test_nested_json_string(self):
+        raw = json.dumps({"Content": json.dumps({"RType": "Trade"})})
+        assert decode_content(raw) == {"RType": "Trade"}
+
+    def test_lowercase_content_key(self):
+        assert decode_content({"content": {"RType": "R"}}) == {"RType": "R"}
+
+    def test_invalid_input(self):
+        assert decode_content("not json") is None
+        assert decode_content("") is None
+        assert decode_content(42) is None
+        assert decode_content(None) is None
@@ -1,7 +1,8 @@
 """Tests for SSI stream service — demux routing and callback dispatch."""
 
 import asyncio
-from unittest.mock import AsyncMock, MagicMock
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -160,6 +161,65 @@ class TestHandleMessage:
         cb2.assert_called_once()
 
 
+class TestFastDecoder:
+    def test_fast_decoder_dispatches_records(self):
+        svc = SSIStreamService(MagicMock(), MagicMock(), decoder="fast")
+        svc._loop = asyncio.new_event_loop()
+        trade_cb, quote_cb = AsyncMock(), AsyncMock()
+        svc.on_trade(trade_cb)
+        svc.on_quote(quote_cb)
+        svc._handle_message('{"Content": "{\\"RType\\": \\"X\\", \\"Symbol\\": \\"VNM\\", \\"LastVol\\": 100}"}')
+        svc._loop.run_until_complete(asyncio.sleep(0.05))
+        assert trade_cb.call_args[0][0].last_vol == 100
+        assert quote_cb.call_args[0][0].symbol == "VNM"
+
+    def test_unknown_decoder_rejected(self):
+        with pytest.raises(KeyError):
+            SSIStreamService(MagicMock(), MagicMock(), decoder="msgspec")
+
+
+class TestSymbolFilter:
+    def test_unwatched_symbol_dropped_before_parse(self, stream_service):
+        cb = AsyncMock()
+        stream_service.on_trade(cb)
+        stream_service.set_symbol_filter(lambda s: s == "VNM")
+        with patch.object(stream_service, "_parse", wraps=stream_service._parse) as parse:
+            stream_service._handle_message({"Content": {"RType": "X", "Symbol": "AAA"}})
+            stream_service._handle_message({"Content": {"RType": "X", "Symbol": "VNM"}})
+        stream_service._loop.run_until_complete(asyncio.sleep(0.05))
+        parse.assert_called_once()
+        assert cb.call_args[0][0].symbol == "VNM"
+
+    def test_drops_counted_per_channel(self, stream_service):
+        from app.metrics import ssi_messages_dropped_total
+
+        stream_service.set_symbol_filter(lambda s: False)
+        before = ssi_messages_dropped_total.labels(channel="foreign")._value.get()
+        stream_service._handle_message({"Content": {"RType": "R", "Symbol": "AAA"}})
+        stream_service._handle_message({"Content": {"RType": "R", "StockSymbol": "BBB"}})
+        after = ssi_messages_dropped_total.labels(channel="foreign")._value.get()
+        assert after - before == 2
+
+    def test_messages_without_symbol_pass(self, stream_service):
+        cb = AsyncMock()
+        stream_service.on_index(cb)
+        stream_service.set_symbol_filter(lambda s: False)
+        stream_service._handle_message({"Content": {"RType": "MI", "IndexId": "VN30"}})
+        stream_service._loop.run_until_complete(asyncio.sleep(0.05))
+        cb.assert_called_once()
+
+    def test_filter_with_fast_decoder(self):
+        svc = SSIStreamService(MagicMock(), MagicMock(), decoder="fast")
+        svc._loop = asyncio.new_event_loop()
+        cb = AsyncMock()
+        svc.on_quote(cb)
+        svc.set_symbol_filter(lambda s: s.startswith("VN30F"))
+        svc._handle_message('{"Content": {"RType": "X", "Symbol": "AAA"}}')
+        svc._handle_message('{"Content": {"RType": "X", "Symbol": "VN30F2603"}}')
+        svc._loop.run_until_complete(asyncio.sleep(0.05))
+        cb.assert_called_once()
+
+
 class TestCallbackErrorIsolation:
     def test_failing_callback_does_not_crash(self, stream_service):
         """A callback that raises should not crash the service."""
@@ -182,6 +242,69 @@ class TestCallbackErrorIsolation:
         good_cb.assert_called_once()
 
 
+class TestBatchedHandoff:
+    def test_burst_wakes_loop_once(self, stream_service):
+        cb = AsyncMock()
+        stream_service.on_trade(cb)
+        loop = stream_service._loop
+        loop.call_soon_threadsafe = MagicMock(wraps=loop.call_soon_threadsafe)
+        for i in range(10):
+            stream_service._handle_message({"Content": {"RType": "Trade", "Symbol": f"S{i}"}})
+        loop.call_soon_threadsafe.assert_called_once()
+        loop.run_until_complete(asyncio.sleep(0.05))
+        assert cb.call_count == 10
+
+    def test_callbacks_run_in_arrival_order(self, stream_service):
+        seen = []
+
+        async def cb(msg):
+            seen.append(msg.symbol)
+
+        stream_service.on_trade(cb)
+        symbols = [f"S{i}" for i in range(20)]
+        for sym in symbols:
+            stream_service._handle_message({"Content": {"RType": "Trade", "Symbol": sym}})
+        stream_service._loop.run_until_complete(asyncio.sleep(0.05))
+        assert seen == symbols
+
+    def test_batches_capped(self, stream_service):
+        cb = AsyncMock()
+        stream_service.on_trade(cb)
+        stream_service._HANDOFF_MAX_BATCH = 3
+        with patch("app.services.ssi_stream_service.ssi_handoff_batch_size") as hist:
+            for i in range(7):
+                stream_service._handle_message({"Content": {"RType": "Trade", "Symbol": f"S{i}"}})
+            stream_service._loop.run_until_complete(asyncio.sleep(0.05))
+        assert [c.args[0] for c in hist.observe.call_args_list] == [3, 3, 1]
+        assert cb.call_count == 7
+
+    def test_new_burst_after_drain_wakes_again(self, stream_service):
+        cb = AsyncMock()
+        stream_service.on_trade(cb)
+        raw = {"Content": {"RType": "Trade", "Symbol": "VNM"}}
+        stream_service._handle_message(raw)
+        stream_service._loop.run_until_complete(asyncio.sleep(0.05))
+        assert stream_service._drain_scheduled is False
+        stream_service._handle_message(raw)
+        stream_service._loop.run_until_complete(asyncio.sleep(0.05))
+        assert cb.call_count == 2
+
+    def test_handoff_from_stream_thread(self, stream_service):
+        cb = AsyncMock()
+        stream_service.on_trade(cb)
+        raw = {"Content": {"RType": "Trade", "Symbol": "VNM"}}
+
+        def produce():
+            for _ in range(50):
+                stream_service._handle_message(raw)
+
+        thread = threading.Thread(target=produce)
+        thread.start()
+        thread.join()
+        stream_service._loop.run_until_complete(asyncio.sleep(0.1))
+        assert cb.call_count == 50
+
+
 class TestNoLoopDropsCallback:
     def test_no_loop_logs_warning(self):
         """Without event loop set, callbacks should be dropped gracefully."""
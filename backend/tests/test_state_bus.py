@@ -0,0 +1,66 @@
+"""Tests for the in-process StateBus stand-in and bus factory."""
+
+import pytest
+
+from app.services.state_bus import InProcessStateBus, RedisStateBus, StateBus, create_state_bus
+
+
+class TestInProcessStateBus:
+    @pytest.mark.asyncio
+    async def test_subscriber_receives_frames_in_order(self):
+        bus = InProcessStateBus()
+        frames = await bus.subscribe()
+        await bus.publish("market", "a")
+        await bus.publish("index", "b")
+        assert await anext(frames) == ("market", "a")
+        assert await anext(frames) == ("index", "b")
+
+    @pytest.mark.asyncio
+    async def test_frames_before_subscribe_not_delivered(self):
+        bus = InProcessStateBus()
+        await bus.publish("market", "early")
+        frames = await bus.subscribe()
+        await bus.publish("market", "late")
+        assert await anext(frames) == ("market", "late")
+
+    @pytest.mark.asyncio
+    async def test_fan_out_to_every_subscriber(self):
+        bus = InProcessStateBus()
+        first, second = await bus.subscribe(), await bus.subscribe()
+        await bus.publish("alerts", "x")
+        assert await anext(first) == ("alerts", "x")
+        assert await anext(second) == ("alerts", "x")
+
+    @pytest.mark.asyncio
+    async def test_closing_iterator_unsubscribes(self):
+        bus = InProcessStateBus()
+        frames = await bus.subscribe()
+        await bus.publish("market", "a")
+        await anext(frames)
+        await frames.aclose()
+        assert bus._subscribers == []
+
+    @pytest.mark.asyncio
+    async def test_get_set(self):
+        bus = InProcessStateBus()
+        assert await bus.get("rest:snapshot") is None
+        await bus.set("rest:snapshot", "v1")
+        assert await bus.get("rest:snapshot") == "v1"
+
+    def test_incomplete_backend_fails_at_construction(self):
+        class NoSubscribe(StateBus):
+            async def publish(self, channel, frame): ...
+            async def set(self, key, value): ...
+            async def get(self, key): ...
+
+        with pytest.raises(TypeError, match="subscribe"):
+            NoSubscribe()
+
+
+class TestFactory:
+    def test_memory_url(self):
+        assert isinstance(create_state_bus("memory://"), InProcessStateBus)
+
+    def test_redis_url(self):
+        pytest.importorskip("redis")
+        assert isinstance(create_state_bus("redis://localhost:6379/0"), RedisStateBus)
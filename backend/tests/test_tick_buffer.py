@@ -0,0 +1,85 @@
+"""Tests for TickBuffer — columnar append, take, overflow/spill, high-water callback."""
+
+from datetime import datetime
+
+from app.database.tick_buffer import TICK_COLUMNS, TickBuffer, compact_row
+
+_TS = datetime(2026, 2, 9, 10, 30)
+
+
+def _fill(buf: TickBuffer, n: int, start: int = 0) -> None:
+    for i in range(start, start + n):
+        buf.append("VNM", _TS, float(i), i, "neutral", 79.5, 80.0)
+
+
+class TestAppendTake:
+    def test_rows_in_column_order(self):
+        buf = TickBuffer(10)
+        buf.append("VNM", _TS, 80.5, 100, "mua_chu_dong", 80.0, 80.5)
+        batch = buf.take(10)
+        assert len(TICK_COLUMNS) == 7
+        assert list(batch.rows()) == [("VNM", _TS, 8050, 100, 1, 8000, 8050)]
+
+    def test_take_all_detaches_columns(self):
+        buf = TickBuffer(10)
+        _fill(buf, 3)
+        batch = buf.take(10)
+        assert len(batch) == 3
+        assert len(buf) == 0
+        _fill(buf, 1)
+        assert len(batch) == 3  # detached batch unaffected by new appends
+
+    def test_take_partial_keeps_remainder(self):
+        buf = TickBuffer(10)
+        _fill(buf, 5)
+        batch = buf.take(2)
+        assert list(batch.price) == [0, 100]
+        assert list(buf.take(10).price) == [200, 300, 400]
+
+    def test_numeric_columns_are_arrays(self):
+        buf = TickBuffer(10)
+        _fill(buf, 1)
+        batch = buf.take(10)
+        assert batch.price.typecode == "i"
+        assert batch.volume.typecode == "q"
+        assert batch.side.typecode == "b"
+
+    def test_prices_stored_exactly_in_hundredths(self):
+        buf = TickBuffer(10)
+        buf.append("VN30F2603", _TS, 1210.3, 1, "ban_chu_dong", 1210.15, 1210.35)
+        (row,) = buf.take(10).rows()
+        assert row[2:] == (121030, 1, 2, 121015, 121035)
+
+
+class TestOverflow:
+    def test_drops_oldest_chunk(self):
+        buf = TickBuffer(200)  # drop chunk = 2
+        _fill(buf, 201)
+        prices = list(buf.take(200).price)
+        assert len(prices) == 199
+        assert prices[0] == 200
+        assert prices[-1] == 20000
+
+    def test_on_overflow_receives_whole_backlog(self):
+        spilled = []
+        buf = TickBuffer(10, on_overflow=spilled.append)
+        _fill(buf, 11)
+        (batch,) = spilled
+        assert [r[2] for r in batch] == [i * 100 for i in range(10)]
+        assert list(buf.take(10).price) == [1000]
+
+
+class TestHighWater:
+    def test_callback_fires_at_high_water(self):
+        calls = []
+        buf = TickBuffer(100, high_water=5, on_high_water=lambda: calls.append(1))
+        _fill(buf, 4)
+        assert calls == []
+        _fill(buf, 1)
+        assert len(calls) == 1
+
+
+class TestCompactRow:
+    def test_legacy_row_reencoded(self):
+        legacy = ("VNM", _TS, 80.5, 100, "ban_chu_dong", 80.45, None)
+        assert compact_row(legacy) == ("VNM", _TS, 8050, 100, 2, 8045, None)
@@ -0,0 +1,74 @@
+"""Tests for TimeRing — append/wrap, at_or_before and since bisect queries."""
+
+from datetime import datetime, timedelta
+
+from app.services.time_ring import TimeRing
+
+_T0 = datetime(2026, 2, 9, 10, 0, 0)
+
+
+def _at(seconds: float) -> datetime:
+    return _T0 + timedelta(seconds=seconds)
+
+
+def _filled(capacity: int, n: int) -> TimeRing[int]:
+    ring: TimeRing[int] = TimeRing(capacity)
+    for i in range(n):
+        ring.append(_at(i * 10), i)
+    return ring
+
+
+class TestAppend:
+    def test_items_in_order(self):
+        ring = _filled(5, 3)
+        assert len(ring) == 3
+        assert ring.items() == [0, 1, 2]
+
+    def test_wraps_and_keeps_newest(self):
+        ring = _filled(5, 12)
+        assert len(ring) == 5
+        assert ring.items() == [7, 8, 9, 10, 11]
+
+    def test_clock_step_back_clamped(self):
+        ring = _filled(5, 3)  # newest at +20s
+        ring.append(_at(5), 99)
+        assert ring.items() == [0, 1, 2, 99]
+        assert ring.since(_at(20)) == [2, 99]
+
+    def test_clear(self):
+        ring = _filled(5, 7)
+        ring.clear()
+        assert len(ring) == 0
+        assert ring.items() == []
+        assert ring.at_or_before(_at(100)) is None
+
+
+class TestAtOrBefore:
+    def test_exact_and_between(self):
+        ring = _filled(10, 5)  # items at 0, 10, 20, 30, 40s
+        assert ring.at_or_before(_at(20)) == 2
+        assert ring.at_or_before(_at(25)) == 2
+        assert ring.at_or_before(_at(1000)) == 4
+
+    def test_before_oldest_is_none(self):
+        ring = _filled(10, 5)
+        assert ring.at_or_before(_at(-1)) is None
+
+    def test_after_wrap(self):
+        ring = _filled(4, 10)  # retained: 6..9 at 60..90s
+        assert ring.at_or_before(_at(75)) == 7
+        assert ring.at_or_before(_at(55)) is None
+
+
+class TestSince:
+    def test_slice_to_newest(self):
+        ring = _filled(10, 5)
+        assert ring.since(_at(15)) == [2, 3, 4]
+        assert ring.since(_at(20)) == [2, 3, 4]
+        assert ring.since(_at(41)) == []
+        assert ring.since(_at(-100)) == [0, 1, 2, 3, 4]
+
+    def test_unwraps_across_ring_boundary(self):
+        ring = _filled(4, 6)  # physical layout wrapped: [4, 5, 2, 3]
+        assert ring.since(_at(30)) == [3, 4, 5]
+        assert ring.since(_at(0)) == [2, 3, 4, 5]
@@ -7,7 +7,9 @@ Validates lifecycle, broadcast, heartbeat, channels, and data format.
 import asyncio
 import json
 import threading
+import zlib
 
+import msgpack
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi import FastAPI, WebSocket
@@ -165,6 +167,66 @@ class TestBroadcast:
                 assert json.loads(bg_data[0]) == {"test": True}
 
 
+# ---------------------------------------------------------------------------
+# Client messages (market subscriptions)
+# ---------------------------------------------------------------------------
+
+class TestClientMessages:
+    def test_subscribe_over_read_loop(self, market_mgr):
+        from app.websocket.market_subscriptions import MarketSubscriptions
+
+        state = {"quotes": {"VNM": {"total_volume": 1}, "FPT": {"total_volume": 2}}}
+        subs = MarketSubscriptions(
+            market_mgr, lambda: (3, state), lambda: json.dumps({"type": "keyframe", "seq": 3}),
+        )
+        app = FastAPI()
+
+        @app.websocket("/ws/market")
+        async def ws_market(ws: WebSocket):
+            await _ws_lifecycle(ws, market_mgr, on_message=subs.handle)
+
+        with patch(_SETTINGS, _mock_settings()):
+            with TestClient(app).websocket_connect("/ws/market") as ws:
+                ws.send_text('{"type": "subscribe", "symbols": ["FPT"]}')
+                assert json.loads(ws.receive_text()) == {
+                    "type": "keyframe", "seq": 3, "quotes": {"FPT": {"total_volume": 2}},
+                }
+                assert subs.group_count == 1
+
+
+# ---------------------------------------------------------------------------
+# Per-connection encodings
+# ---------------------------------------------------------------------------
+
+class TestEncoding:
+    def test_msgpack_client_receives_binary(self, app, market_mgr):
+        with patch(_SETTINGS, _mock_settings()):
+            with TestClient(app).websocket_connect("/ws/market?format=msgpack") as ws:
+                market_mgr.broadcast('{"quotes": {"VNM": 1}}')
+                assert msgpack.unpackb(ws.receive_bytes()) == {"quotes": {"VNM": 1}}
+
+    def test_deflate_client_receives_raw_deflate(self, app, market_mgr):
+        with patch(_SETTINGS, _mock_settings()):
+            with TestClient(app).websocket_connect("/ws/market?compress=deflate") as ws:
+                market_mgr.broadcast('{"quotes": {}}')
+                assert zlib.decompress(ws.receive_bytes(), wbits=-15) == b'{"quotes": {}}'
+
+    def test_msgpack_deflate(self, app, market_mgr):
+        with patch(_SETTINGS, _mock_settings()):
+            url = "/ws/market?format=msgpack&compress=deflate"
+            with TestClient(app).websocket_connect(url) as ws:
+                market_mgr.broadcast('{"a": [1, 2]}')
+                assert msgpack.unpackb(zlib.decompress(ws.receive_bytes(), wbits=-15)) == {"a": [1, 2]}
+
+    def test_unsupported_format_rejected(self, app, market_mgr):
+        with patch(_SETTINGS, _mock_settings()):
+            with pytest.raises(Exception):
+                with TestClient(app).websocket_connect("/ws/market?format=xml"):
+                    pass
+            assert market_mgr.client_count == 0
+            assert sum(_rate_limiter._connections.values()) == 0
+
+
 # ---------------------------------------------------------------------------
 # Channel subscription — isolation between channels
 # ---------------------------------------------------------------------------
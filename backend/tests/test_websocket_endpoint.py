@@ -7,7 +7,8 @@ import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 
 from app.models.domain import MarketSnapshot, ForeignSummary, IndexData
-from app.websocket.connection_manager import ConnectionManager
+from app.websocket.connection_manager import ConnectionManager, _Client, _FifoOutbox
+from app.websocket.encoding import JSON
 
 
 @pytest.fixture
@@ -44,12 +45,12 @@ def mock_indices():
 
 
 def _add_fake_client(manager):
-    """Add a fake client to a ConnectionManager. Returns (queue, task)."""
+    """Add a fake client to a ConnectionManager. Returns (outbox, task)."""
     ws = MagicMock()
-    queue: asyncio.Queue[str] = asyncio.Queue(maxsize=50)
+    outbox = _FifoOutbox(50)
     task = asyncio.create_task(asyncio.sleep(999))
-    manager._clients[ws] = (queue, task)
-    return queue, task
+    manager._clients[ws] = _Client(JSON, outbox, task=task, wake=asyncio.Event())
+    return outbox, task
 
 
 class TestBroadcastLoop:
@@ -85,9 +86,9 @@ class TestBroadcastLoop:
         assert mock_processor.get_market_snapshot.call_count >= 2
         assert mock_processor.get_foreign_summary.call_count >= 2
         assert mock_processor.index_tracker.get_all.call_count >= 2
-        assert not mq.empty()
-        assert not fq.empty()
-        assert not iq.empty()
+        assert len(mq)
+        assert len(fq)
+        assert len(iq)
         for t in (mt, ft, it):
             t.cancel()
 
@@ -167,14 +168,14 @@ class TestBroadcastLoop:
             except asyncio.CancelledError:
                 pass
 
-        market_data = json.loads(mq.get_nowait())
+        market_data = json.loads(mq.pop())
         assert "quotes" in market_data
         assert "indices" in market_data
 
-        foreign_data = json.loads(fq.get_nowait())
+        foreign_data = json.loads(fq.pop())
         assert "total_buy_value" in foreign_data
 
-        index_data = json.loads(iq.get_nowait())
+        index_data = json.loads(iq.pop())
         assert "VN30" in index_data
         assert "VNINDEX" in index_data
 
@@ -0,0 +1,175 @@
+-- Multi-resolution candles: 5m / 15m / 1h continuous aggregates cascaded
+-- on top of candles_1m and index_candles_1m (hierarchical continuous
+-- aggregates, TimescaleDB >= 2.9). Each level reads the one below it, so a
+-- refresh never rescans tick_data / index_snapshots.
+-- Columns match the 1-minute views; HistoryService selects by resolution.
+-- Views are real-time (materialized_only = false) so the current, still
+-- open bar is included.
+-- Daily bars are bucketed on the Asia/Ho_Chi_Minh trading day. A time-zone
+-- bucket cannot be stacked on the UTC-bucketed levels, so the 1d views read
+-- tick_data / index_snapshots directly (like the 1m views); a refresh only
+-- recomputes the days whose rows changed.
+
+-- 1. Stock / futures candles ---------------------------------------------------
+
+CREATE MATERIALIZED VIEW candles_5m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('5 minutes', timestamp) AS timestamp,
+    symbol,
+    first(open, timestamp)       AS open,
+    max(high)                    AS high,
+    min(low)                     AS low,
+    last(close, timestamp)       AS close,
+    sum(volume)::bigint          AS volume,
+    sum(active_buy_vol)::bigint  AS active_buy_vol,
+    sum(active_sell_vol)::bigint AS active_sell_vol
+FROM candles_1m
+GROUP BY 1, 2
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW candles_15m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('15 minutes', timestamp) AS timestamp,
+    symbol,
+    first(open, timestamp)       AS open,
+    max(high)                    AS high,
+    min(low)                     AS low,
+    last(close, timestamp)       AS close,
+    sum(volume)::bigint          AS volume,
+    sum(active_buy_vol)::bigint  AS active_buy_vol,
+    sum(active_sell_vol)::bigint AS active_sell_vol
+FROM candles_5m
+GROUP BY 1, 2
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW candles_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('1 hour', timestamp) AS timestamp,
+    symbol,
+    first(open, timestamp)       AS open,
+    max(high)                    AS high,
+    min(low)                     AS low,
+    last(close, timestamp)       AS close,
+    sum(volume)::bigint          AS volume,
+    sum(active_buy_vol)::bigint  AS active_buy_vol,
+    sum(active_sell_vol)::bigint AS active_sell_vol
+FROM candles_15m
+GROUP BY 1, 2
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW candles_1d
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('1 day', timestamp, 'Asia/Ho_Chi_Minh') AS timestamp,
+    symbol,
+    first(price, timestamp)  AS open,
+    max(price)               AS high,
+    min(price)               AS low,
+    last(price, timestamp)   AS close,
+    sum(volume)::bigint      AS volume,
+    coalesce(sum(volume) FILTER (WHERE side = 'mua_chu_dong'), 0)::bigint AS active_buy_vol,
+    coalesce(sum(volume) FILTER (WHERE side = 'ban_chu_dong'), 0)::bigint AS active_sell_vol
+FROM tick_data
+GROUP BY 1, 2
+WITH NO DATA;
+
+-- 2. Index candles -------------------------------------------------------------
+--    Index volume is the cumulative session volume, so every level keeps the
+--    last value rather than a sum.
+
+CREATE MATERIALIZED VIEW index_candles_5m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('5 minutes', timestamp) AS timestamp,
+    index_name,
+    first(open, timestamp)  AS open,
+    max(high)               AS high,
+    min(low)                AS low,
+    last(close, timestamp)  AS close,
+    last(volume, timestamp) AS volume
+FROM index_candles_1m
+GROUP BY 1, 2
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW index_candles_15m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('15 minutes', timestamp) AS timestamp,
+    index_name,
+    first(open, timestamp)  AS open,
+    max(high)               AS high,
+    min(low)                AS low,
+    last(close, timestamp)  AS close,
+    last(volume, timestamp) AS volume
+FROM index_candles_5m
+GROUP BY 1, 2
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW index_candles_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('1 hour', timestamp) AS timestamp,
+    index_name,
+    first(open, timestamp)  AS open,
+    max(high)               AS high,
+    min(low)                AS low,
+    last(close, timestamp)  AS close,
+    last(volume, timestamp) AS volume
+FROM index_candles_15m
+GROUP BY 1, 2
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW index_candles_1d
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('1 day', timestamp, 'Asia/Ho_Chi_Minh') AS timestamp,
+    index_name,
+    first(value, timestamp)  AS open,
+    max(value)               AS high,
+    min(value)               AS low,
+    last(value, timestamp)   AS close,
+    last(volume, timestamp)::bigint AS volume
+FROM index_snapshots
+GROUP BY 1, 2
+WITH NO DATA;
+
+-- 3. Refresh policies: each level trails the one below by one of its buckets
+
+SELECT add_continuous_aggregate_policy('candles_5m',
+    start_offset => INTERVAL '3 hours', end_offset => INTERVAL '5 minutes',
+    schedule_interval => INTERVAL '5 minutes');
+SELECT add_continuous_aggregate_policy('candles_15m',
+    start_offset => INTERVAL '6 hours', end_offset => INTERVAL '15 minutes',
+    schedule_interval => INTERVAL '15 minutes');
+SELECT add_continuous_aggregate_policy('candles_1h',
+    start_offset => INTERVAL '1 day', end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '1 hour');
+SELECT add_continuous_aggregate_policy('candles_1d',
+    start_offset => INTERVAL '7 days', end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour');
+
+SELECT add_continuous_aggregate_policy('index_candles_5m',
+    start_offset => INTERVAL '3 hours', end_offset => INTERVAL '5 minutes',
+    schedule_interval => INTERVAL '5 minutes');
+SELECT add_continuous_aggregate_policy('index_candles_15m',
+    start_offset => INTERVAL '6 hours', end_offset => INTERVAL '15 minutes',
+    schedule_interval => INTERVAL '15 minutes');
+SELECT add_continuous_aggregate_policy('index_candles_1h',
+    start_offset => INTERVAL '1 day', end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '1 hour');
+SELECT add_continuous_aggregate_policy('index_candles_1d',
+    start_offset => INTERVAL '7 days', end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour');
+
+-- 4. Backfill, bottom-up
+CALL refresh_continuous_aggregate('candles_5m', NULL, NOW());
+CALL refresh_continuous_aggregate('candles_15m', NULL, NOW());
+CALL refresh_continuous_aggregate('candles_1h', NULL, NOW());
+CALL refresh_continuous_aggregate('candles_1d', NULL, NOW());
+CALL refresh_continuous_aggregate('index_candles_5m', NULL, NOW());
+CALL refresh_continuous_aggregate('index_candles_15m', NULL, NOW());
+CALL refresh_continuous_aggregate('index_candles_1h', NULL, NOW());
+CALL refresh_continuous_aggregate('index_candles_1d', NULL, NOW());
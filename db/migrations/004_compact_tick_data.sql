@@ -0,0 +1,175 @@
+-- Compact tick_data: fixed-width integer columns, compression and retention.
+--
+--   price / bid / ask  NUMERIC(12,2) -> INTEGER, hundredths of the price in
+--                      1000 VND (80.50 -> 8050). Exact for stock and VN30F
+--                      prices, and binary COPY sends 4 fixed bytes instead of
+--                      a variable-length NUMERIC.
+--   side               VARCHAR(20) -> SMALLINT: 0 neutral, 1 mua_chu_dong,
+--                      2 ban_chu_dong (app/database/tick_buffer.py SIDE_CODES).
+--
+-- HistoryService decodes both on read, so API responses are unchanged.
+-- Chunks older than 2 days are compressed, segmented by symbol (every history
+-- query filters on one symbol) and ordered by time. Raw ticks are dropped
+-- after 180 days; the candle aggregates keep their history, because their
+-- refresh windows never reach back that far.
+--
+-- candles_1m and candles_1d read tick_data, so they and the aggregates built
+-- on candles_1m (003_candle_resolutions.sql) are recreated over the new columns.
+-- Drain the BatchWriter spill log before applying: rows spilled in the old
+-- encoding are re-encoded on replay, but not while this runs.
+
+BEGIN;
+
+-- 1. New table, copied from the old one -----------------------------------------
+
+ALTER TABLE tick_data RENAME TO tick_data_numeric;
+ALTER INDEX IF EXISTS idx_tick_symbol_time RENAME TO idx_tick_numeric_symbol_time;
+
+CREATE TABLE tick_data (
+    symbol     VARCHAR(10) NOT NULL,
+    timestamp  TIMESTAMPTZ NOT NULL,
+    price      INTEGER NOT NULL,   -- hundredths
+    volume     INTEGER NOT NULL,
+    side       SMALLINT NOT NULL,  -- 0 neutral / 1 mua_chu_dong / 2 ban_chu_dong
+    bid        INTEGER,            -- hundredths
+    ask        INTEGER             -- hundredths
+);
+SELECT create_hypertable('tick_data', 'timestamp',
+    chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);
+CREATE INDEX IF NOT EXISTS idx_tick_symbol_time ON tick_data (symbol, timestamp DESC);
+
+INSERT INTO tick_data (symbol, timestamp, price, volume, side, bid, ask)
+SELECT symbol,
+       timestamp,
+       round(price * 100)::integer,
+       volume,
+       CASE side WHEN 'mua_chu_dong' THEN 1 WHEN 'ban_chu_dong' THEN 2 ELSE 0 END,
+       round(bid * 100)::integer,
+       round(ask * 100)::integer
+FROM tick_data_numeric;
+
+-- 2. Candle aggregates over the new columns --------------------------------------
+
+DROP MATERIALIZED VIEW IF EXISTS candles_1m CASCADE;
+DROP MATERIALIZED VIEW IF EXISTS candles_1d;
+DROP TABLE tick_data_numeric;
+
+CREATE MATERIALIZED VIEW candles_1m
+WITH (timescaledb.continuous) AS
+SELECT
+    time_bucket('1 minute', timestamp) AS timestamp,
+    symbol,
+    (first(price, timestamp) * 0.01)::numeric(12, 2) AS open,
+    (max(price) * 0.01)::numeric(12, 2)              AS high,
+    (min(price) * 0.01)::numeric(12, 2)              AS low,
+    (last(price, timestamp) * 0.01)::numeric(12, 2)  AS close,
+    sum(volume)::bigint      AS volume,
+    coalesce(sum(volume) FILTER (WHERE side = 1), 0)::bigint AS active_buy_vol,
+    coalesce(sum(volume) FILTER (WHERE side = 2), 0)::bigint AS active_sell_vol
+FROM tick_data
+GROUP BY 1, 2
+WITH NO DATA;
+
+SELECT add_continuous_aggregate_policy('candles_1m',
+    start_offset  => INTERVAL '2 hours',
+    end_offset    => INTERVAL '1 minute',
+    schedule_interval => INTERVAL '1 minute'
+);
+
+-- Cascaded resolutions and the tick_data-based daily view, as in 003
+
+CREATE MATERIALIZED VIEW candles_5m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('5 minutes', timestamp) AS timestamp,
+    symbol,
+    first(open, timestamp)       AS open,
+    max(high)                    AS high,
+    min(low)                     AS low,
+    last(close, timestamp)       AS close,
+    sum(volume)::bigint          AS volume,
+    sum(active_buy_vol)::bigint  AS active_buy_vol,
+    sum(active_sell_vol)::bigint AS active_sell_vol
+FROM candles_1m
+GROUP BY 1, 2
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW candles_15m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('15 minutes', timestamp) AS timestamp,
+    symbol,
+    first(open, timestamp)       AS open,
+    max(high)                    AS high,
+    min(low)                     AS low,
+    last(close, timestamp)       AS close,
+    sum(volume)::bigint          AS volume,
+    sum(active_buy_vol)::bigint  AS active_buy_vol,
+    sum(active_sell_vol)::bigint AS active_sell_vol
+FROM candles_5m
+GROUP BY 1, 2
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW candles_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('1 hour', timestamp) AS timestamp,
+    symbol,
+    first(open, timestamp)       AS open,
+    max(high)                    AS high,
+    min(low)                     AS low,
+    last(close, timestamp)       AS close,
+    sum(volume)::bigint          AS volume,
+    sum(active_buy_vol)::bigint  AS active_buy_vol,
+    sum(active_sell_vol)::bigint AS active_sell_vol
+FROM candles_15m
+GROUP BY 1, 2
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW candles_1d
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket('1 day', timestamp, 'Asia/Ho_Chi_Minh') AS timestamp,
+    symbol,
+    (first(price, timestamp) * 0.01)::numeric(12, 2) AS open,
+    (max(price) * 0.01)::numeric(12, 2)              AS high,
+    (min(price) * 0.01)::numeric(12, 2)              AS low,
+    (last(price, timestamp) * 0.01)::numeric(12, 2)  AS close,
+    sum(volume)::bigint      AS volume,
+    coalesce(sum(volume) FILTER (WHERE side = 1), 0)::bigint AS active_buy_vol,
+    coalesce(sum(volume) FILTER (WHERE side = 2), 0)::bigint AS active_sell_vol
+FROM tick_data
+GROUP BY 1, 2
+WITH NO DATA;
+
+SELECT add_continuous_aggregate_policy('candles_5m',
+    start_offset => INTERVAL '3 hours', end_offset => INTERVAL '5 minutes',
+    schedule_interval => INTERVAL '5 minutes');
+SELECT add_continuous_aggregate_policy('candles_15m',
+    start_offset => INTERVAL '6 hours', end_offset => INTERVAL '15 minutes',
+    schedule_interval => INTERVAL '15 minutes');
+SELECT add_continuous_aggregate_policy('candles_1h',
+    start_offset => INTERVAL '1 day', end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '1 hour');
+SELECT add_continuous_aggregate_policy('candles_1d',
+    start_offset => INTERVAL '7 days', end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour');
+
+-- 3. Compression and retention -----------------------------------------------
+
+ALTER TABLE tick_data SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'symbol',
+    timescaledb.compress_orderby = 'timestamp DESC'
+);
+SELECT add_compression_policy('tick_data', INTERVAL '2 days');
+SELECT add_retention_policy('tick_data', INTERVAL '180 days');
+
+COMMIT;
+
+-- 4. Backfill, bottom-up (outside the transaction: refresh cannot run in one)
+CALL refresh_continuous_aggregate('candles_1m', NULL, NOW());
+CALL refresh_continuous_aggregate('candles_5m', NULL, NOW());
+CALL refresh_continuous_aggregate('candles_15m', NULL, NOW());
+CALL refresh_continuous_aggregate('candles_1h', NULL, NOW());
+CALL refresh_continuous_aggregate('candles_1d', NULL, NOW());
@@ -108,10 +108,16 @@ export function useCandleData(
     return () => clearInterval(id);
   }, [fetchCandles]);
 
-  // Subscribe to WS for real-time price to build current candle
+  // Subscribe to WS for real-time price to build current candle — only this
+  // symbol's last price (or the futures contract's) rather than every symbol
   const { data: snapshot } = useWebSocket<MarketSnapshot>("market", {
     fallbackFetcher: () => apiFetch<MarketSnapshot>("/market/snapshot"),
     fallbackIntervalMs: 5000,
+    subscribe: {
+      symbols: [symbol],
+      fields: ["last_price"],
+      channels: ["prices", "derivatives"],
+    },
   });
 
   // Update live candle from WS snapshot
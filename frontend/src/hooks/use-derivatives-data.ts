@@ -5,6 +5,8 @@ import { usePolling } from "./use-polling";
 import { apiFetch } from "../utils/api-client";
 import type { MarketSnapshot, BasisPoint, DerivativesData } from "../types";
 
+const DERIVATIVES_ONLY = { channels: ["derivatives"] };
+
 interface DerivativesPageData {
   derivatives: DerivativesData | null;
   basisTrend: BasisPoint[];
@@ -16,10 +18,11 @@ export function useDerivativesData(
   trendMinutes = 30,
   trendPollMs = 10_000,
 ): DerivativesPageData {
-  // Real-time derivatives from existing WS market channel
+  // Real-time derivatives from the WS market channel, subscribed to that section only
   const ws = useWebSocket<MarketSnapshot>("market", {
     fallbackFetcher: () => apiFetch<MarketSnapshot>("/market/snapshot"),
     fallbackIntervalMs: 5000,
+    subscribe: DERIVATIVES_ONLY,
   });
 
   // Basis trend from new REST endpoint
@@ -1,10 +1,11 @@
 /** Generic WebSocket hook with auto-reconnect and REST polling fallback. */
 
 import { useState, useEffect, useRef, useCallback } from "react";
+import { applyMarketDelta, keyframeToSnapshot } from "../utils/market-delta";
 
 // -- Public types --
 
-export type WebSocketChannel = "market" | "foreign" | "index" | "alerts";
+export type WebSocketChannel = "market" | "foreign" | "index" | "alerts" | "sparkline";
 export type ConnectionStatus = "connecting" | "connected" | "disconnected";
 
 export interface WebSocketResult<T> {
@@ -29,6 +30,15 @@ export interface UseWebSocketOptions<T> {
   fallbackIntervalMs?: number;
   /** Max consecutive reconnect attempts before fallback (default: 3) */
   maxReconnectAttempts?: number;
+  /** /ws/market only: narrow the stream to these symbols/fields/sections.
+   *  Sent on every connect, and again whenever its contents change. */
+  subscribe?: MarketSubscription;
+}
+
+export interface MarketSubscription {
+  symbols?: string[];
+  fields?: string[];
+  channels?: string[];
 }
 
 // -- Constants --
@@ -56,8 +66,11 @@ export function useWebSocket<T>(
 
   // Expose reconnect from inside effect via stable ref
   const reconnectRef = useRef<() => void>(() => {});
+  // Send on the open socket (no-op while connecting or polling)
+  const sendRef = useRef<(msg: object) => void>(() => {});
 
   const token = options.token;
+  const subscriptionKey = options.subscribe ? JSON.stringify(options.subscribe) : null;
 
   useEffect(() => {
     let unmounted = false;
@@ -68,6 +81,9 @@ export function useWebSocket<T>(
     let attempts = 0;
     let inFallback = false;
     let generation = 0; // prevents stale poll responses after WS connects
+    // Delta-encoded channels (/ws/market): last applied seq + rebuilt state
+    let seq: number | null = null;
+    let latest: T | null = null;
 
     const buildUrl = (): string => {
       const proto = window.location.protocol === "https:" ? "wss:" : "ws:";
@@ -128,10 +144,13 @@ export function useWebSocket<T>(
         if (unmounted) return;
         attempts = 0;
         generation += 1; // invalidate in-flight poll responses
+        seq = null; // server sends a fresh keyframe on connect
         stopFallback();
         setStatus("connected");
         setIsLive(true);
         setError(null);
+        const subscription = optsRef.current.subscribe;
+        if (subscription) ws?.send(JSON.stringify({ type: "subscribe", ...subscription }));
       };
 
       ws.onmessage = (e) => {
@@ -139,6 +158,20 @@ export function useWebSocket<T>(
         try {
           const msg = JSON.parse(e.data);
           if (msg?.type === "status") return; // SSI upstream status event
+          if (msg?.type === "keyframe") {
+            seq = msg.seq;
+            latest = keyframeToSnapshot<T>(msg);
+            setData(latest);
+            return;
+          }
+          if (msg?.type === "delta") {
+            // Gap (dropped frame) — ignore deltas until the next keyframe
+            if (latest === null || msg.base !== seq) return;
+            seq = msg.seq;
+            latest = applyMarketDelta(latest as T & object, msg);
+            setData(latest);
+            return;
+          }
           setData(msg as T);
         } catch {
           // binary or non-JSON — ignore
@@ -169,6 +202,10 @@ export function useWebSocket<T>(
       };
     };
 
+    sendRef.current = (msg) => {
+      if (ws?.readyState === WebSocket.OPEN) ws.send(JSON.stringify(msg));
+    };
+
     // Expose manual reconnect
     reconnectRef.current = () => {
       attempts = 0;
@@ -195,6 +232,15 @@ export function useWebSocket<T>(
     };
   }, [channel, token]);
 
+  // Re-send a changed subscription on the open socket (onopen covers reconnects);
+  // the server answers with a keyframe for the new selection
+  useEffect(() => {
+    const subscription = optsRef.current.subscribe;
+    sendRef.current(
+      subscription ? { type: "subscribe", ...subscription } : { type: "unsubscribe" },
+    );
+  }, [subscriptionKey]);
+
   const reconnect = useCallback(() => reconnectRef.current(), []);
 
   return { data, status, error, isLive, reconnect };
@@ -83,7 +83,9 @@ export interface IndexData {
   advances: number;
   declines: number;
   no_changes: number;
-  intraday: IntradayPoint[];
+  intraday_cursor: number;
+  /** Present in REST responses only; WS payloads stream it via /ws/sparkline */
+  intraday?: IntradayPoint[];
   advance_ratio: number;
   last_updated: string | null;
 }
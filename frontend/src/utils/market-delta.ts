@@ -0,0 +1,35 @@
+/** Rebuild MarketSnapshot state from /ws/market keyframe + delta frames. */
+
+type Frame = Record<string, unknown>;
+
+const FRAME_META = ["type", "seq", "base"];
+/** Sections keyed by symbol/index id; other sections are plain objects. */
+const SYMBOL_SECTIONS = ["quotes", "prices", "indices"];
+
+/** Strip protocol fields from a keyframe, leaving the full snapshot. */
+export function keyframeToSnapshot<T>(frame: Frame): T {
+  const snapshot: Frame = {};
+  for (const [key, value] of Object.entries(frame)) {
+    if (!FRAME_META.includes(key)) snapshot[key] = value;
+  }
+  return snapshot as T;
+}
+
+/** Merge a delta's changed symbols/fields into a new snapshot object. */
+export function applyMarketDelta<T extends object>(snapshot: T, frame: Frame): T {
+  const next: Frame = { ...snapshot };
+  for (const [section, changes] of Object.entries(frame)) {
+    if (FRAME_META.includes(section)) continue;
+    const prev = (next[section] ?? {}) as Frame;
+    if (SYMBOL_SECTIONS.includes(section)) {
+      const merged: Frame = { ...prev };
+      for (const [key, fields] of Object.entries(changes as Record<string, object>)) {
+        merged[key] = { ...(merged[key] as object | undefined), ...fields };
+      }
+      next[section] = merged;
+    } else {
+      next[section] = { ...prev, ...(changes as object) };
+    }
+  }
+  return next as T;
+}